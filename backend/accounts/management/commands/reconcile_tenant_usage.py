@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Tenant
+from accounts.services.usage import reconcile_usage
+
+
+class Command(BaseCommand):
+    help = "Recompute TenantUsage counters from Product rows and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", type=int, default=None, help="Limit to one tenant id.")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.all()
+        if options.get("tenant"):
+            tenants = tenants.filter(id=options["tenant"])
+        dry_run = options.get("dry_run")
+
+        total = 0
+        drifted = 0
+        for tenant_id in tenants.order_by("id").values_list("id", flat=True).iterator():
+            previous, actual = reconcile_usage(tenant_id, dry_run=dry_run)
+            total += 1
+            if previous != actual:
+                drifted += 1
+                self.stdout.write(f"tenant={tenant_id} products_count {previous} -> {actual}")
+
+        verb = "à corriger" if dry_run else "corrigé(s)"
+        self.stdout.write(self.style.SUCCESS(f"{drifted} compteur(s) {verb} sur {total} tenant(s)."))
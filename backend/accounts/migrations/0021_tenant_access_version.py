@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_userprofile_flags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tenant',
+            name='access_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -63,6 +63,8 @@ class Tenant(models.Model):
     subscription_status = models.CharField(max_length=15, choices=SUBSCRIPTION_STATUS, default="NONE")
     grace_started_at = models.DateTimeField(null=True, blank=True)
     stripe_customer_id = models.CharField(max_length=255, blank=True, default="")
+    # Incrémenté à chaque changement plan / facturation / overrides : clé du cache d'entitlements.
+    access_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -189,6 +191,21 @@ class OrganizationOverrides(models.Model):
     custom_limits = models.JSONField(null=True, blank=True)
 
 
+class TenantUsage(models.Model):
+    """
+    Compteurs d'usage maintenus transactionnellement (signaux produit + chemins bulk),
+    lus par check_limit au lieu d'un COUNT(*) à chaque création.
+    Recalés périodiquement par `reconcile_tenant_usage`.
+    """
+    tenant = models.OneToOneField(Tenant, on_delete=models.CASCADE, related_name="usage")
+    products_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Usage {self.tenant_id}: {self.products_count} produit(s)"
+
+
 class Subscription(models.Model):
     PROVIDERS = (("STRIPE", "Stripe"), ("MANUAL", "Manual"))
     tenant = models.OneToOneField(Tenant, on_delete=models.CASCADE)
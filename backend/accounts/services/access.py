@@ -1,12 +1,16 @@
 # backend/accounts/services/access.py
 import datetime
+import threading
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional, Tuple
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
 from django.utils import timezone
 
 from accounts.models import OrganizationOverrides, Tenant, Membership
-from products.models import Product
+from accounts.services.usage import get_products_count
 
 User = get_user_model()
 
@@ -117,6 +121,16 @@ PLAN_REGISTRY: Dict[str, Dict[str, Any]] = {
 
 DEFAULT_PLAN_CODE = "ESSENTIEL"
 
+# Cache entitlements / limites : clé (tenant, access_version, plan effectif).
+# access_version vit en base (Tenant) : l'invalidation est visible de tous les process,
+# et annulée avec la transaction (webhook Stripe) en cas d'erreur.
+ACCESS_CACHE_TTL_SECONDS = 10 * 60
+ACCESS_LOCAL_CACHE_SIZE = 1024
+ACCESS_BILLING_FIELDS = ("plan", "plan_source", "license_expires_at", "is_lifetime", "subscription_status")
+
+_local_access: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_local_access_lock = threading.Lock()
+
 
 def _now() -> datetime.datetime:
     return timezone.now()
@@ -159,36 +173,81 @@ def get_effective_plan(tenant: Tenant) -> Tuple[str, Dict[str, Any]]:
     return DEFAULT_PLAN_CODE, PLAN_REGISTRY[DEFAULT_PLAN_CODE]
 
 
-def get_entitlements(tenant: Tenant) -> List[str]:
-    _, plan_cfg = get_effective_plan(tenant)
+def _load_access(tenant: Tenant, plan_cfg: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
     entitlements = list(plan_cfg.get("entitlements", []))
+    limits: Dict[str, Optional[int]] = dict(plan_cfg.get("limits", {}))
 
     # Overrides enterprise / custom
     try:
         overrides = OrganizationOverrides.objects.filter(tenant=tenant).first()
         if overrides and overrides.custom_entitlements:
             entitlements = list(set(entitlements) | set(overrides.custom_entitlements))
-    except Exception:
-        entitlements = list(plan_cfg.get("entitlements", []))
-
-    return entitlements
-
-
-def get_limits(tenant: Tenant) -> Dict[str, Optional[int]]:
-    _, plan_cfg = get_effective_plan(tenant)
-    limits: Dict[str, Optional[int]] = dict(plan_cfg.get("limits", {}))
-
-    try:
-        overrides = OrganizationOverrides.objects.filter(tenant=tenant).first()
         if overrides and overrides.custom_limits:
             # custom_limits peut forcer des valeurs
             for k, v in overrides.custom_limits.items():
                 if v is not None:
                     limits[k] = v
     except Exception:
-        limits = dict(plan_cfg.get("limits", {}))
+        # Repli sur le plan, non mis en cache (les overrides seront relus au prochain appel).
+        return {"entitlements": list(plan_cfg.get("entitlements", [])), "limits": dict(plan_cfg.get("limits", {}))}, False
+
+    return {"entitlements": entitlements, "limits": limits}, True
+
+
+def _resolve_access(tenant: Tenant) -> Dict[str, Any]:
+    """
+    Entitlements + limites du tenant : cache process (LRU) puis cache partagé, sinon 1 requête.
+    Le plan effectif est recalculé à chaque appel (expiration de licence sans écriture en base).
+    """
+    plan_code, plan_cfg = get_effective_plan(tenant)
+    if not tenant.pk:
+        return _load_access(tenant, plan_cfg)[0]
+
+    key = f"access:{tenant.pk}:v{tenant.access_version}:{plan_code}"
+    with _local_access_lock:
+        value = _local_access.get(key)
+        if value is not None:
+            _local_access.move_to_end(key)
+            return value
+
+    value = cache.get(key)
+    if value is None:
+        value, cacheable = _load_access(tenant, plan_cfg)
+        if not cacheable:
+            return value
+        cache.set(key, value, ACCESS_CACHE_TTL_SECONDS)
+
+    with _local_access_lock:
+        _local_access[key] = value
+        while len(_local_access) > ACCESS_LOCAL_CACHE_SIZE:
+            _local_access.popitem(last=False)
+    return value
+
+
+def bump_access_version(tenant_ids) -> None:
+    ids = [tenant_id for tenant_id in tenant_ids if tenant_id]
+    if ids:
+        Tenant.objects.filter(id__in=ids).update(access_version=F("access_version") + 1)
+
 
-    return limits
+def invalidate_access_cache(tenant: Tenant) -> None:
+    """Nouvelle version d'accès pour ce tenant (et l'instance en mémoire)."""
+    bump_access_version([tenant.pk])
+    tenant.refresh_from_db(fields=["access_version"])
+
+
+def clear_access_cache() -> None:
+    """Vide le cache process (tests, shell)."""
+    with _local_access_lock:
+        _local_access.clear()
+
+
+def get_entitlements(tenant: Tenant) -> List[str]:
+    return list(_resolve_access(tenant)["entitlements"])
+
+
+def get_limits(tenant: Tenant) -> Dict[str, Optional[int]]:
+    return dict(_resolve_access(tenant)["limits"])
 
 
 def get_retention_days(tenant: Tenant) -> Optional[int]:
@@ -203,7 +262,8 @@ def get_plan_code(tenant: Tenant) -> str:
 
 
 def get_usage(tenant: Tenant) -> Dict[str, int]:
-    products_count = Product.objects.filter(tenant=tenant).count()
+    # Compteur TenantUsage (pas de COUNT(*) sur Product à chaque appel).
+    products_count = get_products_count(tenant)
     services_count = tenant.services.count()
 
     # ✅ IMPORTANT: compter les membres actifs si le champ status existe,
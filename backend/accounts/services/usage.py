@@ -0,0 +1,87 @@
+# backend/accounts/services/usage.py
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import TenantUsage
+from products.models import Product
+
+
+def count_active_products(tenant_id) -> int:
+    # Product.objects exclut les produits archivés (même périmètre que l'ancien get_usage).
+    return Product.objects.filter(tenant_id=tenant_id).count()
+
+
+def _ensure_usage(tenant_id):
+    """Ligne de compteurs, amorcée par un COUNT(*) unique à la première utilisation."""
+    usage, created = TenantUsage.objects.get_or_create(
+        tenant_id=tenant_id,
+        defaults={"products_count": count_active_products(tenant_id)},
+    )
+    return usage, created
+
+
+def get_products_count(tenant) -> int:
+    usage = TenantUsage.objects.filter(tenant_id=tenant.id).values_list("products_count", flat=True).first()
+    if usage is None:
+        usage = _ensure_usage(tenant.id)[0].products_count
+    return max(int(usage), 0)
+
+
+def adjust_products_count(tenant_id, delta: int) -> None:
+    """
+    Incrément atomique (UPDATE ... SET products_count = products_count + delta) :
+    à appeler dans la transaction de l'écriture produit pour être annulé avec elle.
+    """
+    if not tenant_id or not delta:
+        return
+    updated = TenantUsage.objects.filter(tenant_id=tenant_id).update(
+        products_count=F("products_count") + delta,
+        updated_at=timezone.now(),
+    )
+    if updated:
+        return
+    # Pas encore de ligne : l'amorçage compte déjà l'écriture courante (même transaction).
+    _, created = _ensure_usage(tenant_id)
+    if not created:
+        adjust_products_count(tenant_id, delta)
+
+
+def reserve_product_slots(tenant, count: int) -> None:
+    """
+    Réserve `count` produits en une seule requête conditionnelle : l'UPDATE ne passe que
+    si products_count + count <= max_products. Les lignes bulk_create (sans signaux) ne
+    doivent pas être recomptées ensuite. Lève LimitExceeded si la limite serait dépassée.
+    """
+    from accounts.services.access import LimitExceeded, get_limits
+
+    if count <= 0:
+        return
+    limit = get_limits(tenant).get("max_products")
+    _ensure_usage(tenant.id)
+    qs = TenantUsage.objects.filter(tenant_id=tenant.id)
+    if limit is not None:
+        qs = qs.filter(products_count__lte=int(limit) - count)
+    updated = qs.update(products_count=F("products_count") + count, updated_at=timezone.now())
+    if not updated:
+        raise LimitExceeded(code="LIMIT_MAX_PRODUCTS", detail="Limite max_products atteinte.")
+
+
+def reconcile_usage(tenant_id, dry_run=False):
+    """
+    Recalcule les compteurs d'un tenant sous verrou de ligne.
+    Retourne (ancienne valeur, valeur réelle).
+    """
+    with transaction.atomic():
+        usage, _ = _ensure_usage(tenant_id)
+        usage = TenantUsage.objects.select_for_update().get(pk=usage.pk)
+        actual = count_active_products(tenant_id)
+        previous = usage.products_count
+        if not dry_run:
+            now = timezone.now()
+            TenantUsage.objects.filter(pk=usage.pk).update(
+                products_count=actual,
+                updated_at=now if previous != actual else usage.updated_at,
+                reconciled_at=now,
+            )
+    return previous, actual
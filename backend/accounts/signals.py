@@ -0,0 +1,52 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import OrganizationOverrides, Plan, Tenant
+from .services.access import ACCESS_BILLING_FIELDS, bump_access_version, invalidate_access_cache
+
+_BILLING_ATTNAMES = tuple(Tenant._meta.get_field(name).attname for name in ACCESS_BILLING_FIELDS)
+
+
+@receiver(pre_save, sender=Tenant)
+def sync_tenant_access_version(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    save() complet : repart de la version en base (une instance chargée avant un bump
+    ne doit pas la faire régresser) et l'incrémente si un champ de facturation change.
+    """
+    if raw or not instance.pk or update_fields is not None:
+        return
+    row = Tenant.objects.filter(pk=instance.pk).values("access_version", *_BILLING_ATTNAMES).first()
+    if row is None:
+        return
+    version = row["access_version"]
+    if any(row[attname] != getattr(instance, attname) for attname in _BILLING_ATTNAMES):
+        version += 1
+    instance.access_version = version
+
+
+@receiver(post_save, sender=Tenant)
+def bump_tenant_access_on_billing_update(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # save(update_fields=[...]) : webhook Stripe, _set_tenant_plan_active, admin...
+    if raw or created or not update_fields or "access_version" in update_fields:
+        return
+    if set(update_fields) & set(ACCESS_BILLING_FIELDS):
+        invalidate_access_cache(instance)
+
+
+@receiver(post_save, sender=Plan)
+def bump_plan_tenants_access(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_access_version(Tenant.objects.filter(plan=instance).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=OrganizationOverrides)
+@receiver(post_delete, sender=OrganizationOverrides)
+def bump_overrides_tenant_access(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    tenant = instance._state.fields_cache.get("tenant")
+    if tenant is not None:
+        invalidate_access_cache(tenant)
+    else:
+        bump_access_version([instance.tenant_id])
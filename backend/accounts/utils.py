@@ -1,5 +1,6 @@
 # Deployed backend: https://inventory-tool-plage.onrender.com
 from copy import deepcopy
+from functools import cached_property
 
 from django.utils.text import slugify
 from rest_framework import exceptions
@@ -195,17 +196,7 @@ def get_or_create_default_tenant():
 
 
 def get_tenant_for_request(request):
-    user = getattr(request, "user", None)
-    if not user or not user.is_authenticated:
-        return get_or_create_default_tenant()
-
-    profile = getattr(user, "profile", None)
-    if profile:
-        return profile.tenant
-
-    tenant = get_or_create_default_tenant()
-    UserProfile.objects.create(user=user, tenant=tenant, role="owner")
-    return tenant
+    return get_request_context(request).tenant
 
 
 def get_default_service(tenant: Tenant):
@@ -234,33 +225,33 @@ def _get_membership_for_tenant(user, tenant: Tenant):
     return qs.first()
 
 
-def get_user_role(request):
+def _resolve_user_role(user, tenant, profile, get_membership):
     """
     ✅ Règle: le compte principal est piloté par UserProfile.
     - Si profile existe sur le tenant, on renvoie owner/manager si dispo,
       sinon fallback owner.
     - Sinon on se base sur Membership (ACTIVE si champ status existe).
     """
-    user = getattr(request, "user", None)
-    tenant = get_tenant_for_request(request)
-
     if not user or not user.is_authenticated:
         return "operator"
 
-    profile = getattr(user, "profile", None)
     if profile and profile.tenant_id == tenant.id:
         role = (profile.role or "").strip().lower()
         if role in ("owner", "manager"):
             return role
         return "owner"
 
-    m = _get_membership_for_tenant(user, tenant)
+    m = get_membership()
     if m:
         return m.role
 
     return "operator"
 
 
+def get_user_role(request):
+    return get_request_context(request).role
+
+
 def _extract_service_id_from_headers(request):
     """
     Front envoie X-Service-Id pour fixer le contexte service.
@@ -280,20 +271,7 @@ def _extract_service_id_from_headers(request):
     return raw
 
 
-def get_service_from_request(request):
-    """
-    ✅ IMPORTANT (scope service):
-    - owner => libre via ?service= / body / header X-Service-Id
-    - non-owner + membership ACTIVE + membership.service défini => service forcé
-    - sinon => ?service= / body / header, ou Principal
-    """
-    tenant = get_tenant_for_request(request)
-    user = getattr(request, "user", None)
-
-    role = get_user_role(request)
-    membership = _get_membership_for_tenant(user, tenant)
-
-    # 1) service demandé (query/body/header)
+def _requested_service_id(request):
     service_id = request.query_params.get("service") or (
         request.data.get("service") if hasattr(request, "data") else None
     )
@@ -303,20 +281,103 @@ def get_service_from_request(request):
     # Si "all" (mode lecture), on ne peut pas sélectionner un service concret => fallback
     if service_id and str(service_id).lower() == "all":
         service_id = None
+    return service_id
+
+
+def get_service_from_request(request):
+    """
+    ✅ IMPORTANT (scope service):
+    - owner => libre via ?service= / body / header X-Service-Id
+    - non-owner + membership ACTIVE + membership.service défini => service forcé
+    - sinon => ?service= / body / header, ou Principal
+    """
+    return get_request_context(request).service_for(_requested_service_id(request))
+
 
-    # 2) membership scope forcé
-    if role != "owner" and membership and membership.service_id:
-        forced = membership.service
-        if service_id and str(service_id) != str(forced.id):
-            raise exceptions.PermissionDenied("Accès limité : vous n'avez pas accès à ce service.")
-        return forced
-
-    # 3) owner / manager: utiliser service demandé si présent
-    if service_id:
-        try:
-            return Service.objects.get(id=service_id, tenant=tenant)
-        except (Service.DoesNotExist, ValueError, TypeError):
-            pass
-
-    # 4) fallback
-    return get_default_service(tenant)
+class RequestContext:
+    """
+    Tenant / profil / membership / rôle / service de l'utilisateur courant, résolus une fois
+    par requête puis mémorisés : profil + tenant (+ plan) en une requête, service en une autre.
+    Le membership n'est chargé que si le rôle ou le scope service en dépend (non-owner).
+    """
+
+    def __init__(self, user):
+        self.user = user if user is not None and getattr(user, "is_authenticated", False) else None
+        self._services = {}
+
+    @property
+    def user_key(self):
+        return self.user.pk if self.user is not None else None
+
+    @cached_property
+    def profile(self):
+        if self.user is None:
+            return None
+        profile = UserProfile.objects.select_related("tenant", "tenant__plan").filter(user=self.user).first()
+        if profile is None:
+            tenant = get_or_create_default_tenant()
+            profile = UserProfile.objects.create(user=self.user, tenant=tenant, role="owner")
+        # Cache ORM : `user.profile` ne refait pas de requête ailleurs dans la vue.
+        self.user.profile = profile
+        return profile
+
+    @cached_property
+    def tenant(self):
+        if self.profile is None:
+            return get_or_create_default_tenant()
+        return self.profile.tenant
+
+    @cached_property
+    def membership(self):
+        return _get_membership_for_tenant(self.user, self.tenant)
+
+    @cached_property
+    def role(self):
+        return _resolve_user_role(self.user, self.tenant, self.profile, lambda: self.membership)
+
+    def service_for(self, service_id):
+        key = str(service_id) if service_id else None
+        if key in self._services:
+            return self._services[key]
+
+        # 2) membership scope forcé
+        if self.role != "owner":
+            membership = self.membership
+            if membership and membership.service_id:
+                forced = membership.service
+                if service_id and str(service_id) != str(forced.id):
+                    raise exceptions.PermissionDenied("Accès limité : vous n'avez pas accès à ce service.")
+                self._services[key] = forced
+                return forced
+
+        # 3) owner / manager: utiliser service demandé si présent
+        service = None
+        if service_id:
+            try:
+                service = Service.objects.get(id=service_id, tenant=self.tenant)
+            except (Service.DoesNotExist, ValueError, TypeError):
+                service = None
+
+        # 4) fallback
+        if service is None:
+            service = get_default_service(self.tenant)
+        self._services[key] = service
+        return service
+
+
+_CONTEXT_ATTR = "_stockscan_request_context"
+
+
+def get_request_context(request):
+    """
+    Contexte mémorisé sur la HttpRequest sous-jacente (partagée par les wrappers DRF).
+    Recalculé si l'utilisateur change (ex. authentification JWT faite après un premier appel).
+    """
+    holder = getattr(request, "_request", request)
+    user = getattr(request, "user", None)
+    user_key = user.pk if user is not None and getattr(user, "is_authenticated", False) else None
+    context = getattr(holder, _CONTEXT_ATTR, None)
+    if context is None or context.user_key != user_key:
+        context = RequestContext(user)
+        setattr(holder, _CONTEXT_ATTR, context)
+    return context
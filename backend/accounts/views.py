@@ -21,8 +21,6 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from products.models import Product
-
 from .models import (
     Service,
     Membership,
@@ -824,19 +822,7 @@ class EntitlementsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_usage(self, tenant: Tenant):
-        products_count = Product.objects.filter(tenant=tenant).count()
-        services_count = tenant.services.count()
-
-        try:
-            users_count = Membership.objects.filter(tenant=tenant, status="ACTIVE").count()
-        except Exception:
-            users_count = User.objects.filter(profile__tenant=tenant).count()
-
-        return {
-            "products_count": products_count,
-            "services_count": services_count,
-            "users_count": users_count,
-        }
+        return get_usage(tenant)
 
     def get(self, request):
         tenant = get_tenant_for_request(request)
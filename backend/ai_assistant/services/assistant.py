@@ -14,9 +14,11 @@ except Exception:  # pragma: no cover
 
 try:
     from products.models import Product, LossEvent
+    from products.services.snapshots import merge_losses_by_reason, snapshot_rows, sum_counters
 except ImportError:  # pragma: no cover
     Product = None
     LossEvent = None
+    snapshot_rows = None
 
 LOGGER = logging.getLogger(__name__)
 
@@ -420,21 +422,44 @@ def build_context(user, scope=None, period_start=None, period_end=None, filters=
         products_qs = products_qs.filter(inventory_month=month)
         losses_qs = losses_qs.filter(inventory_month=month)
 
-    summary = products_qs.aggregate(
-        total_skus=Count("id"),
-        total_units=Coalesce(Sum("quantity"), decimal_zero(), output_field=DecimalField(max_digits=14, decimal_places=4)),
-        low_stock_count=Count("id", filter=Q(quantity__lte=2)),
-        out_of_stock_count=Count("id", filter=Q(quantity__lte=0)),
-    )
+    service_scoped = bool(service_id and service_id != "all")
+    snapshots = None
+    if month and snapshot_rows and (service is not None or not service_scoped):
+        snapshots = snapshot_rows(tenant, month, service=service)
+    if snapshots is not None:
+        summary = sum_counters(snapshots, "product_count", "total_quantity", "low_qty_count", "out_of_stock_count")
+        summary = {
+            "total_skus": summary["product_count"],
+            "total_units": summary["total_quantity"],
+            "low_stock_count": summary["low_qty_count"],
+            "out_of_stock_count": summary["out_of_stock_count"],
+        }
+        reasons = merge_losses_by_reason(snapshots)
+        loss_totals = {
+            "loss_count": sum(r["count"] for r in reasons.values()),
+            "losses_total_qty": sum(r["qty"] for r in reasons.values()),
+        }
+        loss_by_reason = sorted(
+            ({"reason": reason, "total_qty": r["qty"]} for reason, r in reasons.items()),
+            key=lambda r: r["total_qty"],
+            reverse=True,
+        )[:5]
+    else:
+        summary = products_qs.aggregate(
+            total_skus=Count("id"),
+            total_units=Coalesce(Sum("quantity"), decimal_zero(), output_field=DecimalField(max_digits=14, decimal_places=4)),
+            low_stock_count=Count("id", filter=Q(quantity__lte=2)),
+            out_of_stock_count=Count("id", filter=Q(quantity__lte=0)),
+        )
 
-    loss_totals = losses_qs.aggregate(
-        loss_count=Count("id"),
-        losses_total_qty=Coalesce(Sum("quantity"), decimal_zero(), output_field=DecimalField(max_digits=14, decimal_places=4)),
-    )
+        loss_totals = losses_qs.aggregate(
+            loss_count=Count("id"),
+            losses_total_qty=Coalesce(Sum("quantity"), decimal_zero(), output_field=DecimalField(max_digits=14, decimal_places=4)),
+        )
 
-    loss_by_reason = list(
-        losses_qs.values("reason").annotate(total_qty=Sum("quantity")).order_by("-total_qty")[:5]
-    )
+        loss_by_reason = list(
+            losses_qs.values("reason").annotate(total_qty=Sum("quantity")).order_by("-total_qty")[:5]
+        )
 
     movers_limit = 3 if mode == "light" else 5
     fast_movers = list(products_qs.order_by("-quantity").values("name", "quantity", "unit", "category")[:movers_limit])
@@ -451,12 +476,30 @@ def build_context(user, scope=None, period_start=None, period_end=None, filters=
         .values("name", "quantity", "unit", "category", "service_id", "barcode", "internal_sku", "container_status")[:items_limit]
     )
 
-    missing_id_count = products_qs.filter(barcode__isnull=True, internal_sku__isnull=True).count()
-    missing_category_count = products_qs.filter(Q(category__isnull=True) | Q(category="")).count()
-    missing_purchase_count = products_qs.filter(Q(purchase_price__isnull=True) | Q(purchase_price=0)).count()
-    missing_selling_count = products_qs.filter(Q(selling_price__isnull=True) | Q(selling_price=0)).count()
-    missing_dlc_count = products_qs.filter(dlc__isnull=True).count()
-    opened_count = products_qs.filter(container_status="OPENED").count()
+    if snapshots is not None:
+        quality = sum_counters(
+            snapshots,
+            "missing_identifier_count",
+            "missing_purchase_price_count",
+            "missing_selling_price_count",
+            "missing_dlc_count",
+            "opened_count",
+        )
+        missing_id_count = quality["missing_identifier_count"]
+        missing_category_count = sum(row.product_count for row in snapshots if not row.category)
+        missing_purchase_count = quality["missing_purchase_price_count"]
+        missing_selling_count = quality["missing_selling_price_count"]
+        missing_dlc_count = quality["missing_dlc_count"]
+        opened_count = quality["opened_count"]
+    else:
+        missing_id_count = products_qs.filter(
+            (Q(barcode__isnull=True) | Q(barcode="")) & (Q(internal_sku__isnull=True) | Q(internal_sku=""))
+        ).count()
+        missing_category_count = products_qs.filter(Q(category__isnull=True) | Q(category="")).count()
+        missing_purchase_count = products_qs.filter(Q(purchase_price__isnull=True) | Q(purchase_price=0)).count()
+        missing_selling_count = products_qs.filter(Q(selling_price__isnull=True) | Q(selling_price=0)).count()
+        missing_dlc_count = products_qs.filter(dlc__isnull=True).count()
+        opened_count = products_qs.filter(container_status="OPENED").count()
     question = (user_question or "").strip()[:500]
 
     plan_code = None
@@ -1,9 +1,10 @@
 from django.http import HttpResponse
 
 try:
-    from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 except Exception:  # pragma: no cover
     Counter = None
+    Histogram = None
     generate_latest = None
     CONTENT_TYPE_LATEST = "text/plain"
 
@@ -16,6 +17,16 @@ if PROMETHEUS_AVAILABLE:
         "OpenFoodFacts lookup failures",
         ["reason"],
     )
+    OFF_REQUEST_SECONDS = Histogram(
+        "stockscan_off_request_seconds",
+        "OpenFoodFacts HTTP request latency",
+        ["outcome"],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0),
+    )
+    OFF_CIRCUIT_OPEN = Counter(
+        "stockscan_off_circuit_open_total",
+        "OpenFoodFacts circuit breaker openings",
+    )
     EXPORT_EVENTS = Counter(
         "stockscan_export_events_total",
         "Export events",
@@ -40,6 +51,16 @@ def track_off_lookup_failure(reason):
         OFF_LOOKUP_FAILURES.labels(reason=reason or "unknown").inc()
 
 
+def track_off_request(outcome, seconds):
+    if PROMETHEUS_AVAILABLE:
+        OFF_REQUEST_SECONDS.labels(outcome=outcome or "unknown").observe(seconds)
+
+
+def track_off_circuit_open():
+    if PROMETHEUS_AVAILABLE:
+        OFF_CIRCUIT_OPEN.inc()
+
+
 def track_export_event(export_format, emailed):
     if PROMETHEUS_AVAILABLE:
         EXPORT_EVENTS.labels(format=export_format or "unknown", emailed=str(bool(emailed)).lower()).inc()
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     "pos",
     "kds",
     "admin_dashboard",
+    "jobs",
 ]
 
 MIDDLEWARE = [
@@ -279,3 +280,30 @@ SENDGRID_API_KEY = os.environ.get("SENDGRID_API_KEY")
 SENDGRID_FROM_EMAIL = os.environ.get("SENDGRID_FROM_EMAIL", "no-reply@stockscan.app")
 INVITATIONS_SEND_EMAILS = os.environ.get("INVITATIONS_SEND_EMAILS", "true").lower() == "true"
 EMAIL_VERIFICATION_REQUIRED = os.environ.get("EMAIL_VERIFICATION_REQUIRED", "true").lower() == "true"
+
+# KDS : flux cuisine temps réel (SSE). N'activer que si l'API est servie par inventory.asgi
+# (worker uvicorn) : sous WSGI, chaque écran occuperait un worker sans rien recevoir en direct.
+KDS_STREAM_ENABLED = os.environ.get("KDS_STREAM_ENABLED", "false").lower() == "true"
+KDS_STREAM_MAX_SECONDS = int(os.environ.get("KDS_STREAM_MAX_SECONDS", 300))
+KDS_STREAM_HEARTBEAT_SECONDS = int(os.environ.get("KDS_STREAM_HEARTBEAT_SECONDS", 15))
+KDS_EVENTS_PG_NOTIFY = os.environ.get("KDS_EVENTS_PG_NOTIFY", "true").lower() == "true"
+KDS_AVAILABILITY_CACHE_SECONDS = int(os.environ.get("KDS_AVAILABILITY_CACHE_SECONDS", 60))
+
+# Recherche produits (POS / recherche globale) : "auto" = trigram PostgreSQL, sinon index n-gram en mémoire
+PRODUCT_SEARCH_BACKEND = os.environ.get("PRODUCT_SEARCH_BACKEND", "auto").lower()
+PRODUCT_SEARCH_INDEX_MAX_AGE_SECONDS = int(os.environ.get("PRODUCT_SEARCH_INDEX_MAX_AGE_SECONDS", 600))
+PRODUCT_SEARCH_INDEX_MAX_SERVICES = int(os.environ.get("PRODUCT_SEARCH_INDEX_MAX_SERVICES", 64))
+
+# OpenFoodFacts (pré-remplissage au scan) : cache partagé + LRU local par process
+OFF_CACHE_TTL_SECONDS = int(os.environ.get("OFF_CACHE_TTL_SECONDS", 60 * 60 * 48))
+OFF_NEGATIVE_CACHE_TTL_SECONDS = int(os.environ.get("OFF_NEGATIVE_CACHE_TTL_SECONDS", 60 * 60 * 6))
+OFF_LOCAL_CACHE_TTL_SECONDS = int(os.environ.get("OFF_LOCAL_CACHE_TTL_SECONDS", 300))
+OFF_LOCAL_CACHE_SIZE = int(os.environ.get("OFF_LOCAL_CACHE_SIZE", 2048))
+OFF_LOOKUP_MAX_WORKERS = int(os.environ.get("OFF_LOOKUP_MAX_WORKERS", 8))
+# Client HTTP OFF : pool keep-alive, délais connexion / lecture, disjoncteur
+OFF_BASE_URL = os.environ.get("OFF_BASE_URL", "https://world.openfoodfacts.org")
+OFF_TIMEOUT_SECONDS = float(os.environ.get("OFF_TIMEOUT_SECONDS", 3))
+OFF_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("OFF_CONNECT_TIMEOUT_SECONDS", 1))
+OFF_POOL_SIZE = int(os.environ.get("OFF_POOL_SIZE", 10))
+OFF_BREAKER_FAILURES = int(os.environ.get("OFF_BREAKER_FAILURES", 5))
+OFF_BREAKER_RESET_SECONDS = int(os.environ.get("OFF_BREAKER_RESET_SECONDS", 30))
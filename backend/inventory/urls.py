@@ -22,6 +22,7 @@ from products.views import (
     catalog_templates,
     search_products,
     lookup_product,
+    lookup_products_batch,
     product_duplicates,
     merge_products,
     rituals,
@@ -29,7 +30,12 @@ from products.views import (
     apply_receipt,
     receipts_history,
 )
-from products.inventory_import import inventory_import_preview, inventory_import_commit
+from products.inventory_import import (
+    inventory_import_preview,
+    inventory_import_preview_page,
+    inventory_import_commit,
+    inventory_import_progress,
+)
 
 router = DefaultRouter()
 router.register(r"products", ProductViewSet, basename="products")
@@ -71,6 +77,7 @@ urlpatterns = [
     path("api/alerts/", alerts),
 
     path("api/products/lookup/", lookup_product),
+    path("api/products/lookup/batch/", lookup_products_batch),
 
     
     path("api/catalog/templates/", catalog_templates, name="api_catalog_templates"),
@@ -87,7 +94,9 @@ urlpatterns = [
     path("api/receipts/<int:receipt_id>/apply/", apply_receipt),
     path("api/receipts/history/", receipts_history),
     path("api/imports/inventory/preview/", inventory_import_preview),
+    path("api/imports/inventory/preview/<str:preview_id>/", inventory_import_preview_page),
     path("api/imports/inventory/commit/", inventory_import_commit),
+    path("api/imports/inventory/commit/<str:preview_id>/progress/", inventory_import_progress),
 
     path("api/auth/", include("accounts.urls")),
     path("api/ai/assistant/", AiAssistantView.as_view(), name="ai-assistant"),
@@ -96,6 +105,7 @@ urlpatterns = [
     path("api/pos/", include("pos.urls")),
     path("api/kds/", include("kds.urls")),
     path("api/admin/", include("admin_dashboard.urls")),
+    path("api/jobs/", include("jobs.urls")),
 
     path("api/", include(router.urls)),
 ]
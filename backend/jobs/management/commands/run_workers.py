@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+import socket
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.services.runner import JOB_POLL_INTERVAL_SECONDS, JOB_STALE_AFTER_SECONDS, work
+
+
+def _worker_main(worker_id, once, poll_interval, stale_after):
+    # Processus fils (fork) : chaque worker ouvre sa propre connexion base.
+    connections.close_all()
+    work(worker_id, once=once, poll_interval=poll_interval, stale_after=stale_after)
+
+
+class Command(BaseCommand):
+    help = "Run background job workers (exports, PDFs, receipt imports) polling the BackgroundJob table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=1, help="Number of worker processes.")
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=JOB_POLL_INTERVAL_SECONDS,
+            help="Seconds to wait when the queue is empty.",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=JOB_STALE_AFTER_SECONDS,
+            help="Seconds without heartbeat after which a running job is considered abandoned and requeued.",
+        )
+        parser.add_argument("--once", action="store_true", help="Drain the queue then exit.")
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        once = options["once"]
+        poll_interval = options["poll_interval"]
+        stale_after = options["stale_after"]
+        base_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        if processes == 1:
+            processed = work(base_id, once=once, poll_interval=poll_interval, stale_after=stale_after)
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)."))
+            return
+
+        # Pas de connexion partagée entre parent et fils après le fork.
+        connections.close_all()
+        children = [
+            multiprocessing.Process(
+                target=_worker_main,
+                args=(f"{base_id}/{index}", once, poll_interval, stale_after),
+                name=f"run_workers-{index}",
+            )
+            for index in range(processes)
+        ]
+        for child in children:
+            child.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {processes} worker process(es)."))
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                child.terminate()
+            for child in children:
+                child.join()
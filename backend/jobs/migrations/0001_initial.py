@@ -0,0 +1,66 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0020_userprofile_flags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('export_generic', 'Export inventaire'), ('export_advanced', 'Export avancé'), ('catalog_pdf', 'Catalogue PDF'), ('labels_pdf', 'Étiquettes PDF'), ('import_receipt', 'Import facture / bon de réception')], max_length=32)),
+                ('status', models.CharField(choices=[('queued', 'En attente'), ('running', 'En cours'), ('succeeded', 'Terminé'), ('failed', 'Échec')], default='queued', max_length=10)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('request_method', models.CharField(default='GET', max_length=8)),
+                ('request_path', models.CharField(max_length=255)),
+                ('request_query', models.JSONField(blank=True, default=dict)),
+                ('request_format', models.CharField(default='multipart', max_length=10)),
+                ('request_data', models.JSONField(blank=True, default=dict)),
+                ('request_meta', models.JSONField(blank=True, default=dict)),
+                ('result_blob', models.BinaryField(blank=True, null=True)),
+                ('result_filename', models.CharField(blank=True, default='', max_length=255)),
+                ('result_content_type', models.CharField(blank=True, default='', max_length=120)),
+                ('result_json', models.JSONField(blank=True, null=True)),
+                ('result_status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('error', models.JSONField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('worker_id', models.CharField(blank=True, default='', max_length=64)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='background_jobs', to='accounts.tenant')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='background_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BackgroundJobInput',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=64)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(blank=True, default='', max_length=120)),
+                ('content', models.BinaryField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inputs', to='jobs.backgroundjob')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='backgroundjob',
+            index=models.Index(fields=['status', 'created_at'], name='jobs_backgr_status_226590_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='backgroundjob',
+            index=models.Index(fields=['tenant', 'user', 'created_at'], name='jobs_backgr_tenant__e5f9a3_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from accounts.models import Tenant
+
+
+class BackgroundJob(models.Model):
+    """
+    Requête API différée (export, PDF, import de facture) exécutée par `manage.py run_workers`.
+    La requête d'origine est rejouée telle quelle côté worker (mêmes contrôles d'accès / quotas).
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "En attente"),
+        (STATUS_RUNNING, "En cours"),
+        (STATUS_SUCCEEDED, "Terminé"),
+        (STATUS_FAILED, "Échec"),
+    ]
+
+    KIND_CHOICES = [
+        ("export_generic", "Export inventaire"),
+        ("export_advanced", "Export avancé"),
+        ("catalog_pdf", "Catalogue PDF"),
+        ("labels_pdf", "Étiquettes PDF"),
+        ("import_receipt", "Import facture / bon de réception"),
+    ]
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="background_jobs")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="background_jobs",
+    )
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)
+
+    # Requête à rejouer
+    request_method = models.CharField(max_length=8, default="GET")
+    request_path = models.CharField(max_length=255)
+    request_query = models.JSONField(default=dict, blank=True)
+    request_format = models.CharField(max_length=10, default="multipart")  # "json" | "multipart"
+    request_data = models.JSONField(default=dict, blank=True)
+    request_meta = models.JSONField(default=dict, blank=True)
+
+    # Résultat : fichier binaire (export / PDF) ou JSON (import)
+    result_blob = models.BinaryField(null=True, blank=True)
+    result_filename = models.CharField(max_length=255, blank=True, default="")
+    result_content_type = models.CharField(max_length=120, blank=True, default="")
+    result_json = models.JSONField(null=True, blank=True)
+    result_status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    error = models.JSONField(null=True, blank=True)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker_id = models.CharField(max_length=64, blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Rafraîchi par le worker pendant le traitement : base de la détection des jobs abandonnés.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["tenant", "user", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Job #{self.id} {self.kind} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+
+class BackgroundJobInput(models.Model):
+    """Fichier uploadé avec la requête d'origine (facture, logo, couverture...)."""
+
+    job = models.ForeignKey(BackgroundJob, on_delete=models.CASCADE, related_name="inputs")
+    field = models.CharField(max_length=64)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=120, blank=True, default="")
+    content = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.field}: {self.filename}"
@@ -0,0 +1,119 @@
+# backend/jobs/services/queue.py
+from functools import wraps
+
+from django.db import transaction
+from django.http import JsonResponse
+from django.http.multipartparser import MultiPartParserError
+
+from accounts.utils import get_tenant_for_request
+
+from ..models import BackgroundJob, BackgroundJobInput
+
+ASYNC_PARAM = "async"
+# En-têtes utiles au rejeu (scope service, négociation de rendu).
+REPLAYED_META = ("HTTP_X_SERVICE_ID", "HTTP_ACCEPT", "HTTP_ACCEPT_LANGUAGE")
+
+
+def wants_async(request):
+    # Query param uniquement : on ne touche pas au corps avant de décider (upload non parsé deux fois).
+    return (request.query_params.get(ASYNC_PARAM) or "").lower() in ("1", "true", "yes")
+
+
+def _query_payload(request):
+    return {key: values for key, values in request.query_params.lists() if key != ASYNC_PARAM}
+
+
+def _body_payload(request):
+    """Retourne (format, données JSON-sérialisables, fichiers)."""
+    if request.method == "GET":
+        return "multipart", {}, []
+    try:
+        data = request.data
+        files = list(request.FILES.lists()) if hasattr(request.FILES, "lists") else []
+    except MultiPartParserError:
+        return "multipart", {}, []
+    if (request.content_type or "").startswith("application/json"):
+        return "json", data if isinstance(data, (dict, list)) else {}, []
+    file_fields = {field for field, _ in files}
+    fields = {}
+    if hasattr(data, "lists"):
+        for key, values in data.lists():
+            if key in file_fields:
+                continue
+            fields[key] = [value for value in values if isinstance(value, str)]
+    return "multipart", fields, files
+
+
+def job_payload(job):
+    payload = {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "status_url": f"/api/jobs/{job.id}/",
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == BackgroundJob.STATUS_SUCCEEDED:
+        if job.result_json is not None:
+            payload["result"] = job.result_json
+        else:
+            payload["download_url"] = f"/api/jobs/{job.id}/download/"
+            payload["filename"] = job.result_filename
+    if job.status == BackgroundJob.STATUS_FAILED:
+        payload["error"] = job.error
+        payload["status_code"] = job.result_status_code
+    return payload
+
+
+def enqueue_request_job(kind, request):
+    """Enregistre la requête (paramètres, corps, fichiers) pour un rejeu par le worker."""
+    request_format, data, files = _body_payload(request)
+    meta = {key: request.META[key] for key in REPLAYED_META if request.META.get(key)}
+    with transaction.atomic():
+        job = BackgroundJob.objects.create(
+            tenant=get_tenant_for_request(request),
+            user=request.user,
+            kind=kind,
+            request_method=request.method,
+            request_path=request.path,
+            request_query=_query_payload(request),
+            request_format=request_format,
+            request_data=data,
+            request_meta=meta,
+        )
+        BackgroundJobInput.objects.bulk_create(
+            [
+                BackgroundJobInput(
+                    job=job,
+                    field=field,
+                    filename=upload.name or field,
+                    content_type=getattr(upload, "content_type", "") or "",
+                    content=upload.read(),
+                )
+                for field, uploads in files
+                for upload in uploads
+            ]
+        )
+    return job
+
+
+def offloadable(kind):
+    """
+    Décorateur (sous @api_view / @permission_classes) : avec `?async=1`, la requête est
+    mise en file et la vue répond 202 + job_id au lieu d'exécuter le traitement.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not wants_async(request):
+                return view_func(request, *args, **kwargs)
+            job = enqueue_request_job(kind, request)
+            # JsonResponse : les vues d'export ont des renderers binaires (XLSX/CSV/PDF).
+            return JsonResponse(job_payload(job), status=202)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,242 @@
+# backend/jobs/services/runner.py
+import json
+import logging
+import re
+import threading
+import time
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.test.client import RequestFactory
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from ..models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+JOB_VIEWS = {
+    "export_generic": "products.views.export_generic",
+    "export_advanced": "products.views.export_advanced",
+    "catalog_pdf": "products.views.catalog_pdf",
+    "labels_pdf": "products.views.labels_pdf",
+    "import_receipt": "products.views.import_receipt",
+}
+
+JOB_POLL_INTERVAL_SECONDS = 2.0
+JOB_CLAIM_CANDIDATES = 10
+JOB_HEARTBEAT_INTERVAL_SECONDS = 30
+JOB_STALE_AFTER_SECONDS = 3 * 60  # plus de battement depuis 3 min (worker tué) -> job remis en file
+JOB_REQUEUE_INTERVAL_SECONDS = 60
+JOB_MAX_ATTEMPTS = 3
+JOB_RESULT_TTL_HOURS = 48
+JOB_PURGE_INTERVAL_SECONDS = 60 * 60
+
+_FILENAME_RE = re.compile(r'filename="?([^";]+)"?')
+
+
+def claim_next_job(worker_id):
+    """
+    Réserve le plus ancien job en attente via un UPDATE conditionnel (status=queued) :
+    portable SQLite / PostgreSQL, sans SELECT ... FOR UPDATE ni broker.
+    """
+    candidates = list(
+        BackgroundJob.objects.filter(status=BackgroundJob.STATUS_QUEUED)
+        .order_by("created_at", "id")
+        .values_list("id", flat=True)[:JOB_CLAIM_CANDIDATES]
+    )
+    for job_id in candidates:
+        now = timezone.now()
+        claimed = BackgroundJob.objects.filter(id=job_id, status=BackgroundJob.STATUS_QUEUED).update(
+            status=BackgroundJob.STATUS_RUNNING,
+            worker_id=worker_id,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+            progress=5,
+        )
+        if claimed:
+            return BackgroundJob.objects.select_related("user").get(id=job_id)
+    return None
+
+
+def _owned(job):
+    """Le job tel que réservé par ce worker (pas remis en file ni repris par un autre entre-temps)."""
+    return BackgroundJob.objects.filter(id=job.id, status=BackgroundJob.STATUS_RUNNING, worker_id=job.worker_id)
+
+
+def beat(job):
+    """Rafraîchit `heartbeat_at` ; False si le job n'appartient plus à ce worker."""
+    return bool(_owned(job).update(heartbeat_at=timezone.now()))
+
+
+class _Heartbeat:
+    """
+    Thread de battement pendant `run_job` : la vue rejouée bloque le thread principal
+    (export ou PDF de plusieurs minutes), le battement doit donc vivre à côté, sur sa propre connexion.
+    """
+
+    def __init__(self, job, interval=JOB_HEARTBEAT_INTERVAL_SECONDS):
+        self.job = job
+        self.interval = interval
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"job-heartbeat-{job.id}", daemon=True)
+
+    def _run(self):
+        try:
+            while not self.stop.wait(self.interval):
+                try:
+                    if not beat(self.job):
+                        return
+                except Exception:
+                    logger.exception("background_job_heartbeat_failed", extra={"job_id": self.job.id})
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+
+def _build_request(job):
+    factory = RequestFactory()
+    extra = dict(job.request_meta or {})
+    if job.request_method == "GET":
+        request = factory.get(job.request_path, data=job.request_query, **extra)
+    else:
+        query = factory.get(job.request_path, data=job.request_query).META.get("QUERY_STRING", "")
+        path = f"{job.request_path}?{query}" if query else job.request_path
+        if job.request_format == "json":
+            request = factory.post(path, data=json.dumps(job.request_data), content_type="application/json", **extra)
+        else:
+            data = {key: list(values) for key, values in (job.request_data or {}).items()}
+            for item in job.inputs.all():
+                upload = SimpleUploadedFile(
+                    item.filename, bytes(item.content), content_type=item.content_type or "application/octet-stream"
+                )
+                data.setdefault(item.field, []).append(upload)
+            request = factory.post(path, data=data, **extra)
+    # Authentification forcée (DRF) : le worker agit pour l'utilisateur qui a lancé le job.
+    request._force_auth_user = job.user
+    return request
+
+
+def _error_payload(response):
+    data = getattr(response, "data", None)
+    if isinstance(data, dict):
+        return {key: (value if isinstance(value, (list, dict)) else str(value)) for key, value in data.items()}
+    if data is not None:
+        return {"detail": str(data)}
+    return {"detail": response.content.decode("utf-8", "replace")[:1000]}
+
+
+def run_job(job, heartbeat_interval=JOB_HEARTBEAT_INTERVAL_SECONDS):
+    """Rejoue la vue d'origine et stocke le résultat (fichier ou JSON) sur le job."""
+    try:
+        with _Heartbeat(job, heartbeat_interval):
+            view = import_string(JOB_VIEWS[job.kind])
+            response = view(_build_request(job))
+            if hasattr(response, "render"):
+                response.render()
+            content = b"".join(response.streaming_content) if response.streaming else response.content
+    except Exception:
+        logger.exception("background_job_failed", extra={"job_id": job.id, "kind": job.kind})
+        _finish(job, BackgroundJob.STATUS_FAILED, error={"detail": "Erreur interne pendant le traitement."})
+        return job
+
+    content_type = response.get("Content-Type", "")
+    if response.status_code >= 400:
+        _finish(
+            job,
+            BackgroundJob.STATUS_FAILED,
+            result_status_code=response.status_code,
+            error=_error_payload(response),
+        )
+        return job
+
+    _owned(job).update(progress=90)
+    fields = {"result_status_code": response.status_code, "result_content_type": content_type}
+    if content_type.startswith("application/json"):
+        fields["result_json"] = json.loads(content or b"null")
+    else:
+        match = _FILENAME_RE.search(response.get("Content-Disposition", ""))
+        fields["result_blob"] = bytes(content)
+        fields["result_filename"] = match.group(1) if match else f"{job.kind}-{job.id}"
+    _finish(job, BackgroundJob.STATUS_SUCCEEDED, **fields)
+    return job
+
+
+def _finish(job, status, **fields):
+    """
+    Conditionnel au worker : si le job a été remis en file et repris ailleurs, ce résultat
+    tardif n'écrase pas celui du nouveau propriétaire.
+    """
+    fields.update(status=status, progress=100, finished_at=timezone.now())
+    if not _owned(job).update(**fields):
+        logger.warning("background_job_lost", extra={"job_id": job.id, "worker_id": job.worker_id})
+        return False
+    for key, value in fields.items():
+        setattr(job, key, value)
+    return True
+
+
+def requeue_stale_jobs(stale_after=JOB_STALE_AFTER_SECONDS):
+    """
+    Jobs `running` sans battement depuis `stale_after` (worker arrêté brutalement) : remis en file,
+    ou en échec après N tentatives. Un job long mais vivant continue de battre et n'est pas touché.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    stale = BackgroundJob.objects.filter(status=BackgroundJob.STATUS_RUNNING).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    failed = stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status=BackgroundJob.STATUS_FAILED,
+        finished_at=timezone.now(),
+        error={"detail": "Traitement interrompu à plusieurs reprises."},
+    )
+    requeued = stale.update(status=BackgroundJob.STATUS_QUEUED, worker_id="", progress=0)
+    return requeued, failed
+
+
+def purge_expired_jobs(ttl_hours=JOB_RESULT_TTL_HOURS):
+    cutoff = timezone.now() - timedelta(hours=ttl_hours)
+    deleted, _ = BackgroundJob.objects.filter(
+        status__in=[BackgroundJob.STATUS_SUCCEEDED, BackgroundJob.STATUS_FAILED],
+        finished_at__lt=cutoff,
+    ).delete()
+    return deleted
+
+
+def work(worker_id, once=False, poll_interval=JOB_POLL_INTERVAL_SECONDS, stale_after=JOB_STALE_AFTER_SECONDS):
+    """
+    Boucle d'un worker. `once=True` : vide la file puis rend la main (tests, cron).
+    Retourne le nombre de jobs traités.
+    """
+    processed = 0
+    last_requeue = last_purge = None
+    while True:
+        if not once:
+            # Worker longue durée : connexions recyclées comme entre deux requêtes HTTP.
+            close_old_connections()
+        now = time.monotonic()
+        if last_requeue is None or now - last_requeue >= JOB_REQUEUE_INTERVAL_SECONDS:
+            requeue_stale_jobs(stale_after)
+            last_requeue = now
+        if last_purge is None or now - last_purge >= JOB_PURGE_INTERVAL_SECONDS:
+            purge_expired_jobs()
+            last_purge = now
+
+        job = claim_next_job(worker_id)
+        if job is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("<int:job_id>/", views.job_status, name="job_status"),
+    path("<int:job_id>/download/", views.job_download, name="job_download"),
+]
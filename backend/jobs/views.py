@@ -0,0 +1,40 @@
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from accounts.utils import get_tenant_for_request
+
+from .models import BackgroundJob
+from .services.queue import job_payload
+
+
+def _get_job(request, job_id):
+    tenant = get_tenant_for_request(request)
+    return BackgroundJob.objects.filter(id=job_id, tenant=tenant, user=request.user).defer("result_blob").first()
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def job_status(request, job_id):
+    job = _get_job(request, job_id)
+    if not job:
+        return Response({"detail": "Tâche introuvable."}, status=404)
+    return Response(job_payload(job))
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def job_download(request, job_id):
+    job = _get_job(request, job_id)
+    if not job:
+        return Response({"detail": "Tâche introuvable."}, status=404)
+    if job.status != BackgroundJob.STATUS_SUCCEEDED or job.result_json is not None:
+        return Response(
+            {"detail": "Aucun fichier disponible pour cette tâche.", "status": job.status},
+            status=409,
+        )
+    blob = BackgroundJob.objects.filter(id=job.id).values_list("result_blob", flat=True).first()
+    resp = HttpResponse(bytes(blob or b""), content_type=job.result_content_type or "application/octet-stream")
+    resp["Content-Disposition"] = f'attachment; filename="{job.result_filename}"'
+    return resp
@@ -0,0 +1,39 @@
+import secrets
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+STREAM_TICKET_SALT = "kds.kitchen_stream"
+STREAM_TICKET_MAX_AGE_SECONDS = 30
+
+
+def issue_stream_ticket(user, service):
+    """Ticket signé, valable STREAM_TICKET_MAX_AGE_SECONDS, pour un seul flux de ce service."""
+    payload = {"u": user.pk, "s": service.pk, "n": secrets.token_urlsafe(12)}
+    return signing.dumps(payload, salt=STREAM_TICKET_SALT)
+
+
+class StreamTicketAuthentication(BaseAuthentication):
+    """
+    EventSource ne permet pas d'envoyer d'en-tête Authorization : le flux SSE accepte un ticket
+    `?ticket=` obtenu par POST authentifié (kitchen/stream/ticket/). Court, à usage unique et
+    limité au flux d'un service : le jeton d'accès ne passe jamais dans l'URL.
+    """
+
+    def authenticate(self, request):
+        raw_ticket = request.query_params.get("ticket")
+        if not raw_ticket:
+            return None
+        try:
+            payload = signing.loads(raw_ticket, salt=STREAM_TICKET_SALT, max_age=STREAM_TICKET_MAX_AGE_SECONDS)
+        except signing.BadSignature:
+            raise AuthenticationFailed("Ticket de flux invalide ou expiré.")
+        if not cache.add(f"kds_stream_ticket:{payload['n']}", 1, STREAM_TICKET_MAX_AGE_SECONDS * 2):
+            raise AuthenticationFailed("Ticket de flux déjà utilisé.")
+        user = get_user_model().objects.filter(pk=payload["u"], is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed("Ticket de flux invalide ou expiré.")
+        return user, payload
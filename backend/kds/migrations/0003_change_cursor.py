@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_tenant_usage'),
+        ('kds', '0002_rename_kds_kdstab_tenant__0e61f0_idx_kds_kdstabl_tenant__8edad4_idx_and_more'),
+        ('pos', '0007_pos_daily_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KdsChangeCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['tenant', 'service', 'change_seq'], name='kds_order_tenant__b0ac5e_idx'),
+        ),
+        migrations.AddField(
+            model_name='kdschangecursor',
+            name='service',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='kds_change_cursor', to='accounts.service'),
+        ),
+    ]
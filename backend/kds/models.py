@@ -1,5 +1,5 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 from accounts.models import Tenant, Service
@@ -72,6 +72,16 @@ class KdsTable(models.Model):
         return self.name
 
 
+class KdsChangeCursor(models.Model):
+    """Compteur de changements par service : chaque écriture de commande prend le suivant."""
+
+    service = models.OneToOneField(Service, on_delete=models.CASCADE, related_name="kds_change_cursor")
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.service_id}: {self.value}"
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("DRAFT", "Brouillon"),
@@ -113,13 +123,28 @@ class Order(models.Model):
     pos_ticket = models.ForeignKey(
         PosTicket, on_delete=models.SET_NULL, null=True, blank=True, related_name="kds_orders"
     )
+    # Valeur du KdsChangeCursor du service lors de la dernière modification (commande ou lignes).
+    change_seq = models.BigIntegerField(default=0)
 
     class Meta:
         indexes = [
             models.Index(fields=["tenant", "service", "status"]),
             models.Index(fields=["tenant", "service", "created_at"]),
+            models.Index(fields=["tenant", "service", "change_seq"]),
         ]
 
+    def save(self, *args, **kwargs):
+        from .services.cursors import next_change_seq
+
+        # Curseur pris et commande écrite dans la même transaction : le verrou de ligne du
+        # compteur est tenu jusqu'au commit, les valeurs deviennent visibles dans l'ordre.
+        with transaction.atomic():
+            self.change_seq = next_change_seq(self.service_id)
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "change_seq", "updated_at"}
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Commande #{self.id}"
 
@@ -55,6 +55,16 @@ class OrderCreateSerializer(serializers.Serializer):
         return attrs
 
 
+class AvailabilitySimulationSerializer(serializers.Serializer):
+    order_id = serializers.IntegerField(required=False, allow_null=True)
+    lines = OrderLineInputSerializer(many=True, required=False)
+
+    def validate(self, attrs):
+        if not attrs.get("order_id") and not attrs.get("lines"):
+            raise serializers.ValidationError({"lines": "Indiquez une commande ou au moins un plat."})
+        return attrs
+
+
 class OrderLineSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderLine
@@ -0,0 +1,137 @@
+# backend/kds/services/availability.py
+import time
+from decimal import Decimal, ROUND_FLOOR
+
+from django.conf import settings
+from django.core.cache import cache
+
+from products.models import Product
+
+from ..models import MenuItem, RecipeItem
+
+ZERO = Decimal("0")
+
+
+def _version_key(service_id):
+    return f"kds:availability:ver:{service_id}"
+
+
+def availability_version(service_id):
+    key = _version_key(service_id)
+    version = cache.get(key)
+    if version is None:
+        # Départ horodaté : une clé évincée ne ressert jamais un ancien résultat en cache.
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_availability(service_ids):
+    for service_id in {sid for sid in service_ids if sid}:
+        try:
+            cache.incr(_version_key(service_id))
+        except ValueError:
+            availability_version(service_id)
+
+
+def _floor_div(stock, needed):
+    if needed <= 0:
+        return 0
+    return int((stock / needed).to_integral_value(rounding=ROUND_FLOOR))
+
+
+def load_availability_inputs(tenant, service):
+    """
+    Recettes et stocks d'ingrédients de tout le service en deux requêtes :
+    recipes = {menu_item_id: [(product_id, qty)]}, stocks = {product_id: (name, quantity)}.
+    """
+    recipes = {}
+    rows = RecipeItem.objects.filter(menu_item__tenant=tenant, menu_item__service=service).order_by("id")
+    for menu_item_id, product_id, qty in rows.values_list("menu_item_id", "ingredient_product_id", "qty"):
+        recipes.setdefault(menu_item_id, []).append((product_id, qty))
+    product_ids = {product_id for items in recipes.values() for product_id, _ in items}
+    stocks = {
+        pid: (name, quantity or ZERO)
+        for pid, name, quantity in Product.all_objects.filter(id__in=product_ids).values_list("id", "name", "quantity")
+    }
+    return recipes, stocks
+
+
+def compute_availability(recipes, stocks, consumed=None):
+    """
+    Une passe sur toutes les recettes : chaque couple (ingrédient, quantité par plat) n'est
+    divisé qu'une fois, quel que soit le nombre de plats qui le partagent.
+    `consumed` ({product_id: qty}) retire d'abord le besoin d'une commande simulée.
+    Retourne {menu_item_id: (available_count, limiting_ingredients)}.
+    """
+    consumed = consumed or {}
+    remaining = {pid: quantity - consumed.get(pid, ZERO) for pid, (_, quantity) in stocks.items()}
+    possible_by_need = {}
+    result = {}
+    for menu_item_id, items in recipes.items():
+        limiting = []
+        for product_id, qty in items:
+            if product_id not in stocks:
+                continue
+            key = (product_id, qty)
+            if key not in possible_by_need:
+                possible_by_need[key] = _floor_div(remaining[product_id], qty)
+            limiting.append(
+                {
+                    "product_id": product_id,
+                    "name": stocks[product_id][0],
+                    "needed": str(qty),
+                    "stock": str(remaining[product_id]),
+                    "possible": possible_by_need[key],
+                }
+            )
+        result[menu_item_id] = (min((row["possible"] for row in limiting), default=0), limiting)
+    return result
+
+
+def service_availability(tenant, service):
+    """
+    Disponibilités de tous les plats du service, en cache jusqu'à la prochaine écriture de
+    stock / recette (version par service) ; la durée de vie borne l'écart entre process
+    si le cache n'est pas partagé.
+    """
+    key = f"kds:availability:{service.id}:v{availability_version(service.id)}"
+    cached = cache.get(key)
+    if cached is None:
+        recipes, stocks = load_availability_inputs(tenant, service)
+        cached = {"recipes": recipes, "stocks": stocks, "availability": compute_availability(recipes, stocks)}
+        cache.set(key, cached, settings.KDS_AVAILABILITY_CACHE_SECONDS)
+    return cached
+
+
+def menu_item_availability(tenant, service, menu_item_id):
+    return service_availability(tenant, service)["availability"].get(menu_item_id, (0, []))
+
+
+def simulate_order(tenant, service, lines):
+    """
+    « Et si » : disponibilités après une commande en attente (lignes menu_item_id / qty),
+    sans rien écrire. Retourne (faisable, manques, disponibilités).
+    """
+    data = service_availability(tenant, service)
+    recipes, stocks = data["recipes"], data["stocks"]
+    consumed = {}
+    for line in lines:
+        for product_id, qty in recipes.get(line["menu_item_id"], []):
+            consumed[product_id] = consumed.get(product_id, ZERO) + qty * line["qty"]
+    shortages = [
+        {
+            "product_id": pid,
+            "name": stocks[pid][0],
+            "needed": str(needed),
+            "available": str(stocks[pid][1]),
+        }
+        for pid, needed in sorted(consumed.items())
+        if pid in stocks and stocks[pid][1] < needed
+    ]
+    return not shortages, shortages, compute_availability(recipes, stocks, consumed)
+
+
+def unknown_menu_items(tenant, service, menu_item_ids):
+    known = set(MenuItem.objects.filter(tenant=tenant, service=service, id__in=menu_item_ids).values_list("id", flat=True))
+    return sorted(set(menu_item_ids) - known)
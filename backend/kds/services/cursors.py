@@ -0,0 +1,55 @@
+# backend/kds/services/cursors.py
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import KdsChangeCursor, Order
+
+
+def next_change_seq(service_id) -> int:
+    """
+    Incrémente le compteur du service (UPDATE relatif) et renvoie la nouvelle valeur.
+    À appeler dans la transaction de l'écriture : le verrou de ligne pris par l'UPDATE
+    sérialise les écritures d'un même service jusqu'au commit, un lecteur ne voit donc
+    jamais une valeur N+1 avant que N soit commitée.
+    """
+    updated = KdsChangeCursor.objects.filter(service_id=service_id).update(value=F("value") + 1)
+    if not updated:
+        try:
+            with transaction.atomic():
+                KdsChangeCursor.objects.create(service_id=service_id, value=1)
+            return 1
+        except IntegrityError:
+            return next_change_seq(service_id)
+    return KdsChangeCursor.objects.filter(service_id=service_id).values_list("value", flat=True).get()
+
+
+def current_change_seq(service_id) -> int:
+    value = KdsChangeCursor.objects.filter(service_id=service_id).values_list("value", flat=True).first()
+    return int(value or 0)
+
+
+def touch_order(order_id, service_id):
+    """Modification de lignes seules (sans save() de la commande) : la commande change de curseur."""
+    with transaction.atomic():
+        Order.objects.filter(id=order_id).update(change_seq=next_change_seq(service_id), updated_at=timezone.now())
+
+
+def feed_etag(service_id, change_seq) -> str:
+    return f'W/"kds-{service_id}-{change_seq}"'
+
+
+def etag_matches(request, etag) -> bool:
+    header = request.headers.get("If-None-Match") or ""
+    return etag in {tag.strip() for tag in header.split(",")} or header.strip() == "*"
+
+
+def orders_changed_since(queryset, statuses, cursor):
+    """
+    Commandes modifiées après `cursor` : celles encore dans `statuses` (à jour, lignes
+    comprises) et les ids sortis du périmètre (servies, annulées, payées...).
+    """
+    changed = list(queryset.filter(change_seq__gt=cursor).only("id", "status"))
+    keep_ids = [order.id for order in changed if order.status in statuses]
+    removed = sorted(order.id for order in changed if order.status not in statuses)
+    return keep_ids, removed
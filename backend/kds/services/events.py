@@ -0,0 +1,221 @@
+# backend/kds/services/events.py
+"""
+Diffusion des changements d'état des commandes vers les écrans cuisine (flux SSE).
+
+- Chaque écran ouvert s'abonne au service qu'il affiche (file asyncio par connexion).
+- `publish_order_event` est appelé par les transitions de commande ; l'événement part
+  au commit de la transaction (jamais d'état annulé poussé aux écrans).
+- Sur PostgreSQL, l'événement passe par NOTIFY (livré au commit, à tous les process) et
+  un thread LISTEN par process le redistribue localement. Ailleurs (SQLite / dev), la
+  diffusion reste dans le process courant.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+PG_CHANNEL = "kds_kitchen_feed"
+# NOTIFY refuse les charges > 8000 octets : au-delà, l'écran recharge la commande.
+PG_PAYLOAD_MAX_BYTES = 7500
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Subscription:
+    """File d'un écran connecté, alimentée depuis n'importe quel thread."""
+
+    def __init__(self, service_id, loop):
+        self.service_id = service_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Écran trop lent : on vide et on lui demande de recharger le flux complet.
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "reset", "service_id": self.service_id})
+
+    async def get(self, timeout=None):
+        event = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        if event.get("type") == "reset":
+            self.overflowed = False
+        return event
+
+
+class KitchenBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._listener = None
+
+    def subscribe(self, service_id):
+        subscription = Subscription(service_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(service_id, set()).add(subscription)
+        if use_pg_notify():
+            self._ensure_listener()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.service_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.service_id]
+
+    def subscriber_count(self, service_id=None):
+        with self._lock:
+            if service_id is not None:
+                return len(self._subscribers.get(service_id, ()))
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def dispatch(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(event.get("service_id"), ()))
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = PgListener(self)
+            self._listener.start()
+
+
+class PgListener(threading.Thread):
+    """LISTEN sur une connexion dédiée (autocommit) ; reconnexion avec backoff."""
+
+    def __init__(self, broker):
+        super().__init__(name="kds-pg-listener", daemon=True)
+        self.broker = broker
+
+    def run(self):
+        import psycopg
+
+        backoff = 1
+        while True:
+            try:
+                params = connections["default"].get_connection_params()
+                with psycopg.connect(**params, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {PG_CHANNEL}")
+                    backoff = 1
+                    for notify in conn.notifies():
+                        self._forward(notify.payload)
+            except Exception:
+                logger.warning("KDS_LISTEN_FAILED", exc_info=True)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _forward(self, payload):
+        try:
+            self.broker.dispatch(json.loads(payload))
+        except ValueError:
+            logger.warning("KDS_NOTIFY_INVALID_PAYLOAD")
+
+
+broker = KitchenBroker()
+
+
+def use_pg_notify():
+    return connection.vendor == "postgresql" and getattr(settings, "KDS_EVENTS_PG_NOTIFY", True)
+
+
+def _order_fields(order):
+    return {
+        "id": order.id,
+        "status": order.status,
+        "sent_at": order.sent_at,
+        "ready_at": order.ready_at,
+        "served_at": order.served_at,
+        "cancelled_at": order.cancelled_at,
+        "updated_at": order.updated_at,
+    }
+
+
+def build_order_event(order, event_type, include_lines=False):
+    """
+    Delta court : état et horodatages de la commande. À l'envoi en cuisine, la commande
+    complète (lignes) est jointe une seule fois pour tous les écrans.
+    """
+    event = {
+        "type": event_type,
+        "service_id": order.service_id,
+        "cursor": order.change_seq,
+        "order": _order_fields(order),
+    }
+    if include_lines:
+        from ..serializers import OrderSerializer
+
+        event["order"] = {**OrderSerializer(order).data, "updated_at": order.updated_at}
+    return json.loads(json.dumps(event, cls=DjangoJSONEncoder))
+
+
+def publish_order_event(order, event_type, include_lines=False):
+    event = build_order_event(order, event_type, include_lines=include_lines)
+    if use_pg_notify():
+        payload = json.dumps(event)
+        if len(payload.encode("utf-8")) > PG_PAYLOAD_MAX_BYTES:
+            event = build_order_event(order, event_type)
+            event["order"]["refetch"] = True
+            payload = json.dumps(event)
+        # NOTIFY est transactionnel : délivré au commit, abandonné au rollback.
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [PG_CHANNEL, payload])
+        return event
+    transaction.on_commit(lambda: broker.dispatch(event))
+    return event
+
+
+def format_sse(event, event_name=None):
+    lines = []
+    if event.get("cursor"):
+        # Même curseur que kitchen/feed?cursor= : l'écran peut reprendre par delta.
+        lines.append(f"id: {event['cursor']}")
+    if event_name:
+        lines.append(f"event: {event_name}")
+    lines.append(f"data: {json.dumps(event, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_service_events(service_id, max_seconds, heartbeat_seconds):
+    """
+    Générateur SSE d'une connexion écran. L'abonnement est pris avant l'événement `hello` :
+    un écran qui recharge le flux à la réception de `hello` ne peut rien manquer.
+    La connexion est close après `max_seconds` (le navigateur se reconnecte seul).
+    """
+    subscription = broker.subscribe(service_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        yield "retry: 2000\n\n"
+        yield format_sse({"type": "hello", "service_id": service_id}, "hello")
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                event = await subscription.get(timeout=min(heartbeat_seconds, remaining))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield format_sse(event, event["type"])
+    finally:
+        broker.unsubscribe(subscription)
@@ -1,11 +1,13 @@
 # backend/kds/services/orders.py
-from decimal import Decimal, ROUND_FLOOR
+from decimal import Decimal
 
 from django.db import transaction
 from django.utils import timezone
 
 from products.models import Product
+from products.services.stock import apply_stock_deltas, lock_products
 from pos.models import PosPayment, PosTicket, PosTicketLine
+from pos.services.rollups import apply_ticket_to_rollups
 
 from ..models import (
     MenuItem,
@@ -15,6 +17,7 @@ from ..models import (
     StockConsumption,
     WasteEvent,
 )
+from .events import publish_order_event
 
 PAYMENT_TOLERANCE = Decimal("0.01")
 
@@ -55,37 +58,6 @@ class PaymentMismatchError(KdsError):
     pass
 
 
-def _floor_div(stock: Decimal, needed: Decimal) -> int:
-    if needed <= 0:
-        return 0
-    return int((stock / needed).to_integral_value(rounding=ROUND_FLOOR))
-
-
-def compute_menu_item_availability(menu_item: MenuItem):
-    recipe_items = list(menu_item.recipe_items.select_related("ingredient_product"))
-    if not recipe_items:
-        return 0, []
-
-    limiting = []
-    possible_counts = []
-    for item in recipe_items:
-        stock = item.ingredient_product.quantity
-        possible = _floor_div(stock, item.qty)
-        possible_counts.append(possible)
-        limiting.append(
-            {
-                "product_id": item.ingredient_product_id,
-                "name": item.ingredient_product.name,
-                "needed": str(item.qty),
-                "stock": str(stock),
-                "possible": possible,
-            }
-        )
-
-    available = min(possible_counts) if possible_counts else 0
-    return available, limiting
-
-
 def _compute_line_total(unit_price: Decimal, qty: Decimal) -> Decimal:
     return (unit_price or Decimal("0")) * qty
 
@@ -130,6 +102,11 @@ def create_order(tenant, service, user, table, lines_payload):
     if missing_price:
         raise MissingMenuPriceError(missing_price)
 
+    with transaction.atomic():
+        return _create_order_rows(tenant, service, user, table, subtotal_amount, order_lines)
+
+
+def _create_order_rows(tenant, service, user, table, subtotal_amount, order_lines):
     order = Order.objects.create(
         tenant=tenant,
         service=service,
@@ -186,6 +163,14 @@ def _collect_requirements(order: Order):
     return requirements
 
 
+def _lock_ingredients(order: Order, requirements):
+    # Même ordre de verrouillage (ids croissants) que l'encaissement POS : pas d'interblocage.
+    products = lock_products(
+        Product.objects.filter(tenant_id=order.tenant_id, service_id=order.service_id, id__in=list(requirements))
+    )
+    return {p.id: p for p in products}
+
+
 def send_order_to_kitchen(order: Order, user):
     if order.status != "DRAFT":
         raise InvalidOrderStateError("Commande déjà envoyée ou terminée.")
@@ -200,16 +185,10 @@ def send_order_to_kitchen(order: Order, user):
             raise InvalidOrderStateError("Commande déjà envoyée ou terminée.")
 
         requirements = _collect_requirements(order)
-        product_ids = list(requirements.keys())
-        products = list(
-            Product.objects.select_for_update().filter(
-                tenant=order.tenant, service=order.service, id__in=product_ids
-            )
-        )
-        product_map = {p.id: p for p in products}
+        product_map = _lock_ingredients(order, requirements)
 
         insufficient = []
-        for pid, needed in requirements.items():
+        for pid, needed in sorted(requirements.items()):
             product = product_map.get(pid)
             if not product:
                 insufficient.append(
@@ -229,28 +208,31 @@ def send_order_to_kitchen(order: Order, user):
         if insufficient:
             raise StockInsufficientError(insufficient)
 
-        consumptions = []
-        for pid, needed in requirements.items():
-            product = product_map[pid]
-            product.quantity -= needed
-            product.save(update_fields=["quantity"])
-            consumptions.append(
+        apply_stock_deltas(
+            product_map.values(),
+            {pid: -needed for pid, needed in requirements.items()},
+            kind="kds_consumption",
+            reference=f"kds_order:{order.id}",
+            user=user,
+        )
+        StockConsumption.objects.bulk_create(
+            [
                 StockConsumption(
-                    tenant=order.tenant,
-                    service=order.service,
+                    tenant_id=order.tenant_id,
+                    service_id=order.service_id,
                     order=order,
-                    product=product,
+                    product_id=pid,
                     qty_consumed=needed,
                     reason="ORDER_SENT",
                 )
-            )
-
-        if consumptions:
-            StockConsumption.objects.bulk_create(consumptions)
+                for pid, needed in sorted(requirements.items())
+            ]
+        )
 
         order.status = "SENT"
         order.sent_at = timezone.now()
         order.save(update_fields=["status", "sent_at", "updated_at"])
+        publish_order_event(order, "order.sent", include_lines=True)
 
     return order
 
@@ -261,6 +243,7 @@ def mark_order_ready(order: Order):
     order.status = "READY"
     order.ready_at = timezone.now()
     order.save(update_fields=["status", "ready_at", "updated_at"])
+    publish_order_event(order, "order.ready")
     return order
 
 
@@ -270,6 +253,7 @@ def mark_order_served(order: Order):
     order.status = "SERVED"
     order.served_at = timezone.now()
     order.save(update_fields=["status", "served_at", "updated_at"])
+    publish_order_event(order, "order.served")
     return order
 
 
@@ -296,81 +280,77 @@ def cancel_order(order: Order, reason_code: str, reason_text: str, user, restock
             order.status = "CANCELLED"
             order.cancelled_at = timezone.now()
             order.save(update_fields=["status", "cancelled_at", "updated_at"])
+            publish_order_event(order, "order.cancelled")
             return order
 
         # Commande déjà envoyée (SENT/READY/SERVED)
         requirements = _collect_requirements(order)
-        product_ids = list(requirements.keys())
-        products = list(
-            Product.objects.select_for_update().filter(
-                tenant=order.tenant, service=order.service, id__in=product_ids
-            )
-        )
-        product_map = {p.id: p for p in products}
 
         if restock:
-            # ✅ Restock : on remet les quantités
-            consumptions = []
-            for pid, needed in requirements.items():
-                product = product_map.get(pid)
-                if not product:
-                    continue
-                product.quantity += needed
-                product.save(update_fields=["quantity"])
-                # On trace un mouvement inverse (quantité négative consommée = restock)
-                consumptions.append(
+            # ✅ Restock : on remet les quantités (un seul UPDATE relatif, verrous triés)
+            product_map = _lock_ingredients(order, requirements)
+            restocked = {pid: needed for pid, needed in requirements.items() if pid in product_map}
+            apply_stock_deltas(
+                product_map.values(),
+                restocked,
+                kind="kds_restock",
+                reference=f"kds_order:{order.id}",
+                user=user,
+            )
+            # On trace un mouvement inverse (quantité négative consommée = restock)
+            StockConsumption.objects.bulk_create(
+                [
                     StockConsumption(
                         tenant=order.tenant,
                         service=order.service,
                         order=order,
-                        product=product,
+                        product_id=pid,
                         qty_consumed=-needed,
                         reason="CANCEL_RESTOCK",
                     )
-                )
-            if consumptions:
-                StockConsumption.objects.bulk_create(consumptions)
+                    for pid, needed in sorted(restocked.items())
+                ]
+            )
         else:
             # ✅ Perte : on trace la perte (sans toucher au stock car déjà décrémenté à l'envoi)
-            waste_events = []
-            consumptions = []
-
-            for line in order.lines.select_related("menu_item"):
-                waste_events.append(
+            existing = set(
+                Product.objects.filter(
+                    tenant_id=order.tenant_id, service_id=order.service_id, id__in=list(requirements)
+                ).values_list("id", flat=True)
+            )
+            WasteEvent.objects.bulk_create(
+                [
                     WasteEvent(
                         tenant=order.tenant,
                         service=order.service,
                         related_order=order,
-                        related_order_line=line,
+                        related_order_line_id=line_id,
                         reason_code=reason_code,
                         reason_text=reason_text or "",
                         created_by=user,
                     )
-                )
-
-            for pid, needed in requirements.items():
-                product = product_map.get(pid)
-                if not product:
-                    continue
-                consumptions.append(
+                    for line_id in order.lines.order_by("id").values_list("id", flat=True)
+                ]
+            )
+            StockConsumption.objects.bulk_create(
+                [
                     StockConsumption(
                         tenant=order.tenant,
                         service=order.service,
                         order=order,
-                        product=product,
+                        product_id=pid,
                         qty_consumed=needed,
                         reason="WASTE",
                     )
-                )
-
-            if waste_events:
-                WasteEvent.objects.bulk_create(waste_events)
-            if consumptions:
-                StockConsumption.objects.bulk_create(consumptions)
+                    for pid, needed in sorted(requirements.items())
+                    if pid in existing
+                ]
+            )
 
         order.status = "CANCELLED"
         order.cancelled_at = timezone.now()
         order.save(update_fields=["status", "cancelled_at", "updated_at"])
+        publish_order_event(order, "order.cancelled")
 
     return order
 
@@ -399,24 +379,26 @@ def mark_order_paid(order: Order, user, payments_payload):
             note=order.note,
         )
 
-        lines = []
-        for line in order.lines.all():
-            lines.append(
-                PosTicketLine(
-                    ticket=ticket,
-                    product=None,
-                    qty=line.qty,
-                    unit="pcs",
-                    unit_price=line.unit_price,
-                    line_discount=line.line_discount,
-                    line_total=line.line_total,
-                    product_name=line.menu_item_name,
-                    barcode="",
-                    internal_sku="",
-                    category="",
-                    tva=None,
-                )
+        # Lignes lues en tuples (une requête, sans instancier d'OrderLine) puis un seul INSERT.
+        lines = [
+            PosTicketLine(
+                ticket=ticket,
+                product=None,
+                qty=qty,
+                unit="pcs",
+                unit_price=unit_price,
+                line_discount=line_discount,
+                line_total=line_total,
+                product_name=menu_item_name,
+                barcode="",
+                internal_sku="",
+                category="",
+                tva=None,
+            )
+            for qty, unit_price, line_discount, line_total, menu_item_name in order.lines.order_by("id").values_list(
+                "qty", "unit_price", "line_discount", "line_total", "menu_item_name"
             )
+        ]
         if lines:
             PosTicketLine.objects.bulk_create(lines)
 
@@ -431,6 +413,11 @@ def mark_order_paid(order: Order, user, payments_payload):
         ]
         if payments:
             PosPayment.objects.bulk_create(payments)
+        apply_ticket_to_rollups(
+            ticket,
+            [{"product_name": line.product_name, "qty": line.qty, "line_total": line.line_total} for line in lines],
+            [{"method": payment.method, "amount": payment.amount} for payment in payments],
+        )
 
         order.status = "PAID"
         order.paid_at = timezone.now()
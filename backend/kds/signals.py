@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import Product
+from products.services.stock import stock_changed
+
+from .models import MenuItem, Order, OrderLine, RecipeItem
+from .services.availability import invalidate_availability
+from .services.cursors import touch_order
+
+
+@receiver(post_save, sender=OrderLine)
+@receiver(post_delete, sender=OrderLine)
+def touch_order_on_line_change(sender, instance, raw=False, **kwargs):
+    # Ligne modifiée seule (admin, édition de commande) : la commande repart dans les deltas.
+    if raw or not instance.order_id:
+        return
+    service_id = Order.objects.filter(id=instance.order_id).values_list("service_id", flat=True).first()
+    if service_id:
+        touch_order(instance.order_id, service_id)
+
+
+@receiver(stock_changed)
+def invalidate_availability_on_bulk_stock(sender, service_ids, **kwargs):
+    invalidate_availability(service_ids)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_availability_on_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    service_id = instance.service_id
+    transaction.on_commit(lambda: invalidate_availability([service_id]))
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def invalidate_availability_on_menu_item(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    service_id = instance.service_id
+    transaction.on_commit(lambda: invalidate_availability([service_id]))
+
+
+@receiver(post_save, sender=RecipeItem)
+@receiver(post_delete, sender=RecipeItem)
+def invalidate_availability_on_recipe(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if RecipeItem.menu_item.is_cached(instance):
+        service_id = instance.menu_item.service_id
+    else:
+        service_id = MenuItem.objects.filter(id=instance.menu_item_id).values_list("service_id", flat=True).first()
+    if service_id:
+        transaction.on_commit(lambda: invalidate_availability([service_id]))
@@ -4,6 +4,7 @@ from . import views
 
 urlpatterns = [
     path("menu-items/", views.kds_menu_items, name="kds_menu_items"),
+    path("menu-items/availability/", views.kds_menu_availability, name="kds_menu_availability"),
     path("menu-items/<int:menu_item_id>/", views.kds_menu_item_detail, name="kds_menu_item_detail"),
     path(
         "menu-items/<int:menu_item_id>/availability/",
@@ -25,6 +26,8 @@ urlpatterns = [
     path("orders/<int:order_id>/served/", views.kds_order_served, name="kds_order_served"),
     path("orders/<int:order_id>/cancel/", views.kds_order_cancel, name="kds_order_cancel"),
     path("kitchen/feed/", views.kds_kitchen_feed, name="kds_kitchen_feed"),
+    path("kitchen/stream/", views.kds_kitchen_stream, name="kds_kitchen_stream"),
+    path("kitchen/stream/ticket/", views.kds_kitchen_stream_ticket, name="kds_kitchen_stream_ticket"),
     path("pos/open-tables/", views.kds_pos_open_tables, name="kds_pos_open_tables"),
     path("pos/orders/<int:order_id>/for-checkout/", views.kds_pos_order_for_checkout, name="kds_pos_order_for_checkout"),
     path("pos/orders/<int:order_id>/mark-paid/", views.kds_pos_order_mark_paid, name="kds_pos_order_mark_paid"),
@@ -2,19 +2,24 @@
 from datetime import datetime
 from decimal import Decimal
 
+from django.conf import settings
 from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from rest_framework import permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from accounts.permissions import ProductPermission
 from accounts.utils import get_service_from_request, get_tenant_for_request
 from products.models import Product
 
+from .authentication import STREAM_TICKET_MAX_AGE_SECONDS, StreamTicketAuthentication, issue_stream_ticket
 from .models import KdsTable, MenuItem, Order, OrderLine, RecipeItem
 from .serializers import (
+    AvailabilitySimulationSerializer,
     KdsTableSerializer,
     MenuItemSerializer,
     OrderCancelSerializer,
@@ -35,8 +40,16 @@ from .services.orders import (
     mark_order_served,
     send_order_to_kitchen,
     cancel_order,
-    compute_menu_item_availability,
 )
+from .services.availability import (
+    invalidate_availability,
+    menu_item_availability,
+    service_availability,
+    simulate_order,
+    unknown_menu_items,
+)
+from .services.cursors import current_change_seq, etag_matches, feed_etag, orders_changed_since
+from .services.events import stream_service_events
 from .utils import require_kds_enabled
 
 
@@ -49,6 +62,70 @@ def _parse_since(value):
         return None
 
 
+FEED_STATUSES = ("SENT", "READY")
+OPEN_STATUSES = ("DRAFT", "SENT", "READY")
+
+
+def _parse_cursor(value):
+    if value in (None, ""):
+        return None
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _orders_response(request, tenant, service, statuses, legacy_filter=None):
+    """
+    Liste de commandes avec ETag (curseur de changements du service) :
+    - If-None-Match à jour => 304 sans lire les commandes ;
+    - ?cursor=N => {"cursor", "orders" modifiées depuis N, "removed" (ids sortis du périmètre)} ;
+      N=0 ou N inconnu (> curseur courant) => instantané complet avec "full": true ;
+    - sans cursor => liste complète (format historique), curseur dans X-KDS-Cursor.
+    Le curseur est lu avant les commandes : un changement concurrent est au pire renvoyé deux fois.
+    """
+    change_seq = current_change_seq(service.id)
+    etag = feed_etag(service.id, change_seq)
+    headers = {"ETag": etag, "X-KDS-Cursor": str(change_seq), "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    base_qs = Order.objects.filter(tenant=tenant, service=service)
+    cursor = _parse_cursor(request.query_params.get("cursor"))
+    if cursor is None:
+        qs = base_qs.filter(status__in=statuses)
+        if legacy_filter:
+            qs = legacy_filter(qs)
+        qs = qs.select_related("table").prefetch_related("lines").order_by("-created_at")
+        return Response(OrderSerializer(qs, many=True).data, headers=headers)
+
+    full = cursor == 0 or cursor > change_seq
+    removed = []
+    if full:
+        qs = base_qs.filter(status__in=statuses)
+    else:
+        changed_ids, removed = orders_changed_since(base_qs, statuses, cursor)
+        qs = base_qs.filter(id__in=changed_ids)
+    qs = qs.select_related("table").prefetch_related("lines").order_by("-created_at")
+    return Response(
+        {
+            "cursor": change_seq,
+            "full": full,
+            "orders": OrderSerializer(qs, many=True).data,
+            "removed": removed,
+            "stream": settings.KDS_STREAM_ENABLED,
+        },
+        headers=headers,
+    )
+
+
+def _availability_payload(availability):
+    return [
+        {"menu_item_id": menu_item_id, "available_count": available, "limiting_ingredients": limiting}
+        for menu_item_id, (available, limiting) in sorted(availability.items())
+    ]
+
+
 def _get_scope(request):
     tenant = get_tenant_for_request(request)
     service = get_service_from_request(request)
@@ -69,14 +146,13 @@ def kds_menu_items(request):
 
     qs = MenuItem.objects.filter(tenant=tenant, service=service)
     with_availability = request.query_params.get("with_availability") == "1"
-    if with_availability:
-        qs = qs.prefetch_related("recipe_items__ingredient_product")
 
     items = list(qs.order_by("name"))
     data = MenuItemSerializer(items, many=True).data
     if with_availability:
+        availability = service_availability(tenant, service)["availability"]
         for idx, item in enumerate(items):
-            available, limiting = compute_menu_item_availability(item)
+            available, limiting = availability.get(item.id, (0, []))
             data[idx]["available_count"] = available
             data[idx]["limiting_ingredients"] = limiting
     return Response(data)
@@ -103,18 +179,47 @@ def kds_menu_item_detail(request, menu_item_id: int):
 @permission_classes([permissions.IsAuthenticated, ProductPermission])
 def kds_menu_item_availability(request, menu_item_id: int):
     tenant, service = _get_scope(request)
-    menu_item = (
-        MenuItem.objects.filter(tenant=tenant, service=service, id=menu_item_id)
-        .prefetch_related("recipe_items__ingredient_product")
-        .first()
-    )
-    if not menu_item:
+    if not MenuItem.objects.filter(tenant=tenant, service=service, id=menu_item_id).exists():
         return Response({"detail": "Plat introuvable."}, status=status.HTTP_404_NOT_FOUND)
 
-    available, limiting = compute_menu_item_availability(menu_item)
+    available, limiting = menu_item_availability(tenant, service, menu_item_id)
     return Response({"available_count": available, "limiting_ingredients": limiting})
 
 
+@api_view(["GET", "POST"])
+@permission_classes([permissions.IsAuthenticated, ProductPermission])
+def kds_menu_availability(request):
+    """
+    GET : disponibilités de tous les plats du service (calcul groupé, en cache).
+    POST {"lines": [...]} ou {"order_id": n} : simulation d'une commande en attente,
+    sans écriture (faisable, manques, disponibilités restantes).
+    """
+    tenant, service = _get_scope(request)
+
+    if request.method == "GET":
+        availability = service_availability(tenant, service)["availability"]
+        return Response(_availability_payload(availability))
+
+    serializer = AvailabilitySimulationSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    lines = serializer.validated_data.get("lines") or []
+    order_id = serializer.validated_data.get("order_id")
+    if order_id:
+        order = Order.objects.filter(tenant=tenant, service=service, id=order_id).first()
+        if not order:
+            return Response({"detail": "Commande introuvable."}, status=status.HTTP_404_NOT_FOUND)
+        lines = [
+            {"menu_item_id": line.menu_item_id, "qty": line.qty}
+            for line in order.lines.exclude(status="CANCELLED")
+            if line.menu_item_id
+        ]
+    elif unknown_menu_items(tenant, service, [line["menu_item_id"] for line in lines]):
+        raise PermissionDenied("Accès interdit à un ou plusieurs plats.")
+
+    feasible, shortages, availability = simulate_order(tenant, service, lines)
+    return Response({"feasible": feasible, "shortages": shortages, "items": _availability_payload(availability)})
+
+
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated, ProductPermission])
 def kds_menu_item_recipe(request, menu_item_id: int):
@@ -147,6 +252,8 @@ def kds_menu_item_recipe(request, menu_item_id: int):
                 for item in serializer.validated_data
             ]
         )
+        # bulk_create sans signaux : disponibilités recalculées au prochain appel.
+        transaction.on_commit(lambda: invalidate_availability([service.id]))
 
     return Response({"detail": "Recette mise à jour."})
 
@@ -225,12 +332,7 @@ def kds_orders(request):
 @permission_classes([permissions.IsAuthenticated, ProductPermission])
 def kds_orders_open(request):
     tenant, service = _get_scope(request)
-    qs = Order.objects.filter(
-        tenant=tenant,
-        service=service,
-        status__in=["DRAFT", "SENT", "READY"],
-    ).prefetch_related("lines")
-    return Response(OrderSerializer(qs.order_by("-created_at"), many=True).data)
+    return _orders_response(request, tenant, service, OPEN_STATUSES)
 
 
 @api_view(["GET"])
@@ -355,16 +457,55 @@ def kds_order_cancel(request, order_id: int):
 def kds_kitchen_feed(request):
     tenant, service = _get_scope(request)
     since = _parse_since(request.query_params.get("since"))
+    legacy_filter = (lambda qs: qs.filter(updated_at__gte=since)) if since else None
+    return _orders_response(request, tenant, service, FEED_STATUSES, legacy_filter=legacy_filter)
+
+
+def _stream_disabled_response():
+    return Response(
+        {"detail": "Flux temps réel désactivé sur ce serveur.", "code": "KDS_STREAM_DISABLED"},
+        status=status.HTTP_404_NOT_FOUND,
+    )
 
-    qs = Order.objects.filter(
-        tenant=tenant,
-        service=service,
-        status__in=["SENT", "READY"],
-    ).prefetch_related("lines")
-    if since:
-        qs = qs.filter(updated_at__gte=since)
 
-    return Response(OrderSerializer(qs.order_by("-created_at"), many=True).data)
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated, ProductPermission])
+def kds_kitchen_stream_ticket(request):
+    """Ticket court et à usage unique pour ouvrir `kitchen/stream/` (EventSource, sans en-tête)."""
+    tenant, service = _get_scope(request)
+    if not settings.KDS_STREAM_ENABLED:
+        return _stream_disabled_response()
+    return Response(
+        {"ticket": issue_stream_ticket(request.user, service), "expires_in": STREAM_TICKET_MAX_AGE_SECONDS}
+    )
+
+
+@api_view(["GET"])
+@authentication_classes([JWTAuthentication, StreamTicketAuthentication])
+@permission_classes([permissions.IsAuthenticated, ProductPermission])
+def kds_kitchen_stream(request):
+    """
+    Flux cuisine en Server-Sent Events : `hello` à la connexion (l'écran recharge alors
+    `kitchen/feed`), puis un delta par changement d'état (order.sent / ready / served /
+    cancelled). Désactivé par défaut (KDS_STREAM_ENABLED) : n'a de sens que servi par
+    inventory.asgi ; sous WSGI, les écrans restent sur `kitchen/feed` (curseur + ETag).
+    """
+    tenant, service = _get_scope(request)
+    if not settings.KDS_STREAM_ENABLED:
+        return _stream_disabled_response()
+    if isinstance(request.auth, dict) and request.auth.get("s") != service.id:
+        raise PermissionDenied("Ticket de flux émis pour un autre service.")
+    response = StreamingHttpResponse(
+        stream_service_events(
+            service.id,
+            max_seconds=settings.KDS_STREAM_MAX_SECONDS,
+            heartbeat_seconds=settings.KDS_STREAM_HEARTBEAT_SECONDS,
+        ),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @api_view(["GET"])
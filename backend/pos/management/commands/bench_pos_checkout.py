@@ -0,0 +1,118 @@
+import random
+import statistics
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Service, Tenant
+from pos.services.checkout import PosCheckoutError, perform_checkout
+from products.models import Product
+
+User = get_user_model()
+
+BENCH_UNIT_PRICE = Decimal("1.50")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark POS checkouts/second with concurrent tills on a throwaway tenant. "
+        "Run it against PostgreSQL: SQLite serialises writers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tills", type=int, default=4, help="Concurrent tills (threads).")
+        parser.add_argument("--checkouts", type=int, default=50, help="Checkouts per till.")
+        parser.add_argument("--lines", type=int, default=20, help="Lines per basket.")
+        parser.add_argument("--products", type=int, default=200, help="Catalog size shared by all tills.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--keep", action="store_true", help="Keep the bench tenant afterwards.")
+
+    def handle(self, *args, **options):
+        tills = max(options["tills"], 1)
+        lines = max(min(options["lines"], options["products"]), 1)
+        tag = uuid.uuid4().hex[:8]
+
+        tenant = Tenant.objects.create(name=f"bench-pos-{tag}")
+        service = Service.objects.create(tenant=tenant, name="Principal")
+        Product.objects.bulk_create(
+            [
+                Product(
+                    tenant=tenant,
+                    service=service,
+                    name=f"Bench {idx}",
+                    category=f"cat-{idx % 10}",
+                    selling_price=BENCH_UNIT_PRICE,
+                    quantity=Decimal("1000000"),
+                    inventory_month="2025-01",
+                )
+                for idx in range(options["products"])
+            ]
+        )
+        product_ids = list(Product.objects.filter(tenant=tenant).values_list("id", flat=True))
+        users = [User.objects.create(username=f"bench-pos-{tag}-{idx}") for idx in range(tills)]
+
+        def basket(rng):
+            picked = rng.sample(product_ids, lines)
+            return {
+                "items": [{"product_id": pid, "qty": Decimal("1")} for pid in picked],
+                "payments": [{"method": "cash", "amount": BENCH_UNIT_PRICE * lines}],
+            }
+
+        try:
+            # Premier passage : construit les snapshots du catalogue, puis mesure d'un encaissement courant.
+            warmup = random.Random(options["seed"])
+            perform_checkout(tenant, service, users[0], basket(warmup))
+            with CaptureQueriesContext(connection) as ctx:
+                perform_checkout(tenant, service, users[0], basket(warmup))
+            self.stdout.write(f"{len(ctx.captured_queries)} requête(s) SQL par encaissement de {lines} ligne(s).")
+
+            latencies = []
+            errors = []
+            lock = threading.Lock()
+
+            def run_till(idx):
+                rng = random.Random(options["seed"] + idx)
+                try:
+                    for _ in range(options["checkouts"]):
+                        data = basket(rng)
+                        started = time.perf_counter()
+                        try:
+                            perform_checkout(tenant, service, users[idx], data)
+                        except (OperationalError, PosCheckoutError) as exc:
+                            with lock:
+                                errors.append(exc)
+                            continue
+                        with lock:
+                            latencies.append(time.perf_counter() - started)
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=run_till, args=(idx,)) for idx in range(tills)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            if not options["keep"]:
+                tenant.delete()
+                User.objects.filter(id__in=[user.id for user in users]).delete()
+
+        done = len(latencies)
+        self.stdout.write(f"{tills} caisse(s), {done} encaissement(s) en {elapsed:.2f}s, {len(errors)} erreur(s).")
+        if done:
+            ordered = sorted(latencies)
+            p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{done / elapsed:.1f} encaissements/s ; latence p50 {statistics.median(ordered) * 1000:.1f} ms, "
+                    f"p95 {p95 * 1000:.1f} ms"
+                )
+            )
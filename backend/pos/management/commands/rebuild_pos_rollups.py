@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from pos.models import PosDailyRollup, PosTicket
+from pos.services.rollups import rebuild_rollups
+
+
+def _parse_day(value, option):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError as exc:
+        raise CommandError(f"{option} invalide (attendu YYYY-MM-DD) : {value}") from exc
+
+
+class Command(BaseCommand):
+    help = "Rebuild PosDailyRollup / PosDailyProductRollup from paid POS tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", type=int, default=None, help="Limit to one tenant id.")
+        parser.add_argument("--service", type=int, default=None, help="Limit to one service id.")
+        parser.add_argument("--from", dest="date_from", default="", help="First day included (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="date_to", default="", help="Last day included (YYYY-MM-DD).")
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only create days that have paid tickets but no rollup row yet (safe at deploy time).",
+        )
+
+    def handle(self, *args, **options):
+        date_from = _parse_day(options.get("date_from"), "--from")
+        date_to = _parse_day(options.get("date_to"), "--to")
+        missing_only = options.get("missing_only")
+
+        tickets = PosTicket.objects.filter(status="PAID")
+        rollups = PosDailyRollup.objects.all()
+        if options.get("tenant"):
+            tickets = tickets.filter(tenant_id=options["tenant"])
+            rollups = rollups.filter(tenant_id=options["tenant"])
+        if options.get("service"):
+            tickets = tickets.filter(service_id=options["service"])
+            rollups = rollups.filter(service_id=options["service"])
+        tenant_ids = set(tickets.values_list("tenant_id", flat=True).distinct())
+        if not missing_only:
+            # Tenants sans ticket payé restant (tout annulé) : leurs cumuls sont purgés.
+            tenant_ids |= set(rollups.values_list("tenant_id", flat=True).distinct())
+        tenant_ids = sorted(tenant_ids)
+
+        total_days = 0
+        for tenant_id in tenant_ids:
+            with transaction.atomic():
+                total_days += rebuild_rollups(
+                    tenant_id,
+                    date_from=date_from,
+                    date_to=date_to,
+                    service_id=options.get("service"),
+                    missing_only=missing_only,
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"{total_days} jour(s) reconstruit(s) sur {len(tenant_ids)} tenant(s)."))
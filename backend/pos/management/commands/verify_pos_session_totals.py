@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from pos.models import PosCashSession
+from pos.services.sessions import recompute_session_totals, store_session_totals, stored_session_totals
+
+
+class Command(BaseCommand):
+    help = "Compare running PosCashSession totals with a full recompute from tickets and payments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", type=int, default=None, help="Limit to one tenant id.")
+        parser.add_argument("--session", type=int, default=None, help="Limit to one session id.")
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Include closed sessions (tickets voided after the Z report legitimately differ).",
+        )
+        parser.add_argument("--fix", action="store_true", help="Overwrite drifting open sessions with the recompute.")
+
+    def handle(self, *args, **options):
+        sessions = PosCashSession.objects.all()
+        if options.get("tenant"):
+            sessions = sessions.filter(tenant_id=options["tenant"])
+        if options.get("session"):
+            sessions = sessions.filter(id=options["session"])
+        if not options.get("all") and not options.get("session"):
+            sessions = sessions.filter(status="OPEN")
+
+        checked = 0
+        drifted = 0
+        fixed = 0
+        for session_id in sessions.order_by("id").values_list("id", flat=True).iterator():
+            with transaction.atomic():
+                session = PosCashSession.objects.select_for_update().get(id=session_id)
+                stored = stored_session_totals(session)
+                expected = recompute_session_totals(session)
+                checked += 1
+                if stored == expected:
+                    continue
+                drifted += 1
+                diff = ", ".join(
+                    f"{key} {stored[key]} != {expected[key]}" for key in expected if stored[key] != expected[key]
+                )
+                self.stdout.write(f"session={session.id} ({session.status}) : {diff}")
+                if options.get("fix") and session.status == "OPEN":
+                    store_session_totals(session.id, expected)
+                    fixed += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{drifted} caisse(s) en écart sur {checked} vérifiée(s), {fixed} corrigée(s).")
+        )
@@ -0,0 +1,35 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def backfill_open_sessions(apps, schema_editor):
+    # Les totaux n'étaient écrits qu'à la clôture : on initialise les caisses encore ouvertes.
+    PosCashSession = apps.get_model("pos", "PosCashSession")
+    PosTicket = apps.get_model("pos", "PosTicket")
+    PosPayment = apps.get_model("pos", "PosPayment")
+    for session in PosCashSession.objects.filter(status="OPEN").iterator():
+        tickets = PosTicket.objects.filter(session=session, status="PAID")
+        totals = tickets.aggregate(
+            total_amount=Sum("total_amount"),
+            total_discount=Sum("discount_total"),
+            total_subtotal=Sum("subtotal_amount"),
+            total_tickets=Count("id"),
+        )
+        by_method = PosPayment.objects.filter(ticket__in=tickets).values("method").annotate(total=Sum("amount"))
+        PosCashSession.objects.filter(id=session.id).update(
+            total_amount=totals["total_amount"] or 0,
+            total_discount=totals["total_discount"] or 0,
+            total_subtotal=totals["total_subtotal"] or 0,
+            total_tickets=totals["total_tickets"] or 0,
+            totals_by_method={row["method"]: str(row["total"]) for row in by_method if row["total"]},
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pos", "0005_ticket_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_open_sessions, migrations.RunPython.noop),
+    ]
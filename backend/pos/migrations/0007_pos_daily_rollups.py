@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_tenant_usage'),
+        ('pos', '0006_backfill_open_session_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosDailyProductRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('product_name', models.CharField(blank=True, default='', max_length=120)),
+                ('total_qty', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_daily_product_rollups', to='accounts.service')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_daily_product_rollups', to='accounts.tenant')),
+            ],
+            options={
+                'unique_together': {('tenant', 'service', 'day', 'product_name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PosDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('tickets_count', models.IntegerField(default=0)),
+                ('total_net', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_brut', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments_by_method', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_daily_rollups', to='accounts.service')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pos_daily_rollups', to='accounts.tenant')),
+            ],
+            options={
+                'unique_together': {('tenant', 'service', 'day')},
+            },
+        ),
+    ]
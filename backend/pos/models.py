@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
 from accounts.models import Tenant, Service
@@ -75,12 +76,21 @@ class PosTicket(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PAID")
     note = models.TextField(blank=True, default="")
     metadata = models.JSONField(default=dict, blank=True)
+    # Clé générée par la caisse : un renvoi (réseau coupé, file hors ligne) ne crée pas de second ticket.
+    idempotency_key = models.CharField(max_length=64, blank=True, default="")
 
     class Meta:
         indexes = [
             models.Index(fields=["tenant", "service", "created_at"]),
             models.Index(fields=["tenant", "status"]),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tenant", "idempotency_key"],
+                name="uniq_pos_ticket_idempotency_key",
+                condition=~Q(idempotency_key=""),
+            ),
+        ]
 
     def __str__(self):
         return f"POS Ticket #{self.id} ({self.tenant_id})"
@@ -163,3 +173,43 @@ class PosPayment(models.Model):
 
     def __str__(self):
         return f"{self.method} {self.amount}"
+
+
+class PosDailyRollup(models.Model):
+    """
+    Ventes encaissées (tickets PAID) par (tenant, service, jour), tenues à jour à chaque
+    encaissement / annulation. Reconstruites par `manage.py rebuild_pos_rollups`.
+    """
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="pos_daily_rollups")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="pos_daily_rollups")
+    day = models.DateField()
+
+    tickets_count = models.IntegerField(default=0)
+    total_net = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_brut = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments_by_method = models.JSONField(default=dict, blank=True)  # {method: "montant"}
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("tenant", "service", "day")
+
+    def __str__(self):
+        return f"POS {self.service_id} {self.day}: {self.total_net}"
+
+
+class PosDailyProductRollup(models.Model):
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="pos_daily_product_rollups")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="pos_daily_product_rollups")
+    day = models.DateField()
+    product_name = models.CharField(max_length=120, blank=True, default="")
+
+    total_qty = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("tenant", "service", "day", "product_name")
+
+    def __str__(self):
+        return f"{self.product_name} {self.day}: {self.total_qty}"
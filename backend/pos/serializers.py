@@ -45,6 +45,9 @@ class PosCheckoutSerializer(serializers.Serializer):
     global_discount = PosGlobalDiscountSerializer(required=False, allow_null=True)
     payments = PosPaymentSerializer(many=True)
     note = serializers.CharField(required=False, allow_blank=True, default="")
+    idempotency_key = serializers.CharField(required=False, allow_blank=True, default="", max_length=64)
+    # Heure de vente réelle d'un ticket saisi hors ligne (bornée à maintenant).
+    created_at = serializers.DateTimeField(required=False, allow_null=True)
 
     def validate(self, attrs):
         items = attrs.get("items") or []
@@ -56,6 +59,21 @@ class PosCheckoutSerializer(serializers.Serializer):
         return attrs
 
 
+class PosCheckoutBatchSerializer(serializers.Serializer):
+    MAX_TICKETS = 200
+
+    tickets = PosCheckoutSerializer(many=True)
+
+    def validate_tickets(self, value):
+        if not value:
+            raise serializers.ValidationError("Aucun ticket à synchroniser.")
+        if len(value) > self.MAX_TICKETS:
+            raise serializers.ValidationError(f"{self.MAX_TICKETS} tickets maximum par envoi.")
+        if any(not ticket.get("idempotency_key") for ticket in value):
+            raise serializers.ValidationError("Chaque ticket hors ligne doit porter une idempotency_key.")
+        return value
+
+
 class PosTicketCancelSerializer(serializers.Serializer):
     REASON_CHOICES = [
         ("error", "Erreur de caisse"),
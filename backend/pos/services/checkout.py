@@ -0,0 +1,347 @@
+# backend/pos/services/checkout.py
+import hashlib
+import json
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied
+
+from products.models import Product
+from products.services.stock import apply_stock_deltas, lock_products
+
+from ..models import PosCashSession, PosPayment, PosTicket, PosTicketLine
+from ..serializers import _discount_amount
+from .rollups import apply_ticket_to_rollups
+from .sessions import apply_ticket_to_session
+
+PAYMENT_TOLERANCE = Decimal("0.01")
+CENT = Decimal("0.01")
+
+
+class PosCheckoutError(Exception):
+    """Refus métier d'un encaissement : rendu tel quel par la vue (detail, code, données)."""
+
+    def __init__(self, detail, code, status_code=status.HTTP_400_BAD_REQUEST, **extra):
+        super().__init__(detail)
+        self.detail = detail
+        self.code = code
+        self.status_code = status_code
+        self.extra = extra
+
+    def as_payload(self):
+        return {"detail": self.detail, "code": self.code, **self.extra}
+
+
+def get_open_session(tenant, service, user):
+    session = (
+        PosCashSession.objects.filter(tenant=tenant, service=service, status="OPEN")
+        .order_by("-opened_at")
+        .first()
+    )
+    if session:
+        return session
+    return PosCashSession.objects.create(
+        tenant=tenant,
+        service=service,
+        opened_by=user,
+        status="OPEN",
+    )
+
+
+def _price_lines(items, product_map):
+    missing_price = []
+    line_payloads = []
+    subtotal_amount = Decimal("0")
+    line_discount_total = Decimal("0")
+
+    for item in items:
+        product = product_map[item["product_id"]]
+        qty = item["qty"]
+        unit_price = item.get("unit_price")
+        if unit_price is None:
+            if product.selling_price is None:
+                missing_price.append({"id": product.id, "name": product.name, "barcode": product.barcode})
+                continue
+            unit_price = product.selling_price
+
+        line_subtotal = unit_price * qty
+        discount_value = item.get("discount") or Decimal("0")
+        discount_type = item.get("discount_type") or "amount"
+        line_discount = _discount_amount(line_subtotal, discount_value, discount_type)
+        if line_discount > line_subtotal:
+            raise PosCheckoutError(f"Remise ligne trop élevée pour {product.name}.", "line_discount_invalid")
+
+        subtotal_amount += line_subtotal
+        line_discount_total += line_discount
+        line_payloads.append(
+            {
+                "product": product,
+                "qty": qty,
+                "unit": product.unit,
+                "unit_price": unit_price,
+                "line_discount": line_discount,
+                "line_total": line_subtotal - line_discount,
+            }
+        )
+
+    if missing_price:
+        raise PosCheckoutError(
+            "Prix de vente manquant pour certains produits.",
+            "missing_selling_price",
+            products=missing_price,
+        )
+    return line_payloads, subtotal_amount, line_discount_total
+
+
+def sale_amounts(lines, total_amount, sign=1):
+    """
+    CA net par produit pour le journal de stock : (product_id, line_total) avec la remise
+    globale répartie au prorata des lignes.
+    """
+    amounts = {}
+    for product_id, line_total in lines:
+        if product_id:
+            amounts[product_id] = amounts.get(product_id, Decimal("0")) + line_total
+    lines_total = sum(amounts.values(), Decimal("0"))
+    if not lines_total:
+        return amounts
+    ratio = Decimal(total_amount) / lines_total
+    return {pid: (sign * amount * ratio).quantize(CENT) for pid, amount in amounts.items()}
+
+
+def _canonical(value):
+    if isinstance(value, Decimal):
+        return format(value.normalize(), "f")
+    if isinstance(value, dict):
+        return {key: _canonical(val) for key, val in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(val) for val in value]
+    return value
+
+
+def checkout_fingerprint(data):
+    """Empreinte du panier : une même clé rejouée avec un autre contenu est refusée."""
+    payload = {key: data.get(key) for key in ("items", "payments", "global_discount", "note")}
+    raw = json.dumps(_canonical(payload), sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _result(ticket, replayed=False):
+    return {
+        "ticket": ticket,
+        "subtotal_amount": ticket.subtotal_amount,
+        "discount_total": ticket.discount_total,
+        "total_amount": ticket.total_amount,
+        "replayed": replayed,
+    }
+
+
+def _replay(ticket, data):
+    if (ticket.metadata or {}).get("fingerprint") != checkout_fingerprint(data):
+        raise PosCheckoutError(
+            "Clé d'idempotence déjà utilisée pour un autre panier.",
+            "idempotency_key_conflict",
+            status_code=status.HTTP_409_CONFLICT,
+            ticket_id=ticket.id,
+        )
+    return _result(ticket, replayed=True)
+
+
+def _checkout_locked(tenant, service, user, data, product_map, session):
+    """Encaisse un panier ; les produits de `product_map` sont déjà verrouillés par l'appelant."""
+    items = data["items"]
+    payments = data["payments"]
+    global_discount = data.get("global_discount")
+    if any(item["product_id"] not in product_map for item in items):
+        raise PermissionDenied("Accès interdit à un ou plusieurs produits.")
+
+    line_payloads, subtotal_amount, line_discount_total = _price_lines(items, product_map)
+
+    if subtotal_amount <= 0:
+        raise PosCheckoutError("Total invalide.", "invalid_total")
+
+    global_discount_value = Decimal("0")
+    if global_discount:
+        global_discount_value = _discount_amount(subtotal_amount, global_discount["value"], global_discount["type"])
+        if global_discount_value > subtotal_amount:
+            raise PosCheckoutError("Remise globale trop élevée.", "global_discount_invalid")
+
+    discount_total = line_discount_total + global_discount_value
+    total_amount = subtotal_amount - discount_total
+
+    payment_total = sum(p["amount"] for p in payments)
+    if abs(payment_total - total_amount) > PAYMENT_TOLERANCE:
+        raise PosCheckoutError(
+            "Le total des paiements ne correspond pas au total du ticket.",
+            "payment_total_mismatch",
+        )
+
+    # Un même produit peut apparaître sur plusieurs lignes : contrôle sur la quantité cumulée.
+    needed = {}
+    for payload in line_payloads:
+        needed[payload["product"].id] = needed.get(payload["product"].id, Decimal("0")) + payload["qty"]
+    insufficient = [
+        {"id": product.id, "name": product.name, "available": str(product.quantity)}
+        for pid, product in sorted(product_map.items())
+        if pid in needed and product.quantity < needed[pid]
+    ]
+    if insufficient:
+        raise PosCheckoutError(
+            "Stock insuffisant pour certains produits.",
+            "stock_insufficient",
+            status_code=status.HTTP_409_CONFLICT,
+            products=insufficient,
+        )
+
+    key = data.get("idempotency_key") or ""
+    now = timezone.now()
+    created_at = min(data.get("created_at") or now, now)
+    ticket = PosTicket.objects.create(
+        tenant=tenant,
+        service=service,
+        session=session,
+        created_by=user,
+        created_at=created_at,
+        subtotal_amount=subtotal_amount,
+        discount_total=discount_total,
+        total_amount=total_amount,
+        status="PAID",
+        note=data.get("note") or "",
+        idempotency_key=key,
+        metadata={"fingerprint": checkout_fingerprint(data)} if key else {},
+    )
+
+    PosTicketLine.objects.bulk_create(
+        [
+            PosTicketLine(
+                ticket=ticket,
+                product=payload["product"],
+                qty=payload["qty"],
+                unit=payload["unit"],
+                unit_price=payload["unit_price"],
+                line_discount=payload["line_discount"],
+                line_total=payload["line_total"],
+                product_name=payload["product"].name,
+                barcode=payload["product"].barcode or "",
+                internal_sku=payload["product"].internal_sku or "",
+                category=payload["product"].category or "",
+                tva=payload["product"].tva,
+            )
+            for payload in line_payloads
+        ]
+    )
+    PosPayment.objects.bulk_create(
+        [PosPayment(ticket=ticket, method=payment["method"], amount=payment["amount"]) for payment in payments]
+    )
+
+    apply_stock_deltas(
+        product_map.values(),
+        {pid: -qty for pid, qty in needed.items()},
+        kind="pos_sale",
+        reference=f"pos_ticket:{ticket.id}",
+        user=user,
+        amounts=sale_amounts(
+            [(payload["product"].id, payload["line_total"]) for payload in line_payloads], total_amount
+        ),
+    )
+    apply_ticket_to_session(session.id if session else None, ticket, payments)
+    apply_ticket_to_rollups(
+        ticket,
+        [
+            {"product_name": payload["product"].name, "qty": payload["qty"], "line_total": payload["line_total"]}
+            for payload in line_payloads
+        ],
+        payments,
+    )
+    return _result(ticket)
+
+
+def _lock_products(tenant, service, tickets):
+    product_ids = {item["product_id"] for data in tickets for item in data["items"]}
+    products = lock_products(Product.objects.filter(tenant=tenant, service=service, id__in=product_ids))
+    return {p.id: p for p in products}
+
+
+def perform_checkout(tenant, service, user, data):
+    """
+    Encaissement d'un panier validé par PosCheckoutSerializer.
+
+    Chemin d'écriture à nombre de requêtes constant pendant que les verrous sont tenus :
+    verrous produits triés par id, 1 INSERT ticket, 1 bulk_create lignes, 1 bulk_create
+    paiements, 1 UPDATE ... CASE pour le stock (au lieu d'un create / save() par ligne).
+
+    Avec une idempotency_key déjà encaissée, renvoie le ticket existant (`replayed`) sans
+    toucher au stock. La clé est relue après les verrous : un renvoi concurrent du même
+    panier attend le premier puis le retrouve ; la contrainte unique couvre le reste.
+    """
+    key = data.get("idempotency_key") or ""
+    try:
+        with transaction.atomic():
+            product_map = _lock_products(tenant, service, [data])
+            if key:
+                existing = PosTicket.objects.filter(tenant=tenant, idempotency_key=key).first()
+                if existing:
+                    return _replay(existing, data)
+            return _checkout_locked(tenant, service, user, data, product_map, get_open_session(tenant, service, user))
+    except IntegrityError:
+        existing = PosTicket.objects.filter(tenant=tenant, idempotency_key=key).first() if key else None
+        if existing is None:
+            raise
+        return _replay(existing, data)
+
+
+def perform_checkout_batch(tenant, service, user, tickets):
+    """
+    Synchronisation d'une file hors ligne : une transaction pour le lot, un savepoint par
+    ticket. Tous les produits du lot sont verrouillés une fois (ordre des ids) et les clés
+    déjà connues chargées en une requête. Un ticket refusé n'annule pas les autres.
+    Retourne un résultat par ticket, dans l'ordre reçu.
+    """
+    results = []
+    with transaction.atomic():
+        product_map = _lock_products(tenant, service, tickets)
+        keys = [data["idempotency_key"] for data in tickets]
+        known = {
+            ticket.idempotency_key: ticket
+            for ticket in PosTicket.objects.filter(tenant=tenant, idempotency_key__in=keys)
+        }
+        session = None
+
+        for data in tickets:
+            key = data["idempotency_key"]
+            try:
+                if key in known:
+                    result = _replay(known[key], data)
+                else:
+                    if session is None:
+                        session = get_open_session(tenant, service, user)
+                    with transaction.atomic():
+                        result = _checkout_locked(tenant, service, user, data, product_map, session)
+                    known[key] = result["ticket"]
+            except PosCheckoutError as exc:
+                results.append(
+                    {"idempotency_key": key, "status": "rejected", "status_code": exc.status_code, **exc.as_payload()}
+                )
+                continue
+            except PermissionDenied as exc:
+                results.append(
+                    {
+                        "idempotency_key": key,
+                        "status": "rejected",
+                        "status_code": status.HTTP_403_FORBIDDEN,
+                        "detail": str(exc.detail),
+                        "code": "products_forbidden",
+                    }
+                )
+                continue
+            results.append(
+                {
+                    "idempotency_key": key,
+                    "status": "replayed" if result["replayed"] else "created",
+                    "ticket_id": result["ticket"].id,
+                    "total_amount": str(result["total_amount"]),
+                }
+            )
+    return results
@@ -0,0 +1,279 @@
+# backend/pos/services/rollups.py
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from ..models import PosDailyProductRollup, PosDailyRollup, PosPayment, PosTicket, PosTicketLine
+from .sessions import _merge_methods
+
+ZERO = Decimal("0")
+CENT = Decimal("0.01")
+
+
+def rollup_day(ticket):
+    # Même découpage que l'ancien filtre created_at__date (fuseau courant).
+    return timezone.localtime(ticket.created_at).date()
+
+
+def _apply_day(tenant_id, service_id, day, ticket, payments, sign):
+    key = {"tenant_id": tenant_id, "service_id": service_id, "day": day}
+    row = PosDailyRollup.objects.select_for_update().only("id", "payments_by_method").filter(**key).first()
+    if row is None:
+        try:
+            with transaction.atomic():
+                PosDailyRollup.objects.create(
+                    **key,
+                    tickets_count=sign,
+                    total_net=sign * ticket.total_amount,
+                    total_discount=sign * ticket.discount_total,
+                    total_brut=sign * ticket.subtotal_amount,
+                    payments_by_method=_merge_methods({}, payments, sign),
+                )
+            return
+        except IntegrityError:
+            # Première vente du jour encaissée en parallèle sur une autre caisse.
+            row = PosDailyRollup.objects.select_for_update().only("id", "payments_by_method").get(**key)
+
+    PosDailyRollup.objects.filter(id=row.id).update(
+        tickets_count=F("tickets_count") + sign,
+        total_net=F("total_net") + sign * ticket.total_amount,
+        total_discount=F("total_discount") + sign * ticket.discount_total,
+        total_brut=F("total_brut") + sign * ticket.subtotal_amount,
+        payments_by_method=_merge_methods(row.payments_by_method, payments, sign),
+        updated_at=timezone.now(),
+    )
+
+
+def _apply_products(tenant_id, service_id, day, lines, sign):
+    per_product = {}
+    for line in lines:
+        qty, amount = per_product.get(line["product_name"], (ZERO, ZERO))
+        per_product[line["product_name"]] = (qty + sign * line["qty"], amount + sign * line["line_total"])
+    if not per_product:
+        return
+
+    key = {"tenant_id": tenant_id, "service_id": service_id, "day": day}
+    for attempt in range(2):
+        existing = list(
+            PosDailyProductRollup.objects.select_for_update()
+            .filter(**key, product_name__in=per_product)
+            .order_by("product_name")
+        )
+        for row in existing:
+            qty, amount = per_product[row.product_name]
+            row.total_qty += qty
+            row.total_amount += amount
+        PosDailyProductRollup.objects.bulk_update(existing, ["total_qty", "total_amount"])
+
+        known = {row.product_name for row in existing}
+        missing = [
+            PosDailyProductRollup(**key, product_name=name, total_qty=qty, total_amount=amount)
+            for name, (qty, amount) in sorted(per_product.items())
+            if name not in known
+        ]
+        if not missing:
+            return
+        try:
+            with transaction.atomic():
+                PosDailyProductRollup.objects.bulk_create(missing)
+            return
+        except IntegrityError:
+            if attempt:
+                raise
+            # Lignes créées entre-temps par une autre caisse : on repasse en mise à jour.
+            per_product = {row.product_name: per_product[row.product_name] for row in missing}
+
+
+def apply_ticket_to_rollups(ticket, lines, payments, sign=1):
+    """
+    Cumuls journaliers mis à jour dans la transaction du ticket : une ligne par
+    (tenant, service, jour) et une par produit vendu. `lines` / `payments` sont des dicts
+    (product_name, qty, line_total / method, amount). sign=-1 pour une annulation.
+    Les verrous de cumul sont pris en dernier : ce sont les lignes les plus disputées.
+    """
+    day = rollup_day(ticket)
+    if sign < 0 and not PosDailyRollup.objects.filter(
+        tenant_id=ticket.tenant_id, service_id=ticket.service_id, day=day
+    ).exists():
+        # Jour jamais cumulé (ventes antérieures aux cumuls, ligne purgée) : retrancher créerait
+        # une ligne négative. On reconstruit le jour depuis les tickets, sans celui annulé.
+        rebuild_rollups(
+            ticket.tenant_id, date_from=day, date_to=day, service_id=ticket.service_id, exclude_ticket_ids=[ticket.id]
+        )
+        return
+    _apply_products(ticket.tenant_id, ticket.service_id, day, lines, sign)
+    _apply_day(ticket.tenant_id, ticket.service_id, day, ticket, payments, sign)
+
+
+def ticket_rollup_inputs(ticket):
+    lines = list(ticket.lines.values("product_name", "qty", "line_total"))
+    payments = list(ticket.payments.values("method", "amount"))
+    return lines, payments
+
+
+def rebuild_rollups(
+    tenant_id, date_from=None, date_to=None, service_id=None, missing_only=False, exclude_ticket_ids=()
+):
+    """
+    Recalcule les cumuls depuis les tickets PAID (GROUP BY jour), bornes incluses.
+    missing_only : ne crée que les jours absents, sans toucher aux lignes existantes.
+    exclude_ticket_ids : tickets encore PAID en base mais en cours d'annulation.
+    Retourne le nombre de jours écrits.
+    """
+    tickets = PosTicket.objects.filter(tenant_id=tenant_id, status="PAID")
+    if exclude_ticket_ids:
+        tickets = tickets.exclude(id__in=exclude_ticket_ids)
+    if service_id:
+        tickets = tickets.filter(service_id=service_id)
+    if date_from:
+        tickets = tickets.filter(created_at__date__gte=date_from)
+    if date_to:
+        tickets = tickets.filter(created_at__date__lte=date_to)
+
+    days = {
+        (row["service_id"], row["day"]): row
+        for row in tickets.annotate(day=TruncDate("created_at"))
+        .values("service_id", "day")
+        .annotate(
+            tickets_count=Count("id"),
+            total_net=Sum("total_amount"),
+            total_discount=Sum("discount_total"),
+            total_brut=Sum("subtotal_amount"),
+        )
+        .order_by()
+    }
+
+    existing = PosDailyRollup.objects.filter(tenant_id=tenant_id)
+    if service_id:
+        existing = existing.filter(service_id=service_id)
+    if date_from:
+        existing = existing.filter(day__gte=date_from)
+    if date_to:
+        existing = existing.filter(day__lte=date_to)
+    if missing_only:
+        for service_day in existing.values_list("service_id", "day"):
+            days.pop(service_day, None)
+        if not days:
+            return 0
+
+    methods = {}
+    payments = (
+        PosPayment.objects.filter(ticket__in=tickets)
+        .annotate(day=TruncDate("ticket__created_at"))
+        .values("ticket__service_id", "day", "method")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    )
+    for row in payments:
+        if row["total"]:
+            day_methods = methods.setdefault((row["ticket__service_id"], row["day"]), {})
+            day_methods[row["method"]] = str(Decimal(row["total"]).quantize(CENT))
+
+    products = (
+        PosTicketLine.objects.filter(ticket__in=tickets)
+        .annotate(day=TruncDate("ticket__created_at"))
+        .values("ticket__service_id", "day", "product_name")
+        .annotate(total_qty=Sum("qty"), total_amount=Sum("line_total"))
+        .order_by()
+    )
+    product_rows = [
+        PosDailyProductRollup(
+            tenant_id=tenant_id,
+            service_id=row["ticket__service_id"],
+            day=row["day"],
+            product_name=row["product_name"],
+            total_qty=row["total_qty"] or ZERO,
+            total_amount=row["total_amount"] or ZERO,
+        )
+        for row in products
+        if (row["ticket__service_id"], row["day"]) in days
+    ]
+
+    day_rows = [
+        PosDailyRollup(
+            tenant_id=tenant_id,
+            service_id=service,
+            day=day,
+            tickets_count=row["tickets_count"],
+            total_net=row["total_net"] or ZERO,
+            total_discount=row["total_discount"] or ZERO,
+            total_brut=row["total_brut"] or ZERO,
+            payments_by_method=dict(sorted(methods.get((service, day), {}).items())),
+        )
+        for (service, day), row in sorted(days.items())
+    ]
+
+    product_existing = PosDailyProductRollup.objects.filter(tenant_id=tenant_id)
+    if service_id:
+        product_existing = product_existing.filter(service_id=service_id)
+    if date_from:
+        product_existing = product_existing.filter(day__gte=date_from)
+    if date_to:
+        product_existing = product_existing.filter(day__lte=date_to)
+    if missing_only:
+        # Lignes produit orphelines d'un jour sans ligne jour : remplacées avec lui.
+        orphans = Q()
+        for service, day in days:
+            orphans |= Q(service_id=service, day=day)
+        product_existing.filter(orphans).delete()
+    else:
+        product_existing.delete()
+        existing.delete()
+    PosDailyRollup.objects.bulk_create(day_rows, batch_size=500)
+    PosDailyProductRollup.objects.bulk_create(product_rows, batch_size=500)
+    return len(day_rows)
+
+
+def rollup_report(tenant, service, date_from=None, date_to=None, top=5):
+    """Rapport de ventes sur une plage quelconque : somme des lignes jour, série par jour."""
+    rows = PosDailyRollup.objects.filter(tenant=tenant, service=service)
+    products = PosDailyProductRollup.objects.filter(tenant=tenant, service=service)
+    if date_from:
+        rows = rows.filter(day__gte=date_from)
+        products = products.filter(day__gte=date_from)
+    if date_to:
+        rows = rows.filter(day__lte=date_to)
+        products = products.filter(day__lte=date_to)
+
+    totals = {"total_net": ZERO, "total_remises": ZERO, "total_brut": ZERO, "tickets_count": 0}
+    by_method = {}
+    timeseries = []
+    for row in rows.order_by("day"):
+        if not row.tickets_count and not row.total_net:
+            continue
+        totals["total_net"] += row.total_net
+        totals["total_remises"] += row.total_discount
+        totals["total_brut"] += row.total_brut
+        totals["tickets_count"] += row.tickets_count
+        for method, value in (row.payments_by_method or {}).items():
+            by_method[method] = by_method.get(method, ZERO) + Decimal(str(value))
+        timeseries.append(
+            {
+                "day": row.day.isoformat(),
+                "tickets_count": row.tickets_count,
+                "total_net": str(row.total_net),
+                "total_remises": str(row.total_discount),
+                "total_brut": str(row.total_brut),
+            }
+        )
+
+    top_products = (
+        products.values("product_name")
+        .annotate(total_qty=Sum("total_qty"), total_amount=Sum("total_amount"))
+        .filter(total_qty__gt=0)
+        .order_by("-total_amount", "product_name")[:top]
+    )
+    return {
+        "total_net": str(totals["total_net"]),
+        "total_remises": str(totals["total_remises"]),
+        "total_brut": str(totals["total_brut"]),
+        "tickets_count": totals["tickets_count"],
+        "payments_by_method": [
+            {"method": method, "total": total} for method, total in sorted(by_method.items()) if total
+        ],
+        "top_products": list(top_products),
+        "timeseries": timeseries,
+    }
@@ -0,0 +1,102 @@
+# backend/pos/services/sessions.py
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+
+from ..models import PosCashSession, PosPayment, PosTicket
+
+ZERO = Decimal("0")
+
+
+def _merge_methods(totals_by_method, payments, sign):
+    merged = {method: Decimal(str(value)) for method, value in (totals_by_method or {}).items()}
+    for payment in payments:
+        method = payment["method"]
+        merged[method] = merged.get(method, ZERO) + sign * Decimal(payment["amount"])
+    return {method: str(value) for method, value in sorted(merged.items()) if value}
+
+
+def apply_ticket_to_session(session_id, ticket, payments, sign=1, only_open=False):
+    """
+    Totaux courants de la caisse mis à jour dans la transaction du ticket :
+    montants / nombre de tickets en F() (UPDATE relatif), totaux par moyen de paiement
+    fusionnés sous verrou de ligne. sign=-1 pour une annulation.
+    """
+    if not session_id:
+        return
+    session = (
+        PosCashSession.objects.select_for_update()
+        .only("id", "status", "totals_by_method")
+        .filter(id=session_id)
+        .first()
+    )
+    if session is None or (only_open and session.status != "OPEN"):
+        return
+    PosCashSession.objects.filter(id=session_id).update(
+        total_amount=F("total_amount") + sign * ticket.total_amount,
+        total_discount=F("total_discount") + sign * ticket.discount_total,
+        total_subtotal=F("total_subtotal") + sign * ticket.subtotal_amount,
+        total_tickets=F("total_tickets") + sign,
+        totals_by_method=_merge_methods(session.totals_by_method, payments, sign),
+    )
+
+
+def session_summary(session):
+    """Résumé de caisse lu sur les totaux courants (O(1), plus de réagrégation des tickets)."""
+    return {
+        "session_id": session.id,
+        "opened_at": session.opened_at.isoformat(),
+        "closed_at": session.closed_at.isoformat() if session.closed_at else None,
+        "status": session.status,
+        "total_net": str(session.total_amount or ZERO),
+        "total_remises": str(session.total_discount or ZERO),
+        "total_brut": str(session.total_subtotal or ZERO),
+        "total_tickets": int(session.total_tickets or 0),
+        "payments_by_method": [
+            {"method": method, "total": Decimal(str(total))}
+            for method, total in sorted((session.totals_by_method or {}).items())
+        ],
+    }
+
+
+def recompute_session_totals(session):
+    """Recalcul complet depuis les tickets payés (vérification / réparation)."""
+    tickets_qs = PosTicket.objects.filter(session=session, status="PAID")
+    totals = tickets_qs.aggregate(
+        total_amount=Sum("total_amount"),
+        total_discount=Sum("discount_total"),
+        total_subtotal=Sum("subtotal_amount"),
+        total_tickets=Count("id"),
+    )
+    by_method = (
+        PosPayment.objects.filter(ticket__in=tickets_qs).values("method").annotate(total=Sum("amount")).order_by("method")
+    )
+    return {
+        "total_amount": totals["total_amount"] or ZERO,
+        "total_discount": totals["total_discount"] or ZERO,
+        "total_subtotal": totals["total_subtotal"] or ZERO,
+        "total_tickets": int(totals["total_tickets"] or 0),
+        "totals_by_method": {row["method"]: row["total"] for row in by_method if row["total"]},
+    }
+
+
+def stored_session_totals(session):
+    return {
+        "total_amount": session.total_amount or ZERO,
+        "total_discount": session.total_discount or ZERO,
+        "total_subtotal": session.total_subtotal or ZERO,
+        "total_tickets": int(session.total_tickets or 0),
+        "totals_by_method": {
+            method: Decimal(str(value)) for method, value in (session.totals_by_method or {}).items() if Decimal(str(value))
+        },
+    }
+
+
+def store_session_totals(session_id, totals):
+    PosCashSession.objects.filter(id=session_id).update(
+        total_amount=totals["total_amount"],
+        total_discount=totals["total_discount"],
+        total_subtotal=totals["total_subtotal"],
+        total_tickets=totals["total_tickets"],
+        totals_by_method={method: str(value) for method, value in sorted(totals["totals_by_method"].items())},
+    )
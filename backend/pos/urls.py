@@ -3,6 +3,7 @@ from django.urls import path
 from .views import (
     pos_products_search,
     pos_checkout,
+    pos_checkout_batch,
     pos_reports_summary,
     pos_tickets,
     pos_ticket_detail,
@@ -15,6 +16,7 @@ from .views import (
 urlpatterns = [
     path("products/search/", pos_products_search, name="pos_products_search"),
     path("tickets/checkout/", pos_checkout, name="pos_checkout"),
+    path("tickets/checkout/batch/", pos_checkout_batch, name="pos_checkout_batch"),
     path("reports/summary/", pos_reports_summary, name="pos_reports_summary"),
     path("tickets/", pos_tickets, name="pos_tickets"),
     path("tickets/<int:ticket_id>/", pos_ticket_detail, name="pos_ticket_detail"),
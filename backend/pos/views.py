@@ -2,22 +2,23 @@ from decimal import Decimal
 from datetime import datetime, timedelta
 
 from django.db import transaction
-from django.db.models import Q, Sum, Count
 from django.utils import timezone
 from rest_framework import permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
 
 from accounts.permissions import ProductPermission
 from accounts.services.access import get_retention_days
 from accounts.utils import get_service_from_request, get_tenant_for_request
 from products.models import Product, LossEvent
+from products.services.search import search_catalog
+from products.services.stock import apply_stock_deltas, lock_products
 
-from .models import PosCashSession, PosTicket, PosTicketLine, PosPayment, PosTicketEvent
-from .serializers import PosCheckoutSerializer, PosTicketCancelSerializer, _discount_amount
-
-PAYMENT_TOLERANCE = Decimal("0.01")
+from .models import PosCashSession, PosTicket, PosTicketEvent
+from .serializers import PosCheckoutBatchSerializer, PosCheckoutSerializer, PosTicketCancelSerializer
+from .services.checkout import PosCheckoutError, perform_checkout, perform_checkout_batch, sale_amounts
+from .services.rollups import apply_ticket_to_rollups, rollup_report, ticket_rollup_inputs
+from .services.sessions import apply_ticket_to_session, session_summary
 
 LOSS_REASON_MAP = {
     "error": "mistake",
@@ -51,22 +52,6 @@ def _parse_date(value: str):
         return None
 
 
-def _get_open_session(tenant, service, user):
-    session = (
-        PosCashSession.objects.filter(tenant=tenant, service=service, status="OPEN")
-        .order_by("-opened_at")
-        .first()
-    )
-    if session:
-        return session
-    return PosCashSession.objects.create(
-        tenant=tenant,
-        service=service,
-        opened_by=user,
-        status="OPEN",
-    )
-
-
 def _ticket_reference(ticket):
     return f"POS-{ticket.created_at.strftime('%Y%m%d')}-{ticket.id:05d}"
 
@@ -108,31 +93,6 @@ def _serialize_ticket_detail(ticket):
     }
 
 
-def _build_session_summary(session):
-    tickets_qs = PosTicket.objects.filter(session=session, status="PAID")
-    totals = tickets_qs.aggregate(
-        total_net=Sum("total_amount"),
-        total_remises=Sum("discount_total"),
-        total_brut=Sum("subtotal_amount"),
-        total_tickets=Count("id"),
-    )
-    payments_qs = PosPayment.objects.filter(ticket__in=tickets_qs)
-    payments_by_method = (
-        payments_qs.values("method").annotate(total=Sum("amount")).order_by("method")
-    )
-    return {
-        "session_id": session.id,
-        "opened_at": session.opened_at.isoformat(),
-        "closed_at": session.closed_at.isoformat() if session.closed_at else None,
-        "status": session.status,
-        "total_net": str(totals.get("total_net") or Decimal("0")),
-        "total_remises": str(totals.get("total_remises") or Decimal("0")),
-        "total_brut": str(totals.get("total_brut") or Decimal("0")),
-        "total_tickets": int(totals.get("total_tickets") or 0),
-        "payments_by_method": list(payments_by_method),
-    }
-
-
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated, ProductPermission])
 def pos_products_search(request):
@@ -145,24 +105,12 @@ def pos_products_search(request):
 
     qs = Product.objects.filter(tenant=tenant, service=service)
     qs = _apply_retention(qs, tenant)
-    qs = qs.filter(
-        Q(name__icontains=query)
-        | Q(barcode__icontains=query)
-        | Q(internal_sku__icontains=query)
-    )
-
-    results = list(
-        qs.order_by("name")[:30].values(
-            "id",
-            "name",
-            "barcode",
-            "internal_sku",
-            "quantity",
-            "unit",
-            "selling_price",
-            "tva",
-            "category",
-        )
+    results = search_catalog(
+        qs,
+        query,
+        [service.id],
+        ("id", "name", "barcode", "internal_sku", "quantity", "unit", "selling_price", "tva", "category"),
+        limit=30,
     )
     return Response(results)
 
@@ -177,186 +125,46 @@ def pos_checkout(request):
     tenant = get_tenant_for_request(request)
     service = get_service_from_request(request)
 
-    items = data["items"]
-    payments = data["payments"]
-    global_discount = data.get("global_discount")
-
-    product_ids = [item["product_id"] for item in items]
+    if not data.get("idempotency_key"):
+        data["idempotency_key"] = (request.headers.get("Idempotency-Key") or "").strip()[:64]
 
-    with transaction.atomic():
-        products = list(
-            Product.objects.select_for_update()
-            .filter(tenant=tenant, service=service, id__in=product_ids)
-        )
-
-        product_map = {p.id: p for p in products}
-        missing_ids = [pid for pid in product_ids if pid not in product_map]
-        if missing_ids:
-            raise PermissionDenied("Accès interdit à un ou plusieurs produits.")
-
-        missing_price = []
-        line_payloads = []
-        subtotal_amount = Decimal("0")
-        line_discount_total = Decimal("0")
-
-        for item in items:
-            product = product_map[item["product_id"]]
-            qty = item["qty"]
-            unit_price = item.get("unit_price")
-            if unit_price is None:
-                if product.selling_price is None:
-                    missing_price.append(
-                        {"id": product.id, "name": product.name, "barcode": product.barcode}
-                    )
-                    continue
-                unit_price = product.selling_price
-
-            line_subtotal = unit_price * qty
-            discount_value = item.get("discount") or Decimal("0")
-            discount_type = item.get("discount_type") or "amount"
-            line_discount = _discount_amount(line_subtotal, discount_value, discount_type)
-            if line_discount > line_subtotal:
-                return Response(
-                    {
-                        "detail": f"Remise ligne trop élevée pour {product.name}.",
-                        "code": "line_discount_invalid",
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            line_total = line_subtotal - line_discount
-            subtotal_amount += line_subtotal
-            line_discount_total += line_discount
-
-            line_payloads.append(
-                {
-                    "product": product,
-                    "qty": qty,
-                    "unit": product.unit,
-                    "unit_price": unit_price,
-                    "line_discount": line_discount,
-                    "line_total": line_total,
-                }
-            )
-
-        if missing_price:
-            return Response(
-                {
-                    "detail": "Prix de vente manquant pour certains produits.",
-                    "code": "missing_selling_price",
-                    "products": missing_price,
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        if subtotal_amount <= 0:
-            return Response(
-                {"detail": "Total invalide.", "code": "invalid_total"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        global_discount_value = Decimal("0")
-        if global_discount:
-            global_discount_value = _discount_amount(
-                subtotal_amount, global_discount["value"], global_discount["type"]
-            )
-            if global_discount_value > subtotal_amount:
-                return Response(
-                    {
-                        "detail": "Remise globale trop élevée.",
-                        "code": "global_discount_invalid",
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-        discount_total = line_discount_total + global_discount_value
-        total_amount = subtotal_amount - discount_total
-
-        payment_total = sum(p["amount"] for p in payments)
-        if abs(payment_total - total_amount) > PAYMENT_TOLERANCE:
-            return Response(
-                {
-                    "detail": "Le total des paiements ne correspond pas au total du ticket.",
-                    "code": "payment_total_mismatch",
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        insufficient = []
-        for payload in line_payloads:
-            product = payload["product"]
-            if product.quantity < payload["qty"]:
-                insufficient.append(
-                    {
-                        "id": product.id,
-                        "name": product.name,
-                        "available": str(product.quantity),
-                    }
-                )
-
-        if insufficient:
-            return Response(
-                {
-                    "detail": "Stock insuffisant pour certains produits.",
-                    "code": "stock_insufficient",
-                    "products": insufficient,
-                },
-                status=status.HTTP_409_CONFLICT,
-            )
-
-        session = _get_open_session(tenant, service, request.user)
-
-        ticket = PosTicket.objects.create(
-            tenant=tenant,
-            service=service,
-            session=session,
-            created_by=request.user,
-            subtotal_amount=subtotal_amount,
-            discount_total=discount_total,
-            total_amount=total_amount,
-            status="PAID",
-            note=data.get("note") or "",
-        )
-
-        for payload in line_payloads:
-            product = payload["product"]
-            PosTicketLine.objects.create(
-                ticket=ticket,
-                product=product,
-                qty=payload["qty"],
-                unit=payload["unit"],
-                unit_price=payload["unit_price"],
-                line_discount=payload["line_discount"],
-                line_total=payload["line_total"],
-                product_name=product.name,
-                barcode=product.barcode or "",
-                internal_sku=product.internal_sku or "",
-                category=product.category or "",
-                tva=product.tva,
-            )
-
-        for payment in payments:
-            PosPayment.objects.create(
-                ticket=ticket,
-                method=payment["method"],
-                amount=payment["amount"],
-            )
-
-        for payload in line_payloads:
-            product = payload["product"]
-            product.quantity = product.quantity - payload["qty"]
-            product.save(update_fields=["quantity"])
+    try:
+        result = perform_checkout(tenant, service, request.user, data)
+    except PosCheckoutError as exc:
+        return Response(exc.as_payload(), status=exc.status_code)
 
     return Response(
         {
-            "ticket_id": ticket.id,
-            "subtotal_amount": str(subtotal_amount),
-            "discount_total": str(discount_total),
-            "total_amount": str(total_amount),
+            "ticket_id": result["ticket"].id,
+            "subtotal_amount": str(result["subtotal_amount"]),
+            "discount_total": str(result["discount_total"]),
+            "total_amount": str(result["total_amount"]),
+            "replayed": result["replayed"],
         }
     )
 
 
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated, ProductPermission])
+def pos_checkout_batch(request):
+    """
+    Envoi groupé des tickets saisis hors ligne (reconnexion d'une caisse).
+    Chaque ticket porte son idempotency_key : un lot renvoyé après coupure ne décompte
+    pas deux fois le stock. Réponse 200 avec un statut par ticket (created / replayed / rejected).
+    """
+    serializer = PosCheckoutBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    tenant = get_tenant_for_request(request)
+    service = get_service_from_request(request)
+    results = perform_checkout_batch(tenant, service, request.user, serializer.validated_data["tickets"])
+
+    counts = {"created": 0, "replayed": 0, "rejected": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return Response({"results": results, **counts})
+
+
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated, ProductPermission])
 def pos_reports_summary(request):
@@ -366,39 +174,8 @@ def pos_reports_summary(request):
     date_from = _parse_date(request.query_params.get("from") or "")
     date_to = _parse_date(request.query_params.get("to") or "")
 
-    qs = PosTicket.objects.filter(tenant=tenant, service=service, status="PAID")
-    if date_from:
-        qs = qs.filter(created_at__date__gte=date_from)
-    if date_to:
-        qs = qs.filter(created_at__date__lte=date_to)
-
-    totals = qs.aggregate(
-        total_net=Sum("total_amount"),
-        total_remises=Sum("discount_total"),
-        total_brut=Sum("subtotal_amount"),
-    )
-
-    payments_qs = PosPayment.objects.filter(ticket__in=qs)
-    payments_by_method = (
-        payments_qs.values("method").annotate(total=Sum("amount")).order_by("method")
-    )
-
-    top_products = (
-        PosTicketLine.objects.filter(ticket__in=qs)
-        .values("product_name")
-        .annotate(total_qty=Sum("qty"), total_amount=Sum("line_total"))
-        .order_by("-total_amount")[:5]
-    )
-
-    return Response(
-        {
-            "total_net": str(totals.get("total_net") or Decimal("0")),
-            "total_remises": str(totals.get("total_remises") or Decimal("0")),
-            "total_brut": str(totals.get("total_brut") or Decimal("0")),
-            "payments_by_method": list(payments_by_method),
-            "top_products": list(top_products),
-        }
-    )
+    # Lu sur les cumuls journaliers (PosDailyRollup) : coût proportionnel au nombre de jours.
+    return Response(rollup_report(tenant, service, date_from=date_from, date_to=date_to))
 
 
 @api_view(["GET"])
@@ -468,9 +245,7 @@ def pos_ticket_cancel(request, ticket_id):
         product_ids = [line.product_id for line in lines if line.product_id]
         products = {
             p.id: p
-            for p in Product.objects.select_for_update().filter(
-                tenant=tenant, service=service, id__in=product_ids
-            )
+            for p in lock_products(Product.objects.filter(tenant=tenant, service=service, id__in=product_ids))
         }
 
         restock = bool(data.get("restock"))
@@ -479,12 +254,22 @@ def pos_ticket_cancel(request, ticket_id):
         loss_reason = LOSS_REASON_MAP.get(reason_code, "other")
 
         if restock:
+            restocked = {}
             for line in lines:
-                product = products.get(line.product_id)
-                if not product:
-                    continue
-                product.quantity = product.quantity + line.qty
-                product.save(update_fields=["quantity"])
+                if line.product_id in products:
+                    restocked[line.product_id] = restocked.get(line.product_id, Decimal("0")) + line.qty
+            apply_stock_deltas(
+                products.values(),
+                restocked,
+                kind="pos_restock",
+                reference=f"pos_ticket:{ticket.id}",
+                user=request.user,
+                amounts=sale_amounts(
+                    [(line.product_id, line.line_total) for line in lines],
+                    ticket.total_amount,
+                    sign=-1,
+                ),
+            )
         else:
             now = timezone.now()
             inventory_month = now.strftime("%Y-%m")
@@ -512,6 +297,11 @@ def pos_ticket_cancel(request, ticket_id):
             metadata={"status_before": ticket.status},
         )
 
+        rollup_lines, rollup_payments = ticket_rollup_inputs(ticket)
+        # Caisse encore ouverte : le ticket sort des totaux courants (un Z déjà tiré reste figé).
+        apply_ticket_to_session(ticket.session_id, ticket, rollup_payments, sign=-1, only_open=True)
+        apply_ticket_to_rollups(ticket, rollup_lines, rollup_payments, sign=-1)
+
         ticket.status = "VOID"
         ticket.metadata = {
             **(ticket.metadata or {}),
@@ -535,8 +325,7 @@ def pos_session_active(request):
     )
     if not session:
         return Response({"active": False})
-    summary = _build_session_summary(session)
-    return Response({"active": True, "summary": summary})
+    return Response({"active": True, "summary": session_summary(session)})
 
 
 @api_view(["POST"])
@@ -555,28 +344,11 @@ def pos_session_close(request):
                 {"detail": "Aucune caisse ouverte.", "code": "no_open_session"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        summary = _build_session_summary(session)
+        # Totaux déjà tenus à jour à chaque encaissement / annulation : Z de caisse en O(1).
         session.status = "CLOSED"
         session.closed_at = timezone.now()
         session.closed_by = request.user
-        session.total_amount = Decimal(summary["total_net"])
-        session.total_discount = Decimal(summary["total_remises"])
-        session.total_subtotal = Decimal(summary["total_brut"])
-        session.total_tickets = summary["total_tickets"]
-        session.totals_by_method = {
-            row["method"]: str(row["total"]) for row in summary["payments_by_method"]
-        }
-        session.save(
-            update_fields=[
-                "status",
-                "closed_at",
-                "closed_by",
-                "total_amount",
-                "total_discount",
-                "total_subtotal",
-                "total_tickets",
-                "totals_by_method",
-            ]
-        )
+        session.save(update_fields=["status", "closed_at", "closed_by"])
+        summary = session_summary(session)
 
     return Response({"detail": "Caisse clôturée.", "summary": summary})
@@ -1,3 +1,4 @@
+import codecs
 import csv
 import io
 import json
@@ -7,6 +8,7 @@ import uuid
 from decimal import Decimal, InvalidOperation
 
 from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import permissions, exceptions
 from rest_framework.decorators import api_view, permission_classes, parser_classes
@@ -14,12 +16,26 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 
 from accounts.permissions import ManagerPermission
+from accounts.services.usage import reserve_product_slots
 from accounts.utils import get_tenant_for_request, get_service_from_request
 from .models import Product
-
-INVENTORY_IMPORT_MAX_ROWS = 500
+from .services.ledger import build_movement, record_movements, remember_quantity
+from .services.matching import ProductMatcher
+from .services.search import index_products
+from .services.snapshots import (
+    mark_bucket_dirty,
+    mark_product_losses_dirty,
+    mark_products_dirty,
+    snapshot_batch,
+)
+from .services.stock import notify_stock_changed
+
+INVENTORY_IMPORT_MAX_ROWS = 100000
+INVENTORY_IMPORT_BATCH_SIZE = 500
+INVENTORY_IMPORT_PAGE_SIZE = 500  # lignes par page de preview (clé cache) et par lot de commit
+INVENTORY_IMPORT_SNIFF_BYTES = 64 * 1024
 INVENTORY_IMPORT_CACHE_TTL = 60 * 60  # 1h
-INVENTORY_IMPORT_MAX_FILE_MB = 10
+INVENTORY_IMPORT_MAX_FILE_MB = 50
 INVENTORY_IMPORT_MODES = {"inventory", "products"}
 INVENTORY_IMPORT_UPDATE_STRATEGIES = {"create_only", "update_existing"}
 
@@ -85,23 +101,56 @@ def _parse_decimal(value):
         return None
 
 
-def _load_csv_rows(file_obj):
-    raw_bytes = file_obj.read()
-    if not raw_bytes:
-        return [], []
+def _detect_csv_encoding(file_obj):
+    """
+    UTF-8 si tout le fichier se décode strictement, sinon Latin-1. Lecture par blocs (pas de
+    chargement complet) : un « é » Latin-1 au-delà du premier bloc bascule aussi l'encodage,
+    au lieu de finir en U+FFFD.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
     try:
-        raw = raw_bytes.decode("utf-8-sig")
+        while True:
+            chunk = file_obj.read(INVENTORY_IMPORT_SNIFF_BYTES)
+            decoder.decode(chunk, final=not chunk)
+            if not chunk:
+                return "utf-8-sig"
     except UnicodeDecodeError:
-        raw = raw_bytes.decode("latin-1")
-    sample = raw[:2048]
+        return "latin-1"
+    finally:
+        file_obj.seek(0)
+
+
+def _sniff_csv(file_obj):
+    encoding = _detect_csv_encoding(file_obj)
+    sample_bytes = file_obj.read(INVENTORY_IMPORT_SNIFF_BYTES)
+    file_obj.seek(0)
+    sample = sample_bytes.decode(encoding, errors="ignore")[:2048]
     try:
         dialect = csv.Sniffer().sniff(sample)
     except csv.Error:
         dialect = csv.excel
         dialect.delimiter = ";" if ";" in sample else ","
-    reader = csv.DictReader(io.StringIO(raw), dialect=dialect)
-    rows = list(reader)
-    return rows, reader.fieldnames or []
+    return encoding, dialect, bool(sample_bytes)
+
+
+def _load_csv_rows(file_obj):
+    """Retourne (générateur de lignes, colonnes) sans charger le fichier en mémoire."""
+    encoding, dialect, has_data = _sniff_csv(file_obj)
+    if not has_data:
+        return iter(()), []
+    # Décodage strict : l'encodage a été validé sur tout le fichier par _detect_csv_encoding.
+    text = io.TextIOWrapper(getattr(file_obj, "file", file_obj), encoding=encoding, errors="strict", newline="")
+    reader = csv.DictReader(text, dialect=dialect)
+    columns = reader.fieldnames or []
+
+    def _rows():
+        try:
+            yield from reader
+        finally:
+            # detach() : ne pas fermer le fichier uploadé avec le wrapper.
+            text.detach()
+
+    return _rows(), columns
 
 
 def _load_xlsx_rows(file_obj):
@@ -111,20 +160,23 @@ def _load_xlsx_rows(file_obj):
         raise exceptions.ValidationError("XLSX non supporté sur ce déploiement.") from exc
 
     wb = openpyxl.load_workbook(file_obj, read_only=True, data_only=True)
-    sheet = wb.active
-    rows = list(sheet.iter_rows(values_only=True))
-    if not rows:
-        return [], []
-    headers = [str(h or "").strip() for h in rows[0]]
-    data_rows = []
-    for row in rows[1:]:
-        if not any(cell not in (None, "") for cell in row):
-            continue
-        data = {}
-        for idx, header in enumerate(headers):
-            data[header] = row[idx] if idx < len(row) else ""
-        data_rows.append(data)
-    return data_rows, headers
+    sheet_rows = wb.active.iter_rows(values_only=True)
+    first = next(sheet_rows, None)
+    if first is None:
+        wb.close()
+        return iter(()), []
+    headers = [str(h or "").strip() for h in first]
+
+    def _rows():
+        try:
+            for row in sheet_rows:
+                if not any(cell not in (None, "") for cell in row):
+                    continue
+                yield {header: (row[idx] if idx < len(row) else "") for idx, header in enumerate(headers)}
+        finally:
+            wb.close()
+
+    return _rows(), headers
 
 
 def _parse_inventory_file(file_obj, file_name):
@@ -138,29 +190,64 @@ def _parse_inventory_file(file_obj, file_name):
     raise exceptions.ValidationError("Format non supporté (CSV ou XLSX).")
 
 
-def _match_existing_product(tenant, service, month, row):
-    barcode = (row.get("barcode") or "").strip()
-    sku = (row.get("internal_sku") or "").strip()
-    name = (row.get("name") or "").strip()
-    if barcode:
-        match = Product.objects.filter(
-            tenant=tenant, service=service, inventory_month=month, barcode=barcode
-        ).first()
-        if match:
-            return match, "barcode"
-    if sku:
-        match = Product.objects.filter(
-            tenant=tenant, service=service, inventory_month=month, internal_sku=sku
-        ).first()
-        if match:
-            return match, "sku"
-    if name:
-        match = Product.objects.filter(
-            tenant=tenant, service=service, inventory_month=month, name__iexact=name
-        ).first()
-        if match:
-            return match, "name"
-    return None, ""
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _preview_key(preview_id):
+    return f"inventory_import:{preview_id}"
+
+
+def _page_key(preview_id, page):
+    return f"inventory_import:{preview_id}:page:{page}"
+
+
+def _progress_key(preview_id):
+    return f"inventory_import:{preview_id}:progress"
+
+
+def _load_preview_meta(preview_id, tenant, service):
+    meta = cache.get(_preview_key(preview_id)) if preview_id else None
+    if not meta or meta.get("tenant_id") != tenant.id or meta.get("service_id") != service.id:
+        return None
+    return meta
+
+
+def _apply_row_updates(product, row):
+    """Applique les colonnes d'une ligne à un produit existant, retourne les champs modifiés."""
+    updates = []
+    if row.get("barcode") and not product.barcode:
+        product.barcode = str(row.get("barcode")).strip()
+        updates.append("barcode")
+    if row.get("internal_sku") and not product.internal_sku:
+        product.internal_sku = str(row.get("internal_sku")).strip()
+        updates.append("internal_sku")
+    if row.get("unit"):
+        product.unit = str(row.get("unit")).strip()
+        updates.append("unit")
+    purchase_price = _parse_decimal(row.get("purchase_price"))
+    if purchase_price is not None:
+        product.purchase_price = purchase_price
+        updates.append("purchase_price")
+    selling_price = _parse_decimal(row.get("selling_price"))
+    if selling_price is not None:
+        product.selling_price = selling_price
+        updates.append("selling_price")
+    tva = _parse_decimal(row.get("tva"))
+    if tva is not None:
+        product.tva = tva
+        updates.append("tva")
+    if row.get("category"):
+        product.category = str(row.get("category")).strip()
+        updates.append("category")
+    return updates
 
 
 @api_view(["POST"])
@@ -179,7 +266,9 @@ def inventory_import_preview(request):
         return Response({"detail": "Fichier requis."}, status=400)
 
     if getattr(file_obj, "size", 0) > INVENTORY_IMPORT_MAX_FILE_MB * 1024 * 1024:
-        return Response({"detail": "Fichier trop volumineux (max 10MB)."}, status=400)
+        return Response(
+            {"detail": f"Fichier trop volumineux (max {INVENTORY_IMPORT_MAX_FILE_MB}MB)."}, status=400
+        )
 
     mapping_raw = request.data.get("mapping")
     mapping_override = None
@@ -194,56 +283,95 @@ def inventory_import_preview(request):
     except exceptions.ValidationError as exc:
         return Response({"detail": str(exc.detail)}, status=400)
 
-    rows = rows[:INVENTORY_IMPORT_MAX_ROWS]
     mapping = mapping_override or _detect_mapping(columns)
+    preview_id = uuid.uuid4().hex
+    month = timezone.now().strftime("%Y-%m")
 
-    normalized_rows = []
+    total = 0
     invalid = 0
     missing_required = 0
     invalid_quantity = 0
-    month = timezone.now().strftime("%Y-%m")
-    for idx, row in enumerate(rows, start=1):
-        normalized = {}
-        for field in FIELD_ALIASES.keys():
-            col = mapping.get(field)
-            normalized[field] = row.get(col) if col else ""
-        normalized["name"] = (normalized.get("name") or "").strip()
-        warnings = []
-        row_invalid = False
-        if not normalized["name"]:
-            warnings.append("designation_manquante")
-            missing_required += 1
-            row_invalid = True
-        if mapping.get("quantity"):
-            qty_value = normalized.get("quantity")
-            if qty_value not in ("", None) and _parse_decimal(qty_value) is None:
-                warnings.append("quantite_invalide")
-                invalid_quantity += 1
+    page_count = 0
+    first_page = []
+    invalid_rows = []
+    truncated = False
+    # Un seul matcher pour tout le fichier : l'index des noms du mois n'est lu qu'une fois.
+    matcher = None
+    for chunk in _chunked(rows, INVENTORY_IMPORT_PAGE_SIZE):
+        remaining = INVENTORY_IMPORT_MAX_ROWS - total
+        if remaining <= 0:
+            truncated = True
+            break
+        if len(chunk) > remaining:
+            chunk = chunk[:remaining]
+            truncated = True
+        mapped_rows = []
+        for row in chunk:
+            normalized = {}
+            for field in FIELD_ALIASES.keys():
+                col = mapping.get(field)
+                normalized[field] = row.get(col) if col else ""
+            normalized["name"] = (normalized.get("name") or "").strip()
+            mapped_rows.append(normalized)
+        if matcher is None:
+            matcher = ProductMatcher(tenant, service, month, mapped_rows)
+        else:
+            matcher.load(mapped_rows)
+
+        page_rows = []
+        for normalized in mapped_rows:
+            total += 1
+            warnings = []
+            row_invalid = False
+            if not normalized["name"]:
+                warnings.append("designation_manquante")
+                missing_required += 1
                 row_invalid = True
-        if row_invalid:
-            invalid += 1
-        match, match_kind = _match_existing_product(tenant, service, month, normalized)
-        candidate_duplicate = bool(match and match_kind == "name" and not normalized.get("barcode") and not normalized.get("internal_sku"))
-        normalized_rows.append(
-            {
-                "row_id": idx,
+            if mapping.get("quantity"):
+                qty_value = normalized.get("quantity")
+                if qty_value not in ("", None) and _parse_decimal(qty_value) is None:
+                    warnings.append("quantite_invalide")
+                    invalid_quantity += 1
+                    row_invalid = True
+            if row_invalid:
+                invalid += 1
+            match, match_kind = matcher.match(normalized)
+            candidate_duplicate = bool(match and match_kind == "name" and not normalized.get("barcode") and not normalized.get("internal_sku"))
+            preview_row = {
+                "row_id": total,
                 "source": source,
                 "warnings": warnings,
                 "candidate_duplicate": candidate_duplicate,
                 "matched_product": {"id": match.id, "name": match.name} if match else None,
                 **normalized,
             }
-        )
-
-    preview_id = uuid.uuid4().hex
+            page_rows.append(preview_row)
+            if row_invalid and len(invalid_rows) < INVENTORY_IMPORT_PAGE_SIZE:
+                invalid_rows.append(preview_row)
+
+        page_count += 1
+        cache.set(_page_key(preview_id, page_count), page_rows, INVENTORY_IMPORT_CACHE_TTL)
+        if page_count == 1:
+            first_page = page_rows
+
+    stats = {
+        "total": total,
+        "valid": max(0, total - invalid),
+        "invalid": invalid,
+        "missing_required": missing_required,
+        "invalid_quantity": invalid_quantity,
+        "truncated": truncated,
+    }
     cache.set(
-        f"inventory_import:{preview_id}",
+        _preview_key(preview_id),
         {
             "tenant_id": tenant.id,
             "service_id": service.id,
-            "rows": normalized_rows,
             "mapping": mapping,
             "columns": columns,
+            "stats": stats,
+            "page_count": page_count,
+            "page_size": INVENTORY_IMPORT_PAGE_SIZE,
         },
         INVENTORY_IMPORT_CACHE_TTL,
     )
@@ -253,82 +381,65 @@ def inventory_import_preview(request):
             "preview_id": preview_id,
             "columns": columns,
             "mapping": mapping,
-            "rows": normalized_rows,
-            "stats": {
-                "total": len(rows),
-                "valid": max(0, len(rows) - invalid),
-                "invalid": invalid,
-                "missing_required": missing_required,
-                "invalid_quantity": invalid_quantity,
-            },
+            "rows": first_page,
+            "invalid_rows": invalid_rows,
+            "pagination": {"page": 1, "page_size": INVENTORY_IMPORT_PAGE_SIZE, "page_count": page_count},
+            "stats": stats,
             "field_labels": FIELD_LABELS,
         }
     )
 
 
-@api_view(["POST"])
+@api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated, ManagerPermission])
-def inventory_import_commit(request):
+def inventory_import_preview_page(request, preview_id):
     tenant = get_tenant_for_request(request)
     service = get_service_from_request(request)
+    meta = _load_preview_meta(preview_id, tenant, service)
+    if not meta:
+        return Response({"detail": "Preview introuvable ou expirée."}, status=404)
 
-    mode = (request.query_params.get("mode") or request.data.get("mode") or "inventory").lower()
-    if mode not in INVENTORY_IMPORT_MODES:
-        return Response({"detail": "Mode d’import invalide."}, status=400)
-
-    preview_id = request.data.get("preview_id")
-    if not preview_id:
-        return Response({"detail": "preview_id requis."}, status=400)
-
-    payload = cache.get(f"inventory_import:{preview_id}")
-    if not payload or payload.get("tenant_id") != tenant.id or payload.get("service_id") != service.id:
+    try:
+        page = int(request.query_params.get("page") or 1)
+    except (TypeError, ValueError):
+        page = 1
+    page_count = meta.get("page_count") or 0
+    if page < 1 or page > max(page_count, 1):
+        return Response({"detail": "Page invalide."}, status=400)
+    rows = cache.get(_page_key(preview_id, page)) if page_count else []
+    if rows is None:
         return Response({"detail": "Preview introuvable ou expirée."}, status=404)
 
-    rows = payload.get("rows") or []
-    qty_mode = (request.data.get("qty_mode") or "zero").lower()
-    update_strategy = (request.data.get("update_strategy") or "create_only").lower()
-    if mode == "inventory":
-        update_strategy = "update_existing"
-    if update_strategy not in INVENTORY_IMPORT_UPDATE_STRATEGIES:
-        return Response({"detail": "Stratégie de mise à jour invalide."}, status=400)
-    keep_qty_raw = request.data.get("keep_qty_row_ids") or []
-    if isinstance(keep_qty_raw, str):
-        try:
-            keep_qty_raw = json.loads(keep_qty_raw)
-        except json.JSONDecodeError:
-            keep_qty_raw = []
-    keep_qty = {str(rid) for rid in keep_qty_raw}
+    return Response(
+        {
+            "preview_id": preview_id,
+            "rows": rows,
+            "pagination": {"page": page, "page_size": meta.get("page_size"), "page_count": page_count},
+            "stats": meta.get("stats") or {},
+        }
+    )
 
-    row_overrides_raw = request.data.get("row_overrides") or {}
-    if isinstance(row_overrides_raw, str):
-        try:
-            row_overrides_raw = json.loads(row_overrides_raw)
-        except json.JSONDecodeError:
-            row_overrides_raw = {}
-    row_overrides = row_overrides_raw if isinstance(row_overrides_raw, dict) else {}
-    month = request.data.get("month") or timezone.now().strftime("%Y-%m")
 
-    created = 0
-    updated = 0
-    skipped = 0
-    duplicate_candidates = 0
+def _commit_chunk(rows, matcher, *, mode, qty_mode, update_strategy, keep_qty, counts, reference="", user=None):
+    """
+    Applique un lot de lignes (bulk_update / bulk_create), marque les snapshots touchés et
+    journalise les écarts de quantité (un bulk_create de StockMovement).
+    """
+    should_update_qty = mode == "inventory" or qty_mode in ("set", "selective")
+    to_create = []
+    to_update = {}
+    update_fields = set()
+    previous_buckets = {}
+    previous_qty = {}
 
     for row in rows:
-        row_id = str(row.get("row_id") or "")
-        override = row_overrides.get(row_id)
-        if override is None and row_id.isdigit():
-            override = row_overrides.get(int(row_id))
-        if override:
-            for key, value in override.items():
-                row[key] = value
-
         name = (row.get("name") or "").strip()
         if not name:
             continue
 
-        match, match_kind = _match_existing_product(tenant, service, month, row)
+        match, match_kind = matcher.match(row)
         if match_kind == "name" and not row.get("barcode") and not row.get("internal_sku"):
-            duplicate_candidates += 1
+            counts["duplicates_candidates_count"] += 1
 
         qty = _parse_decimal(row.get("quantity"))
         if qty is None:
@@ -345,48 +456,29 @@ def inventory_import_commit(request):
 
         if match:
             if update_strategy == "create_only":
-                skipped += 1
+                counts["skipped_count"] += 1
                 continue
-            updates = []
-            if row.get("barcode") and not match.barcode:
-                match.barcode = str(row.get("barcode")).strip()
-                updates.append("barcode")
-            if row.get("internal_sku") and not match.internal_sku:
-                match.internal_sku = str(row.get("internal_sku")).strip()
-                updates.append("internal_sku")
-            if row.get("unit"):
-                match.unit = str(row.get("unit")).strip()
-                updates.append("unit")
-            purchase_price = _parse_decimal(row.get("purchase_price"))
-            if purchase_price is not None:
-                match.purchase_price = purchase_price
-                updates.append("purchase_price")
-            selling_price = _parse_decimal(row.get("selling_price"))
-            if selling_price is not None:
-                match.selling_price = selling_price
-                updates.append("selling_price")
-            tva = _parse_decimal(row.get("tva"))
-            if tva is not None:
-                match.tva = tva
-                updates.append("tva")
-            if row.get("category"):
-                match.category = str(row.get("category")).strip()
-                updates.append("category")
-            should_update_qty = mode == "inventory" or qty_mode in ("set", "selective")
+            if match.pk and match.pk not in previous_buckets:
+                previous_buckets[match.pk] = (match.category, match.purchase_price)
+            updates = _apply_row_updates(match, row)
             if should_update_qty:
+                if match.pk and match.pk not in previous_qty:
+                    previous_qty[match.pk] = match.quantity
                 match.quantity = final_qty
                 updates.append("quantity")
-            if updates:
-                match.save(update_fields=sorted(set(updates)))
-            updated += 1
+            if updates and match.pk:
+                to_update[match.pk] = match
+                update_fields.update(updates)
+            matcher.register(match)
+            counts["updated_count"] += 1
             continue
 
-        Product.objects.create(
-            tenant=tenant,
-            service=service,
+        product = Product(
+            tenant=matcher.tenant,
+            service=matcher.service,
             name=name,
-            inventory_month=month,
-            quantity=final_qty if (mode == "inventory" or qty_mode in ("set", "selective")) else Decimal("0"),
+            inventory_month=matcher.month,
+            quantity=final_qty if should_update_qty else Decimal("0"),
             unit=(row.get("unit") or "pcs").strip() if row.get("unit") is not None else "pcs",
             purchase_price=_parse_decimal(row.get("purchase_price")),
             selling_price=_parse_decimal(row.get("selling_price")),
@@ -395,13 +487,147 @@ def inventory_import_commit(request):
             internal_sku=(row.get("internal_sku") or "").strip(),
             category=(row.get("category") or "").strip(),
         )
-        created += 1
-
-    return Response(
-        {
-            "created_count": created,
-            "updated_count": updated,
-            "skipped_count": skipped,
-            "duplicates_candidates_count": duplicate_candidates,
-        }
+        to_create.append(product)
+        matcher.register(product)
+        counts["created_count"] += 1
+
+    if to_update:
+        Product.objects.bulk_update(list(to_update.values()), sorted(update_fields), batch_size=INVENTORY_IMPORT_BATCH_SIZE)
+        notify_stock_changed(product.service_id for product in to_update.values())
+    if to_create:
+        # Une seule réservation pour le lot : fait aussi office d'incrément du compteur (pas de signaux).
+        reserve_product_slots(matcher.tenant, len(to_create))
+        Product.objects.bulk_create(to_create, batch_size=INVENTORY_IMPORT_BATCH_SIZE)
+
+    # Créations : tout le stock importé ; mises à jour : écart avec la quantité chargée.
+    deltas = [(product, product.quantity) for product in to_create]
+    deltas += [(product, product.quantity - previous_qty[pk]) for pk, product in to_update.items() if pk in previous_qty]
+    record_movements(
+        [build_movement(product, delta, "import", reference=reference, user=user) for product, delta in deltas]
     )
+    for product, _ in deltas:
+        remember_quantity(product)
+    index_products([*to_create, *to_update.values()])
+
+    # bulk_* ne déclenchent pas de signaux : snapshots rafraîchis explicitement.
+    mark_products_dirty([*to_create, *to_update.values()])
+    for product in to_update.values():
+        old_category, old_price = previous_buckets.get(product.pk, (product.category, product.purchase_price))
+        mark_bucket_dirty(product.tenant_id, product.service_id, product.inventory_month, old_category)
+        if old_category != product.category or old_price != product.purchase_price:
+            mark_product_losses_dirty(product.pk, old_category, product.category)
+
+
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated, ManagerPermission])
+def inventory_import_commit(request):
+    tenant = get_tenant_for_request(request)
+    service = get_service_from_request(request)
+
+    mode = (request.query_params.get("mode") or request.data.get("mode") or "inventory").lower()
+    if mode not in INVENTORY_IMPORT_MODES:
+        return Response({"detail": "Mode d’import invalide."}, status=400)
+
+    preview_id = request.data.get("preview_id")
+    if not preview_id:
+        return Response({"detail": "preview_id requis."}, status=400)
+
+    meta = _load_preview_meta(preview_id, tenant, service)
+    page_count = (meta or {}).get("page_count") or 0
+    if not meta or not all(cache.has_key(_page_key(preview_id, page)) for page in range(1, page_count + 1)):
+        return Response({"detail": "Preview introuvable ou expirée."}, status=404)
+
+    qty_mode = (request.data.get("qty_mode") or "zero").lower()
+    update_strategy = (request.data.get("update_strategy") or "create_only").lower()
+    if mode == "inventory":
+        update_strategy = "update_existing"
+    if update_strategy not in INVENTORY_IMPORT_UPDATE_STRATEGIES:
+        return Response({"detail": "Stratégie de mise à jour invalide."}, status=400)
+    keep_qty_raw = request.data.get("keep_qty_row_ids") or []
+    if isinstance(keep_qty_raw, str):
+        try:
+            keep_qty_raw = json.loads(keep_qty_raw)
+        except json.JSONDecodeError:
+            keep_qty_raw = []
+    keep_qty = {str(rid) for rid in keep_qty_raw}
+
+    row_overrides_raw = request.data.get("row_overrides") or {}
+    if isinstance(row_overrides_raw, str):
+        try:
+            row_overrides_raw = json.loads(row_overrides_raw)
+        except json.JSONDecodeError:
+            row_overrides_raw = {}
+    row_overrides = row_overrides_raw if isinstance(row_overrides_raw, dict) else {}
+    month = request.data.get("month") or timezone.now().strftime("%Y-%m")
+
+    counts = {
+        "created_count": 0,
+        "updated_count": 0,
+        "skipped_count": 0,
+        "duplicates_candidates_count": 0,
+    }
+    total = (meta.get("stats") or {}).get("total") or 0
+    processed = 0
+    progress_key = _progress_key(preview_id)
+    cache.set(progress_key, {"status": "running", "processed": 0, "total": total, **counts}, INVENTORY_IMPORT_CACHE_TTL)
+
+    try:
+        matcher = None
+        with transaction.atomic(), snapshot_batch():
+            for page in range(1, page_count + 1):
+                rows = cache.get(_page_key(preview_id, page)) or []
+                for row in rows:
+                    row_id = str(row.get("row_id") or "")
+                    override = row_overrides.get(row_id)
+                    if override is None and row_id.isdigit():
+                        override = row_overrides.get(int(row_id))
+                    if override:
+                        for key, value in override.items():
+                            row[key] = value
+
+                # Matcher partagé entre les pages : produits créés aux pages précédentes déjà
+                # connus via register(), index des noms du mois construit une seule fois.
+                if matcher is None:
+                    matcher = ProductMatcher(tenant, service, month, rows)
+                else:
+                    matcher.load(rows)
+                _commit_chunk(
+                    rows,
+                    matcher,
+                    mode=mode,
+                    qty_mode=qty_mode,
+                    update_strategy=update_strategy,
+                    keep_qty=keep_qty,
+                    counts=counts,
+                    reference=f"inventory_import:{preview_id}",
+                    user=request.user,
+                )
+                processed += len(rows)
+                cache.set(
+                    progress_key,
+                    {"status": "running", "processed": processed, "total": total, **counts},
+                    INVENTORY_IMPORT_CACHE_TTL,
+                )
+    except Exception:
+        cache.set(
+            progress_key,
+            {"status": "failed", "processed": processed, "total": total, **counts},
+            INVENTORY_IMPORT_CACHE_TTL,
+        )
+        raise
+
+    cache.set(progress_key, {"status": "done", "processed": processed, "total": total, **counts}, INVENTORY_IMPORT_CACHE_TTL)
+    return Response(counts)
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated, ManagerPermission])
+def inventory_import_progress(request, preview_id):
+    tenant = get_tenant_for_request(request)
+    service = get_service_from_request(request)
+    if not _load_preview_meta(preview_id, tenant, service):
+        return Response({"detail": "Preview introuvable ou expirée."}, status=404)
+    progress = cache.get(_progress_key(preview_id))
+    if progress is None:
+        return Response({"status": "pending", "processed": 0})
+    return Response(progress)
@@ -0,0 +1,140 @@
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Service, Tenant
+from products.models import Product
+from products.services.duplicates import (
+    DUPLICATE_MIN_SHARED_TOKENS,
+    DUPLICATE_TOKEN_SIMILARITY,
+    _name_is_generic,
+    _tokenize_name,
+    _tokens_are_specific,
+    find_duplicate_groups,
+    fuzzy_candidate_pairs,
+)
+
+SYLLABLES = ("ba", "ca", "co", "fa", "la", "li", "ma", "mo", "na", "pa", "po", "ri", "sa", "so", "ta", "to", "va", "zu")
+CATEGORIES = ("epicerie", "boissons", "frais", "surgeles", "hygiene", "entretien")
+
+
+def _vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _brute_force_pairs(token_sets):
+    keys = list(token_sets)
+    pairs = []
+    for i, base in enumerate(keys):
+        set_a = set(token_sets[base])
+        for other in keys[i + 1 :]:
+            set_b = set(token_sets[other])
+            shared = len(set_a & set_b)
+            if shared >= DUPLICATE_MIN_SHARED_TOKENS and shared / len(set_a | set_b) >= DUPLICATE_TOKEN_SIMILARITY:
+                pairs.append((base, other))
+    return pairs
+
+
+class Command(BaseCommand):
+    help = "Benchmark duplicate detection (barcode/SKU/name/fuzzy) on a throwaway catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=50000, help="Catalog size.")
+        parser.add_argument("--vocabulary", type=int, default=3000, help="Distinct words used in names.")
+        parser.add_argument(
+            "--duplicate-rate", type=float, default=0.02, help="Share of products re-created as near duplicates."
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Also compare the candidate index with the all-pairs scan (quadratic: small catalogs only).",
+        )
+        parser.add_argument("--keep", action="store_true", help="Keep the bench tenant afterwards.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        words = _vocabulary(rng, options["vocabulary"])
+        tag = uuid.uuid4().hex[:8]
+
+        tenant = Tenant.objects.create(name=f"bench-dup-{tag}")
+        service = Service.objects.create(tenant=tenant, name="Principal")
+        try:
+            rows = []
+            for idx in range(options["products"]):
+                tokens = rng.sample(words, rng.randint(3, 12))
+                category = rng.choice(CATEGORIES)
+                price = Decimal(rng.randint(50, 2000)) / 100
+                rows.append(
+                    Product(
+                        tenant=tenant,
+                        service=service,
+                        name=" ".join(tokens),
+                        category=category,
+                        supplier=f"fournisseur-{idx % 40}",
+                        brand=f"marque-{idx % 25}",
+                        purchase_price=price,
+                        barcode=f"bench{idx}" if idx % 3 else "",
+                        quantity=Decimal(rng.randint(0, 50)),
+                        inventory_month="2025-01",
+                    )
+                )
+                if rng.random() < options["duplicate_rate"]:
+                    # Même nom à un token répété près, mêmes signaux, sans code-barres.
+                    rows.append(
+                        Product(
+                            tenant=tenant,
+                            service=service,
+                            name=" ".join([*tokens, tokens[-1]]) if len(tokens) > 8 else " ".join(tokens).upper(),
+                            category=category,
+                            supplier=f"fournisseur-{idx % 40}",
+                            brand=f"marque-{idx % 25}",
+                            purchase_price=price,
+                            quantity=Decimal("1"),
+                            inventory_month="2025-01",
+                        )
+                    )
+            Product.objects.bulk_create(rows, batch_size=2000)
+            products = Product.objects.filter(tenant=tenant, service=service)
+
+            started = time.perf_counter()
+            groups = find_duplicate_groups(products)
+            elapsed = time.perf_counter() - started
+
+            names = {}
+            for name in products.values_list("name", flat=True):
+                tokens = _tokenize_name(name)
+                if not _name_is_generic(tokens) and _tokens_are_specific(tokens):
+                    names[" ".join(tokens)] = tokens
+            started = time.perf_counter()
+            pairs = fuzzy_candidate_pairs(names)
+            index_elapsed = time.perf_counter() - started
+
+            if options["check"]:
+                started = time.perf_counter()
+                expected = _brute_force_pairs(names)
+                brute_elapsed = time.perf_counter() - started
+                status = "identiques" if expected == pairs else "DIFFÉRENTES"
+                self.stdout.write(
+                    f"Contrôle toutes paires : {len(expected)} paire(s) en {brute_elapsed:.2f}s, résultats {status}."
+                )
+        finally:
+            if not options["keep"]:
+                tenant.delete()
+
+        by_type = {}
+        for group in groups:
+            by_type[group["type"]] = by_type.get(group["type"], 0) + 1
+        detail = ", ".join(f"{kind} {count}" for kind, count in sorted(by_type.items())) or "aucun"
+        self.stdout.write(
+            f"Index de candidats : {len(pairs)} paire(s) plausible(s) sur {len(names)} nom(s) en {index_elapsed:.2f}s."
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(rows)} produit(s) analysé(s) en {elapsed:.2f}s ; groupes : {detail}.")
+        )
@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Service, Tenant
+from products.models import Product
+from products.services.search import get_service_index, search_backend, search_catalog
+
+SYLLABLES = ("ba", "cé", "co", "fa", "la", "li", "ma", "mo", "na", "pa", "pô", "ri", "sa", "so", "ta", "to", "va", "zu")
+POS_FIELDS = ("id", "name", "barcode", "internal_sku", "quantity", "unit", "selling_price", "tva", "category")
+
+
+class Command(BaseCommand):
+    help = "Benchmark keystroke product search (POS) on a throwaway catalog; reports p50/p95 latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100000, help="Catalog size.")
+        parser.add_argument("--queries", type=int, default=1000, help="Searches to time.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--keep", action="store_true", help="Keep the bench tenant afterwards.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        words = sorted({"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(5000)})
+        tag = uuid.uuid4().hex[:8]
+
+        tenant = Tenant.objects.create(name=f"bench-search-{tag}")
+        service = Service.objects.create(tenant=tenant, name="Principal")
+        try:
+            names = [" ".join(rng.sample(words, rng.randint(2, 5))) for _ in range(options["products"])]
+            Product.objects.bulk_create(
+                [
+                    Product(
+                        tenant=tenant,
+                        service=service,
+                        name=name,
+                        barcode=f"{3000000000000 + idx}",
+                        internal_sku=f"SKU-{idx}",
+                        selling_price=Decimal("1.50"),
+                        inventory_month="2025-01",
+                    )
+                    for idx, name in enumerate(names)
+                ],
+                batch_size=5000,
+            )
+            qs = Product.objects.filter(tenant=tenant, service=service)
+
+            started = time.perf_counter()
+            if search_backend() == "ngram":
+                get_service_index(service.id)
+            build = time.perf_counter() - started
+
+            # Frappe au clavier : préfixes de 1 à 6 caractères, parfois un code-barres complet.
+            queries = []
+            for _ in range(options["queries"]):
+                if rng.random() < 0.1:
+                    queries.append(f"{3000000000000 + rng.randrange(options['products'])}")
+                else:
+                    word = rng.choice(rng.choice(names).split())
+                    queries.append(word[: rng.randint(1, 6)])
+
+            latencies = []
+            empty = 0
+            for query in queries:
+                started = time.perf_counter()
+                rows = search_catalog(qs, query, [service.id], POS_FIELDS, limit=30)
+                latencies.append(time.perf_counter() - started)
+                empty += not rows
+        finally:
+            if not options["keep"]:
+                tenant.delete()
+
+        ordered = sorted(latencies)
+        p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+        self.stdout.write(f"Moteur {search_backend()} ; index construit en {build:.2f}s ; {empty} recherche(s) sans résultat.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(ordered)} recherche(s) sur {options['products']} produit(s) : "
+                f"p50 {statistics.median(ordered) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms"
+            )
+        )
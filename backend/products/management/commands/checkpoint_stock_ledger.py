@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Product
+from products.services.ledger import take_checkpoints
+from products.services.stock import lock_products
+
+CHECKPOINT_CHUNK = 500
+
+
+class Command(BaseCommand):
+    help = "Take per-product StockCheckpoint rows and report drift between the movement ledger and Product.quantity."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", type=int, default=None, help="Limit to one tenant id.")
+        parser.add_argument("--service", type=int, default=None, help="Limit to one service id.")
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Record an 'adjustment' movement for each drift so the ledger matches Product.quantity.",
+        )
+
+    def handle(self, *args, **options):
+        products = Product.all_objects.all()
+        if options.get("tenant"):
+            products = products.filter(tenant_id=options["tenant"])
+        if options.get("service"):
+            products = products.filter(service_id=options["service"])
+        product_ids = list(products.order_by("id").values_list("id", flat=True))
+
+        created = 0
+        drifts = []
+        for start in range(0, len(product_ids), CHECKPOINT_CHUNK):
+            chunk = product_ids[start : start + CHECKPOINT_CHUNK]
+            # Verrous courts par lot : aucune vente ne s'intercale entre lecture du solde et point.
+            with transaction.atomic():
+                locked = lock_products(Product.all_objects.filter(id__in=chunk))
+                chunk_created, chunk_drifts = take_checkpoints(locked, repair=options.get("repair"))
+            created += chunk_created
+            drifts.extend(chunk_drifts)
+
+        for product_id, quantity, balance in drifts:
+            self.stdout.write(
+                self.style.WARNING(f"Écart produit {product_id} : stock {quantity}, journal {balance}.")
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{created} point(s) de stock créé(s), {len(drifts)} écart(s) sur {len(product_ids)} produit(s)."
+            )
+        )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Service
+from products.models import MonthlyServiceSnapshot, Product
+from products.services.snapshots import rebuild_snapshots
+
+
+class Command(BaseCommand):
+    help = "Rebuild MonthlyServiceSnapshot aggregates from Product / LossEvent rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenant", type=int, default=None, help="Limit to one tenant id.")
+        parser.add_argument("--service", type=int, default=None, help="Limit to one service id.")
+        parser.add_argument("--month", default="", help="Limit to one inventory month (YYYY-MM).")
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only rebuild services that have products but no snapshot rows yet (safe at deploy time).",
+        )
+
+    def handle(self, *args, **options):
+        tenant_id = options.get("tenant")
+        service_id = options.get("service")
+        month = (options.get("month") or "").strip() or None
+
+        services = Service.objects.all()
+        if tenant_id:
+            services = services.filter(tenant_id=tenant_id)
+        if service_id:
+            services = services.filter(id=service_id)
+        if options.get("missing_only"):
+            with_products = Product.all_objects.values("service_id")
+            with_snapshots = MonthlyServiceSnapshot.objects.values("service_id")
+            services = services.filter(id__in=with_products).exclude(id__in=with_snapshots)
+
+        total_services = 0
+        total_buckets = 0
+        for service in services.order_by("id").iterator():
+            with transaction.atomic():
+                total_buckets += rebuild_snapshots(tenant_id=service.tenant_id, service_id=service.id, month=month)
+            total_services += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{total_buckets} bucket(s) reconstruit(s) sur {total_services} service(s).")
+        )
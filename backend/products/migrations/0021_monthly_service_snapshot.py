@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-17 00:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_userprofile_flags'),
+        ('products', '0020_receipt_import_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyServiceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inventory_month', models.CharField(max_length=7)),
+                ('category', models.CharField(blank=True, max_length=50, null=True)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('total_quantity', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ('purchase_value', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('selling_value', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('raw_material_selling_value', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('converted_totals', models.JSONField(blank=True, default=dict)),
+                ('low_stock_count', models.PositiveIntegerField(default=0)),
+                ('low_qty_count', models.PositiveIntegerField(default=0)),
+                ('out_of_stock_count', models.PositiveIntegerField(default=0)),
+                ('missing_identifier_count', models.PositiveIntegerField(default=0)),
+                ('missing_price_count', models.PositiveIntegerField(default=0)),
+                ('missing_purchase_price_count', models.PositiveIntegerField(default=0)),
+                ('missing_selling_price_count', models.PositiveIntegerField(default=0)),
+                ('missing_supplier_count', models.PositiveIntegerField(default=0)),
+                ('missing_unit_count', models.PositiveIntegerField(default=0)),
+                ('missing_lot_count', models.PositiveIntegerField(default=0)),
+                ('missing_dlc_count', models.PositiveIntegerField(default=0)),
+                ('opened_count', models.PositiveIntegerField(default=0)),
+                ('loss_count', models.PositiveIntegerField(default=0)),
+                ('losses_qty', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ('losses_cost', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('product_losses_qty', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ('losses_by_reason', models.JSONField(blank=True, default=dict)),
+                ('oldest_created_at', models.DateTimeField(blank=True, null=True)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_snapshots', to='accounts.service')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_snapshots', to='accounts.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant', 'inventory_month'], name='invsnap_tenant_month_idx'), models.Index(fields=['tenant', 'service', 'inventory_month'], name='invsnap_tenant_svc_month_idx')],
+                'unique_together': {('tenant', 'service', 'inventory_month', 'category')},
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.1 on 2026-10-17 01:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def baseline_checkpoints(apps, schema_editor):
+    """Stock existant avant le journal : un point de départ par produit (movement_id=0)."""
+    Product = apps.get_model("products", "Product")
+    StockCheckpoint = apps.get_model("products", "StockCheckpoint")
+    now = django.utils.timezone.now()
+    batch = []
+    for product_id, quantity in Product.objects.order_by("id").values_list("id", "quantity").iterator(chunk_size=2000):
+        batch.append(StockCheckpoint(product_id=product_id, movement_id=0, quantity=quantity or 0, taken_at=now))
+        if len(batch) >= 2000:
+            StockCheckpoint.objects.bulk_create(batch)
+            batch = []
+    StockCheckpoint.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_tenant_usage'),
+        ('products', '0021_monthly_service_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_id', models.BigIntegerField(default=0)),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_checkpoints', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'taken_at'], name='stockcp_product_at_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'movement_id'), name='uniq_stock_checkpoint_product_mv')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('initial', 'Stock initial'), ('manual', 'Correction manuelle'), ('import', 'Import inventaire'), ('receipt', 'Réception'), ('merge', 'Fusion de doublons'), ('pos_sale', 'Vente caisse'), ('pos_restock', 'Annulation caisse (remise en stock)'), ('kds_consumption', 'Envoi cuisine'), ('kds_restock', 'Annulation cuisine (remise en stock)'), ('adjustment', 'Écart de rapprochement')], max_length=20)),
+                ('delta', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('reference', models.CharField(blank=True, default='', max_length=64)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='products.product')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='accounts.service')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='accounts.tenant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tenant', 'service', 'occurred_at'], name='stockmv_tenant_svc_at_idx'), models.Index(fields=['tenant', 'service', 'kind', 'occurred_at'], name='stockmv_svc_kind_at_idx'), models.Index(fields=['product', 'occurred_at'], name='stockmv_product_at_idx')],
+            },
+        ),
+        migrations.RunPython(baseline_checkpoints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# Index GIN trigram de la recherche produits (PostgreSQL uniquement ; SQLite : index en mémoire).
+# unaccent() n'est pas IMMUTABLE : enveloppé dans une fonction immuable pour être indexable.
+FORWARD_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    r"""
+    CREATE OR REPLACE FUNCTION public.products_search_text(value text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT btrim(regexp_replace(lower(public.unaccent('public.unaccent'::regdictionary, coalesce(value, ''))), '\s+', ' ', 'g'))
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION public.products_search_document(name text, barcode text, sku text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT public.products_search_text(name) || ' ' || lower(coalesce(barcode, '')) || ' ' || public.products_search_text(sku)
+    $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS products_product_search_trgm ON products_product
+    USING gin (public.products_search_document(name, barcode, internal_sku) gin_trgm_ops)
+    """,
+]
+
+REVERSE_SQL = [
+    "DROP INDEX IF EXISTS products_product_search_trgm",
+    "DROP FUNCTION IF EXISTS public.products_search_document(text, text, text)",
+    "DROP FUNCTION IF EXISTS public.products_search_text(text)",
+]
+
+
+def _run(statements):
+    def _apply(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return _apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0022_stock_ledger"),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FORWARD_SQL), _run(REVERSE_SQL)),
+    ]
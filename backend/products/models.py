@@ -403,3 +403,132 @@ class ProductMergeLog(models.Model):
 
     def __str__(self):
         return f"Merge {self.tenant_id} {self.master_product_id}->{self.merged_product_id}"
+
+
+class MonthlyServiceSnapshot(models.Model):
+    """
+    Agrégats matérialisés par (tenant, service, mois, catégorie).
+    Rafraîchis par bucket via signaux / products.services.snapshots, reconstruits par
+    `manage.py rebuild_inventory_snapshots`.
+    """
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="inventory_snapshots")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="inventory_snapshots")
+    inventory_month = models.CharField(max_length=7)
+    category = models.CharField(max_length=50, null=True, blank=True)
+
+    product_count = models.PositiveIntegerField(default=0)
+    total_quantity = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+    purchase_value = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    selling_value = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    raw_material_selling_value = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    converted_totals = models.JSONField(default=dict, blank=True)
+
+    low_stock_count = models.PositiveIntegerField(default=0)  # quantity <= min_qty
+    low_qty_count = models.PositiveIntegerField(default=0)  # quantity <= 2
+    out_of_stock_count = models.PositiveIntegerField(default=0)
+    missing_identifier_count = models.PositiveIntegerField(default=0)
+    missing_price_count = models.PositiveIntegerField(default=0)  # ni achat ni vente
+    missing_purchase_price_count = models.PositiveIntegerField(default=0)
+    missing_selling_price_count = models.PositiveIntegerField(default=0)
+    missing_supplier_count = models.PositiveIntegerField(default=0)
+    missing_unit_count = models.PositiveIntegerField(default=0)
+    missing_lot_count = models.PositiveIntegerField(default=0)
+    missing_dlc_count = models.PositiveIntegerField(default=0)
+    opened_count = models.PositiveIntegerField(default=0)
+
+    # Pertes du mois rattachées à la catégorie du produit (produit supprimé => catégorie nulle)
+    loss_count = models.PositiveIntegerField(default=0)
+    losses_qty = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+    losses_cost = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    product_losses_qty = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+    losses_by_reason = models.JSONField(default=dict, blank=True)
+
+    # Plus ancien created_at (produits + pertes) : permet de savoir si la rétention tronque le bucket.
+    oldest_created_at = models.DateTimeField(null=True, blank=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("tenant", "service", "inventory_month", "category")
+        indexes = [
+            models.Index(fields=["tenant", "inventory_month"], name="invsnap_tenant_month_idx"),
+            models.Index(fields=["tenant", "service", "inventory_month"], name="invsnap_tenant_svc_month_idx"),
+        ]
+
+    def __str__(self):
+        return f"Snapshot {self.service_id} {self.inventory_month} {self.category}"
+
+
+class StockMovement(models.Model):
+    """
+    Journal append-only des variations de Product.quantity (le stock courant reste
+    dénormalisé sur Product). Écrit par lots par products.services.ledger.
+    """
+
+    KIND_CHOICES = [
+        ("initial", "Stock initial"),
+        ("manual", "Correction manuelle"),
+        ("import", "Import inventaire"),
+        ("receipt", "Réception"),
+        ("merge", "Fusion de doublons"),
+        ("pos_sale", "Vente caisse"),
+        ("pos_restock", "Annulation caisse (remise en stock)"),
+        ("kds_consumption", "Envoi cuisine"),
+        ("kds_restock", "Annulation cuisine (remise en stock)"),
+        ("adjustment", "Écart de rapprochement"),
+    ]
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="stock_movements")
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="stock_movements")
+    product = models.ForeignKey(
+        Product, on_delete=models.SET_NULL, null=True, blank=True, related_name="stock_movements"
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    delta = models.DecimalField(max_digits=14, decimal_places=3)  # négatif = sortie
+    # Coût unitaire (prix d'achat) au moment du mouvement, et montant de vente net pour pos_*.
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    reference = models.CharField(max_length=64, blank=True, default="")  # ex: pos_ticket:42
+
+    occurred_at = models.DateTimeField(default=timezone.now)
+    created_by = models.ForeignKey(
+        "auth.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="stock_movements",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tenant", "service", "occurred_at"], name="stockmv_tenant_svc_at_idx"),
+            models.Index(fields=["tenant", "service", "kind", "occurred_at"], name="stockmv_svc_kind_at_idx"),
+            models.Index(fields=["product", "occurred_at"], name="stockmv_product_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"Movement {self.product_id} {self.delta} ({self.kind})"
+
+
+class StockCheckpoint(models.Model):
+    """
+    Solde d'un produit arrêté après le mouvement `movement_id` : le stock à une date se lit
+    depuis le dernier point + les mouvements suivants (somme bornée, jamais tout le journal).
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_checkpoints")
+    movement_id = models.BigIntegerField(default=0)
+    quantity = models.DecimalField(max_digits=14, decimal_places=3)
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "movement_id"], name="uniq_stock_checkpoint_product_mv"),
+        ]
+        indexes = [
+            models.Index(fields=["product", "taken_at"], name="stockcp_product_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"Checkpoint {self.product_id} @{self.movement_id}: {self.quantity}"
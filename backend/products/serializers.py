@@ -222,6 +222,36 @@ class ProductSerializer(serializers.ModelSerializer):
         return data
 
 
+class ProductScanSerializer(ProductSerializer):
+    """Fiche réduite de la boucle de scan (lookup) : champs de pré-remplissage uniquement."""
+
+    warnings = None
+
+    class Meta(ProductSerializer.Meta):
+        fields = [
+            "id",
+            "name",
+            "barcode",
+            "internal_sku",
+            "category",
+            "inventory_month",
+            "quantity",
+            "unit",
+            "min_qty",
+            "variant_name",
+            "variant_value",
+            "conversion_unit",
+            "conversion_factor",
+            "product_role",
+            "purchase_price",
+            "selling_price",
+            "tva",
+            "dlc",
+            "lot_number",
+        ]
+        read_only_fields = fields
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -0,0 +1,329 @@
+# backend/products/services/duplicates.py
+"""
+Détection des doublons produit (code-barres, SKU, nom, nom proche).
+
+Le catalogue est chargé en une requête (champs utiles seulement) ; les groupes code-barres /
+SKU / nom sont formés en mémoire. La passe floue ne compare plus toutes les paires de noms :
+un index inversé sur les préfixes de tokens (prefix filtering) ne produit que les paires
+pouvant atteindre le seuil de Jaccard, vérifiées ensuite (Jaccard, puis SequenceMatcher).
+"""
+import difflib
+import math
+import re
+import unicodedata
+from collections import Counter
+
+DUPLICATE_NAME_SIMILARITY = 0.985
+NAME_STOPWORDS = {
+    "produit",
+    "article",
+    "test",
+    "item",
+    "lot",
+    "pack",
+    "piece",
+    "pieces",
+    "pcs",
+    "kg",
+    "g",
+    "gr",
+    "l",
+    "ml",
+    "cl",
+    "x",
+    "packaging",
+}
+
+DUPLICATE_TOKEN_SIMILARITY = 0.9
+DUPLICATE_MIN_SHARED_TOKENS = 3
+DUPLICATE_FIELDS = (
+    "id",
+    "name",
+    "barcode",
+    "internal_sku",
+    "category",
+    "brand",
+    "supplier",
+    "pack_uom",
+    "pack_size",
+    "purchase_price",
+    "selling_price",
+    "quantity",
+    "inventory_month",
+    "created_at",
+)
+
+
+def _tokenize_name(value):
+    if not value:
+        return []
+    text = str(value)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+    tokens = [t for t in text.split() if t and t not in NAME_STOPWORDS]
+    return tokens
+
+
+def _normalize_name(value):
+    tokens = _tokenize_name(value)
+    return " ".join(tokens)
+
+
+def _similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return difflib.SequenceMatcher(a=a, b=b).ratio()
+
+
+def _name_is_generic(tokens):
+    if len(tokens) < 2:
+        return True
+    text = " ".join(tokens)
+    if len(text) < 8:
+        return True
+    if len(tokens) < 3 and all(len(t) <= 3 for t in tokens):
+        return True
+    return False
+
+
+def _tokens_are_specific(tokens):
+    if len(tokens) < 2:
+        return False
+    long_tokens = [t for t in tokens if len(t) >= 4]
+    return len(long_tokens) >= 2
+
+
+def _supporting_signal_count(a, b):
+    def same_field(field):
+        av = (getattr(a, field, None) or "").strip().lower()
+        bv = (getattr(b, field, None) or "").strip().lower()
+        return bool(av and bv and av == bv)
+
+    count = 0
+    count += 1 if same_field("category") else 0
+    count += 1 if same_field("brand") else 0
+    count += 1 if same_field("supplier") else 0
+    count += 1 if same_field("pack_uom") else 0
+    count += 1 if same_field("pack_size") else 0
+
+    try:
+        ap = float(a.purchase_price) if a.purchase_price is not None else None
+        bp = float(b.purchase_price) if b.purchase_price is not None else None
+    except (TypeError, ValueError):
+        ap, bp = None, None
+    if ap is not None and bp is not None and ap > 0 and bp > 0 and abs(ap - bp) < 0.01:
+        count += 1
+
+    return count
+
+
+def _has_meaningful_signal(a, b):
+    def same_field(field):
+        av = (getattr(a, field, None) or "").strip().lower()
+        bv = (getattr(b, field, None) or "").strip().lower()
+        return bool(av and bv and av == bv)
+
+    if same_field("category") or same_field("brand") or same_field("supplier"):
+        return True
+    if same_field("pack_uom") or same_field("pack_size"):
+        return True
+    try:
+        ap = float(a.purchase_price) if a.purchase_price is not None else None
+        bp = float(b.purchase_price) if b.purchase_price is not None else None
+    except (TypeError, ValueError):
+        ap, bp = None, None
+    return ap is not None and bp is not None and ap > 0 and bp > 0 and abs(ap - bp) < 0.01
+
+
+def _has_core_signal(a, b):
+    def same_field(field):
+        av = (getattr(a, field, None) or "").strip().lower()
+        bv = (getattr(b, field, None) or "").strip().lower()
+        return bool(av and bv and av == bv)
+
+    return bool(same_field("category") or same_field("brand") or same_field("supplier"))
+
+
+def _group_has_core_signal(group):
+    if len(group) < 2:
+        return False
+    for idx, p in enumerate(group):
+        for q in group[idx + 1 :]:
+            if _has_core_signal(p, q):
+                return True
+    return False
+
+
+def _has_strong_signal(a, b):
+    return bool(
+        (a.barcode and b.barcode and a.barcode == b.barcode)
+        or (a.internal_sku and b.internal_sku and a.internal_sku == b.internal_sku)
+    )
+
+
+def _has_supporting_signal(a, b, min_signals=3):
+    if _has_strong_signal(a, b):
+        return True
+    if not _has_meaningful_signal(a, b):
+        return False
+    return _supporting_signal_count(a, b) >= min_signals
+
+
+def _group_has_supporting_signal(group, min_signals=3):
+    if len(group) < 2:
+        return False
+    for idx, p in enumerate(group):
+        for q in group[idx + 1 :]:
+            if _has_supporting_signal(p, q, min_signals=min_signals):
+                return True
+    return False
+
+
+def _pick_master(candidates):
+    if not candidates:
+        return None
+    scored = []
+    for p in candidates:
+        score = 0
+        score += 3 if p.barcode else 0
+        score += 3 if p.internal_sku else 0
+        score += 1 if p.category else 0
+        score += 1 if p.purchase_price is not None else 0
+        score += 1 if p.selling_price is not None else 0
+        score += float(p.quantity or 0)
+        scored.append((score, p))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored[0][1]
+
+
+def fuzzy_candidate_pairs(token_sets, min_jaccard=DUPLICATE_TOKEN_SIMILARITY, min_shared=DUPLICATE_MIN_SHARED_TOKENS):
+    """
+    Paires (a, b) de clés de `token_sets` ({clé: tokens}) ayant au moins `min_shared` tokens
+    communs et un Jaccard >= `min_jaccard`, dans l'ordre d'entrée (a avant b).
+
+    Prefix filtering : tokens triés du plus rare au plus fréquent, deux ensembles à Jaccard
+    >= t partagent forcément un token parmi les |x| - ceil(t.|x|) + 1 premiers. Seuls ces
+    préfixes sont indexés (filtre de taille en plus) : aucune paire valide n'est perdue et
+    les tokens fréquents ("bio", "sauce"…) ne génèrent plus de candidats.
+    """
+    keys = list(token_sets)
+    sets = [frozenset(token_sets[key]) for key in keys]
+    frequency = Counter(token for tokens in sets for token in tokens)
+    index = {}
+    pairs = set()
+    # Du plus petit au plus grand : les ensembles déjà indexés sont les plus courts.
+    for i in sorted(range(len(sets)), key=lambda pos: (len(sets[pos]), pos)):
+        tokens = sets[i]
+        size = len(tokens)
+        if size < min_shared:
+            continue
+        min_size = min_jaccard * size - 1e-9
+        prefix = size - math.ceil(min_jaccard * size - 1e-9) + 1
+        candidates = set()
+        for token in sorted(tokens, key=lambda tok: (frequency[tok], tok))[:prefix]:
+            bucket = index.setdefault(token, [])
+            # Buckets remplis par taille croissante : on s'arrête au premier ensemble trop court.
+            for j in reversed(bucket):
+                if len(sets[j]) < min_size:
+                    break
+                candidates.add(j)
+            bucket.append(i)
+        for j in candidates:
+            shared = len(tokens & sets[j])
+            if shared < min_shared:
+                continue
+            if shared / (size + len(sets[j]) - shared) < min_jaccard:
+                continue
+            pairs.add((min(i, j), max(i, j)))
+    return [(keys[a], keys[b]) for a, b in sorted(pairs)]
+
+
+def _has_unidentified(group):
+    return any((not p.barcode and not p.internal_sku) for p in group)
+
+
+def find_duplicate_groups(products):
+    """
+    Groupes de doublons d'un queryset produit : [{type, key, master, confidence, reason, products}],
+    produits sous forme de lignes nommées (attributs de DUPLICATE_FIELDS).
+    Une requête pour tout le catalogue, quelle que soit la taille des groupes.
+    """
+    # Tuples nommés (values_list named=True) : 50k produits sans instancier de modèles.
+    catalog = list(products.order_by("id").values_list(*DUPLICATE_FIELDS, named=True))
+    groups = []
+
+    for field, label in (("barcode", "barcode"), ("internal_sku", "sku")):
+        by_value = {}
+        for p in catalog:
+            value = getattr(p, field)
+            if value:
+                by_value.setdefault(value, []).append(p)
+        for value, group in sorted(by_value.items()):
+            if len(group) < 2:
+                continue
+            groups.append(
+                {
+                    "type": label,
+                    "key": value,
+                    "master": _pick_master(group),
+                    "confidence": 0.98 if label == "barcode" else 0.96,
+                    "reason": "Même code-barres" if label == "barcode" else "Même SKU",
+                    "products": group,
+                }
+            )
+
+    name_groups = {}
+    name_tokens = {}
+    for p in catalog:
+        tokens = _tokenize_name(p.name)
+        if _name_is_generic(tokens) or not _tokens_are_specific(tokens):
+            continue
+        norm = " ".join(tokens)
+        if not norm:
+            continue
+        name_groups.setdefault(norm, []).append(p)
+        name_tokens[norm] = tokens
+
+    for norm, group in name_groups.items():
+        if len(group) < 2:
+            continue
+        if not _has_unidentified(group):
+            continue
+        if not _group_has_core_signal(group):
+            continue
+        if not _group_has_supporting_signal(group, min_signals=4):
+            continue
+        groups.append(
+            {
+                "type": "name",
+                "key": norm,
+                "master": _pick_master(group),
+                "confidence": 0.82,
+                "reason": "Nom identique + signaux communs (catégorie, prix, fournisseur…)",
+                "products": group,
+            }
+        )
+
+    for base, other in fuzzy_candidate_pairs(name_tokens):
+        if _similarity(base, other) < DUPLICATE_NAME_SIMILARITY:
+            continue
+        merged = sorted({*name_groups[base], *name_groups[other]}, key=lambda p: p.id)
+        if not _has_unidentified(merged):
+            continue
+        if not _group_has_core_signal(merged):
+            continue
+        if not _group_has_supporting_signal(merged, min_signals=4):
+            continue
+        groups.append(
+            {
+                "type": "name_fuzzy",
+                "key": f"{base} ~ {other}",
+                "master": _pick_master(merged),
+                "confidence": 0.76,
+                "reason": "Nom très proche + signaux forts (catégorie/prix/fournisseur)",
+                "products": merged,
+            }
+        )
+    return groups
@@ -0,0 +1,297 @@
+# backend/products/services/ledger.py
+"""
+Journal des mouvements de stock (StockMovement).
+
+- Chemins groupés (caisse, cuisine, import) : `record_movements` / `apply_stock_deltas`
+  écrivent les mouvements en un bulk_create, dans la transaction qui modifie le stock.
+- Chemins save() (fiche produit, réception, fusion) : le signal post_save produit relève
+  l'écart de quantité ; `stock_ledger(kind, ...)` étiquette et regroupe ces mouvements.
+- Le stock à une date / les ventes et la marge d'une période sont des requêtes de plage
+  bornées par le dernier StockCheckpoint (`manage.py checkpoint_stock_ledger`).
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import Product, StockCheckpoint, StockMovement
+
+ZERO = Decimal("0")
+LEDGER_DECIMAL = DecimalField(max_digits=20, decimal_places=6)
+MOVEMENT_BATCH_SIZE = 500
+
+SALE_KINDS = ("pos_sale", "pos_restock")
+CONSUMPTION_KINDS = ("kds_consumption", "kds_restock")
+
+_UNSET = object()
+_local = threading.local()
+
+
+class _PendingMovements:
+    def __init__(self, kind, reference, user):
+        self.kind = kind
+        self.reference = reference
+        self.user = user
+        self.rows = []
+
+
+def _current_batch():
+    return getattr(_local, "pending", None)
+
+
+@contextmanager
+def stock_ledger(kind, reference="", user=None):
+    """
+    Étiquette les variations de stock relevées par les save() produit du bloc et les écrit
+    en un seul bulk_create à la sortie (à placer dans le transaction.atomic() du chemin).
+    """
+    outer = _current_batch()
+    pending = _PendingMovements(kind, reference, user)
+    _local.pending = pending
+    try:
+        yield pending
+    finally:
+        _local.pending = outer
+    record_movements(pending.rows)
+
+
+def _decimal(value):
+    if value is None:
+        return ZERO
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def build_movement(product, delta, kind, *, reference="", user=None, amount=None, occurred_at=None):
+    return StockMovement(
+        tenant_id=product.tenant_id,
+        service_id=product.service_id,
+        product_id=product.id,
+        kind=kind,
+        delta=_decimal(delta),
+        unit_cost=product.__dict__.get("purchase_price"),
+        amount=amount,
+        reference=reference[:64],
+        occurred_at=occurred_at or timezone.now(),
+        created_by=user if getattr(user, "is_authenticated", False) else None,
+    )
+
+
+def record_movements(movements):
+    movements = [movement for movement in movements if movement.delta]
+    if movements:
+        StockMovement.objects.bulk_create(movements, batch_size=MOVEMENT_BATCH_SIZE)
+    return movements
+
+
+def remember_quantity(instance):
+    # __dict__ uniquement : un champ quantity différé n'est ni chargé ni journalisé.
+    instance._ledger_quantity = instance.__dict__.get("quantity", _UNSET)
+
+
+def record_quantity_change(instance, created):
+    """Appelé par post_save : journalise l'écart depuis le chargement / le dernier mouvement."""
+    old = ZERO if created else getattr(instance, "_ledger_quantity", _UNSET)
+    new = instance.__dict__.get("quantity", _UNSET)
+    if old is _UNSET or new is _UNSET:
+        return
+    delta = _decimal(new) - _decimal(old)
+    remember_quantity(instance)
+    if not delta:
+        return
+
+    pending = _current_batch()
+    if pending is None:
+        record_movements([build_movement(instance, delta, "initial" if created else "manual")])
+        return
+    pending.rows.append(
+        build_movement(instance, delta, pending.kind, reference=pending.reference, user=pending.user)
+    )
+
+
+def _latest_checkpoint(field):
+    return Subquery(
+        StockCheckpoint.objects.filter(product_id=OuterRef("pk")).order_by("-movement_id").values(field)[:1]
+    )
+
+
+def ledger_balances(products):
+    """
+    Solde du journal par produit : dernier point + somme des mouvements postérieurs.
+    Une requête ; sert au rapprochement avec Product.quantity.
+    """
+    pending = (
+        StockMovement.objects.filter(product_id=OuterRef("pk"), id__gt=OuterRef("last_movement_id"))
+        .order_by()
+        .values("product_id")
+        .annotate(total=Sum("delta"))
+        .values("total")
+    )
+    last_movement = (
+        StockMovement.objects.filter(product_id=OuterRef("pk"))
+        .order_by()
+        .values("product_id")
+        .annotate(last=Max("id"))
+        .values("last")
+    )
+    rows = (
+        products.order_by()
+        .annotate(
+            last_movement_id=Coalesce(_latest_checkpoint("movement_id"), Value(0)),
+            checkpoint_qty=Coalesce(_latest_checkpoint("quantity"), Value(ZERO), output_field=LEDGER_DECIMAL),
+        )
+        .annotate(
+            pending_qty=Coalesce(Subquery(pending), Value(ZERO), output_field=LEDGER_DECIMAL),
+            head_movement_id=Subquery(last_movement),
+        )
+        .values("id", "quantity", "last_movement_id", "checkpoint_qty", "pending_qty", "head_movement_id")
+    )
+    return {
+        row["id"]: {
+            "quantity": row["quantity"],
+            "balance": _decimal(row["checkpoint_qty"]) + _decimal(row["pending_qty"]),
+            "last_movement_id": row["last_movement_id"],
+            "head_movement_id": row["head_movement_id"],
+        }
+        for row in rows
+    }
+
+
+def take_checkpoints(products, repair=False, user=None):
+    """
+    Arrête un point par produit ayant bougé depuis le dernier (produits verrouillés par
+    l'appelant). Écart journal / Product.quantity : signalé, ou journalisé en `adjustment`
+    avec repair=True. Retourne (points créés, écarts [(product_id, stock, solde journal)]).
+    """
+    products = list(products)
+    balances = ledger_balances(Product.all_objects.filter(id__in=[p.id for p in products]))
+    drifts = []
+    adjustments = []
+    for product in products:
+        row = balances.get(product.id)
+        if row is None:
+            continue
+        diff = _decimal(row["quantity"]) - row["balance"]
+        if diff:
+            drifts.append((product.id, row["quantity"], row["balance"]))
+            if repair:
+                adjustments.append(build_movement(product, diff, "adjustment", user=user))
+    record_movements(adjustments)
+
+    heads = {movement.product_id: movement.id for movement in adjustments}
+    now = timezone.now()
+    checkpoints = []
+    for product in products:
+        row = balances.get(product.id)
+        if row is None:
+            continue
+        head = heads.get(product.id) or row["head_movement_id"]
+        if not head or head <= row["last_movement_id"]:
+            continue
+        quantity = row["quantity"] if product.id in heads else row["balance"]
+        checkpoints.append(StockCheckpoint(product_id=product.id, movement_id=head, quantity=quantity, taken_at=now))
+    StockCheckpoint.objects.bulk_create(checkpoints, batch_size=MOVEMENT_BATCH_SIZE)
+    return len(checkpoints), drifts
+
+
+def stock_at(products, moment):
+    """Stock de chaque produit à `moment` : dernier point antérieur + mouvements jusqu'à moment."""
+    checkpoint = StockCheckpoint.objects.filter(product_id=OuterRef("pk"), taken_at__lte=moment).order_by(
+        "-movement_id"
+    )
+    pending = (
+        StockMovement.objects.filter(
+            product_id=OuterRef("pk"),
+            id__gt=OuterRef("from_movement_id"),
+            occurred_at__lte=moment,
+        )
+        .order_by()
+        .values("product_id")
+        .annotate(total=Sum("delta"))
+        .values("total")
+    )
+    rows = (
+        products.order_by()
+        .annotate(
+            from_movement_id=Coalesce(Subquery(checkpoint.values("movement_id")[:1]), Value(0)),
+            checkpoint_qty=Coalesce(
+                Subquery(checkpoint.values("quantity")[:1]), Value(ZERO), output_field=LEDGER_DECIMAL
+            ),
+        )
+        .annotate(pending_qty=Coalesce(Subquery(pending), Value(ZERO), output_field=LEDGER_DECIMAL))
+        .values_list("id", "checkpoint_qty", "pending_qty")
+    )
+    return {pid: _decimal(base) + _decimal(pending_qty) for pid, base, pending_qty in rows}
+
+
+def _flow_movements(tenant, service, start=None, end=None, product_ids=None):
+    movements = StockMovement.objects.filter(tenant=tenant, service=service, product__isnull=False)
+    if start:
+        movements = movements.filter(occurred_at__gte=start)
+    if end:
+        movements = movements.filter(occurred_at__lt=end)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    return movements
+
+
+def _flow_aggregates():
+    cost = ExpressionWrapper(-F("delta") * F("unit_cost"), output_field=LEDGER_DECIMAL)
+    sales = Q(kind__in=SALE_KINDS)
+    consumption = Q(kind__in=CONSUMPTION_KINDS)
+
+    def _sum(expression, condition=None, field=LEDGER_DECIMAL):
+        if condition is not None:
+            expression = Case(When(condition, then=expression), default=None, output_field=field)
+        return Coalesce(Sum(expression, output_field=field), Value(ZERO), output_field=field)
+
+    return {
+        "entries": _sum(F("delta"), Q(delta__gt=0)),
+        "exits": _sum(-F("delta"), Q(delta__lt=0)),
+        "sold_qty": _sum(-F("delta"), sales),
+        "sales_amount": _sum(F("amount"), sales),
+        "sales_cost": _sum(cost, sales),
+        "consumed_qty": _sum(-F("delta"), consumption),
+        "consumed_cost": _sum(cost, consumption),
+    }
+
+
+def _flow_row(row):
+    row = {key: _decimal(value) for key, value in row.items()}
+    row["margin"] = row["sales_amount"] - row["sales_cost"]
+    return row
+
+
+def movement_totals(tenant, service, start=None, end=None, product_ids=None):
+    """
+    Entrées / sorties, quantité vendue, CA, coût et marge par produit sur une plage
+    (une requête GROUP BY sur l'index (tenant, service, occurred_at)).
+    Vente caisse : CA net des remises ; coût = quantité x prix d'achat au moment du mouvement.
+    Un produit sans mouvement est absent du résultat.
+    """
+    rows = (
+        _flow_movements(tenant, service, start, end, product_ids)
+        .values("product_id")
+        .annotate(**_flow_aggregates())
+        .order_by()
+    )
+    totals = {}
+    for row in rows:
+        product_id = row.pop("product_id")
+        totals[product_id] = _flow_row(row)
+    return totals
+
+
+def movement_summary(tenant, service, start=None, end=None, product_ids=None):
+    """
+    Mêmes totaux que `movement_totals`, cumulés sur le service (un aggregate, sans GROUP BY) ;
+    None si aucun mouvement sur la plage.
+    """
+    row = _flow_movements(tenant, service, start, end, product_ids).aggregate(
+        movements=Count("id"), **_flow_aggregates()
+    )
+    if not row.pop("movements"):
+        return None
+    return _flow_row(row)
@@ -0,0 +1,137 @@
+# backend/products/services/lookup.py
+"""
+Pré-remplissage par code-barres (boucle de scan) : suggestion OpenFoodFacts mise en cache.
+Transport HTTP (pool, disjoncteur, coalescence) : voir off_client.
+
+Deux niveaux : LRU en mémoire du process (rescans sur un même poste, sans aller-retour cache)
+puis cache Django partagé (autres postes / workers). Les codes inconnus d'OFF sont aussi mis
+en cache (TTL plus court : une fiche OFF peut être créée entre-temps) ; les erreurs réseau ne
+le sont jamais. Les lots (scanners qui rejouent leur file) interrogent OFF en parallèle,
+dans un pool borné (OFF_LOOKUP_MAX_WORKERS).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .off_client import OffLookupError, get_off_client
+
+OFF_CACHE_VERSION = 1
+
+_MISS = object()
+
+
+class _LocalLRU:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISS
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return _MISS
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        max_size = getattr(settings, "OFF_LOCAL_CACHE_SIZE", 2048)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_local = _LocalLRU()
+
+
+def reset_off_cache():
+    _local.clear()
+
+
+def _cache_key(barcode):
+    if barcode.isalnum() and len(barcode) <= 64:
+        return f"off_product:v{OFF_CACHE_VERSION}:{barcode}"
+    digest = hashlib.sha1(barcode.encode("utf-8")).hexdigest()
+    return f"off_product:v{OFF_CACHE_VERSION}:h:{digest}"
+
+
+def _suggestion(payload):
+    product = payload.get("product", {}) or {}
+    return {
+        "name": product.get("product_name") or "",
+        "brand": product.get("brands") or "",
+        "category": (product.get("categories_tags") or [None])[0],
+        "quantity": product.get("quantity"),
+    }
+
+
+def _fetch(barcode):
+    product = get_off_client().fetch_product(barcode)
+    return _suggestion({"product": product}) if product is not None else None
+
+
+def off_suggestion(barcode):
+    """
+    Suggestion OFF (name, brand, category, quantity) ou None si OFF ne connaît pas le code.
+    Lève OffLookupError si OFF est injoignable.
+    """
+    key = _cache_key(barcode)
+    value = _local.get(key)
+    if value is not _MISS:
+        return value
+
+    positive_ttl = getattr(settings, "OFF_CACHE_TTL_SECONDS", 60 * 60 * 48)
+    negative_ttl = getattr(settings, "OFF_NEGATIVE_CACHE_TTL_SECONDS", 60 * 60 * 6)
+    entry = cache.get(key)
+    if entry is not None:
+        value = entry["suggestion"]
+    else:
+        value = _fetch(barcode)
+        cache.set(key, {"suggestion": value}, positive_ttl if value else negative_ttl)
+    # TTL local court : une purge du cache partagé se propage à tous les process en quelques minutes.
+    local_ttl = getattr(settings, "OFF_LOCAL_CACHE_TTL_SECONDS", 300)
+    _local.set(key, value, min(local_ttl, positive_ttl if value else negative_ttl))
+    return value
+
+
+def off_suggestions(barcodes):
+    """
+    `off_suggestion` pour plusieurs codes, en parallèle (pool borné) : {code: suggestion | None |
+    OffLookupError}. Les codes déjà en LRU local ne passent pas par le pool.
+    """
+    results = {}
+    pending = []
+    for barcode in dict.fromkeys(barcodes):
+        value = _local.get(_cache_key(barcode))
+        if value is _MISS:
+            pending.append(barcode)
+        else:
+            results[barcode] = value
+
+    def _one(barcode):
+        try:
+            return off_suggestion(barcode)
+        except OffLookupError as exc:
+            return exc
+
+    workers = min(len(pending), getattr(settings, "OFF_LOOKUP_MAX_WORKERS", 8))
+    if workers <= 1:
+        results.update((barcode, _one(barcode)) for barcode in pending)
+        return results
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="off-lookup") as pool:
+        results.update(zip(pending, pool.map(_one, pending)))
+    return results
@@ -0,0 +1,114 @@
+# backend/products/services/matching.py
+from ..models import Product
+
+MATCH_IN_CHUNK = 500
+
+
+def _clean(value):
+    return str(value or "").strip()
+
+
+def _name_key(value):
+    return _clean(value).lower()
+
+
+def _chunks(values, size=MATCH_IN_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+class ProductMatcher:
+    """
+    Résolution en mémoire code-barres -> SKU -> nom (insensible à la casse) pour un
+    (tenant, service, mois). Les index sont chargés en quelques requêtes `IN` groupées
+    au lieu de 3 `.first()` par ligne.
+
+    Réutilisable page après page (`load()`) : seuls les codes pas encore vus sont demandés, et
+    l'index des noms (parcours (id, nom) du mois) n'est construit qu'une fois par import.
+
+    `register()` ajoute un produit pas encore inséré (bulk_create différé) pour que les
+    lignes suivantes du même lot le retrouvent, comme le faisait l'ancien traitement ligne à ligne.
+    """
+
+    def __init__(self, tenant, service, month, rows=()):
+        self.tenant = tenant
+        self.service = service
+        self.month = month
+        self.by_barcode = {}
+        self.by_sku = {}
+        self.by_name = {}
+        self._seen = {}
+        self._looked_up = {"barcode": set(), "sku": set(), "name": set()}
+        self._name_ids = None
+        self.load(rows)
+
+    def _base_qs(self):
+        return Product.objects.filter(tenant=self.tenant, service=self.service, inventory_month=self.month)
+
+    def _fetch(self, qs):
+        for product in qs.order_by("id"):
+            yield self._seen.setdefault(product.id, product)
+
+    def _name_index(self):
+        # Clé de nom calculée en Python (str.lower) : LOWER() de SQLite ne replie que l'ASCII,
+        # un filtre Lower("name") IN (...) raterait « Éclair » contre « éclair ».
+        if self._name_ids is None:
+            self._name_ids = {}
+            pairs = self._base_qs().order_by("id").values_list("id", "name").iterator(chunk_size=MATCH_IN_CHUNK * 4)
+            for product_id, name in pairs:
+                self._name_ids.setdefault(_name_key(name), product_id)
+        return self._name_ids
+
+    def load(self, rows):
+        """Charge les produits existants correspondant à un nouveau lot de lignes."""
+        barcodes, skus, names = set(), set(), set()
+        for row in rows:
+            barcode, sku, name = _clean(row.get("barcode")), _clean(row.get("internal_sku")), _name_key(row.get("name"))
+            if barcode:
+                barcodes.add(barcode)
+            if sku:
+                skus.add(sku)
+            if name:
+                names.add(name)
+        barcodes -= self._looked_up["barcode"]
+        skus -= self._looked_up["sku"]
+        names -= self._looked_up["name"]
+        self._looked_up["barcode"] |= barcodes
+        self._looked_up["sku"] |= skus
+        self._looked_up["name"] |= names
+
+        for chunk in _chunks(barcodes):
+            for product in self._fetch(self._base_qs().filter(barcode__in=chunk)):
+                self.by_barcode.setdefault(product.barcode, product)
+        for chunk in _chunks(skus):
+            for product in self._fetch(self._base_qs().filter(internal_sku__in=chunk)):
+                self.by_sku.setdefault(product.internal_sku, product)
+        if names:
+            name_index = self._name_index()
+            name_ids = sorted({name_index[name] for name in names if name in name_index and name not in self.by_name})
+            for chunk in _chunks(name_ids):
+                for product in self._fetch(self._base_qs().filter(id__in=chunk)):
+                    self.by_name.setdefault(_name_key(product.name), product)
+        return self
+
+    def match(self, row):
+        barcode = _clean(row.get("barcode"))
+        sku = _clean(row.get("internal_sku"))
+        name = _name_key(row.get("name"))
+        if barcode and barcode in self.by_barcode:
+            return self.by_barcode[barcode], "barcode"
+        if sku and sku in self.by_sku:
+            return self.by_sku[sku], "sku"
+        if name and name in self.by_name:
+            return self.by_name[name], "name"
+        return None, ""
+
+    def register(self, product):
+        """Indexe un produit créé / modifié dans le lot courant."""
+        if product.barcode:
+            self.by_barcode.setdefault(product.barcode, product)
+        if product.internal_sku:
+            self.by_sku.setdefault(product.internal_sku, product)
+        if product.name:
+            self.by_name.setdefault(_name_key(product.name), product)
@@ -0,0 +1,189 @@
+# backend/products/services/off_client.py
+"""
+Client HTTP OpenFoodFacts (API v2 produit), partagé par le process.
+
+- `httpx.Client` avec pool de connexions keep-alive (OFF_POOL_SIZE) : plus de poignée de
+  main TLS par scan.
+- Délais séparés connexion / lecture : un OFF lent ne bloque pas un worker plus de
+  OFF_CONNECT_TIMEOUT_SECONDS + OFF_TIMEOUT_SECONDS.
+- Disjoncteur : après OFF_BREAKER_FAILURES échecs consécutifs, les appels échouent aussitôt
+  (reason="circuit_open") pendant OFF_BREAKER_RESET_SECONDS, puis un seul appel d'essai
+  décide de la refermeture.
+- Coalescence : un même code déjà en vol n'est demandé qu'une fois ; les autres appelants
+  attendent la même réponse.
+- Latence par issue (found / missing / error) en histogramme Prometheus.
+"""
+import threading
+import time
+import urllib.parse
+
+import httpx
+from django.conf import settings
+
+from inventory.metrics import track_off_circuit_open, track_off_request
+
+OFF_DEFAULT_BASE_URL = "https://world.openfoodfacts.org"
+OFF_USER_AGENT = "StockScan/1.0 (+https://stockscan.app)"
+
+
+class OffLookupError(Exception):
+    """OFF injoignable, disjoncteur ouvert ou réponse illisible ; `reason` alimente logs et métriques."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            reopened = self.trial_in_flight
+            self.trial_in_flight = False
+            if reopened or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class OffClient:
+    def __init__(
+        self,
+        base_url=OFF_DEFAULT_BASE_URL,
+        timeout=3,
+        connect_timeout=1,
+        pool_size=10,
+        breaker_failures=5,
+        breaker_reset_seconds=30,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset_seconds)
+        self.http = httpx.Client(
+            headers={"User-Agent": OFF_USER_AGENT},
+            # OFF_POOL_SIZE connexions gardées ouvertes ; un pic au-delà ouvre des connexions en plus
+            # plutôt que d'attendre une place (un PoolTimeout compterait comme une panne d'OFF).
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def fetch_product(self, barcode):
+        """Fiche produit OFF (dict `product`) ou None si le code est inconnu ; OffLookupError sinon."""
+        with self._inflight_lock:
+            call = self._inflight.get(barcode)
+            leader = call is None
+            if leader:
+                call = self._inflight[barcode] = _InFlight()
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = self._request(barcode)
+            except OffLookupError as exc:
+                call.error = exc
+            finally:
+                with self._inflight_lock:
+                    self._inflight.pop(barcode, None)
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _request(self, barcode):
+        if not self.breaker.allow():
+            raise OffLookupError("circuit_open")
+        url = f"{self.base_url}/api/v2/product/{urllib.parse.quote(barcode, safe='')}.json"
+        started = time.perf_counter()
+        try:
+            resp = self.http.get(url)
+            # API v2 : code inconnu => 404 (corps status=0), une réponse et non une panne.
+            if resp.status_code == 404:
+                data = {"status": 0}
+            else:
+                resp.raise_for_status()
+                data = resp.json()
+        except httpx.HTTPError as exc:
+            self._failed(started)
+            raise OffLookupError("url_error") from exc
+        except Exception as exc:
+            self._failed(started)
+            raise OffLookupError("exception") from exc
+        self.breaker.record_success()
+        if data.get("status") == 1:
+            track_off_request("found", time.perf_counter() - started)
+            return data.get("product", {}) or {}
+        track_off_request("missing", time.perf_counter() - started)
+        return None
+
+    def _failed(self, started):
+        track_off_request("error", time.perf_counter() - started)
+        if self.breaker.record_failure():
+            track_off_circuit_open()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_off_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OffClient(
+                    base_url=getattr(settings, "OFF_BASE_URL", OFF_DEFAULT_BASE_URL),
+                    timeout=getattr(settings, "OFF_TIMEOUT_SECONDS", 3),
+                    connect_timeout=getattr(settings, "OFF_CONNECT_TIMEOUT_SECONDS", 1),
+                    pool_size=getattr(settings, "OFF_POOL_SIZE", 10),
+                    breaker_failures=getattr(settings, "OFF_BREAKER_FAILURES", 5),
+                    breaker_reset_seconds=getattr(settings, "OFF_BREAKER_RESET_SECONDS", 30),
+                )
+    return _client
+
+
+def reset_off_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.http.close()
+        _client = None
@@ -0,0 +1,298 @@
+# backend/products/services/search.py
+"""
+Recherche produits à la frappe (caisse, recherche globale).
+
+Deux moteurs, même classement :
+- PostgreSQL : index GIN trigram sur `products_search_document(name, barcode, internal_sku)`
+  (fonction SQL immuable sans accents, migration 0023) ; LIKE '%q%' servi par l'index.
+- Autres bases (SQLite) : index n-gram en mémoire par service, construit au premier appel
+  puis tenu à jour à chaque save() produit (au commit) ; reconstruit après
+  PRODUCT_SEARCH_INDEX_MAX_AGE_SECONDS pour rattraper les écritures d'autres process.
+
+Classement : code-barres / SKU exact, nom qui commence par la saisie, mot qui commence par
+la saisie, sous-chaîne du nom, sous-chaîne du code-barres / SKU ; puis nom. Sous PostgreSQL,
+un code-barres complet (8 à 14 chiffres) est d'abord cherché tel quel sur l'index
+(tenant, service, barcode).
+"""
+import heapq
+import itertools
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Func, IntegerField, Q, TextField, Value, When
+
+from ..models import Product
+
+SEARCH_FETCH_CHUNK = 100
+# Changement d'un de ces champs => document de recherche à recalculer.
+SEARCH_FIELDS = ("name", "barcode", "internal_sku", "is_archived")
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "ß": "ss"})
+
+RANK_EXACT_CODE = 0
+RANK_NAME_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_NAME_CONTAINS = 3
+RANK_CODE_CONTAINS = 4
+
+
+def normalize_search_text(value):
+    """Minuscules, sans accents, espaces compactés (équivalent de products_search_text en SQL)."""
+    text = str(value or "").lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text.translate(_LIGATURES))
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.split())
+
+
+def is_full_barcode(query):
+    return query.isdigit() and 8 <= len(query) <= 14
+
+
+def search_backend():
+    backend = getattr(settings, "PRODUCT_SEARCH_BACKEND", "auto")
+    if backend == "auto":
+        return "postgres" if connection.vendor == "postgresql" else "ngram"
+    return backend
+
+
+def _rank(query, name, barcode, sku):
+    if query == barcode or query == sku:
+        return RANK_EXACT_CODE
+    if name.startswith(query):
+        return RANK_NAME_PREFIX
+    if f" {query}" in name:
+        return RANK_WORD_PREFIX
+    if query in name:
+        return RANK_NAME_CONTAINS
+    if query in barcode or query in sku:
+        return RANK_CODE_CONTAINS
+    return None
+
+
+class NgramIndex:
+    """
+    Index d'un service : trigrammes du document (nom, code-barres, SKU normalisés) et
+    préfixes de 1-2 caractères de chaque mot pour les saisies courtes. Les listes de
+    postings peuvent contenir des ids périmés (mises à jour en ajout seul) : chaque candidat
+    est revérifié sur `docs`, la source de vérité ; compactage par reconstruction.
+    Les saisies de 1-2 caractères (listes longues, très répétées à la frappe) sont mises en
+    cache jusqu'à la prochaine écriture dans l'index.
+    """
+
+    def __init__(self, service_id):
+        self.service_id = service_id
+        self.docs = {}
+        self.postings = {}
+        self.stale = 0
+        self.short_results = {}
+        self.built_at = 0.0
+        self.lock = threading.Lock()
+
+    def build(self):
+        rows = (
+            Product.objects.filter(service_id=self.service_id)
+            .order_by()
+            .values_list("id", "name", "barcode", "internal_sku")
+            .iterator(chunk_size=5000)
+        )
+        docs, postings = {}, {}
+        for product_id, name, barcode, sku in rows:
+            self._index(docs, postings, product_id, name, barcode, sku)
+        with self.lock:
+            self.docs, self.postings, self.stale = docs, postings, 0
+            self.short_results = {}
+            self.built_at = time.monotonic()
+        return self
+
+    @staticmethod
+    def _grams(name, barcode, sku):
+        document = f"{name} {barcode} {sku}"
+        grams = {document[pos : pos + 3] for pos in range(len(document) - 2)}
+        for word in document.split():
+            grams.add("^" + word[:1])
+            if len(word) > 1:
+                grams.add("^" + word[:2])
+        return grams
+
+    def _index(self, docs, postings, product_id, name, barcode, sku):
+        doc = (normalize_search_text(name), normalize_search_text(barcode), normalize_search_text(sku))
+        docs[product_id] = doc
+        for gram in self._grams(*doc):
+            postings.setdefault(gram, []).append(product_id)
+
+    def add(self, product_id, name, barcode, sku):
+        with self.lock:
+            if product_id in self.docs:
+                self.stale += 1
+            self.short_results = {}
+            self._index(self.docs, self.postings, product_id, name, barcode, sku)
+
+    def remove(self, product_id):
+        with self.lock:
+            if self.docs.pop(product_id, None) is not None:
+                self.stale += 1
+                self.short_results = {}
+
+    def needs_rebuild(self, max_age):
+        return time.monotonic() - self.built_at > max_age or self.stale > max(1000, len(self.docs) // 2)
+
+    def search(self, query):
+        """
+        Tous les tuples (rang, nom, id) correspondants, triés ; `query` déjà normalisée.
+        Pas de coupe ici : les filtres du queryset (rétention, mois) peuvent écarter les premiers.
+        """
+        if not query:
+            return []
+        short = len(query) < 3
+        if short:
+            keys = ["^" + query]
+        else:
+            keys = [query[pos : pos + 3] for pos in range(len(query) - 2)]
+        with self.lock:
+            if short and query in self.short_results:
+                return self.short_results[query]
+            lists = [self.postings.get(key) for key in keys]
+            if not all(lists):
+                return []
+            # Liste la plus courte = trigramme le plus rare ; les autres sont vérifiés par sous-chaîne.
+            candidates = set(min(lists, key=len))
+            docs = self.docs
+            scored = []
+            for product_id in candidates:
+                doc = docs.get(product_id)
+                if doc is None:
+                    continue
+                rank = _rank(query, *doc)
+                if rank is not None:
+                    scored.append((rank, doc[0], product_id))
+            scored.sort()
+            if short:
+                self.short_results[query] = scored
+        return scored
+
+
+_indexes = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def get_service_index(service_id):
+    max_age = getattr(settings, "PRODUCT_SEARCH_INDEX_MAX_AGE_SECONDS", 600)
+    with _registry_lock:
+        index = _indexes.get(service_id)
+        if index is not None:
+            _indexes.move_to_end(service_id)
+    if index is not None and not index.needs_rebuild(max_age):
+        return index
+
+    index = NgramIndex(service_id).build()
+    with _registry_lock:
+        _indexes[service_id] = index
+        _indexes.move_to_end(service_id)
+        while len(_indexes) > getattr(settings, "PRODUCT_SEARCH_INDEX_MAX_SERVICES", 64):
+            _indexes.popitem(last=False)
+    return index
+
+
+def reset_search_indexes():
+    with _registry_lock:
+        _indexes.clear()
+
+
+def _loaded_index(service_id):
+    with _registry_lock:
+        return _indexes.get(service_id)
+
+
+def index_products(products):
+    """Mise à jour incrémentale (au commit) des index déjà chargés : save() et chemins bulk."""
+    updates = [
+        (p.service_id, p.id, None if p.is_archived else (p.name, p.barcode, p.internal_sku))
+        for p in products
+        if p.id and _loaded_index(p.service_id) is not None
+    ]
+    if not updates:
+        return
+
+    def _apply():
+        for service_id, product_id, doc in updates:
+            index = _loaded_index(service_id)
+            if index is None:
+                continue
+            if doc is None:
+                index.remove(product_id)
+            else:
+                index.add(product_id, *doc)
+
+    transaction.on_commit(_apply)
+
+
+def unindex_product(product):
+    index = _loaded_index(product.service_id)
+    if index is not None:
+        transaction.on_commit(lambda: index.remove(product.id))
+
+
+SEARCH_DOCUMENT = Func(
+    F("name"), F("barcode"), F("internal_sku"), function="products_search_document", output_field=TextField()
+)
+SEARCH_NAME = Func(F("name"), function="products_search_text", output_field=TextField())
+
+
+def _postgres_search(qs, query, raw_query, fields, limit):
+    ranked = (
+        qs.annotate(search_document=SEARCH_DOCUMENT)
+        .filter(search_document__contains=query)
+        .annotate(search_name=SEARCH_NAME)
+        .annotate(
+            search_rank=Case(
+                When(Q(barcode=raw_query) | Q(internal_sku__iexact=raw_query), then=Value(RANK_EXACT_CODE)),
+                When(search_name__startswith=query, then=Value(RANK_NAME_PREFIX)),
+                When(search_name__contains=f" {query}", then=Value(RANK_WORD_PREFIX)),
+                When(search_name__contains=query, then=Value(RANK_NAME_CONTAINS)),
+                default=Value(RANK_CODE_CONTAINS),
+                output_field=IntegerField(),
+            ),
+            search_similarity=Func(F("search_name"), Value(query), function="similarity", output_field=FloatField()),
+        )
+        .order_by("search_rank", "-search_similarity", "name", "id")
+    )
+    return list(ranked.values(*fields)[:limit])
+
+
+def _ngram_search(qs, query, service_ids, fields, limit):
+    ranked = heapq.merge(*(get_service_index(service_id).search(query) for service_id in service_ids))
+
+    # Les filtres du queryset (tenant, rétention…) restent appliqués par la base, par lots d'ids
+    # classés, jusqu'à `limit` lignes retenues : des produits hors rétention en tête ne masquent
+    # pas les suivants.
+    results = []
+    while len(results) < limit:
+        chunk = [product_id for _, _, product_id in itertools.islice(ranked, SEARCH_FETCH_CHUNK)]
+        if not chunk:
+            break
+        rows = {row["id"]: row for row in qs.filter(id__in=chunk).order_by().values(*{"id", *fields})}
+        results.extend(rows[pid] for pid in chunk if pid in rows)
+    return [{field: row[field] for field in fields} for row in results[:limit]]
+
+
+def search_catalog(qs, query, service_ids, fields, limit=10):
+    """
+    Produits de `qs` correspondant à `query`, classés (voir module), en dicts `fields`.
+    `service_ids` : services couverts par `qs` (un index n-gram par service).
+    """
+    raw_query = (query or "").strip()
+    normalized = normalize_search_text(raw_query)
+    if not normalized:
+        return []
+    if search_backend() != "postgres":
+        # Index n-gram : un code exact sort déjà en tête (rang 0), sans requête supplémentaire.
+        return _ngram_search(qs, normalized, service_ids, fields, limit)
+    if is_full_barcode(raw_query):
+        exact = list(qs.filter(barcode=raw_query).order_by("-inventory_month", "name").values(*fields)[:limit])
+        if exact:
+            return exact
+    return _postgres_search(qs, normalized, raw_query, fields, limit)
@@ -0,0 +1,389 @@
+# backend/products/services/snapshots.py
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db.models import Case, Count, DecimalField, F, Min, Q, Sum, Value, When
+from django.utils import timezone
+
+from ..models import LossEvent, MonthlyServiceSnapshot, Product
+
+SNAPSHOT_DECIMAL = DecimalField(max_digits=20, decimal_places=6)
+
+# Champs produit dont la modification déplace / modifie les pertes rattachées.
+LOSS_AFFECTING_FIELDS = ("category", "purchase_price", "inventory_month", "is_archived")
+
+_local = threading.local()
+
+
+class _PendingRefresh:
+    def __init__(self):
+        self.keys = set()
+        # product_id -> catégories (ancienne / nouvelle) dont les buckets de pertes sont à recalculer
+        self.loss_products = {}
+
+    def add_bucket(self, tenant_id, service_id, month, category):
+        if tenant_id and service_id and month:
+            self.keys.add((tenant_id, service_id, month, category))
+
+    def add_product_losses(self, product_id, *categories):
+        if product_id:
+            self.loss_products.setdefault(product_id, set()).update(categories)
+
+
+def _current_batch():
+    return getattr(_local, "pending", None)
+
+
+@contextmanager
+def snapshot_batch():
+    """
+    Regroupe les rafraîchissements : les buckets touchés sont recalculés une seule fois
+    à la sortie du bloc (à placer dans le transaction.atomic() du chemin bulk).
+    """
+    pending = _current_batch()
+    if pending is not None:
+        yield pending
+        return
+    pending = _PendingRefresh()
+    _local.pending = pending
+    try:
+        yield pending
+    finally:
+        _local.pending = None
+    _flush(pending)
+
+
+def queue_refresh(callback):
+    pending = _current_batch()
+    if pending is not None:
+        callback(pending)
+        return
+    pending = _PendingRefresh()
+    callback(pending)
+    _flush(pending)
+
+
+def mark_bucket_dirty(tenant_id, service_id, month, category):
+    queue_refresh(lambda pending: pending.add_bucket(tenant_id, service_id, month, category))
+
+
+def mark_product_losses_dirty(product_id, *categories):
+    queue_refresh(lambda pending: pending.add_product_losses(product_id, *categories))
+
+
+def mark_products_dirty(products):
+    """Pour les chemins bulk_create / bulk_update / update() qui ne déclenchent pas de signaux."""
+
+    def _add(pending):
+        for product in products:
+            pending.add_bucket(product.tenant_id, product.service_id, product.inventory_month, product.category)
+
+    queue_refresh(_add)
+
+
+QUANTITY_DELTA_FIELDS = (
+    "total_quantity",
+    "purchase_value",
+    "selling_value",
+    "raw_material_selling_value",
+    "low_stock_count",
+    "low_qty_count",
+    "out_of_stock_count",
+)
+
+
+def _quantity_flags(product, quantity):
+    return (
+        int(product.min_qty is not None and quantity <= product.min_qty),
+        int(quantity <= 2),
+        int(quantity <= 0),
+    )
+
+
+def apply_quantity_changes(changes):
+    """
+    Seul le stock a bougé (caisse, cuisine) : les buckets sont ajustés par delta au lieu
+    d'être recalculés. `changes` : [(produit avec sa nouvelle quantité, ancienne quantité)].
+    2 requêtes quel que soit le panier (SELECT ... FOR UPDATE trié + bulk_update) ;
+    un bucket encore absent est recalculé entièrement.
+    """
+    deltas = {}
+    for product, old_qty in changes:
+        if product.is_archived:
+            continue
+        new_qty = product.quantity or Decimal("0")
+        old_qty = old_qty or Decimal("0")
+        if new_qty == old_qty:
+            continue
+        diff = new_qty - old_qty
+        key = (product.tenant_id, product.service_id, product.inventory_month, product.category)
+        bucket = deltas.setdefault(key, {"converted": {}, **{field: 0 for field in QUANTITY_DELTA_FIELDS}})
+        bucket["total_quantity"] += diff
+        if product.purchase_price is not None:
+            bucket["purchase_value"] += diff * product.purchase_price
+        if product.selling_price is not None:
+            bucket["selling_value"] += diff * product.selling_price
+            if product.product_role == "raw_material":
+                bucket["raw_material_selling_value"] += diff * product.selling_price
+        for field, new_flag, old_flag in zip(
+            ("low_stock_count", "low_qty_count", "out_of_stock_count"),
+            _quantity_flags(product, new_qty),
+            _quantity_flags(product, old_qty),
+        ):
+            bucket[field] += new_flag - old_flag
+        if product.conversion_factor is not None and product.conversion_unit:
+            unit = product.conversion_unit
+            bucket["converted"][unit] = bucket["converted"].get(unit, 0) + float(diff * product.conversion_factor)
+    if not deltas:
+        return
+
+    lookups = [
+        Q(tenant_id=tenant_id, service_id=service_id, inventory_month=month, **_category_lookup(category))
+        for tenant_id, service_id, month, category in deltas
+    ]
+    rows = list(MonthlyServiceSnapshot.objects.select_for_update().filter(reduce(or_, lookups)).order_by("id"))
+    now = timezone.now()
+    for row in rows:
+        bucket = deltas.pop((row.tenant_id, row.service_id, row.inventory_month, row.category), None)
+        if bucket is None:
+            continue
+        for field in QUANTITY_DELTA_FIELDS:
+            value = getattr(row, field) + bucket[field]
+            setattr(row, field, max(value, 0) if field.endswith("_count") else value)
+        totals = dict(row.converted_totals or {})
+        for unit, qty in bucket["converted"].items():
+            totals[unit] = totals.get(unit, 0) + qty
+        row.converted_totals = totals
+        row.refreshed_at = now
+    if rows:
+        MonthlyServiceSnapshot.objects.bulk_update(rows, [*QUANTITY_DELTA_FIELDS, "converted_totals", "refreshed_at"])
+    for key in deltas:
+        mark_bucket_dirty(*key)
+
+
+def _category_lookup(category):
+    return {"category__isnull": True} if category is None else {"category": category}
+
+
+def _flush(pending):
+    keys = set(pending.keys)
+    if pending.loss_products:
+        rows = (
+            LossEvent.objects.filter(product_id__in=list(pending.loss_products.keys()))
+            .order_by()
+            .values_list("product_id", "tenant_id", "service_id", "inventory_month")
+            .distinct()
+        )
+        for product_id, tenant_id, service_id, month in rows:
+            for category in pending.loss_products.get(product_id, ()):
+                keys.add((tenant_id, service_id, month, category))
+    for key in keys:
+        refresh_bucket(*key)
+
+
+def _category_filter(category, prefix=""):
+    if category is None:
+        if prefix:
+            return Q(**{f"{prefix}isnull": True}) | Q(**{f"{prefix}category__isnull": True})
+        return Q(category__isnull=True)
+    return Q(**{f"{prefix}category": category})
+
+
+def _missing(field):
+    return Q(**{f"{field}__isnull": True}) | Q(**{field: ""})
+
+
+def refresh_bucket(tenant_id, service_id, month, category):
+    """Recalcule un bucket (O(produits du bucket)), le supprime s'il est vide."""
+    products = Product.objects.filter(tenant_id=tenant_id, service_id=service_id, inventory_month=month).filter(
+        _category_filter(category)
+    )
+    agg = products.aggregate(
+        product_count=Count("id"),
+        total_quantity=Sum("quantity"),
+        purchase_value=Sum(F("purchase_price") * F("quantity"), output_field=SNAPSHOT_DECIMAL),
+        selling_value=Sum(F("selling_price") * F("quantity"), output_field=SNAPSHOT_DECIMAL),
+        raw_material_selling_value=Sum(
+            Case(
+                When(product_role="raw_material", then=F("selling_price") * F("quantity")),
+                default=Value(0),
+                output_field=SNAPSHOT_DECIMAL,
+            ),
+            output_field=SNAPSHOT_DECIMAL,
+        ),
+        low_stock_count=Count("id", filter=Q(min_qty__isnull=False, quantity__lte=F("min_qty"))),
+        low_qty_count=Count("id", filter=Q(quantity__lte=2)),
+        out_of_stock_count=Count("id", filter=Q(quantity__lte=0)),
+        missing_identifier_count=Count("id", filter=_missing("barcode") & _missing("internal_sku")),
+        missing_price_count=Count("id", filter=Q(purchase_price__isnull=True, selling_price__isnull=True)),
+        missing_purchase_price_count=Count("id", filter=Q(purchase_price__isnull=True) | Q(purchase_price=0)),
+        missing_selling_price_count=Count("id", filter=Q(selling_price__isnull=True) | Q(selling_price=0)),
+        missing_supplier_count=Count("id", filter=_missing("supplier")),
+        missing_unit_count=Count("id", filter=_missing("unit")),
+        missing_lot_count=Count("id", filter=Q(lot_number__isnull=True)),
+        missing_dlc_count=Count("id", filter=Q(dlc__isnull=True)),
+        opened_count=Count("id", filter=Q(container_status="OPENED")),
+        oldest_created_at=Min("created_at"),
+    )
+    converted_totals = {}
+    if agg["product_count"]:
+        converted_rows = (
+            products.filter(conversion_factor__isnull=False)
+            .exclude(_missing("conversion_unit"))
+            .order_by()
+            .values("conversion_unit")
+            .annotate(total=Sum(F("quantity") * F("conversion_factor"), output_field=SNAPSHOT_DECIMAL))
+        )
+        converted_totals = {row["conversion_unit"]: float(row["total"] or 0) for row in converted_rows}
+
+    loss_rows = (
+        LossEvent.objects.filter(tenant_id=tenant_id, service_id=service_id, inventory_month=month)
+        .filter(_category_filter(category, prefix="product__"))
+        .order_by()
+        .values("reason")
+        .annotate(
+            count=Count("id"),
+            qty=Sum("quantity"),
+            cost=Sum(F("quantity") * F("product__purchase_price"), output_field=SNAPSHOT_DECIMAL),
+            product_qty=Sum(
+                "quantity",
+                filter=Q(product__is_archived=False, product__inventory_month=month),
+            ),
+            oldest=Min("created_at"),
+        )
+    )
+    losses_by_reason = {}
+    loss_count = 0
+    losses_qty = 0.0
+    losses_cost = 0.0
+    product_losses_qty = 0.0
+    oldest = agg["oldest_created_at"]
+    for row in loss_rows:
+        qty = float(row["qty"] or 0)
+        cost = float(row["cost"] or 0)
+        losses_by_reason[row["reason"]] = {"count": row["count"], "qty": qty, "cost": cost}
+        loss_count += row["count"]
+        losses_qty += qty
+        losses_cost += cost
+        product_losses_qty += float(row["product_qty"] or 0)
+        if row["oldest"] and (oldest is None or row["oldest"] < oldest):
+            oldest = row["oldest"]
+
+    lookup = {
+        "tenant_id": tenant_id,
+        "service_id": service_id,
+        "inventory_month": month,
+        "category": category,
+    }
+    if not agg["product_count"] and not loss_count:
+        MonthlyServiceSnapshot.objects.filter(**lookup).delete()
+        return None
+
+    defaults = {
+        key: agg[key] or 0
+        for key in (
+            "product_count",
+            "total_quantity",
+            "purchase_value",
+            "selling_value",
+            "raw_material_selling_value",
+            "low_stock_count",
+            "low_qty_count",
+            "out_of_stock_count",
+            "missing_identifier_count",
+            "missing_price_count",
+            "missing_purchase_price_count",
+            "missing_selling_price_count",
+            "missing_supplier_count",
+            "missing_unit_count",
+            "missing_lot_count",
+            "missing_dlc_count",
+            "opened_count",
+        )
+    }
+    defaults.update(
+        converted_totals=converted_totals,
+        loss_count=loss_count,
+        losses_qty=losses_qty,
+        losses_cost=losses_cost,
+        product_losses_qty=product_losses_qty,
+        losses_by_reason=losses_by_reason,
+        oldest_created_at=oldest,
+    )
+    snapshot, _ = MonthlyServiceSnapshot.objects.update_or_create(**lookup, defaults=defaults)
+    return snapshot
+
+
+def rebuild_snapshots(tenant_id=None, service_id=None, month=None):
+    """Reconstruit tous les buckets du périmètre (produits actifs + pertes). Retourne le nombre de buckets."""
+    products = Product.objects.all()
+    losses = LossEvent.objects.all()
+    existing = MonthlyServiceSnapshot.objects.all()
+    if tenant_id:
+        products, losses, existing = (
+            products.filter(tenant_id=tenant_id),
+            losses.filter(tenant_id=tenant_id),
+            existing.filter(tenant_id=tenant_id),
+        )
+    if service_id:
+        products, losses, existing = (
+            products.filter(service_id=service_id),
+            losses.filter(service_id=service_id),
+            existing.filter(service_id=service_id),
+        )
+    if month:
+        products, losses, existing = (
+            products.filter(inventory_month=month),
+            losses.filter(inventory_month=month),
+            existing.filter(inventory_month=month),
+        )
+
+    keys = set(
+        products.order_by().values_list("tenant_id", "service_id", "inventory_month", "category").distinct()
+    )
+    keys.update(
+        losses.order_by().values_list("tenant_id", "service_id", "inventory_month", "product__category").distinct()
+    )
+    # Buckets devenus vides : refresh_bucket les supprime.
+    keys.update(existing.values_list("tenant_id", "service_id", "inventory_month", "category"))
+    for key in keys:
+        refresh_bucket(*key)
+    return len(keys)
+
+
+def snapshot_rows(tenant, month, service=None, retention_start=None):
+    """
+    Lignes de snapshot pour un mois (tous services si service=None).
+    Retourne None si la fenêtre de rétention tronque un bucket : l'appelant recalcule alors en direct.
+    """
+    if not month:
+        return None
+    qs = MonthlyServiceSnapshot.objects.filter(tenant=tenant, inventory_month=month)
+    if service is not None:
+        qs = qs.filter(service=service)
+    rows = list(qs)
+    if retention_start and any(r.oldest_created_at and r.oldest_created_at < retention_start for r in rows):
+        return None
+    return rows
+
+
+def sum_counters(rows, *fields):
+    totals = {field: 0 for field in fields}
+    for row in rows:
+        for field in fields:
+            totals[field] += getattr(row, field) or 0
+    return totals
+
+
+def merge_losses_by_reason(rows):
+    merged = {}
+    for row in rows:
+        for reason, values in (row.losses_by_reason or {}).items():
+            bucket = merged.setdefault(reason, {"count": 0, "qty": 0.0, "cost": 0.0})
+            bucket["count"] += values.get("count", 0)
+            bucket["qty"] += values.get("qty", 0)
+            bucket["cost"] += values.get("cost", 0)
+    return merged
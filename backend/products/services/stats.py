@@ -0,0 +1,342 @@
+# backend/products/services/stats.py
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+
+STATS_DECIMAL = DecimalField(max_digits=20, decimal_places=6)
+
+PRODUCT_NOTE_LIMITED = "Calculs complets limités: stock_initial/entrées/sorties non suivis."
+PRODUCT_NOTE_RAW_MATERIAL = "Matière première: valeur de vente potentielle non comptée."
+SERVICE_NOTE_LIMITED = (
+    "Quantité vendue et marge estimée limitées : pas de stock initial/entrées/sorties enregistrés."
+)
+PRODUCT_NOTE_LEDGER = "Entrées/sorties lues dans le journal de stock (mouvements antérieurs au journal non comptés)."
+SERVICE_NOTE_LEDGER = (
+    "Quantité vendue et marge issues du journal de stock (ventes caisse ; coût matière cuisine inclus)."
+)
+SERVICE_NOTE_RAW_MATERIAL = (
+    "Si le module Matière première / Produit fini est actif, la valeur de vente exclut les matières premières."
+)
+
+PRODUCT_FIELDS = (
+    "id",
+    "name",
+    "category",
+    "unit",
+    "quantity",
+    "product_role",
+    "purchase_price",
+    "selling_price",
+    "conversion_unit",
+    "conversion_factor",
+)
+
+
+def _to_float(value):
+    return float(value or 0)
+
+
+def _value_expr(price_field):
+    return Sum(F(price_field) * F("quantity"), output_field=STATS_DECIMAL)
+
+
+def _selling_value_expr(item_type_enabled):
+    if not item_type_enabled:
+        return _value_expr("selling_price")
+    return Sum(
+        Case(
+            When(product_role="raw_material", then=Value(0)),
+            default=F("selling_price") * F("quantity"),
+            output_field=STATS_DECIMAL,
+        ),
+        output_field=STATS_DECIMAL,
+    )
+
+
+def _converted_expr():
+    return Sum(
+        Case(
+            When(conversion_factor__isnull=False, then=F("quantity") * F("conversion_factor")),
+            default=None,
+            output_field=STATS_DECIMAL,
+        ),
+        output_field=STATS_DECIMAL,
+    )
+
+
+def aggregate_products_by_category(products, item_type_enabled=False):
+    """
+    Une seule requête GROUP BY (category, conversion_unit).
+    Retourne ({category: totaux}, {unité convertie: quantité}).
+    """
+    rows = (
+        products.order_by()
+        .values("category", "conversion_unit")
+        .annotate(
+            total_quantity=Sum("quantity"),
+            total_purchase_value=_value_expr("purchase_price"),
+            total_selling_value=_selling_value_expr(item_type_enabled),
+            converted_quantity=_converted_expr(),
+        )
+    )
+    categories = {}
+    converted_totals = {}
+    for row in rows:
+        bucket = categories.setdefault(
+            row["category"],
+            {"total_quantity": 0.0, "total_purchase_value": 0.0, "total_selling_value": 0.0},
+        )
+        bucket["total_quantity"] += _to_float(row["total_quantity"])
+        bucket["total_purchase_value"] += _to_float(row["total_purchase_value"])
+        bucket["total_selling_value"] += _to_float(row["total_selling_value"])
+        unit = row["conversion_unit"]
+        if unit and row["converted_quantity"] is not None:
+            converted_totals[unit] = converted_totals.get(unit, 0) + float(row["converted_quantity"])
+    return categories, converted_totals
+
+
+def aggregate_losses(losses):
+    """
+    Une seule requête GROUP BY (product_id, reason) : quantité et coût (qty × prix d'achat).
+    Retourne ({product_id: qty}, {reason: {"total_qty", "total_cost"}}).
+    """
+    rows = (
+        losses.order_by()
+        .values("product_id", "reason")
+        .annotate(
+            total_qty=Sum("quantity"),
+            total_cost=Sum(F("quantity") * F("product__purchase_price"), output_field=STATS_DECIMAL),
+        )
+    )
+    by_product = {}
+    by_reason = {}
+    for row in rows:
+        qty = _to_float(row["total_qty"])
+        if row["product_id"]:
+            by_product[row["product_id"]] = by_product.get(row["product_id"], 0) + qty
+        bucket = by_reason.setdefault(row["reason"], {"total_qty": 0, "total_cost": 0})
+        bucket["total_qty"] += qty
+        bucket["total_cost"] += _to_float(row["total_cost"])
+    return by_product, by_reason
+
+
+def _flow_fields(stock_final, flows):
+    """Colonnes issues du journal (products.services.ledger.movement_totals) pour un produit."""
+    if flows is None:
+        return {
+            "quantity_sold_est": None,
+            "ca_estime": None,
+            "cout_matiere": None,
+            "marge": None,
+            "notes": [PRODUCT_NOTE_LIMITED],
+        }
+    entries = _to_float(flows.get("entries"))
+    exits = _to_float(flows.get("exits"))
+    return {
+        "stock_initial": stock_final - entries + exits,
+        "entries_qty": entries,
+        "exits_qty": exits,
+        "quantity_sold_est": _to_float(flows.get("sold_qty")),
+        "ca_estime": _to_float(flows.get("sales_amount")),
+        "cout_matiere": _to_float(flows.get("sales_cost")) + _to_float(flows.get("consumed_cost")),
+        "marge": _to_float(flows.get("margin")),
+        "notes": [PRODUCT_NOTE_LEDGER],
+    }
+
+
+def _product_row(p, loss_qty, item_type_enabled, flows=None):
+    """flows : {product_id: totaux du journal} ; None = journal non consulté (colonnes vides)."""
+    stock_final = _to_float(p["quantity"])
+    purchase_price = _to_float(p["purchase_price"])
+    selling_price = _to_float(p["selling_price"])
+    is_raw_material = item_type_enabled and p["product_role"] == "raw_material"
+
+    converted_qty, converted_unit = None, None
+    if p["conversion_factor"] is not None and p["conversion_unit"]:
+        converted_qty = stock_final * float(p["conversion_factor"])
+        converted_unit = p["conversion_unit"]
+
+    # Produit sans mouvement (mois antérieur au journal) : colonnes vides, pas des zéros.
+    flow_fields = _flow_fields(stock_final, None if flows is None else flows.get(p["id"]))
+
+    selling_value_current = 0
+    if selling_price and not is_raw_material:
+        selling_value_current = selling_price * stock_final
+
+    return {
+        "name": p["name"],
+        "category": p["category"],
+        "unit": p["unit"],
+        "stock_final": stock_final,
+        "losses_qty": loss_qty,
+        "product_role": p["product_role"],
+        "purchase_price": purchase_price,
+        "selling_price": selling_price,
+        "purchase_value_current": purchase_price * stock_final if purchase_price else 0,
+        "selling_value_current": selling_value_current,
+        "converted_quantity": converted_qty,
+        "converted_unit": converted_unit,
+        **flow_fields,
+        "notes": flow_fields["notes"] + ([PRODUCT_NOTE_RAW_MATERIAL] if is_raw_material else []),
+    }
+
+
+def compute_inventory_stats(products, losses, item_type_enabled=False, flows=None):
+    """
+    Statistiques d'inventaire calculées côté base (3 requêtes, quel que soit le volume) :
+    - lignes produit via values() (pas d'instanciation de modèles),
+    - totaux catégorie / unités converties via agrégation conditionnelle,
+    - pertes par produit / motif avec coût joint (pas de N+1 sur product.purchase_price).
+    """
+    loss_by_product, losses_by_reason_map = aggregate_losses(losses)
+
+    by_product = []
+    losses_by_category = {}
+    for p in products.order_by().values(*PRODUCT_FIELDS).iterator(chunk_size=2000):
+        loss_qty = loss_by_product.get(p["id"], 0)
+        if loss_qty:
+            losses_by_category[p["category"]] = losses_by_category.get(p["category"], 0) + loss_qty
+        by_product.append(_product_row(p, loss_qty, item_type_enabled, flows))
+
+    categories, converted_totals = aggregate_products_by_category(products, item_type_enabled)
+    return build_stats_payload(
+        by_product=by_product,
+        categories=categories,
+        losses_by_category=losses_by_category,
+        losses_by_reason=losses_by_reason_map,
+        converted_totals=converted_totals,
+        item_type_enabled=item_type_enabled,
+        flows=flows,
+    )
+
+
+def compute_inventory_stats_from_snapshots(
+    rows, products, losses, item_type_enabled=False, include_products=True, flows=None, flow_totals=None
+):
+    """
+    Variante O(catégories) : totaux lus dans MonthlyServiceSnapshot.
+    Seules les lignes by_product (si demandées) touchent encore Product / LossEvent.
+    """
+    categories = {}
+    converted_totals = {}
+    losses_by_category = {}
+    losses_by_reason = {}
+    for row in rows:
+        selling_value = _to_float(row.selling_value)
+        if item_type_enabled:
+            selling_value -= _to_float(row.raw_material_selling_value)
+        # Un bucket sans produit ne porte que des pertes (produit supprimé / d'un autre mois).
+        if row.product_count:
+            bucket = categories.setdefault(
+                row.category,
+                {"total_quantity": 0.0, "total_purchase_value": 0.0, "total_selling_value": 0.0},
+            )
+            bucket["total_quantity"] += _to_float(row.total_quantity)
+            bucket["total_purchase_value"] += _to_float(row.purchase_value)
+            bucket["total_selling_value"] += selling_value
+        if row.product_losses_qty:
+            losses_by_category[row.category] = losses_by_category.get(row.category, 0) + float(row.product_losses_qty)
+        for unit, qty in (row.converted_totals or {}).items():
+            converted_totals[unit] = converted_totals.get(unit, 0) + qty
+        for reason, values in (row.losses_by_reason or {}).items():
+            reason_bucket = losses_by_reason.setdefault(reason, {"total_qty": 0, "total_cost": 0})
+            reason_bucket["total_qty"] += values.get("qty", 0)
+            reason_bucket["total_cost"] += values.get("cost", 0)
+
+    by_product = []
+    if include_products:
+        loss_by_product = {
+            row["product_id"]: _to_float(row["total_qty"])
+            for row in losses.order_by()
+            .filter(product_id__isnull=False)
+            .values("product_id")
+            .annotate(total_qty=Sum("quantity"))
+        }
+        for p in products.order_by().values(*PRODUCT_FIELDS).iterator(chunk_size=2000):
+            by_product.append(_product_row(p, loss_by_product.get(p["id"], 0), item_type_enabled, flows))
+
+    return build_stats_payload(
+        by_product=by_product,
+        categories=categories,
+        losses_by_category=losses_by_category,
+        losses_by_reason=losses_by_reason,
+        converted_totals=converted_totals,
+        item_type_enabled=item_type_enabled,
+        flows=flows,
+        flow_totals=flow_totals,
+    )
+
+
+def summarize_flows(flows):
+    """Totaux service à partir des flux par produit ; None si aucun mouvement."""
+    if not flows:
+        return None
+    keys = ("sold_qty", "sales_amount", "margin", "consumed_cost")
+    return {key: sum(_to_float(row[key]) for row in flows.values()) for key in keys}
+
+
+def build_stats_payload(
+    *,
+    by_product,
+    categories,
+    losses_by_category,
+    losses_by_reason,
+    converted_totals,
+    item_type_enabled,
+    flows=None,
+    flow_totals=None,
+):
+    """flow_totals : totaux service du journal (ledger.movement_summary) ; à défaut, cumul de `flows`."""
+    by_category = [
+        {
+            "category": cat,
+            "total_quantity": totals["total_quantity"],
+            "total_purchase_value": totals["total_purchase_value"],
+            "total_selling_value": totals["total_selling_value"],
+            "losses_qty": losses_by_category.get(cat, 0),
+        }
+        for cat, totals in sorted(categories.items(), key=lambda item: (item[0] is None, item[0] or ""))
+    ]
+    reasons = [
+        {"reason": reason, "total_qty": totals["total_qty"], "total_cost": totals["total_cost"]}
+        for reason, totals in sorted(losses_by_reason.items())
+    ]
+
+    total_purchase_value = sum(c["total_purchase_value"] for c in by_category)
+    total_selling_value = sum(c["total_selling_value"] for c in by_category)
+    losses_total_qty = sum(r["total_qty"] for r in reasons)
+    losses_total_cost = sum(r["total_cost"] for r in reasons)
+
+    service_totals = {
+        "purchase_value": total_purchase_value,
+        "selling_value": total_selling_value,
+        "losses_qty": losses_total_qty,
+        "losses_cost": losses_total_cost,
+    }
+    if flow_totals is None:
+        flow_totals = summarize_flows(flows)
+    if flow_totals is None:
+        service_note = SERVICE_NOTE_LIMITED
+    else:
+        service_note = SERVICE_NOTE_LEDGER
+        service_totals.update(
+            {
+                "quantity_sold": _to_float(flow_totals["sold_qty"]),
+                "sales_amount": _to_float(flow_totals["sales_amount"]),
+                "margin": _to_float(flow_totals["margin"]),
+                "consumed_cost": _to_float(flow_totals["consumed_cost"]),
+            }
+        )
+    service_totals["notes"] = [service_note, SERVICE_NOTE_RAW_MATERIAL] if item_type_enabled else [service_note]
+
+    return {
+        "total_value": total_purchase_value,
+        "total_selling_value": total_selling_value,
+        "service_totals": service_totals,
+        "by_product": by_product,
+        "by_category": by_category,
+        "losses_total_qty": losses_total_qty,
+        "losses_total_cost": losses_total_cost,
+        "losses_by_reason": reasons,
+        "timeseries": [],
+        "categories": by_category,
+        "converted_totals": converted_totals,
+    }
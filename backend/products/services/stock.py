@@ -0,0 +1,77 @@
+# backend/products/services/stock.py
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.dispatch import Signal
+
+from ..models import Product
+from .ledger import build_movement, record_movements, remember_quantity
+from .snapshots import apply_quantity_changes
+
+STOCK_UPDATE_CHUNK = 500
+
+QUANTITY_FIELD = Product._meta.get_field("quantity")
+
+# Écritures de stock groupées (UPDATE / bulk_update) : pas de post_save, les caches qui
+# dépendent du stock (disponibilité des plats KDS) écoutent ce signal. kwargs : service_ids.
+stock_changed = Signal()
+
+
+def notify_stock_changed(service_ids):
+    """Émet `stock_changed` au commit (un cache invalidé avant le commit se re-remplirait d'ancien stock)."""
+    service_ids = sorted({sid for sid in service_ids if sid})
+    if service_ids:
+        transaction.on_commit(lambda: stock_changed.send(sender=Product, service_ids=service_ids))
+
+
+def lock_products(queryset):
+    """
+    SELECT ... FOR UPDATE trié par id : toutes les caisses / cuisines verrouillent les
+    produits dans le même ordre, deux paniers croisés ne peuvent pas s'interbloquer.
+    """
+    return list(queryset.select_for_update().order_by("id"))
+
+
+def apply_stock_deltas(products, deltas, *, kind="manual", reference="", user=None, amounts=None):
+    """
+    Applique {product_id: delta} (négatif = sortie) en un seul UPDATE ... CASE relatif
+    (quantity = quantity + delta) au lieu d'un save() par produit.
+    Les produits doivent être verrouillés par l'appelant ; les instances sont mises à jour
+    en mémoire et leurs snapshots ajustés par delta (update() ne déclenche pas de signaux).
+    Les mouvements (`kind`, `reference`, montants de vente `amounts` par produit) sont
+    journalisés en un bulk_create.
+    """
+    deltas = {pid: Decimal(delta) for pid, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    ids = sorted(deltas)
+    for start in range(0, len(ids), STOCK_UPDATE_CHUNK):
+        chunk = ids[start : start + STOCK_UPDATE_CHUNK]
+        Product.all_objects.filter(id__in=chunk).update(
+            quantity=Case(
+                *[When(id=pid, then=F("quantity") + Value(deltas[pid], output_field=QUANTITY_FIELD)) for pid in chunk],
+                default=F("quantity"),
+                output_field=QUANTITY_FIELD,
+            )
+        )
+
+    changes = []
+    movements = []
+    for product in products:
+        delta = deltas.get(product.id)
+        if delta is None:
+            continue
+        old_qty = product.quantity or Decimal("0")
+        product.quantity = old_qty + delta
+        remember_quantity(product)
+        changes.append((product, old_qty))
+        movements.append(
+            build_movement(
+                product, delta, kind, reference=reference, user=user, amount=(amounts or {}).get(product.id)
+            )
+        )
+    record_movements(movements)
+    apply_quantity_changes(changes)
+    notify_stock_changed(product.service_id for product, _ in changes)
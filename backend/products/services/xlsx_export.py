@@ -0,0 +1,145 @@
+# backend/products/services/xlsx_export.py
+import io
+import itertools
+import numbers
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+EXPORT_HEADER_FILL = PatternFill(start_color="1E293B", end_color="1E293B", fill_type="solid")
+EXPORT_STRIPE_FILL = PatternFill(start_color="F8FAFC", end_color="F8FAFC", fill_type="solid")
+EXPORT_BORDER = Border(
+    left=Side(style="thin"),
+    right=Side(style="thin"),
+    top=Side(style="thin"),
+    bottom=Side(style="thin"),
+)
+EXPORT_HEADER_FONT = Font(bold=True, color="FFFFFF")
+EXPORT_TITLE_FONT = Font(bold=True, size=14)
+
+ALIGN_TITLE = Alignment(horizontal="left", vertical="center")
+ALIGN_HEADER = Alignment(horizontal="center", vertical="center", wrap_text=True)
+ALIGN_NUMBER = Alignment(horizontal="right", vertical="center")
+ALIGN_TEXT = Alignment(horizontal="left", vertical="center", wrap_text=True)
+
+# Les largeurs de colonnes doivent être connues avant la première ligne (mode write-only) :
+# elles sont calculées sur un échantillon des premières lignes.
+XLSX_WIDTH_SAMPLE_ROWS = 1000
+XLSX_MIN_WIDTH = 10
+XLSX_MAX_WIDTH = 42
+
+
+def is_numeric(value):
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+
+def number_format_for(header):
+    header_lower = str(header or "").lower()
+    if any(term in header_lower for term in ("prix", "valeur", "sale", "purchase", "€")):
+        return "#,##0.00"
+    if any(term in header_lower for term in ("tva", "vat")):
+        return "0.00"
+    return "#,##0.###"
+
+
+def new_workbook():
+    """Classeur write-only : les lignes partent dans des fichiers temporaires au fil de l'eau."""
+    return openpyxl.Workbook(write_only=True)
+
+
+def workbook_bytes(wb):
+    bio = io.BytesIO()
+    wb.save(bio)
+    return bio.getvalue()
+
+
+def styled_cell(ws, value, font=None, fill=None, border=None, alignment=None, number_format=None):
+    cell = WriteOnlyCell(ws, value=value)
+    if font is not None:
+        cell.font = font
+    if fill is not None:
+        cell.fill = fill
+    if border is not None:
+        cell.border = border
+    if alignment is not None:
+        cell.alignment = alignment
+    if number_format is not None:
+        cell.number_format = number_format
+    return cell
+
+
+def column_widths(rows, column_count):
+    """Largeur = plus longue valeur (+2), bornée à [10, 42] comme l'ancien calcul cellule par cellule."""
+    longest = [0] * column_count
+    for row in rows:
+        for idx, value in enumerate(row[:column_count]):
+            if value is None:
+                continue
+            longest[idx] = max(longest[idx], len(str(value)))
+    return [min(max(length + 2, XLSX_MIN_WIDTH), XLSX_MAX_WIDTH) for length in longest]
+
+
+def set_column_widths(ws, widths):
+    for idx, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(idx)].width = width
+
+
+def write_table_sheet(wb, sheet_title, headers, rows, title=None, sample_size=XLSX_WIDTH_SAMPLE_ROWS):
+    """
+    Feuille de tableau stylée (titre fusionné, en-tête, bandes, bordures, formats numériques,
+    volets figés, filtre auto) écrite ligne par ligne. `rows` peut être un générateur.
+    Retourne le nombre de lignes de données.
+    """
+    ws = wb.create_sheet(sheet_title)
+    column_count = len(headers)
+    last_col = get_column_letter(column_count)
+    rows = iter(rows)
+    sample = list(itertools.islice(rows, sample_size))
+
+    header_values = [header or "" for header in headers]
+    width_rows = [header_values] + sample
+    if title:
+        width_rows.append([title])
+    set_column_widths(ws, column_widths(width_rows, column_count))
+
+    header_row = 1
+    if title:
+        header_row = 2
+        ws.row_dimensions[1].height = 26
+        ws.merged_cells.add(f"A1:{last_col}1")
+    ws.row_dimensions[header_row].height = 22
+    ws.freeze_panes = f"A{header_row + 1}"
+
+    if title:
+        ws.append([styled_cell(ws, title, font=EXPORT_TITLE_FONT, alignment=ALIGN_TITLE)])
+    ws.append(
+        [
+            styled_cell(ws, header, font=EXPORT_HEADER_FONT, fill=EXPORT_HEADER_FILL, border=EXPORT_BORDER, alignment=ALIGN_HEADER)
+            for header in header_values
+        ]
+    )
+
+    formats = [number_format_for(header) for header in header_values]
+    row_idx = header_row
+    for row in itertools.chain(sample, rows):
+        row_idx += 1
+        fill = EXPORT_STRIPE_FILL if row_idx % 2 == 0 else None
+        cells = []
+        for col_idx, value in enumerate(row):
+            numeric = is_numeric(value)
+            cells.append(
+                styled_cell(
+                    ws,
+                    value,
+                    fill=fill,
+                    border=EXPORT_BORDER,
+                    alignment=ALIGN_NUMBER if numeric else ALIGN_TEXT,
+                    number_format=formats[col_idx] if numeric and col_idx < column_count else None,
+                )
+            )
+        ws.append(cells)
+
+    ws.auto_filter.ref = f"A{header_row}:{last_col}{max(row_idx, header_row)}"
+    return row_idx - header_row
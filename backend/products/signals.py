@@ -0,0 +1,143 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from accounts.models import Service, Tenant
+from accounts.services.usage import adjust_products_count
+
+from .models import LossEvent, Product
+from .services.ledger import record_quantity_change, remember_quantity
+from .services.search import SEARCH_FIELDS, index_products, unindex_product
+from .services.snapshots import (
+    LOSS_AFFECTING_FIELDS,
+    mark_bucket_dirty,
+    queue_refresh,
+)
+
+_UNSET = object()
+
+
+def _remember(instance, fields):
+    # __dict__ uniquement : ne déclenche pas de chargement des champs différés.
+    instance._snapshot_initial = {f: instance.__dict__.get(f, _UNSET) for f in fields}
+
+
+def _owner_cascade(origin):
+    # Suppression d'un tenant / service : les snapshots partent aussi en cascade.
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Tenant, Service)
+
+
+def _tenant_cascade(origin):
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is Tenant
+
+
+def _initial(instance, field):
+    value = getattr(instance, "_snapshot_initial", {}).get(field, _UNSET)
+    return getattr(instance, field) if value is _UNSET else value
+
+
+@receiver(post_init, sender=Product)
+def product_post_init(sender, instance, **kwargs):
+    _remember(instance, ("inventory_month", *LOSS_AFFECTING_FIELDS))
+    remember_quantity(instance)
+
+
+@receiver(post_save, sender=Product)
+def product_post_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    old_month = _initial(instance, "inventory_month")
+    old_category = _initial(instance, "category")
+
+    # Journal de stock : écart de quantité depuis le chargement (fiche, réception, fusion).
+    if not raw and (update_fields is None or "quantity" in update_fields):
+        record_quantity_change(instance, created)
+    # Index de recherche en mémoire (SQLite) : seulement si un champ cherché a pu changer.
+    if not raw and (update_fields is None or set(update_fields) & set(SEARCH_FIELDS)):
+        index_products([instance])
+
+    # Compteur TenantUsage : produits actifs (création, archivage / désarchivage).
+    if not raw:
+        was_active = False if created else not _initial(instance, "is_archived")
+        is_active = not instance.is_archived
+        if was_active != is_active:
+            adjust_products_count(instance.tenant_id, 1 if is_active else -1)
+
+    def _add(pending):
+        pending.add_bucket(instance.tenant_id, instance.service_id, instance.inventory_month, instance.category)
+        if not created:
+            pending.add_bucket(instance.tenant_id, instance.service_id, old_month, old_category)
+            if any(_initial(instance, f) != getattr(instance, f) for f in LOSS_AFFECTING_FIELDS):
+                pending.add_product_losses(instance.id, old_category, instance.category)
+
+    queue_refresh(_add)
+    _remember(instance, ("inventory_month", *LOSS_AFFECTING_FIELDS))
+
+
+@receiver(pre_delete, sender=Product)
+def product_pre_delete(sender, instance, origin=None, **kwargs):
+    if _owner_cascade(origin):
+        return
+    # Les pertes passent à product=NULL avant post_delete : on mémorise leurs mois maintenant.
+    instance._snapshot_loss_months = list(
+        LossEvent.objects.filter(product_id=instance.id).order_by().values_list("inventory_month", flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=Product)
+def product_post_delete(sender, instance, origin=None, **kwargs):
+    unindex_product(instance)
+    # Suppression d'un service : ses produits quittent aussi le compteur du tenant.
+    if not instance.is_archived and not _tenant_cascade(origin):
+        adjust_products_count(instance.tenant_id, -1)
+    if _owner_cascade(origin):
+        return
+
+    def _add(pending):
+        pending.add_bucket(instance.tenant_id, instance.service_id, instance.inventory_month, instance.category)
+        for month in getattr(instance, "_snapshot_loss_months", []):
+            pending.add_bucket(instance.tenant_id, instance.service_id, month, instance.category)
+            pending.add_bucket(instance.tenant_id, instance.service_id, month, None)
+
+    queue_refresh(_add)
+
+
+@receiver(post_init, sender=LossEvent)
+def loss_post_init(sender, instance, **kwargs):
+    _remember(instance, ("inventory_month", "product_id", "service_id"))
+
+
+def _loss_category(product_id):
+    if not product_id:
+        return None
+    return Product.all_objects.filter(id=product_id).values_list("category", flat=True).first()
+
+
+@receiver(post_save, sender=LossEvent)
+def loss_post_save(sender, instance, created, **kwargs):
+    category = _loss_category(instance.product_id)
+    mark_bucket_dirty(instance.tenant_id, instance.service_id, instance.inventory_month, category)
+    if not created:
+        old_product_id = _initial(instance, "product_id")
+        old_month = _initial(instance, "inventory_month")
+        old_service_id = _initial(instance, "service_id")
+        if (old_product_id, old_month, old_service_id) != (
+            instance.product_id,
+            instance.inventory_month,
+            instance.service_id,
+        ):
+            old_category = category if old_product_id == instance.product_id else _loss_category(old_product_id)
+            mark_bucket_dirty(instance.tenant_id, old_service_id, old_month, old_category)
+    _remember(instance, ("inventory_month", "product_id", "service_id"))
+
+
+@receiver(post_delete, sender=LossEvent)
+def loss_post_delete(sender, instance, origin=None, **kwargs):
+    if _owner_cascade(origin):
+        return
+    mark_bucket_dirty(
+        instance.tenant_id,
+        instance.service_id,
+        instance.inventory_month,
+        _loss_category(instance.product_id),
+    )
@@ -8,6 +8,7 @@ from .views import (
     home,
     inventory_stats,
     lookup_product,
+    lookup_products_batch,
     search_products,
 )
 
@@ -18,6 +19,7 @@ urlpatterns = [
     path('export-excel/', export_excel, name='export_excel'),
     path('export-advanced/', export_advanced, name='export_advanced'),
     path('lookup/', lookup_product, name='lookup_product'),
+    path('lookup/batch/', lookup_products_batch, name='lookup_products_batch'),
     path('search/', search_products, name='search_products'),
     path('', home, name='home'),
 ]
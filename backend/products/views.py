@@ -1,6 +1,5 @@
 from datetime import timedelta, datetime
-import difflib
-import unicodedata
+from decimal import Decimal
 
 import os
 import requests
@@ -12,12 +11,9 @@ from rest_framework.renderers import BaseRenderer
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.decorators import parser_classes
 
-from django.http import JsonResponse
-import openpyxl
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-from openpyxl.utils import get_column_letter
+from django.http import JsonResponse, StreamingHttpResponse
+from openpyxl.styles import Font, Alignment
 from openpyxl.chart import BarChart, Reference
-import numbers
 import re
 import logging
 import csv
@@ -42,15 +38,16 @@ from accounts.permissions import ProductPermission, ManagerPermission
 from accounts.services.access import (
     check_entitlement,
     check_limit,
-    get_usage,
     get_retention_days,
     get_limits,
     get_entitlements,
     LimitExceeded,
 )
+from accounts.services.usage import adjust_products_count, get_products_count
 from utils.sendgrid_email import send_email_with_sendgrid
 from utils.renderers import XLSXRenderer, CSVRenderer
 from inventory.metrics import track_export_event, track_off_lookup_failure
+from jobs.services.queue import offloadable
 
 from .models import (
     Product,
@@ -65,8 +62,35 @@ from .models import (
     ReceiptImportEvent,
     ProductMergeLog,
 )
-from .serializers import ProductSerializer, CategorySerializer, LossEventSerializer
+from .serializers import ProductSerializer, ProductScanSerializer, CategorySerializer, LossEventSerializer
 from .sku import generate_auto_sku
+from .services.duplicates import _tokenize_name, find_duplicate_groups
+from .services.ledger import movement_summary, movement_totals, remember_quantity, stock_ledger
+from .services.lookup import OffLookupError, off_suggestion, off_suggestions
+from .services.matching import ProductMatcher
+from .services.search import index_products, search_catalog
+from .services.snapshots import (
+    mark_bucket_dirty,
+    mark_product_losses_dirty,
+    mark_products_dirty,
+    snapshot_batch,
+    snapshot_rows,
+    sum_counters,
+)
+from .services.stock import apply_stock_deltas
+from .services.stats import compute_inventory_stats, compute_inventory_stats_from_snapshots
+from .services.xlsx_export import (
+    EXPORT_BORDER,
+    EXPORT_HEADER_FILL,
+    EXPORT_HEADER_FONT,
+    EXPORT_STRIPE_FILL,
+    column_widths,
+    new_workbook,
+    set_column_widths,
+    styled_cell,
+    workbook_bytes,
+    write_table_sheet,
+)
 from .pdf import (
     build_catalog_graphic_pdf,
     build_catalog_simple_pdf,
@@ -79,46 +103,22 @@ from .pdf.components.utils import currency_symbol, format_price
 
 logger = logging.getLogger(__name__)
 
-EXPORT_HEADER_FILL = PatternFill(start_color="1E293B", end_color="1E293B", fill_type="solid")
-EXPORT_STRIPE_FILL = PatternFill(start_color="F8FAFC", end_color="F8FAFC", fill_type="solid")
-EXPORT_BORDER = Border(
-    left=Side(style="thin"),
-    right=Side(style="thin"),
-    top=Side(style="thin"),
-    bottom=Side(style="thin"),
-)
-EXPORT_HEADER_FONT = Font(bold=True, color="FFFFFF")
-OFF_TIMEOUT_SECONDS = 3
+EXPORT_STREAM_CHUNK_SIZE = 2000  # lignes lues par aller-retour base (.iterator)
+CSV_STREAM_FLUSH_BYTES = 64 * 1024
 OFF_LOG_CODE = "OFF_LOOKUP_FAILED"
 OFF_CACHE_TTL_SECONDS = 60 * 60 * 48
+OFF_ERROR_MESSAGE = "Préremplissage indisponible (OpenFoodFacts). Réessayez plus tard."
+LOOKUP_SECTIONS = {"recent", "history", "full"}
+LOOKUP_BATCH_MAX = 300
 CATALOG_PDF_MAX_PRODUCTS = 500
 LABELS_PDF_MAX_PRODUCTS = 400
 RECEIPT_IMPORT_MAX_LINES = 500
+RECEIPT_BULK_BATCH_SIZE = 500
 RECEIPTS_OCR_PROVIDER_DEFAULT = "ocrspace"
 RECEIPTS_OCR_MIN_TEXT_LEN = 30  # en dessous => on considère que le PDF est scanné / vide
 RECEIPTS_OCR_MAX_PAGES_DEFAULT = 3
 RECEIPTS_OCR_TIMEOUT_DEFAULT = 25
 RECEIPTS_OCR_CACHE_TTL_DEFAULT = 60 * 60 * 24  # 24h
-DUPLICATE_NAME_SIMILARITY = 0.985
-NAME_STOPWORDS = {
-    "produit",
-    "article",
-    "test",
-    "item",
-    "lot",
-    "pack",
-    "piece",
-    "pieces",
-    "pcs",
-    "kg",
-    "g",
-    "gr",
-    "l",
-    "ml",
-    "cl",
-    "x",
-    "packaging",
-}
 LABEL_ALLOWED_FIELDS = {
     "price",
     "price_unit",
@@ -130,10 +130,6 @@ LABEL_ALLOWED_FIELDS = {
 }
 
 
-def _is_numeric(value):
-    return isinstance(value, numbers.Number) and not isinstance(value, bool)
-
-
 def _parse_positive_int(value, default, max_value=None):
     try:
         parsed = int(value)
@@ -474,140 +470,6 @@ def _format_variant(product):
     return value or name or ""
 
 
-def _tokenize_name(value):
-    if not value:
-        return []
-    text = unicodedata.normalize("NFKD", str(value))
-    text = "".join(ch for ch in text if not unicodedata.combining(ch))
-    text = re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
-    tokens = [t for t in text.split() if t and t not in NAME_STOPWORDS]
-    return tokens
-
-
-def _normalize_name(value):
-    tokens = _tokenize_name(value)
-    return " ".join(tokens)
-
-
-def _similarity(a, b):
-    if not a or not b:
-        return 0.0
-    return difflib.SequenceMatcher(a=a, b=b).ratio()
-
-
-def _token_similarity(tokens_a, tokens_b):
-    if not tokens_a or not tokens_b:
-        return 0.0
-    set_a, set_b = set(tokens_a), set(tokens_b)
-    if not set_a or not set_b:
-        return 0.0
-    return len(set_a & set_b) / len(set_a | set_b)
-
-
-def _name_is_generic(tokens):
-    if len(tokens) < 2:
-        return True
-    text = " ".join(tokens)
-    if len(text) < 8:
-        return True
-    if len(tokens) < 3 and all(len(t) <= 3 for t in tokens):
-        return True
-    return False
-
-
-def _tokens_are_specific(tokens):
-    if len(tokens) < 2:
-        return False
-    long_tokens = [t for t in tokens if len(t) >= 4]
-    return len(long_tokens) >= 2
-
-
-def _supporting_signal_count(a, b):
-    def same_field(field):
-        av = (getattr(a, field, None) or "").strip().lower()
-        bv = (getattr(b, field, None) or "").strip().lower()
-        return bool(av and bv and av == bv)
-
-    count = 0
-    count += 1 if same_field("category") else 0
-    count += 1 if same_field("brand") else 0
-    count += 1 if same_field("supplier") else 0
-    count += 1 if same_field("pack_uom") else 0
-    count += 1 if same_field("pack_size") else 0
-
-    try:
-        ap = float(a.purchase_price) if a.purchase_price is not None else None
-        bp = float(b.purchase_price) if b.purchase_price is not None else None
-    except (TypeError, ValueError):
-        ap, bp = None, None
-    if ap is not None and bp is not None and ap > 0 and bp > 0 and abs(ap - bp) < 0.01:
-        count += 1
-
-    return count
-
-
-def _has_meaningful_signal(a, b):
-    def same_field(field):
-        av = (getattr(a, field, None) or "").strip().lower()
-        bv = (getattr(b, field, None) or "").strip().lower()
-        return bool(av and bv and av == bv)
-
-    if same_field("category") or same_field("brand") or same_field("supplier"):
-        return True
-    if same_field("pack_uom") or same_field("pack_size"):
-        return True
-    try:
-        ap = float(a.purchase_price) if a.purchase_price is not None else None
-        bp = float(b.purchase_price) if b.purchase_price is not None else None
-    except (TypeError, ValueError):
-        ap, bp = None, None
-    return ap is not None and bp is not None and ap > 0 and bp > 0 and abs(ap - bp) < 0.01
-
-
-def _has_core_signal(a, b):
-    def same_field(field):
-        av = (getattr(a, field, None) or "").strip().lower()
-        bv = (getattr(b, field, None) or "").strip().lower()
-        return bool(av and bv and av == bv)
-
-    return bool(same_field("category") or same_field("brand") or same_field("supplier"))
-
-
-def _group_has_core_signal(group):
-    if len(group) < 2:
-        return False
-    for idx, p in enumerate(group):
-        for q in group[idx + 1 :]:
-            if _has_core_signal(p, q):
-                return True
-    return False
-
-
-def _has_strong_signal(a, b):
-    return bool(
-        (a.barcode and b.barcode and a.barcode == b.barcode)
-        or (a.internal_sku and b.internal_sku and a.internal_sku == b.internal_sku)
-    )
-
-
-def _has_supporting_signal(a, b, min_signals=3):
-    if _has_strong_signal(a, b):
-        return True
-    if not _has_meaningful_signal(a, b):
-        return False
-    return _supporting_signal_count(a, b) >= min_signals
-
-
-def _group_has_supporting_signal(group, min_signals=3):
-    if len(group) < 2:
-        return False
-    for idx, p in enumerate(group):
-        for q in group[idx + 1 :]:
-            if _has_supporting_signal(p, q, min_signals=min_signals):
-                return True
-    return False
-
-
 def _history_month_cutoff(months):
     if months is None:
         return None
@@ -623,77 +485,43 @@ def _history_month_cutoff(months):
     return f"{year:04d}-{month:02d}"
 
 
-def _build_csv_bytes(headers, rows, delimiter=";", title=None):
-    buffer = io.StringIO()
-    buffer.write("sep=;\n")
-    writer = csv.writer(buffer, delimiter=delimiter)
+class _CsvEcho:
+    """Pseudo-fichier : csv.writer renvoie la ligne formatée au lieu de l'écrire."""
+
+    def write(self, value):
+        return value
+
+
+def _iter_csv_chunks(headers, rows, delimiter=";", title=None):
+    """
+    CSV par blocs encodés (~64 Ko) : BOM + `sep=;`, titre, en-têtes puis lignes.
+    `rows` peut être un générateur : la mémoire reste constante quel que soit le volume.
+    """
+    writer = csv.writer(_CsvEcho(), delimiter=delimiter)
+    parts = ["\ufeffsep=;\n"]
     if title:
-        writer.writerow([title] + [""] * (len(headers) - 1))
-    writer.writerow(headers)
+        parts.append(writer.writerow([title] + [""] * (len(headers) - 1)))
+    parts.append(writer.writerow(headers))
+    size = 0
     for row in rows:
-        writer.writerow(["" if value is None else value for value in row])
-    content = buffer.getvalue()
-    return ("\ufeff" + content).encode("utf-8")
+        line = writer.writerow(["" if value is None else value for value in row])
+        parts.append(line)
+        size += len(line)
+        if size >= CSV_STREAM_FLUSH_BYTES:
+            yield "".join(parts).encode("utf-8")
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts).encode("utf-8")
 
 
-def _apply_sheet_style(ws, headers, title=None):
-    header_row = 1
-    if title:
-        ws.insert_rows(1)
-        title_cell = ws.cell(row=1, column=1)
-        title_cell.value = title
-        title_cell.font = Font(bold=True, size=14)
-        title_cell.alignment = Alignment(horizontal="left", vertical="center")
-        ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(headers))
-        ws.row_dimensions[1].height = 26
-        header_row = 2
-
-    ws.freeze_panes = f"A{header_row + 1}"
-    last_col = get_column_letter(len(headers))
-    ws.auto_filter.ref = f"A{header_row}:{last_col}{ws.max_row}"
-    ws.row_dimensions[header_row].height = 22
-
-    header_lookup = {index + 1: (header or "") for index, header in enumerate(headers)}
-
-    for col_idx, header in header_lookup.items():
-        cell = ws.cell(row=header_row, column=col_idx)
-        cell.value = header
-        cell.font = EXPORT_HEADER_FONT
-        cell.fill = EXPORT_HEADER_FILL
-        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-        cell.border = EXPORT_BORDER
-
-    for row in ws.iter_rows(min_row=header_row + 1, max_row=ws.max_row, max_col=ws.max_column):
-        row_idx = row[0].row
-        if row_idx % 2 == 0:
-            for cell in row:
-                cell.fill = EXPORT_STRIPE_FILL
-        for cell in row:
-            cell.border = EXPORT_BORDER
-            header = header_lookup.get(cell.column, "")
-            if _is_numeric(cell.value):
-                header_lower = str(header).lower()
-                if any(term in header_lower for term in ("prix", "valeur", "sale", "purchase", "€")):
-                    cell.number_format = "#,##0.00"
-                elif any(term in header_lower for term in ("tva", "vat")):
-                    cell.number_format = "0.00"
-                else:
-                    cell.number_format = "#,##0.###"
-                cell.alignment = Alignment(horizontal="right", vertical="center")
-            else:
-                cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
-
-    for col_cells in ws.columns:
-        max_length = 0
-        column_letter = None
-        for cell in col_cells:
-            if not isinstance(cell, openpyxl.cell.cell.MergedCell):
-                column_letter = cell.column_letter
-                if cell.value is None:
-                    continue
-                max_length = max(max_length, len(str(cell.value)))
-        if column_letter:
-            ws.column_dimensions[column_letter].width = min(max(max_length + 2, 10), 42)
+def _build_csv_bytes(headers, rows, delimiter=";", title=None):
+    return b"".join(_iter_csv_chunks(headers, rows, delimiter=delimiter, title=title))
+
+
+def _streaming_csv_response(headers, rows, filename, title=None):
+    resp = StreamingHttpResponse(_iter_csv_chunks(headers, rows, title=title), content_type="text/csv; charset=utf-8")
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
 
 
 def _format_service_label(tenant, service_param=None):
@@ -772,9 +600,9 @@ class ProductViewSet(TenantQuerySetMixin, viewsets.ModelViewSet):
             raise exceptions.PermissionDenied("Rôle insuffisant pour créer un produit.")
         tenant = get_tenant_for_request(self.request)
         service = get_service_from_request(self.request)
-        usage = get_usage(tenant)
-        check_limit(tenant, "max_products", usage["products_count"], requested_increment=1)
-        serializer.save(tenant=tenant, service=service)
+        check_limit(tenant, "max_products", get_products_count(tenant), requested_increment=1)
+        with transaction.atomic(), stock_ledger("initial", user=self.request.user):
+            serializer.save(tenant=tenant, service=service)
 
     def perform_update(self, serializer):
         role = get_user_role(self.request)
@@ -782,7 +610,8 @@ class ProductViewSet(TenantQuerySetMixin, viewsets.ModelViewSet):
             raise exceptions.PermissionDenied("Rôle insuffisant pour modifier un produit.")
         tenant = get_tenant_for_request(self.request)
         service = get_service_from_request(self.request)
-        serializer.save(tenant=tenant, service=service)
+        with transaction.atomic(), stock_ledger("manual", user=self.request.user):
+            serializer.save(tenant=tenant, service=service)
 
     def perform_destroy(self, instance):
         role = get_user_role(self.request)
@@ -793,101 +622,125 @@ class ProductViewSet(TenantQuerySetMixin, viewsets.ModelViewSet):
         instance.save(update_fields=["is_archived", "archived_at"])
 
 
+def _log_off_failure(exc, barcode):
+    count = _track_off_failure(exc.reason)
+    logger.warning(
+        "OFF_LOOKUP_FAILED code=%s reason=%s count=%s barcode=%s",
+        OFF_LOG_CODE,
+        exc.reason,
+        count,
+        barcode,
+        exc_info=exc.__cause__ or exc,
+    )
+
+
+def _lookup_sections(params):
+    """Sections optionnelles du lookup : `include=recent,history,full` (boucle de scan : aucune)."""
+    sections = {part.strip() for part in (params.get("include") or "").split(",") if part.strip()}
+    # Compatibilité : demander une fenêtre d'historique, c'est demander l'historique.
+    if params.get("history_limit") or params.get("history_months"):
+        sections.add("history")
+    return sections & LOOKUP_SECTIONS
+
+
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated, ProductPermission])
 def lookup_product(request):
-    barcode = request.query_params.get("barcode", "")
+    barcode = (request.query_params.get("barcode") or "").strip()
     if not barcode:
         return Response({"detail": "Paramètre barcode requis."}, status=400)
 
     tenant = get_tenant_for_request(request)
     service = get_service_from_request(request)
+    sections = _lookup_sections(request.query_params)
 
     product_qs = Product.objects.filter(tenant=tenant, service=service, barcode=barcode)
     product_qs = _apply_retention(product_qs, tenant)
     product = product_qs.order_by("-inventory_month", "-created_at").first()
 
     if product:
-        serializer = ProductSerializer(product)
-
-        recent = Product.objects.filter(tenant=tenant, service=service).order_by("-created_at")
-        recent = _apply_retention(recent, tenant)[:5]
-        history = Product.objects.filter(tenant=tenant, service=service, barcode=barcode).order_by(
-            "-inventory_month", "-created_at"
-        )
-        history = _apply_retention(history, tenant)
-        history_limit = _parse_positive_int(request.query_params.get("history_limit"), 200, 500)
-        history_months = request.query_params.get("history_months")
-        if history_months in (None, ""):
-            history_months = 12
-        history_cutoff = _history_month_cutoff(history_months)
-        if history_cutoff:
-            history = history.filter(inventory_month__gte=history_cutoff)
-        history = history[:history_limit]
-
-        return Response(
-            {
-                "found": True,
-                "product": serializer.data,
-                "recent": ProductSerializer(recent, many=True).data,
-                "history": ProductSerializer(history, many=True).data,
-            }
-        )
+        serializer_class = ProductSerializer if "full" in sections else ProductScanSerializer
+        payload = {"found": True, "product": serializer_class(product).data}
+
+        if "recent" in sections:
+            recent = Product.objects.filter(tenant=tenant, service=service).order_by("-created_at")
+            recent = _apply_retention(recent, tenant)[:5]
+            payload["recent"] = serializer_class(recent, many=True).data
+        if "history" in sections:
+            history = Product.objects.filter(tenant=tenant, service=service, barcode=barcode).order_by(
+                "-inventory_month", "-created_at"
+            )
+            history = _apply_retention(history, tenant)
+            history_limit = _parse_positive_int(request.query_params.get("history_limit"), 200, 500)
+            history_months = request.query_params.get("history_months")
+            if history_months in (None, ""):
+                history_months = 12
+            history_cutoff = _history_month_cutoff(history_months)
+            if history_cutoff:
+                history = history.filter(inventory_month__gte=history_cutoff)
+            payload["history"] = serializer_class(history[:history_limit], many=True).data
+
+        return Response(payload)
 
     if tenant.domain == "food":
         try:
-            import socket
-            import urllib.error
-            import urllib.request
-
-            url = f"https://world.openfoodfacts.org/api/v2/product/{barcode}.json"
-            with urllib.request.urlopen(url, timeout=OFF_TIMEOUT_SECONDS) as resp:
-                data = json.loads(resp.read().decode())
-                if data.get("status") == 1:
-                    p = data.get("product", {}) or {}
-                    suggestion = {
-                        "name": p.get("product_name") or "",
-                        "brand": p.get("brands") or "",
-                        "category": (p.get("categories_tags") or [None])[0],
-                        "quantity": p.get("quantity"),
-                    }
-                    return Response({"found": False, "suggestion": suggestion})
-        except (urllib.error.URLError, urllib.error.HTTPError, socket.timeout) as exc:
-            count = _track_off_failure("url_error")
-            logger.warning(
-                "OFF_LOOKUP_FAILED code=%s reason=url_error count=%s barcode=%s",
-                OFF_LOG_CODE,
-                count,
-                barcode,
-                exc_info=exc,
-            )
-            return Response(
-                {
-                    "found": False,
-                    "off_error": "Préremplissage indisponible (OpenFoodFacts). Réessayez plus tard.",
-                },
-                status=200,
-            )
-        except Exception:
-            count = _track_off_failure("exception")
-            logger.warning(
-                "OFF_LOOKUP_FAILED code=%s reason=exception count=%s barcode=%s",
-                OFF_LOG_CODE,
-                count,
-                barcode,
-                exc_info=True,
-            )
-            return Response(
-                {
-                    "found": False,
-                    "off_error": "Préremplissage indisponible (OpenFoodFacts). Réessayez plus tard.",
-                },
-                status=200,
-            )
+            suggestion = off_suggestion(barcode)
+        except OffLookupError as exc:
+            _log_off_failure(exc, barcode)
+            return Response({"found": False, "off_error": OFF_ERROR_MESSAGE}, status=200)
+        if suggestion:
+            return Response({"found": False, "suggestion": suggestion})
 
     return Response({"found": False}, status=200)
 
 
+@api_view(["POST"])
+@permission_classes([permissions.IsAuthenticated, ProductPermission])
+def lookup_products_batch(request):
+    """
+    File d'un scanner rejouée en un appel : {"barcodes": [...]} (au plus LOOKUP_BATCH_MAX).
+    Une requête `barcode__in` (fiche du mois le plus récent par code), puis OFF en parallèle
+    pour les codes inconnus (tenants food). Résultats dans l'ordre reçu, sans doublons.
+    """
+    raw = request.data.get("barcodes") if isinstance(request.data, dict) else None
+    if not isinstance(raw, list):
+        return Response({"detail": "Paramètre barcodes (liste) requis."}, status=400)
+    barcodes = list(dict.fromkeys(str(code).strip() for code in raw if code is not None and str(code).strip()))
+    if not barcodes:
+        return Response({"detail": "Paramètre barcodes (liste) requis."}, status=400)
+    if len(barcodes) > LOOKUP_BATCH_MAX:
+        return Response({"detail": f"{LOOKUP_BATCH_MAX} codes-barres maximum par lot."}, status=400)
+
+    tenant = get_tenant_for_request(request)
+    service = get_service_from_request(request)
+
+    product_qs = Product.objects.filter(tenant=tenant, service=service, barcode__in=barcodes)
+    product_qs = _apply_retention(product_qs, tenant)
+    latest = {}
+    for product in product_qs.order_by("barcode", "-inventory_month", "-created_at"):
+        latest.setdefault(product.barcode, product)
+
+    unknown = [code for code in barcodes if code not in latest]
+    suggestions = off_suggestions(unknown) if unknown and tenant.domain == "food" else {}
+
+    results = []
+    for code in barcodes:
+        product = latest.get(code)
+        if product is not None:
+            results.append({"barcode": code, "found": True, "product": ProductScanSerializer(product).data})
+            continue
+        entry = {"barcode": code, "found": False}
+        suggestion = suggestions.get(code)
+        if isinstance(suggestion, OffLookupError):
+            _log_off_failure(suggestion, code)
+            entry["off_error"] = OFF_ERROR_MESSAGE
+        elif suggestion:
+            entry["suggestion"] = suggestion
+        results.append(entry)
+
+    return Response({"results": results, "found": len(latest), "unknown": len(unknown)})
+
+
 class CategoryViewSet(TenantQuerySetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -965,128 +818,63 @@ def inventory_stats(request):
         losses_qs = losses_qs.filter(inventory_month=month)
     losses_qs = _apply_retention(losses_qs, tenant)
 
-    loss_by_product = {}
-    for l in losses_qs:
-        if l.product_id:
-            loss_by_product[l.product_id] = loss_by_product.get(l.product_id, 0) + float(l.quantity or 0)
-
-    losses_total_qty = sum(float(l.quantity or 0) for l in losses_qs)
-    losses_total_cost = 0
-    losses_by_reason = []
-    reasons = losses_qs.values_list("reason", flat=True).distinct()
-    for r in reasons:
-        subset = losses_qs.filter(reason=r)
-        qty = sum(float(l.quantity or 0) for l in subset)
-        cost = 0
-        for l in subset:
-            if l.product and l.product.purchase_price:
-                cost += float(l.quantity or 0) * float(l.product.purchase_price)
-        losses_by_reason.append({"reason": r, "total_qty": qty, "total_cost": cost})
-        losses_total_cost += cost
-
-    by_product = []
-    for p in products:
-        stock_final = float(p.quantity or 0)
-        loss_qty = loss_by_product.get(p.id, 0)
-        purchase_price = float(p.purchase_price or 0)
-        selling_price = float(p.selling_price or 0)
-        converted_qty, converted_unit = _converted_quantity(p)
+    snapshots = snapshot_rows(tenant, month, service=service, retention_start=_retention_start(tenant))
+    include_products = snapshots is None or request.query_params.get("include_products") != "0"
 
-        is_raw_material = item_type_enabled and p.product_role == "raw_material"
-        selling_value_current = 0
-        if selling_price and not is_raw_material:
-            selling_value_current = selling_price * stock_final
+    # Flux du mois (entrées / sorties / ventes / marge) lus dans le journal de stock : GROUP BY
+    # par produit pour les lignes by_product, sinon un simple aggregate pour les totaux service.
+    flows = flow_totals = None
+    if include_products:
+        flows = movement_totals(tenant, service, product_ids=products.values("id"))
+    else:
+        flow_totals = movement_summary(tenant, service, product_ids=products.values("id"))
 
-        by_product.append(
-            {
-                "name": p.name,
-                "category": p.category,
-                "unit": p.unit,
-                "stock_final": stock_final,
-                "losses_qty": loss_qty,
-                "product_role": p.product_role,
-                "purchase_price": purchase_price,
-                "selling_price": selling_price,
-                "purchase_value_current": purchase_price * stock_final if purchase_price else 0,
-                "selling_value_current": selling_value_current,
-                "converted_quantity": converted_qty,
-                "converted_unit": converted_unit,
-                "quantity_sold_est": None,
-                "ca_estime": None,
-                "cout_matiere": None,
-                "marge": None,
-                "notes": (
-                    ["Calculs complets limités: stock_initial/entrées/sorties non suivis."]
-                    + (["Matière première: valeur de vente potentielle non comptée."] if is_raw_material else [])
-                ),
-            }
+    if snapshots is None:
+        return Response(compute_inventory_stats(products, losses_qs, item_type_enabled=item_type_enabled, flows=flows))
+    return Response(
+        compute_inventory_stats_from_snapshots(
+            snapshots,
+            products,
+            losses_qs,
+            item_type_enabled=item_type_enabled,
+            include_products=include_products,
+            flows=flows,
+            flow_totals=flow_totals,
         )
+    )
 
-    categories = products.values_list("category", flat=True).distinct()
-    by_category = []
-    for cat in categories:
-        cat_products = products.filter(category=cat)
-        total_qty = sum(float(p.quantity or 0) for p in cat_products)
-        total_purchase_value = sum((float(p.purchase_price or 0) * float(p.quantity or 0)) for p in cat_products)
-        total_selling_value = 0
-        for p in cat_products:
-            if item_type_enabled and p.product_role == "raw_material":
-                continue
-            total_selling_value += float(p.selling_price or 0) * float(p.quantity or 0)
-        cat_losses = sum(loss_by_product.get(p.id, 0) for p in cat_products)
-        by_category.append(
-            {
-                "category": cat,
-                "total_quantity": total_qty,
-                "total_purchase_value": total_purchase_value,
-                "total_selling_value": total_selling_value,
-                "losses_qty": cat_losses,
-            }
-        )
 
-    total_purchase_value = sum((float(p.purchase_price or 0) * float(p.quantity or 0)) for p in products)
-    total_selling_value = 0
-    for p in products:
-        if item_type_enabled and p.product_role == "raw_material":
-            continue
-        total_selling_value += float(p.selling_price or 0) * float(p.quantity or 0)
+EXPORT_EXCEL_FIELDS = (
+    "name",
+    "category",
+    "purchase_price",
+    "selling_price",
+    "tva",
+    "dlc",
+    "quantity",
+    "variant_name",
+    "variant_value",
+    "min_qty",
+    "conversion_unit",
+    "conversion_factor",
+)
 
-    converted_totals = {}
-    for p in products:
-        converted_qty, converted_unit = _converted_quantity(p)
-        if converted_qty is None or not converted_unit:
-            continue
-        converted_totals.setdefault(converted_unit, 0)
-        converted_totals[converted_unit] += converted_qty
 
-    return Response(
-        {
-            "total_value": total_purchase_value,
-            "total_selling_value": total_selling_value,
-            "service_totals": {
-                "purchase_value": total_purchase_value,
-                "selling_value": total_selling_value,
-                "losses_qty": losses_total_qty,
-                "losses_cost": losses_total_cost,
-                "notes": (
-                    [
-                        "Quantité vendue et marge estimée limitées : pas de stock initial/entrées/sorties enregistrés.",
-                        "Si le module Matière première / Produit fini est actif, la valeur de vente exclut les matières premières.",
-                    ]
-                    if item_type_enabled
-                    else ["Quantité vendue et marge estimée limitées : pas de stock initial/entrées/sorties enregistrés."]
-                ),
-            },
-            "by_product": by_product,
-            "by_category": by_category,
-            "losses_total_qty": losses_total_qty,
-            "losses_total_cost": losses_total_cost,
-            "losses_by_reason": losses_by_reason,
-            "timeseries": [],
-            "categories": by_category,
-            "converted_totals": converted_totals,
-        }
-    )
+def _export_excel_row(p):
+    converted_qty, converted_unit = _converted_quantity(p)
+    return [
+        p.name,
+        p.category or "",
+        float(p.purchase_price or 0),
+        float(p.selling_price or 0),
+        float(p.tva or 0) if p.tva is not None else "",
+        p.dlc or "",
+        float(p.quantity or 0),
+        _format_variant(p),
+        float(p.min_qty) if p.min_qty is not None else "",
+        converted_qty if converted_qty is not None else "",
+        converted_unit or "",
+    ]
 
 
 @api_view(["GET"])
@@ -1118,39 +906,15 @@ def export_excel(request):
         "Quantité convertie",
         "Unité convertie",
     ]
-    rows = []
-    for p in products:
-        converted_qty, converted_unit = _converted_quantity(p)
-        rows.append(
-            [
-                p.name,
-                p.category or "",
-                float(p.purchase_price or 0),
-                float(p.selling_price or 0),
-                float(p.tva or 0) if p.tva is not None else "",
-                p.dlc or "",
-                float(p.quantity or 0),
-                _format_variant(p),
-                float(p.min_qty) if p.min_qty is not None else "",
-                converted_qty if converted_qty is not None else "",
-                converted_unit or "",
-            ]
-        )
+    values = products.values_list(*EXPORT_EXCEL_FIELDS, named=True).iterator(chunk_size=EXPORT_STREAM_CHUNK_SIZE)
+    rows = (_export_excel_row(p) for p in values)
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"Inventaire {month}"
     service_label = _format_service_label(tenant, service)
     period_label = _format_period_label(month=month)
     title = _build_export_title(tenant, period_label, service_label)
-    ws.append(headers)
-    for row in rows:
-        ws.append(row)
-    _apply_sheet_style(ws, headers, title=title)
-
-    bio = io.BytesIO()
-    wb.save(bio)
-    xlsx_bytes = bio.getvalue()
+    wb = new_workbook()
+    write_table_sheet(wb, f"Inventaire {month}", headers, rows, title=title)
+    xlsx_bytes = workbook_bytes(wb)
 
     filename = _build_export_filename("inventaire", period_label, tenant.name, service_label, "xlsx")
     resp = Response(xlsx_bytes, content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
@@ -1165,9 +929,56 @@ def export_excel(request):
     return resp
 
 
+EXPORT_GENERIC_FIELDS = (
+    "inventory_month",
+    "service__name",
+    "category",
+    "name",
+    "variant_name",
+    "variant_value",
+    "container_status",
+    "quantity",
+    "unit",
+    "min_qty",
+    "conversion_unit",
+    "conversion_factor",
+    "remaining_fraction",
+    "pack_size",
+    "pack_uom",
+    "purchase_price",
+    "selling_price",
+)
+
+
+def _export_generic_rows(qs):
+    """Lignes d'export lues par lots via values_list (pas d'instances Product en mémoire)."""
+    values = qs.values_list(*EXPORT_GENERIC_FIELDS, named=True)
+    for p in values.iterator(chunk_size=EXPORT_STREAM_CHUNK_SIZE):
+        converted_qty, converted_unit = _converted_quantity(p)
+        yield [
+            p.inventory_month,
+            p.service__name or "",
+            p.category or "",
+            p.name,
+            _format_variant(p),
+            p.container_status,
+            float(p.quantity or 0),
+            p.unit or "",
+            float(p.min_qty) if p.min_qty is not None else "",
+            converted_qty if converted_qty is not None else "",
+            converted_unit or "",
+            p.remaining_fraction or "",
+            p.pack_size or "",
+            p.pack_uom or "",
+            float(p.purchase_price or 0),
+            float(p.selling_price or 0),
+        ]
+
+
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated, ManagerPermission])
 @renderer_classes([XLSXRenderer, CSVRenderer])
+@offloadable("export_generic")
 def export_generic(request):
     tenant = get_tenant_for_request(request)
 
@@ -1220,29 +1031,7 @@ def export_generic(request):
         "PurchasePrice",
         "SalePrice",
     ]
-    rows = []
-    for p in qs.select_related("service"):
-        converted_qty, converted_unit = _converted_quantity(p)
-        rows.append(
-            [
-                p.inventory_month,
-                p.service.name if p.service else "",
-                p.category or "",
-                p.name,
-                _format_variant(p),
-                p.container_status,
-                float(p.quantity or 0),
-                p.unit or "",
-                float(p.min_qty) if p.min_qty is not None else "",
-                converted_qty if converted_qty is not None else "",
-                converted_unit or "",
-                p.remaining_fraction or "",
-                p.pack_size or "",
-                p.pack_uom or "",
-                float(p.purchase_price or 0),
-                float(p.selling_price or 0),
-            ]
-        )
+    rows = _export_generic_rows(qs)
 
     service_label = _format_service_label(tenant, service_param)
     period_label = _format_period_label(from_month=from_month, to_month=to_month)
@@ -1260,19 +1049,17 @@ def export_generic(request):
         else "text/csv"
     )
 
-    if export_format == "csv":
+    # CSV sans email : flux direct (mémoire constante, premier octet immédiat).
+    stream_csv = export_format == "csv" and not email_to
+    attachment_bytes = None
+    if stream_csv:
+        resp = _streaming_csv_response(headers, rows, filename, title=title)
+    elif export_format == "csv":
         attachment_bytes = _build_csv_bytes(headers, rows, title=title)
     else:
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Export"
-        ws.append(headers)
-        for row in rows:
-            ws.append(row)
-        _apply_sheet_style(ws, headers, title=title)
-        bio = io.BytesIO()
-        wb.save(bio)
-        attachment_bytes = bio.getvalue()
+        wb = new_workbook()
+        write_table_sheet(wb, "Export", headers, rows, title=title)
+        attachment_bytes = workbook_bytes(wb)
 
     if email_to:
         send_email_with_sendgrid(
@@ -1286,8 +1073,11 @@ def export_generic(request):
             fallback_to_django=True,
         )
 
-    resp = Response(attachment_bytes, content_type=mimetype if export_format == "xlsx" else f"{mimetype}; charset=utf-8")
-    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    if not stream_csv:
+        resp = Response(
+            attachment_bytes, content_type=mimetype if export_format == "xlsx" else f"{mimetype}; charset=utf-8"
+        )
+        resp["Content-Disposition"] = f'attachment; filename="{filename}"'
     _log_export_event(
         tenant=tenant,
         user=request.user,
@@ -1304,9 +1094,40 @@ def export_generic(request):
     return resp
 
 
+EXPORT_ADVANCED_FIELDS = (
+    "name",
+    "category",
+    "purchase_price",
+    "selling_price",
+    "tva",
+    "dlc",
+    "quantity",
+    "no_barcode",
+    "barcode",
+    "internal_sku",
+    "inventory_month",
+    "service__name",
+    "unit",
+    "min_qty",
+    "variant_name",
+    "variant_value",
+    "lot_number",
+    "container_status",
+    "remaining_fraction",
+    "conversion_unit",
+    "conversion_factor",
+    "brand",
+    "supplier",
+    "notes",
+    "product_role",
+    "service_id",
+)
+
+
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated, ManagerPermission])
 @renderer_classes([XLSXRenderer, CSVRenderer])
+@offloadable("export_advanced")
 def export_advanced(request):
     tenant = get_tenant_for_request(request)
     service_from_request = get_service_from_request(request)
@@ -1405,7 +1226,7 @@ def export_advanced(request):
             lambda p: p.internal_sku if getattr(p, "no_barcode", False) else (p.barcode or ""),
         ),
         "inventory_month": ("Mois", lambda p: p.inventory_month or ""),
-        "service": ("Service", lambda p: p.service.name if p.service else ""),
+        "service": ("Service", lambda p: p.service__name or ""),
         "unit": ("Unité", lambda p: p.unit or ""),
         "min_qty": ("Stock min", lambda p: float(p.min_qty) if p.min_qty is not None else ""),
         "variant_name": ("Variante (libellé)", lambda p: p.variant_name or ""),
@@ -1472,11 +1293,12 @@ def export_advanced(request):
             ]
         )
         row.append(product.inventory_month)
-        row.append(product.service.name if product.service else "")
+        row.append(product.service__name or "")
         return row
 
-    products_qs = qs.select_related("service")
-    rows = [build_row(p) for p in products_qs]
+    # Lignes lues par lots (values_list nommé) : générateur consommé par le CSV en flux ou le classeur.
+    values = qs.values_list(*EXPORT_ADVANCED_FIELDS, named=True).iterator(chunk_size=EXPORT_STREAM_CHUNK_SIZE)
+    rows = (build_row(p) for p in values)
 
     service_ids = [int(s) for s in services if str(s).isdigit()]
     service_label = _format_service_label(tenant, "all" if not service_ids else None)
@@ -1503,98 +1325,104 @@ def export_advanced(request):
         else "text/csv"
     )
 
-    if export_format == "csv":
+    stream_csv = export_format == "csv" and not email_to
+    attachment_bytes = None
+    if stream_csv:
+        resp = _streaming_csv_response(headers, rows, filename, title=title)
+    elif export_format == "csv":
         attachment_bytes = _build_csv_bytes(headers, rows, title=title)
     else:
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Export avancé"
-        ws.append(headers)
-        for row in rows:
-            ws.append(row)
-        _apply_sheet_style(ws, headers, title=title)
-
-        if include_summary or include_charts:
+        want_summary = include_summary or include_charts
+        totals = {"products": 0, "qty": 0.0, "purchase": 0.0, "selling": 0.0, "dlc": 0, "item_type": False}
+        category_totals = {}
+        item_type_service_ids = set()
+        if want_summary:
+            for service in Service.objects.filter(tenant=tenant).only("id", "features"):
+                if ((service.features or {}).get("item_type", {}) or {}).get("enabled"):
+                    item_type_service_ids.add(service.id)
+
+        def _track_summary(products):
+            # Totaux de synthèse cumulés pendant l'écriture (pas de seconde passe sur les produits).
+            for p in products:
+                qty = float(p.quantity or 0)
+                purchase = float(p.purchase_price or 0) * qty
+                item_type = p.service_id in item_type_service_ids
+                selling = 0.0
+                if not (item_type and p.product_role == "raw_material"):
+                    selling = float(p.selling_price or 0) * qty
+                totals["products"] += 1
+                totals["qty"] += qty
+                totals["purchase"] += purchase
+                totals["selling"] += selling
+                totals["dlc"] += 1 if p.dlc else 0
+                totals["item_type"] = totals["item_type"] or item_type
+                cat = category_totals.setdefault(p.category or "Sans catégorie", {"qty": 0, "purchase": 0, "selling": 0})
+                cat["qty"] += qty
+                cat["purchase"] += purchase
+                cat["selling"] += selling
+                yield p
+
+        if want_summary:
+            rows = (build_row(p) for p in _track_summary(values))
+
+        wb = new_workbook()
+        write_table_sheet(wb, "Export avancé", headers, rows, title=title)
+
+        if want_summary:
             summary = wb.create_sheet("Synthèse")
-            summary["A1"] = "Synthèse export"
-            summary["A1"].font = Font(bold=True, size=14)
-
-            products_list = list(products_qs)
-            total_products = len(products_list)
-            total_qty = sum(float(p.quantity or 0) for p in products_list)
-            total_purchase = sum(float(p.purchase_price or 0) * float(p.quantity or 0) for p in products_list)
-
-            total_selling = 0
-            for p in products_list:
-                features = getattr(p.service, "features", {}) or {}
-                item_cfg = features.get("item_type", {}) or {}
-                if item_cfg.get("enabled") and p.product_role == "raw_material":
-                    continue
-                total_selling += float(p.selling_price or 0) * float(p.quantity or 0)
-
-            dlc_count = sum(1 for p in products_list if p.dlc)
-
-            has_item_type_enabled = any(
-                (getattr(p.service, "features", {}) or {}).get("item_type", {}).get("enabled")
-                for p in products_list
-            )
-
             info_rows = [
-                ("Produits", total_products),
-                ("Quantité totale", total_qty),
-                ("Valeur stock achat (€)", total_purchase),
-                ("Valeur stock vente (€)", total_selling),
+                ("Produits", totals["products"]),
+                ("Quantité totale", totals["qty"]),
+                ("Valeur stock achat (€)", totals["purchase"]),
+                ("Valeur stock vente (€)", totals["selling"]),
             ]
             if include_dlc and (not selected_fields or "dlc" in selected_fields):
-                info_rows.append(("Produits avec DLC/DDM", dlc_count))
-            if has_item_type_enabled:
+                info_rows.append(("Produits avec DLC/DDM", totals["dlc"]))
+            if totals["item_type"]:
                 info_rows.append(("Note", "Valeur de vente exclut les matières premières."))
 
-            row_cursor = 3
-            for label, value in info_rows:
-                summary.cell(row=row_cursor, column=1, value=label).font = Font(bold=True)
-                summary.cell(row=row_cursor, column=2, value=value)
-                row_cursor += 1
-
-            row_cursor += 1
-            summary.cell(row=row_cursor, column=1, value="Par catégorie").font = Font(bold=True)
-            row_cursor += 1
-
             headers_summary = ["Catégorie", "Quantité", "Valeur achat (€)", "Valeur vente (€)"]
-            for col_num, header in enumerate(headers_summary, 1):
-                cell = summary.cell(row=row_cursor, column=col_num, value=header)
-                cell.font = EXPORT_HEADER_FONT
-                cell.fill = EXPORT_HEADER_FILL
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.border = EXPORT_BORDER
-            row_cursor += 1
-
-            category_totals = {}
-            for p in products_list:
-                cat = p.category or "Sans catégorie"
-                category_totals.setdefault(cat, {"qty": 0, "purchase": 0, "selling": 0})
-                category_totals[cat]["qty"] += float(p.quantity or 0)
-                category_totals[cat]["purchase"] += float(p.purchase_price or 0) * float(p.quantity or 0)
-
-                features = getattr(p.service, "features", {}) or {}
-                item_cfg = features.get("item_type", {}) or {}
-                if not (item_cfg.get("enabled") and p.product_role == "raw_material"):
-                    category_totals[cat]["selling"] += float(p.selling_price or 0) * float(p.quantity or 0)
-
-            start_category_row = row_cursor
-            for cat, totals in sorted(category_totals.items()):
-                summary.cell(row=row_cursor, column=1, value=cat)
-                summary.cell(row=row_cursor, column=2, value=totals["qty"])
-                summary.cell(row=row_cursor, column=3, value=totals["purchase"])
-                summary.cell(row=row_cursor, column=4, value=totals["selling"])
-                if row_cursor % 2 == 0:
-                    for col_idx in range(1, 5):
-                        summary.cell(row=row_cursor, column=col_idx).fill = EXPORT_STRIPE_FILL
-                for col_idx in range(1, 5):
-                    summary.cell(row=row_cursor, column=col_idx).border = EXPORT_BORDER
+            category_rows = [
+                [cat, cat_totals["qty"], cat_totals["purchase"], cat_totals["selling"]]
+                for cat, cat_totals in sorted(category_totals.items())
+            ]
+            set_column_widths(
+                summary,
+                column_widths(
+                    [["Synthèse export"], *info_rows, ["Par catégorie"], headers_summary, *category_rows],
+                    len(headers_summary),
+                ),
+            )
+
+            bold = Font(bold=True)
+            summary.append([styled_cell(summary, "Synthèse export", font=Font(bold=True, size=14))])
+            summary.append([])
+            for label, value in info_rows:
+                summary.append([styled_cell(summary, label, font=bold), value])
+            summary.append([])
+            summary.append([styled_cell(summary, "Par catégorie", font=bold)])
+            summary.append(
+                [
+                    styled_cell(
+                        summary,
+                        header,
+                        font=EXPORT_HEADER_FONT,
+                        fill=EXPORT_HEADER_FILL,
+                        border=EXPORT_BORDER,
+                        alignment=Alignment(horizontal="center", vertical="center"),
+                    )
+                    for header in headers_summary
+                ]
+            )
+            # titre, ligne vide, infos, ligne vide, "Par catégorie", en-tête
+            start_category_row = len(info_rows) + 6
+            row_cursor = start_category_row
+            for category_row in category_rows:
+                fill = EXPORT_STRIPE_FILL if row_cursor % 2 == 0 else None
+                summary.append([styled_cell(summary, value, fill=fill, border=EXPORT_BORDER) for value in category_row])
                 row_cursor += 1
 
-            if include_charts and category_totals:
+            if include_charts and category_rows:
                 chart = BarChart()
                 chart.title = "Valeur stock achat par catégorie"
                 chart.y_axis.title = "€"
@@ -1604,22 +1432,7 @@ def export_advanced(request):
                 chart.set_categories(categories_ref)
                 summary.add_chart(chart, "F4")
 
-        for sheet in wb.worksheets:
-            for col_cells in sheet.columns:
-                max_length = 0
-                column_letter = None
-                for cell in col_cells:
-                    if not isinstance(cell, openpyxl.cell.cell.MergedCell):
-                        column_letter = cell.column_letter
-                        if cell.value is None:
-                            continue
-                        max_length = max(max_length, len(str(cell.value)))
-                if column_letter:
-                    sheet.column_dimensions[column_letter].width = min(max(max_length + 2, 10), 42)
-
-        bio = io.BytesIO()
-        wb.save(bio)
-        attachment_bytes = bio.getvalue()
+        attachment_bytes = workbook_bytes(wb)
 
     if email_to:
         try:
@@ -1636,11 +1449,12 @@ def export_advanced(request):
         except Exception:
             logger.exception("Erreur envoi email export_advanced")
 
-    resp = Response(
-        attachment_bytes,
-        content_type=mimetype if export_format != "csv" else f"{mimetype}; charset=utf-8",
-    )
-    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    if not stream_csv:
+        resp = Response(
+            attachment_bytes,
+            content_type=mimetype if export_format != "csv" else f"{mimetype}; charset=utf-8",
+        )
+        resp["Content-Disposition"] = f'attachment; filename="{filename}"'
     _log_export_event(
         tenant=tenant,
         user=request.user,
@@ -1662,6 +1476,7 @@ def export_advanced(request):
 @permission_classes([permissions.IsAuthenticated, ManagerPermission])
 @renderer_classes([PDFRenderer])
 @parser_classes([MultiPartParser, FormParser])
+@offloadable("catalog_pdf")
 def catalog_pdf(request):
     tenant = get_tenant_for_request(request)
     check_entitlement(tenant, "pdf_catalog")
@@ -1807,25 +1622,23 @@ def search_products(request):
         service = get_service_from_request(request)
         qs = Product.objects.filter(tenant=tenant, service=service)
     qs = _apply_retention(qs, tenant)
-    if query:
-        qs = qs.filter(
-            Q(name__icontains=query)
-            | Q(barcode__icontains=query)
-            | Q(internal_sku__icontains=query)
-        )
-    results = list(
-        qs.order_by("name")[:10].values(
-            "id",
-            "name",
-            "barcode",
-            "internal_sku",
-            "category",
-            "inventory_month",
-            "service_id",
-            "service__name",
-        )
+    fields = (
+        "id",
+        "name",
+        "barcode",
+        "internal_sku",
+        "category",
+        "inventory_month",
+        "service_id",
+        "service__name",
     )
-    return Response(results)
+    if not query.strip():
+        return Response(list(qs.order_by("name")[:10].values(*fields)))
+    if service_param == "all":
+        service_ids = list(Service.objects.filter(tenant=tenant).values_list("id", flat=True))
+    else:
+        service_ids = [service.id]
+    return Response(search_catalog(qs, query, service_ids, fields, limit=10))
 
 
 @api_view(["GET"])
@@ -1922,23 +1735,6 @@ def _product_brief(product):
     }
 
 
-def _pick_master(candidates):
-    if not candidates:
-        return None
-    scored = []
-    for p in candidates:
-        score = 0
-        score += 3 if p.barcode else 0
-        score += 3 if p.internal_sku else 0
-        score += 1 if p.category else 0
-        score += 1 if p.purchase_price is not None else 0
-        score += 1 if p.selling_price is not None else 0
-        score += float(p.quantity or 0)
-        scored.append((score, p))
-    scored.sort(key=lambda item: item[0], reverse=True)
-    return scored[0][1]
-
-
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated, ManagerPermission])
 def product_duplicates(request):
@@ -1951,112 +1747,17 @@ def product_duplicates(request):
     if month:
         qs = qs.filter(inventory_month=month)
 
-    duplicates = []
-
-    for field, label in (("barcode", "barcode"), ("internal_sku", "sku")):
-        agg = (
-            qs.exclude(**{f"{field}__isnull": True})
-            .exclude(**{field: ""})
-            .values(field)
-            .annotate(cnt=Count("id"))
-            .filter(cnt__gt=1)
-        )
-        for row in agg:
-            value = row.get(field)
-            group = list(qs.filter(**{field: value}))
-            master = _pick_master(group)
-            duplicates.append(
-                {
-                    "type": label,
-                    "key": value,
-                    "master_id": master.id if master else None,
-                    "confidence": 0.98 if label == "barcode" else 0.96,
-                    "reason": "Même code-barres" if label == "barcode" else "Même SKU",
-                    "products": [_product_brief(p) for p in group],
-                }
-            )
-
-    name_groups = {}
-    name_tokens = {}
-    for p in qs:
-        tokens = _tokenize_name(p.name)
-        if _name_is_generic(tokens) or not _tokens_are_specific(tokens):
-            continue
-        norm = " ".join(tokens)
-        if not norm:
-            continue
-        name_groups.setdefault(norm, []).append(p)
-        name_tokens[norm] = tokens
-
-    for norm, group in name_groups.items():
-        if len(group) < 2:
-            continue
-        if not any((not p.barcode and not p.internal_sku) for p in group):
-            continue
-        if not _group_has_core_signal(group):
-            continue
-        if not _group_has_supporting_signal(group, min_signals=4):
-            continue
-        master = _pick_master(group)
-        duplicates.append(
-            {
-                "type": "name",
-                "key": norm,
-                "master_id": master.id if master else None,
-                "confidence": 0.82,
-                "reason": "Nom identique + signaux communs (catégorie, prix, fournisseur…)",
-                "products": [_product_brief(p) for p in group],
-            }
-        )
-
-    # fuzzy pass (lightweight) on groups of similar normalized names
-    if len(name_groups) <= 120:
-        norms = list(name_groups.keys())
-        seen_pairs = set()
-        for i, base in enumerate(norms):
-            for other in norms[i + 1 :]:
-                if (base, other) in seen_pairs or (other, base) in seen_pairs:
-                    continue
-                tokens_a = name_tokens.get(base, [])
-                tokens_b = name_tokens.get(other, [])
-                shared = set(tokens_a) & set(tokens_b)
-                if len(shared) < 3:
-                    continue
-                if _token_similarity(tokens_a, tokens_b) < 0.9:
-                    continue
-                if _similarity(base, other) < DUPLICATE_NAME_SIMILARITY:
-                    continue
-                merged = list({*name_groups.get(base, []), *name_groups.get(other, [])})
-                if not any((not p.barcode and not p.internal_sku) for p in merged):
-                    continue
-                if not _group_has_core_signal(merged):
-                    continue
-                has_signal = False
-                for idx, p in enumerate(merged):
-                    for q in merged[idx + 1 :]:
-                        if _has_supporting_signal(p, q, min_signals=4):
-                            has_signal = True
-                            break
-                    if has_signal:
-                        break
-
-                if not has_signal:
-                    continue
-                if len(merged) < 2:
-                    continue
-                master = _pick_master(merged)
-                duplicates.append(
-                    {
-                        "type": "name_fuzzy",
-                        "key": f"{base} ~ {other}",
-                        "master_id": master.id if master else None,
-                        "confidence": 0.76,
-                        "reason": "Nom très proche + signaux forts (catégorie/prix/fournisseur)",
-                        "products": [_product_brief(p) for p in merged],
-                    }
-                )
-                seen_pairs.add((base, other))
-
+    duplicates = [
+        {
+            "type": group["type"],
+            "key": group["key"],
+            "master_id": group["master"].id if group["master"] else None,
+            "confidence": group["confidence"],
+            "reason": group["reason"],
+            "products": [_product_brief(p) for p in group["products"]],
+        }
+        for group in find_duplicate_groups(qs)
+    ]
     return Response({"count": len(duplicates), "groups": duplicates})
 
 
@@ -2084,7 +1785,9 @@ def merge_products(request):
     if len(months) > 1:
         return Response({"detail": "Fusion limitée à un même mois d’inventaire."}, status=400)
 
-    with transaction.atomic():
+    with transaction.atomic(), snapshot_batch(), stock_ledger(
+        "merge", reference=f"product_merge:{master.id}", user=request.user
+    ):
         summary = {
             "before": _product_brief(master),
             "merged_ids": [p.id for p in others],
@@ -2120,7 +1823,13 @@ def merge_products(request):
 
         master.save()
 
-        LossEvent.objects.filter(product_id__in=[p.id for p in others]).update(product=master)
+        # update() ne déclenche pas de signaux : on marque les buckets de pertes déplacées.
+        moved_losses = LossEvent.objects.filter(product_id__in=[p.id for p in others])
+        loss_months = moved_losses.order_by().values_list("inventory_month", flat=True).distinct()
+        for loss_month in loss_months:
+            for category in {master.category, *[p.category for p in others]}:
+                mark_bucket_dirty(tenant.id, master.service_id, loss_month, category)
+        moved_losses.update(product=master)
 
         for dup in others:
             dup.is_archived = True
@@ -2158,16 +1867,40 @@ def rituals(request):
         losses_qs = losses_qs.filter(inventory_month=month)
     losses_qs = _apply_retention(losses_qs, tenant)
 
-    total_products = qs.count()
-    low_stock = qs.filter(min_qty__isnull=False, quantity__lte=F("min_qty")).count()
-    losses_count = losses_qs.count()
-    missing_identifiers = qs.filter(
-        (Q(barcode__isnull=True) | Q(barcode="")) & (Q(internal_sku__isnull=True) | Q(internal_sku=""))
-    ).count()
-    missing_prices = qs.filter(purchase_price__isnull=True, selling_price__isnull=True).count()
-    missing_categories = qs.filter(Q(category__isnull=True) | Q(category="")).count()
-    missing_suppliers = qs.filter(Q(supplier__isnull=True) | Q(supplier="")).count()
-    missing_units = qs.filter(Q(unit__isnull=True) | Q(unit="")).count()
+    snapshots = snapshot_rows(tenant, month, service=service, retention_start=_retention_start(tenant))
+    if snapshots is not None:
+        counters = sum_counters(
+            snapshots,
+            "product_count",
+            "low_stock_count",
+            "loss_count",
+            "missing_identifier_count",
+            "missing_price_count",
+            "missing_supplier_count",
+            "missing_unit_count",
+            "missing_lot_count",
+        )
+        total_products = counters["product_count"]
+        low_stock = counters["low_stock_count"]
+        losses_count = counters["loss_count"]
+        missing_identifiers = counters["missing_identifier_count"]
+        missing_prices = counters["missing_price_count"]
+        missing_categories = sum(row.product_count for row in snapshots if not row.category)
+        missing_suppliers = counters["missing_supplier_count"]
+        missing_units = counters["missing_unit_count"]
+        missing_lots = counters["missing_lot_count"]
+    else:
+        total_products = qs.count()
+        low_stock = qs.filter(min_qty__isnull=False, quantity__lte=F("min_qty")).count()
+        losses_count = losses_qs.count()
+        missing_identifiers = qs.filter(
+            (Q(barcode__isnull=True) | Q(barcode="")) & (Q(internal_sku__isnull=True) | Q(internal_sku=""))
+        ).count()
+        missing_prices = qs.filter(purchase_price__isnull=True, selling_price__isnull=True).count()
+        missing_categories = qs.filter(Q(category__isnull=True) | Q(category="")).count()
+        missing_suppliers = qs.filter(Q(supplier__isnull=True) | Q(supplier="")).count()
+        missing_units = qs.filter(Q(unit__isnull=True) | Q(unit="")).count()
+        missing_lots = qs.filter(lot_number__isnull=True).count()
 
     now = timezone.now().date()
     dlc_30 = qs.filter(dlc__isnull=False, dlc__lte=now + timedelta(days=30)).count()
@@ -2175,8 +1908,6 @@ def rituals(request):
 
     service_type = getattr(service, "service_type", "other")
 
-    missing_lots = qs.filter(lot_number__isnull=True).count()
-
     top_low_stock = list(
         qs.filter(min_qty__isnull=False, quantity__lte=F("min_qty"))
         .order_by("quantity")
@@ -3111,26 +2842,9 @@ def _compute_receipt_hash(rows, supplier_name, invoice_number, invoice_date, rec
     return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
-def _match_product_from_line(tenant, service, line, month):
-    code = (line.get("barcode") or "").strip()
-    sku = (line.get("internal_sku") or "").strip()
-    name = (line.get("name") or "").strip()
-
-    if code:
-        found = Product.objects.filter(tenant=tenant, service=service, inventory_month=month, barcode=code).first()
-        if found:
-            return found
-    if sku:
-        found = Product.objects.filter(tenant=tenant, service=service, inventory_month=month, internal_sku=sku).first()
-        if found:
-            return found
-    if name:
-        return Product.objects.filter(tenant=tenant, service=service, inventory_month=month, name__iexact=name).first()
-    return None
-
-
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated, ManagerPermission])
+@offloadable("import_receipt")
 def import_receipt(request):
     tenant = get_tenant_for_request(request)
     check_entitlement(tenant, "receipts_import")
@@ -3247,7 +2961,9 @@ def import_receipt(request):
     )
 
     month = timezone.now().strftime("%Y-%m")
-    lines_payload = []
+    # Index code-barres / SKU / nom du mois chargés en quelques requêtes IN pour toutes les lignes.
+    matcher = ProductMatcher(tenant, service, month, cleaned_rows)
+    lines = []
     for idx, cleaned in enumerate(cleaned_rows, start=1):
         try:
             qty = float(cleaned["quantity"]) if cleaned["quantity"] not in ("", None) else 1
@@ -3264,36 +2980,40 @@ def import_receipt(request):
         except (TypeError, ValueError):
             tva = None
 
-        matched = _match_product_from_line(tenant, service, cleaned, month)
-
-        line = ReceiptLine.objects.create(
-            receipt=receipt,
-            line_number=idx,
-            raw_name=cleaned["name"],
-            quantity=qty,
-            unit=cleaned["unit"] or "pcs",
-            purchase_price=price,
-            tva=tva,
-            category=cleaned.get("category") or "",
-            barcode=cleaned["barcode"] or "",
-            internal_sku=cleaned["internal_sku"] or "",
-            matched_product=matched,
-            status="MATCHED" if matched else "PENDING",
-        )
-        lines_payload.append(
-            {
-                "id": line.id,
-                "name": line.raw_name,
-                "quantity": float(line.quantity or 0),
-                "unit": line.unit,
-                "purchase_price": line.purchase_price,
-                "tva": line.tva,
-                "category": line.category,
-                "barcode": line.barcode,
-                "internal_sku": line.internal_sku,
-                "matched_product_id": matched.id if matched else None,
-            }
+        matched, _ = matcher.match(cleaned)
+        lines.append(
+            ReceiptLine(
+                receipt=receipt,
+                line_number=idx,
+                raw_name=cleaned["name"],
+                quantity=qty,
+                unit=cleaned["unit"] or "pcs",
+                purchase_price=price,
+                tva=tva,
+                category=cleaned.get("category") or "",
+                barcode=cleaned["barcode"] or "",
+                internal_sku=cleaned["internal_sku"] or "",
+                matched_product=matched,
+                status="MATCHED" if matched else "PENDING",
+            )
         )
+    ReceiptLine.objects.bulk_create(lines, batch_size=RECEIPT_BULK_BATCH_SIZE)
+
+    lines_payload = [
+        {
+            "id": line.id,
+            "name": line.raw_name,
+            "quantity": float(line.quantity or 0),
+            "unit": line.unit,
+            "purchase_price": line.purchase_price,
+            "tva": line.tva,
+            "category": line.category,
+            "barcode": line.barcode,
+            "internal_sku": line.internal_sku,
+            "matched_product_id": line.matched_product_id,
+        }
+        for line in lines
+    ]
 
     _log_receipt_import_event(
         tenant=tenant,
@@ -3326,6 +3046,68 @@ def import_receipt(request):
     )
 
 
+def _apply_receipt_line_override(line, line_override):
+    """Corrections saisies à la validation ; renvoie les champs de ligne modifiés."""
+    updates = []
+    name_override = (line_override.get("name") or "").strip()
+    if name_override:
+        line.raw_name = name_override
+        updates.append("raw_name")
+    qty_override = _parse_receipt_number(line_override.get("quantity"))
+    if qty_override is not None and qty_override > 0:
+        line.quantity = qty_override
+        updates.append("quantity")
+    unit_override = (line_override.get("unit") or "").strip()
+    if unit_override:
+        line.unit = unit_override
+        updates.append("unit")
+    price_override = _parse_receipt_number(line_override.get("purchase_price"))
+    if price_override is not None:
+        line.purchase_price = price_override
+        updates.append("purchase_price")
+    tva_override = _parse_receipt_number(line_override.get("tva"))
+    if tva_override is not None:
+        line.tva = tva_override
+        updates.append("tva")
+    barcode_override = (line_override.get("barcode") or "").strip()
+    if barcode_override:
+        line.barcode = barcode_override
+        updates.append("barcode")
+    sku_override = (line_override.get("internal_sku") or "").strip()
+    if sku_override:
+        line.internal_sku = sku_override
+        updates.append("internal_sku")
+    category_override = (line_override.get("category") or "").strip()
+    if category_override:
+        line.category = category_override
+        updates.append("category")
+    return updates
+
+
+def _fill_product_from_receipt_line(product, line):
+    """Complète les champs vides du produit depuis la ligne ; renvoie les champs modifiés."""
+    updates = []
+    if line.barcode and not product.barcode:
+        product.barcode = line.barcode
+        updates.append("barcode")
+    if line.internal_sku and not product.internal_sku:
+        product.internal_sku = line.internal_sku
+        updates.append("internal_sku")
+    if line.category and not product.category:
+        product.category = line.category
+        updates.append("category")
+    if line.unit and not product.unit:
+        product.unit = line.unit
+        updates.append("unit")
+    if line.purchase_price is not None and product.purchase_price in (None, "", 0):
+        product.purchase_price = line.purchase_price
+        updates.append("purchase_price")
+    if line.tva is not None and product.tva in (None, ""):
+        product.tva = line.tva
+        updates.append("tva")
+    return updates
+
+
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated, ManagerPermission])
 def apply_receipt(request, receipt_id):
@@ -3344,72 +3126,63 @@ def apply_receipt(request, receipt_id):
             line_overrides_raw = {}
     line_overrides = line_overrides_raw if isinstance(line_overrides_raw, dict) else {}
     month = timezone.now().strftime("%Y-%m")
+    service = receipt.service
 
     applied = 0
-    with transaction.atomic():
-        for line in receipt.lines.select_for_update():
+    with transaction.atomic(), snapshot_batch():
+        lines = list(receipt.lines.select_for_update().order_by("line_number", "id"))
+        line_fields = {"matched_product", "status"}
+        for line in lines:
             line_override = line_overrides.get(str(line.id)) or line_overrides.get(line.id)
             if isinstance(line_override, dict) and line_override:
-                updates = []
-                name_override = (line_override.get("name") or "").strip()
-                if name_override:
-                    line.raw_name = name_override
-                    updates.append("raw_name")
-                qty_override = _parse_receipt_number(line_override.get("quantity"))
-                if qty_override is not None and qty_override > 0:
-                    line.quantity = qty_override
-                    updates.append("quantity")
-                unit_override = (line_override.get("unit") or "").strip()
-                if unit_override:
-                    line.unit = unit_override
-                    updates.append("unit")
-                price_override = _parse_receipt_number(line_override.get("purchase_price"))
-                if price_override is not None:
-                    line.purchase_price = price_override
-                    updates.append("purchase_price")
-                tva_override = _parse_receipt_number(line_override.get("tva"))
-                if tva_override is not None:
-                    line.tva = tva_override
-                    updates.append("tva")
-                barcode_override = (line_override.get("barcode") or "").strip()
-                if barcode_override:
-                    line.barcode = barcode_override
-                    updates.append("barcode")
-                sku_override = (line_override.get("internal_sku") or "").strip()
-                if sku_override:
-                    line.internal_sku = sku_override
-                    updates.append("internal_sku")
-                category_override = (line_override.get("category") or "").strip()
-                if category_override:
-                    line.category = category_override
-                    updates.append("category")
-                if updates:
-                    line.save(update_fields=updates)
+                line_fields.update(_apply_receipt_line_override(line, line_override))
 
+        decided = []
+        for line in lines:
             decision = decisions_map.get(str(line.id), {}) if decisions_map else {}
-            action = decision.get("action") or ("match" if line.matched_product else "create")
+            action = decision.get("action") or ("match" if line.matched_product_id else "create")
+            product_id = _parse_positive_int(decision.get("product_id") or line.matched_product_id, None)
+            decided.append((line, action, product_id))
 
+        # Produits du mois résolus en lot : un matcher (code-barres / SKU / nom) + une requête IN
+        # pour les produits désignés explicitement.
+        matcher = ProductMatcher(
+            tenant,
+            service,
+            month,
+            [
+                {"barcode": line.barcode, "internal_sku": line.internal_sku, "name": line.raw_name}
+                for line, action, _ in decided
+                if action == "match"
+            ],
+        )
+        products_by_id = {
+            product.id: product
+            for index in (matcher.by_barcode, matcher.by_sku, matcher.by_name)
+            for product in index.values()
+        }
+        wanted = {pid for _, action, pid in decided if action == "match" and pid and pid not in products_by_id}
+        if wanted:
+            for product in Product.objects.filter(id__in=wanted, tenant=tenant, service=service, inventory_month=month):
+                products_by_id[product.id] = product
+
+        targets = []
+        to_create = []
+        for line, action, product_id in decided:
             if action == "ignore":
                 line.status = "IGNORED"
-                line.save(update_fields=["status"])
                 continue
-
             product = None
             if action == "match":
-                product_id = decision.get("product_id") or (line.matched_product_id if line.matched_product_id else None)
-                if product_id:
-                    product = Product.objects.filter(id=product_id, tenant=tenant, service=receipt.service, inventory_month=month).first()
-                if not product:
-                    product = _match_product_from_line(tenant, receipt.service, {
-                        "barcode": line.barcode,
-                        "internal_sku": line.internal_sku,
-                        "name": line.raw_name,
-                    }, month)
-
+                product = products_by_id.get(product_id) if product_id else None
+                if product is None:
+                    product, _ = matcher.match(
+                        {"barcode": line.barcode, "internal_sku": line.internal_sku, "name": line.raw_name}
+                    )
             if action == "create" or product is None:
-                product = Product.objects.create(
+                product = Product(
                     tenant=tenant,
-                    service=receipt.service,
+                    service=service,
                     name=line.raw_name,
                     inventory_month=month,
                     quantity=0,
@@ -3418,35 +3191,68 @@ def apply_receipt(request, receipt_id):
                     internal_sku=line.internal_sku or "",
                     purchase_price=line.purchase_price,
                 )
-
-            updates = []
-            if line.barcode and not product.barcode:
-                product.barcode = line.barcode
-                updates.append("barcode")
-            if line.internal_sku and not product.internal_sku:
-                product.internal_sku = line.internal_sku
-                updates.append("internal_sku")
-            if line.category and not product.category:
-                product.category = line.category
-                updates.append("category")
-            if line.unit and not product.unit:
-                product.unit = line.unit
-                updates.append("unit")
-            if line.purchase_price is not None and product.purchase_price in (None, "", 0):
-                product.purchase_price = line.purchase_price
-                updates.append("purchase_price")
-            if line.tva is not None and product.tva in (None, ""):
-                product.tva = line.tva
-                updates.append("tva")
-
-            product.quantity = float(product.quantity or 0) + float(line.quantity or 0)
-            updates.append("quantity")
-            product.save(update_fields=updates)
+                to_create.append(product)
+                # Les lignes suivantes retrouvent ce produit, comme l'ancien traitement ligne à ligne.
+                matcher.register(product)
+            targets.append((line, product, action))
+
+        # Verrou des produits existants (ordre des id) puis stock relu sous verrou.
+        existing = {product.id: product for _, product, _ in targets if product.pk}
+        if existing:
+            for product_id, quantity in (
+                Product.objects.filter(id__in=existing).select_for_update().order_by("id").values_list("id", "quantity")
+            ):
+                existing[product_id].quantity = quantity
+                remember_quantity(existing[product_id])
+        previous_buckets = {pid: (product.category, product.purchase_price) for pid, product in existing.items()}
+
+        to_update = {}
+        product_fields = set()
+        received = []
+        for line, product, action in targets:
+            updates = _fill_product_from_receipt_line(product, line)
+            if updates and product.pk:
+                to_update[product.pk] = product
+                product_fields.update(updates)
+            received.append((product, line.quantity))
             line.matched_product = product
             line.status = "MATCHED" if action == "match" else "CREATED"
-            line.save(update_fields=["matched_product", "status"])
             applied += 1
 
+        if to_create:
+            Product.objects.bulk_create(to_create, batch_size=RECEIPT_BULK_BATCH_SIZE)
+            # bulk_create sans signaux : compteur TenantUsage incrémenté pour le lot.
+            adjust_products_count(tenant.id, len(to_create))
+            index_products(to_create)
+        if to_update:
+            Product.objects.bulk_update(
+                list(to_update.values()), sorted(product_fields), batch_size=RECEIPT_BULK_BATCH_SIZE
+            )
+            index_products(to_update.values())
+        for line, product, _ in targets:
+            line.matched_product_id = product.id
+        ReceiptLine.objects.bulk_update(lines, sorted(line_fields), batch_size=RECEIPT_BULK_BATCH_SIZE)
+
+        # Entrées de stock : un UPDATE relatif + mouvements « receipt » journalisés en lot.
+        deltas = {}
+        for product, qty in received:
+            deltas[product.id] = deltas.get(product.id, Decimal("0")) + Decimal(str(qty or 0))
+        apply_stock_deltas(
+            [*to_create, *existing.values()],
+            deltas,
+            kind="receipt",
+            reference=f"receipt:{receipt.id}",
+            user=request.user,
+        )
+
+        # bulk_* ne déclenchent pas de signaux : snapshots rafraîchis explicitement.
+        mark_products_dirty([*to_create, *to_update.values()])
+        for product in to_update.values():
+            old_category, old_price = previous_buckets[product.pk]
+            mark_bucket_dirty(product.tenant_id, product.service_id, product.inventory_month, old_category)
+            if old_category != product.category or old_price != product.purchase_price:
+                mark_product_losses_dirty(product.pk, old_category, product.category)
+
         receipt.status = "APPLIED"
         receipt.save(update_fields=["status"])
     logger.info(
@@ -3525,6 +3331,7 @@ def receipts_history(request):
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated, ManagerPermission])
 @renderer_classes([PDFRenderer])
+@offloadable("labels_pdf")
 def labels_pdf(request):
     tenant = get_tenant_for_request(request)
     check_entitlement(tenant, "labels_pdf")
@@ -10,9 +10,22 @@ cd "$BACKEND_DIR"
 echo "Running migrations..."
 python manage.py migrate --noinput
 
+echo "Building missing inventory snapshots..."
+python manage.py rebuild_inventory_snapshots --missing-only
+
+echo "Building missing POS daily rollups..."
+python manage.py rebuild_pos_rollups --missing-only
+
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Flux cuisine (SSE) activé : l'API doit être servie en ASGI (workers uvicorn) ; en WSGI sync,
+# chaque écran connecté bloquerait un worker.
+if [ "${KDS_STREAM_ENABLED:-false}" = "true" ]; then
+  echo "Starting gunicorn (ASGI, uvicorn workers) on :$PORT ..."
+  exec gunicorn inventory.asgi:application -k uvicorn_worker.UvicornWorker --bind "0.0.0.0:${PORT}"
+fi
+
 echo "Starting gunicorn on :$PORT ..."
 exec gunicorn inventory.wsgi:application --bind "0.0.0.0:${PORT}"
 
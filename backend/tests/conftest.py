@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.core.cache import cache
+
+from accounts.services.access import clear_access_cache
+from products.services.lookup import reset_off_cache
+from products.services.off_client import reset_off_client
+from products.services.search import reset_search_indexes
+
+
+@pytest.fixture(autouse=True)
+def _isolated_caches():
+    # Les ids sont réutilisés d'un test à l'autre (rollback) : pas de cache partagé entre tests.
+    cache.clear()
+    clear_access_cache()
+    reset_search_indexes()
+    reset_off_cache()
+    reset_off_client()
+    yield
+    cache.clear()
+    clear_access_cache()
+    reset_search_indexes()
+    reset_off_cache()
+    reset_off_client()
+
+
+class _OffStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        stub = self.server
+        code = self.path.rsplit("/", 1)[-1].removesuffix(".json")
+        with stub.lock:
+            stub.hits.append((code, self.client_address[1]))
+        if stub.delay:
+            time.sleep(stub.delay)
+        if stub.fail_status or code in stub.failing:
+            status, body = stub.fail_status or 503, {"status": 0}
+        elif code in stub.products:
+            status, body = 200, {"status": 1, "product": stub.products[code]}
+        else:
+            status, body = 404, {"status": 0, "status_verbose": "product not found"}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def off_stub(settings):
+    """Faux serveur OpenFoodFacts local : `products` {code: fiche}, `failing` / `fail_status`, `delay`, `hits`."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OffStubHandler)
+    server.daemon_threads = True
+    server.products, server.failing, server.fail_status, server.delay = {}, set(), None, 0
+    server.hits, server.lock = [], threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.OFF_BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+    reset_off_client()
+    yield server
+    reset_off_client()
+    server.shutdown()
+    server.server_close()
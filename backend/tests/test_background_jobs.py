@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+import time
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Service
+from jobs.models import BackgroundJob
+from jobs.services.runner import _Heartbeat, _finish, beat, claim_next_job, requeue_stale_jobs
+from products.models import Product, Receipt
+from .factories import TenantFactory, UserFactory
+
+
+def _auth_client(user):
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+@pytest.mark.django_db
+def test_async_export_is_queued_then_downloadable():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    Product.objects.create(tenant=tenant, service=service, name="Test A", inventory_month="2025-01", quantity=1)
+    client = _auth_client(user)
+
+    res = client.get(f"/api/exports/?service={service.id}&format=csv&async=1")
+    assert res.status_code == 202
+    job_id = res.json()["job_id"]
+    assert res.json()["status"] == "queued"
+    assert "async" not in BackgroundJob.objects.get(id=job_id).request_query
+
+    pending = client.get(f"/api/jobs/{job_id}/download/")
+    assert pending.status_code == 409
+
+    call_command("run_workers", "--once")
+
+    status = client.get(f"/api/jobs/{job_id}/")
+    assert status.status_code == 200
+    assert status.data["status"] == "succeeded"
+    assert status.data["progress"] == 100
+    assert status.data["filename"].endswith(".csv")
+
+    download = client.get(status.data["download_url"])
+    assert download.status_code == 200
+    assert download["Content-Type"].startswith("text/csv")
+    assert "attachment" in download["Content-Disposition"]
+    content = download.content.decode("utf-8-sig")
+    assert "Month" in content and "Test A" in content
+
+    # Un autre utilisateur ne voit pas le job.
+    other = _auth_client(UserFactory(profile=TenantFactory()))
+    assert other.get(f"/api/jobs/{job_id}/").status_code == 404
+
+
+@pytest.mark.django_db
+def test_async_receipt_import_replays_upload_and_reports_errors():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    client = _auth_client(user)
+
+    def _file():
+        content = "name,quantity,unit,barcode\nFarine,2,kg,\nBeurre,1,pcs,\n"
+        return SimpleUploadedFile("receipt.csv", content.encode("utf-8"), content_type="text/csv")
+
+    first = client.post("/api/receipts/import/?async=1", {"file": _file(), "supplier_name": "Metro"}, format="multipart")
+    second = client.post(
+        "/api/receipts/import/?async=1", {"file": _file(), "supplier_name": "Metro"}, format="multipart"
+    )
+    assert first.status_code == second.status_code == 202
+    assert Receipt.objects.count() == 0
+
+    call_command("run_workers", "--once")
+
+    ok = client.get(f"/api/jobs/{first.json()['job_id']}/").data
+    assert ok["status"] == "succeeded"
+    assert ok["result"]["lines"]
+    assert Receipt.objects.get(tenant=tenant).supplier_name == "Metro"
+
+    # Rejeu identique : le contrôle de doublon de la vue s'applique côté worker.
+    failed = client.get(f"/api/jobs/{second.json()['job_id']}/").data
+    assert failed["status"] == "failed"
+    assert failed["status_code"] == 409
+    assert failed["error"]["code"] == "RECEIPT_DUPLICATE_INVOICE"
+
+
+@pytest.mark.django_db
+def test_long_running_job_with_heartbeat_is_not_requeued_nor_overwritten():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    job = BackgroundJob.objects.create(tenant=tenant, user=user, kind="export_generic", request_path="/api/exports/")
+
+    first = claim_next_job("worker-a")
+    assert first.id == job.id and first.heartbeat_at is not None
+
+    # Démarré il y a une heure mais toujours vivant : le battement le protège.
+    long_ago = timezone.now() - timedelta(hours=1)
+    BackgroundJob.objects.filter(id=job.id).update(started_at=long_ago, heartbeat_at=long_ago)
+    assert beat(first)
+    assert requeue_stale_jobs(stale_after=60) == (0, 0)
+
+    # Plus de battement : remis en file, repris par un autre worker.
+    BackgroundJob.objects.filter(id=job.id).update(heartbeat_at=long_ago)
+    assert requeue_stale_jobs(stale_after=60) == (1, 0)
+    assert not beat(first)
+    second = claim_next_job("worker-b")
+    assert second.id == job.id and second.attempts == 2
+
+    # Le résultat tardif du premier worker n'écrase pas le job repris.
+    assert not _finish(first, BackgroundJob.STATUS_FAILED, error={"detail": "tard"})
+    job.refresh_from_db()
+    assert job.status == BackgroundJob.STATUS_RUNNING and job.worker_id == "worker-b"
+    assert _finish(second, BackgroundJob.STATUS_SUCCEEDED, result_status_code=200)
+    job.refresh_from_db()
+    assert job.status == BackgroundJob.STATUS_SUCCEEDED and job.error is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_heartbeat_thread_refreshes_running_job():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    BackgroundJob.objects.create(tenant=tenant, user=user, kind="export_generic", request_path="/api/exports/")
+    job = claim_next_job("worker-a")
+    long_ago = timezone.now() - timedelta(hours=1)
+    BackgroundJob.objects.filter(id=job.id).update(heartbeat_at=long_ago)
+
+    with _Heartbeat(job, interval=0.05):
+        time.sleep(0.3)
+
+    job.refresh_from_db()
+    assert job.heartbeat_at > long_ago
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import OrganizationOverrides, Plan, Tenant
+from accounts.services.access import check_entitlement, clear_access_cache, get_entitlements, get_limits
+from accounts.views import _set_tenant_plan_active
+from .factories import TenantFactory
+
+
+def _overrides_queries(ctx):
+    return [q for q in ctx.captured_queries if "organizationoverrides" in q["sql"].lower()]
+
+
+@pytest.mark.django_db
+def test_entitlements_are_loaded_once_per_access_version():
+    tenant = Tenant.objects.select_related("plan").get(pk=TenantFactory().pk)
+
+    with CaptureQueriesContext(connection) as ctx:
+        for _ in range(5):
+            get_entitlements(tenant)
+            get_limits(tenant)
+    assert len(_overrides_queries(ctx)) == 1
+
+    # Cache process vidé : relu depuis le cache partagé, sans requête.
+    clear_access_cache()
+    with CaptureQueriesContext(connection) as ctx:
+        get_limits(tenant)
+    assert ctx.captured_queries == []
+
+    # Les appelants peuvent modifier le résultat sans polluer le cache.
+    get_entitlements(tenant).append("hacked")
+    assert "hacked" not in get_entitlements(tenant)
+
+
+@pytest.mark.django_db
+def test_plan_change_is_visible_immediately():
+    tenant = TenantFactory()
+    assert "reports_advanced" not in get_entitlements(tenant)
+
+    _set_tenant_plan_active(tenant, "PRO", "MONTHLY", "ACTIVE", timezone.now() + timedelta(days=30))
+    assert "reports_advanced" in get_entitlements(Tenant.objects.get(pk=tenant.pk))
+    check_entitlement(tenant, "reports_advanced")
+
+
+@pytest.mark.django_db
+def test_overrides_changes_invalidate_cache():
+    tenant = TenantFactory()
+    assert get_limits(tenant)["max_products"] == 100
+
+    overrides = OrganizationOverrides.objects.create(tenant=tenant, custom_limits={"max_products": 5000})
+    assert get_limits(tenant)["max_products"] == 5000
+
+    overrides.delete()
+    assert get_limits(Tenant.objects.get(pk=tenant.pk))["max_products"] == 100
+
+
+@pytest.mark.django_db
+def test_plan_edit_and_stale_full_save_keep_versions_consistent():
+    tenant = TenantFactory()
+    plan, _ = Plan.objects.get_or_create(code="PRO", defaults={"name": "PRO"})
+
+    tenant.plan = plan
+    tenant.license_expires_at = timezone.now() + timedelta(days=30)
+    tenant.save()
+    assert tenant.access_version == 1
+    assert "reports_advanced" in get_entitlements(tenant)
+
+    # Instance chargée avant un bump : un save() complet ne fait pas régresser la version.
+    stale = Tenant.objects.get(pk=tenant.pk)
+    OrganizationOverrides.objects.create(tenant=tenant, custom_limits={"max_products": 42})
+    stale.name = "Renommé"
+    stale.save()
+    assert stale.access_version == 2
+    assert get_limits(stale)["max_products"] == 42
+
+    plan.name = "Pro"
+    plan.save()
+    assert Tenant.objects.get(pk=tenant.pk).access_version == 3
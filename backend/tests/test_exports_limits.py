@@ -89,7 +89,7 @@ def test_export_global_service_all_csv_limit():
     client = _auth_client(user)
     res1 = client.get("/api/exports/?service=all&format=csv")
     assert res1.status_code == 200
-    content = res1.content.decode("utf-8-sig")
+    content = b"".join(res1.streaming_content).decode("utf-8-sig")
     assert "Month" in content
     assert "Test A" in content
     assert "Test B" in content
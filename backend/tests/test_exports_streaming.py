@@ -0,0 +1,140 @@
+import io
+from datetime import timedelta
+
+import openpyxl
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Plan, Service
+from products.models import Product
+from products.views import _build_csv_bytes, _iter_csv_chunks
+from .factories import TenantFactory, UserFactory
+
+
+def _auth_client(user):
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+def test_csv_chunks_keep_title_and_delimiter():
+    headers = ["Nom", "Qté"]
+    rows = ([f"P{idx}", idx] for idx in range(20000))
+    chunks = list(_iter_csv_chunks(headers, rows, title="Inventaire"))
+    assert len(chunks) > 1
+    content = b"".join(chunks).decode("utf-8")
+    assert content.startswith("﻿sep=;\nInventaire;\r\nNom;Qté\r\nP0;0\r\n")
+    assert content == _build_csv_bytes(headers, [[f"P{idx}", idx] for idx in range(20000)], title="Inventaire").decode(
+        "utf-8"
+    )
+
+
+def _seed_products():
+    tenant = TenantFactory()
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    for idx in range(3):
+        Product.objects.create(
+            tenant=tenant,
+            service=service,
+            name=f"Produit {idx}",
+            inventory_month="2025-01",
+            quantity=idx + 1,
+            conversion_unit="kg",
+            conversion_factor="0.5",
+            variant_name="Format",
+            variant_value="1L",
+        )
+    return _auth_client(UserFactory(profile=tenant)), service
+
+
+@pytest.mark.django_db
+def test_generic_csv_export_is_streamed():
+    client, service = _seed_products()
+    res = client.get(f"/api/exports/?service={service.id}&format=csv")
+    assert res.status_code == 200
+    assert res.streaming
+    assert 'filename="' in res["Content-Disposition"]
+    lines = b"".join(res.streaming_content).decode("utf-8-sig").splitlines()
+    assert lines[0] == "sep=;"
+    assert lines[2].startswith("Month;Service;Category;ProductName")
+    assert "2025-01;Principal;;Produit 0;Format: 1L;SEALED;1.0;pcs;;0.5;kg" in lines[3]
+    assert len(lines) == 6
+
+
+@pytest.mark.django_db
+def test_advanced_csv_export_is_streamed():
+    # Quota CSV mensuel : un tenant par export.
+    client, service = _seed_products()
+    res = client.post(
+        "/api/export-advanced/",
+        {"service": service.id, "format": "csv", "include_summary": False, "fields": ["name", "service"]},
+        format="json",
+    )
+    assert res.status_code == 200
+    assert res.streaming
+    lines = b"".join(res.streaming_content).decode("utf-8-sig").splitlines()
+    assert lines[2] == "Nom;Service"
+    assert lines[3:] == ["Produit 0;Principal", "Produit 1;Principal", "Produit 2;Principal"]
+
+
+def _pro_client():
+    tenant = TenantFactory()
+    plan, _ = Plan.objects.get_or_create(code="PRO", defaults={"name": "Multi"})
+    tenant.plan = plan
+    tenant.license_expires_at = timezone.now() + timedelta(days=30)
+    tenant.save(update_fields=["plan", "license_expires_at"])
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    service.features = {"item_type": {"enabled": True}}
+    service.save(update_fields=["features"])
+    return _auth_client(UserFactory(profile=tenant)), service
+
+
+@pytest.mark.django_db
+def test_xlsx_export_keeps_styling_and_summary():
+    client, service = _pro_client()
+    for idx, (category, role) in enumerate([("sec", None), ("sec", "raw_material"), ("frais", None)]):
+        Product.objects.create(
+            tenant=service.tenant,
+            service=service,
+            name=f"Produit {idx}",
+            category=category,
+            inventory_month="2025-01",
+            quantity=2,
+            purchase_price="1.50",
+            selling_price="4.00",
+            product_role=role,
+        )
+
+    res = client.get(f"/api/export-excel/?month=2025-01&service={service.id}")
+    assert res.status_code == 200
+    ws = openpyxl.load_workbook(io.BytesIO(res.content)).active
+    assert ws.title == "Inventaire 2025-01"
+    assert "A1:K1" in {str(rng) for rng in ws.merged_cells.ranges}
+    assert ws.freeze_panes == "A3"
+    assert ws.auto_filter.ref == "A2:K5"
+    assert ws["A2"].value == "Nom" and ws["A2"].fill.start_color.rgb.endswith("1E293B")
+    assert ws["C3"].value == 1.5 and ws["C3"].number_format == "#,##0.00"
+    assert ws["A4"].fill.start_color.rgb.endswith("F8FAFC")
+    assert ws.column_dimensions["A"].width == 42
+    assert ws.column_dimensions["B"].width == 11
+
+    res = client.post(
+        "/api/export-advanced/",
+        {"service": service.id, "format": "xlsx", "include_summary": True, "include_charts": True},
+        format="json",
+    )
+    assert res.status_code == 200
+    wb = openpyxl.load_workbook(io.BytesIO(res.content))
+    assert wb.sheetnames == ["Export avancé", "Synthèse"]
+    assert wb["Export avancé"].max_row == 5
+    summary = wb["Synthèse"]
+    assert summary["A3"].value == "Produits" and summary["B3"].value == 3
+    assert summary["B6"].value == 16.0  # vente hors matière première
+    assert summary["B8"].value == "Valeur de vente exclut les matières premières."
+    assert [summary.cell(row=12, column=col).value for col in range(1, 5)] == ["frais", 2, 3, 8]
+    assert [summary.cell(row=13, column=col).value for col in range(1, 5)] == ["sec", 4, 6, 8]
+    assert summary["A12"].fill.start_color.rgb.endswith("F8FAFC")
+    assert len(summary._charts) == 1
@@ -1,11 +1,16 @@
+import io
 import pytest
 from decimal import Decimal
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from accounts.models import OrganizationOverrides
 from .factories import TenantFactory, UserFactory
+from products.inventory_import import INVENTORY_IMPORT_SNIFF_BYTES
 from products.models import Product, Service
 
 
@@ -87,3 +92,212 @@ def test_inventory_import_row_overrides_apply():
     pain = Product.objects.filter(tenant=tenant, service=service, name="Pain").first()
     assert pain is not None
     assert pain.quantity == Decimal("10")
+
+
+def _catalog_csv(count, offset=0):
+    lines = ["designation,quantity,prix_achat,code_barres,categorie"]
+    for idx in range(offset, offset + count):
+        lines.append(f"Produit {idx},{idx % 7},1.{idx % 10}0,BC-{idx},cat-{idx % 4}")
+    return SimpleUploadedFile("catalog.csv", "\n".join(lines).encode("utf-8"), content_type="text/csv")
+
+
+def _preview_and_commit(client, service, upload, **commit_data):
+    res = client.post(
+        f"/api/imports/inventory/preview/?service={service.id}",
+        {"file": upload},
+        format="multipart",
+    )
+    assert res.status_code == 200
+    with CaptureQueriesContext(connection) as ctx:
+        commit = client.post(
+            f"/api/imports/inventory/commit/?service={service.id}",
+            {"preview_id": res.data["preview_id"], **commit_data},
+            format="json",
+        )
+    assert commit.status_code == 200
+    return commit.data, len(ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_inventory_import_commit_queries_do_not_scale_with_rows():
+    tenant = TenantFactory()
+    # 200 produits : au-delà de la limite du plan gratuit, réservée à l'import.
+    OrganizationOverrides.objects.create(tenant=tenant, custom_limits={"max_products": 1000})
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+
+    small, small_queries = _preview_and_commit(client, service, _catalog_csv(5), qty_mode="set")
+    assert small["created_count"] == 5
+
+    # 5 lignes existantes mises à jour + 195 nouvelles, même nombre de catégories
+    big, big_queries = _preview_and_commit(client, service, _catalog_csv(200), qty_mode="set")
+    assert big["created_count"] == 195
+    assert big["updated_count"] == 5
+    assert big_queries <= small_queries + 6
+    assert Product.objects.filter(tenant=tenant, service=service).count() == 200
+
+
+@pytest.mark.django_db
+def test_inventory_import_commit_matches_rows_created_earlier_in_same_file():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+    content = (
+        "designation,quantity,code_barres\n"
+        "Eau,3,EAU-1\n"
+        "Eau plate,5,EAU-1\n"
+        "EAU,7,\n"
+    )
+    upload = SimpleUploadedFile("dups.csv", content.encode("utf-8"), content_type="text/csv")
+
+    data, _ = _preview_and_commit(client, service, upload, qty_mode="set")
+    assert data["created_count"] == 1
+    assert data["updated_count"] == 2
+    product = Product.objects.get(tenant=tenant, service=service)
+    assert product.name == "Eau"
+    assert product.quantity == Decimal("7")
+
+
+@pytest.mark.django_db
+def test_inventory_import_matches_existing_names_with_accented_capitals():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+
+    first = SimpleUploadedFile("a.csv", "designation,quantity\nÉclair CRÈME,2\n".encode("utf-8"), content_type="text/csv")
+    data, _ = _preview_and_commit(client, service, first, qty_mode="set")
+    assert data["created_count"] == 1
+
+    # LOWER() de SQLite ne replie pas « É » / « È » : la correspondance doit se faire côté Python.
+    second = SimpleUploadedFile("b.csv", "designation,quantity\néclair crème,5\n".encode("utf-8"), content_type="text/csv")
+    data, _ = _preview_and_commit(client, service, second, qty_mode="set")
+    assert data["created_count"] == 0
+    assert data["updated_count"] == 1
+    product = Product.objects.get(tenant=tenant, service=service)
+    assert product.name == "Éclair CRÈME"
+    assert product.quantity == Decimal("5")
+
+
+@pytest.mark.django_db
+def test_inventory_import_preview_pages_and_chunked_commit(monkeypatch):
+    monkeypatch.setattr("products.inventory_import.INVENTORY_IMPORT_PAGE_SIZE", 3)
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+
+    res = client.post(
+        f"/api/imports/inventory/preview/?service={service.id}",
+        {"file": _catalog_csv(8)},
+        format="multipart",
+    )
+    assert res.status_code == 200
+    preview_id = res.data["preview_id"]
+    assert res.data["stats"]["total"] == 8
+    assert res.data["pagination"] == {"page": 1, "page_size": 3, "page_count": 3}
+    assert [row["row_id"] for row in res.data["rows"]] == [1, 2, 3]
+
+    page = client.get(f"/api/imports/inventory/preview/{preview_id}/?service={service.id}&page=3")
+    assert page.status_code == 200
+    assert [row["row_id"] for row in page.data["rows"]] == [7, 8]
+    assert client.get(f"/api/imports/inventory/preview/{preview_id}/?service={service.id}&page=4").status_code == 400
+
+    commit = client.post(
+        f"/api/imports/inventory/commit/?service={service.id}",
+        {"preview_id": preview_id, "qty_mode": "set", "row_overrides": {"8": {"quantity": "42"}}},
+        format="json",
+    )
+    assert commit.status_code == 200
+    assert commit.data["created_count"] == 8
+    assert Product.objects.get(tenant=tenant, service=service, barcode="BC-7").quantity == Decimal("42")
+
+    progress = client.get(f"/api/imports/inventory/commit/{preview_id}/progress/?service={service.id}")
+    assert progress.status_code == 200
+    assert progress.data["status"] == "done"
+    assert progress.data["processed"] == 8
+
+
+@pytest.mark.django_db
+def test_inventory_import_reads_month_names_once_per_pass(monkeypatch):
+    monkeypatch.setattr("products.inventory_import.INVENTORY_IMPORT_PAGE_SIZE", 3)
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+    _preview_and_commit(client, service, _catalog_csv(4), qty_mode="set")
+
+    def _name_scans(queries):
+        scan = 'SELECT "products_product"."id" AS "id", "products_product"."name" AS "name" FROM'
+        return sum(q["sql"].startswith(scan) for q in queries)
+
+    with CaptureQueriesContext(connection) as preview_ctx:
+        res = client.post(
+            f"/api/imports/inventory/preview/?service={service.id}",
+            {"file": _catalog_csv(9)},
+            format="multipart",
+        )
+    assert res.status_code == 200 and res.data["pagination"]["page_count"] == 3
+    with CaptureQueriesContext(connection) as commit_ctx:
+        commit = client.post(
+            f"/api/imports/inventory/commit/?service={service.id}",
+            {"preview_id": res.data["preview_id"], "qty_mode": "set"},
+            format="json",
+        )
+    assert commit.status_code == 200
+    assert commit.data["created_count"] == 5 and commit.data["updated_count"] == 4
+    assert _name_scans(preview_ctx.captured_queries) == 1
+    assert _name_scans(commit_ctx.captured_queries) == 1
+    assert Product.objects.filter(tenant=tenant, service=service).count() == 9
+
+
+@pytest.mark.django_db
+def test_inventory_import_streams_latin1_csv_and_xlsx():
+    import openpyxl
+
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+
+    latin1 = SimpleUploadedFile(
+        "latin1.csv",
+        "désignation;quantité\nCafé;3\nThé;2\n".encode("latin-1"),
+        content_type="text/csv",
+    )
+    res = client.post(f"/api/imports/inventory/preview/?service={service.id}", {"file": latin1}, format="multipart")
+    assert res.status_code == 200
+    assert [row["name"] for row in res.data["rows"]] == ["Café", "Thé"]
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["Désignation", "Quantité"])
+    ws.append(["Sucre", 4])
+    ws.append([None, None])
+    ws.append(["Sel", 1])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    xlsx = SimpleUploadedFile("stock.xlsx", buffer.getvalue())
+    res = client.post(f"/api/imports/inventory/preview/?service={service.id}", {"file": xlsx}, format="multipart")
+    assert res.status_code == 200
+    assert [row["name"] for row in res.data["rows"]] == ["Sucre", "Sel"]
+
+
+@pytest.mark.django_db
+def test_inventory_import_latin1_accents_after_sniff_window():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+
+    # Premier bloc purement ASCII, premier « é » Latin-1 bien au-delà.
+    lines = ["designation;quantity"] + [f"Produit {idx};1" for idx in range(5000)] + ["Crème brûlée;2"]
+    upload = SimpleUploadedFile("late.csv", "\n".join(lines).encode("latin-1"), content_type="text/csv")
+    res = client.post(f"/api/imports/inventory/preview/?service={service.id}", {"file": upload}, format="multipart")
+    assert res.status_code == 200
+    assert INVENTORY_IMPORT_SNIFF_BYTES < len(upload) - len("Crème brûlée;2")
+    assert res.data["stats"]["total"] == 5001
+    page = client.get(f"/api/imports/inventory/preview/{res.data['preview_id']}/?service={service.id}&page=11")
+    assert page.data["rows"][-1]["name"] == "Crème brûlée"
@@ -0,0 +1,194 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Plan, Service
+from products.models import LossEvent, MonthlyServiceSnapshot, Product
+from products.services.snapshots import refresh_bucket, snapshot_batch
+from products.services.stock import apply_stock_deltas, lock_products
+from products.services.stats import compute_inventory_stats, compute_inventory_stats_from_snapshots
+from .factories import TenantFactory, UserFactory
+
+
+def _auth_client(user):
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+def _snapshot(service, month, category):
+    return MonthlyServiceSnapshot.objects.filter(service=service, inventory_month=month, category=category).first()
+
+
+def _loss(product, qty, reason="breakage", month="2025-06"):
+    return LossEvent.objects.create(
+        tenant=product.tenant,
+        service=product.service,
+        product=product,
+        occurred_at=timezone.now(),
+        inventory_month=month,
+        quantity=qty,
+        reason=reason,
+    )
+
+
+@pytest.mark.django_db
+def test_snapshot_follows_product_and_loss_writes():
+    tenant = TenantFactory()
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    product = Product.objects.create(
+        tenant=tenant,
+        service=service,
+        name="Farine",
+        category="sec",
+        inventory_month="2025-06",
+        quantity=10,
+        purchase_price="2.00",
+        selling_price="3.00",
+    )
+    snap = _snapshot(service, "2025-06", "sec")
+    assert snap.product_count == 1
+    assert float(snap.purchase_value) == 20.0
+    assert snap.missing_identifier_count == 1
+
+    _loss(product, 2)
+    snap.refresh_from_db()
+    assert snap.loss_count == 1
+    assert float(snap.losses_cost) == 4.0
+    assert snap.losses_by_reason["breakage"]["qty"] == 2.0
+
+    product.category = "frais"
+    product.save()
+    assert _snapshot(service, "2025-06", "sec") is None
+    moved = _snapshot(service, "2025-06", "frais")
+    assert moved.product_count == 1
+    assert moved.loss_count == 1
+
+    product.delete()
+    orphan = _snapshot(service, "2025-06", None)
+    assert _snapshot(service, "2025-06", "frais") is None
+    assert orphan.product_count == 0
+    assert orphan.loss_count == 1
+
+
+@pytest.mark.django_db
+def test_snapshot_stats_match_live_computation():
+    tenant = TenantFactory()
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    with snapshot_batch():
+        for idx, category in enumerate(["sec", "sec", "frais", None]):
+            product = Product.objects.create(
+                tenant=tenant,
+                service=service,
+                name=f"P{idx}",
+                category=category,
+                inventory_month="2025-06",
+                quantity=idx + 1,
+                purchase_price="1.50",
+                selling_price="4.00",
+                product_role="raw_material" if idx == 1 else None,
+                conversion_unit="kg",
+                conversion_factor="0.25",
+            )
+            _loss(product, 1, reason="expired" if idx % 2 else "breakage")
+    assert MonthlyServiceSnapshot.objects.filter(service=service).count() == 3
+
+    products = Product.objects.filter(tenant=tenant, service=service, inventory_month="2025-06")
+    losses = LossEvent.objects.filter(tenant=tenant, service=service, inventory_month="2025-06")
+    rows = list(MonthlyServiceSnapshot.objects.filter(service=service, inventory_month="2025-06"))
+    for item_type_enabled in (False, True):
+        live = compute_inventory_stats(products, losses, item_type_enabled=item_type_enabled)
+        snap = compute_inventory_stats_from_snapshots(rows, products, losses, item_type_enabled=item_type_enabled)
+        assert snap == live
+
+
+@pytest.mark.django_db
+def test_rebuild_command_restores_snapshots():
+    tenant = TenantFactory()
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    Product.objects.create(tenant=tenant, service=service, name="A", category="sec", inventory_month="2025-06", quantity=3)
+    MonthlyServiceSnapshot.objects.all().delete()
+
+    call_command("rebuild_inventory_snapshots", "--missing-only")
+    assert _snapshot(service, "2025-06", "sec").product_count == 1
+
+    MonthlyServiceSnapshot.objects.filter(service=service).update(product_count=99)
+    call_command("rebuild_inventory_snapshots", "--tenant", str(tenant.id))
+    assert _snapshot(service, "2025-06", "sec").product_count == 1
+
+
+@pytest.mark.django_db
+def test_rituals_read_snapshot_counters():
+    tenant = TenantFactory()
+    plan, _ = Plan.objects.get_or_create(code="BOUTIQUE", defaults={"name": "Duo"})
+    tenant.plan = plan
+    tenant.license_expires_at = timezone.now() + timedelta(days=30)
+    tenant.save(update_fields=["plan", "license_expires_at"])
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    Product.objects.create(tenant=tenant, service=service, name="Sans id", category="", inventory_month="2025-06")
+    Product.objects.create(
+        tenant=tenant,
+        service=service,
+        name="Bas",
+        category="sec",
+        inventory_month="2025-06",
+        barcode="RIT-1",
+        quantity=1,
+        min_qty=5,
+    )
+
+    res = _auth_client(user).get(f"/api/rituals/?month=2025-06&service={service.id}")
+    assert res.status_code == 200
+    ritual = res.json()["rituals"][0]
+    assert ritual["summary"].startswith("2 produit(s) suivis")
+    low_stock = next(item for item in ritual["items"] if item["label"] == "Stocks bas")
+    assert low_stock["value"] == 1
+
+
+@pytest.mark.django_db
+def test_stock_deltas_adjust_snapshot_like_full_refresh():
+    tenant = TenantFactory()
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    products = [
+        Product.objects.create(
+            tenant=tenant,
+            service=service,
+            name=f"S{idx}",
+            category="sec",
+            inventory_month="2025-06",
+            quantity=qty,
+            min_qty=4,
+            purchase_price="1.25",
+            selling_price="3.00",
+            product_role="raw_material" if idx == 0 else None,
+            conversion_unit="kg",
+            conversion_factor="0.5",
+        )
+        for idx, qty in enumerate([5, 3, 1])
+    ]
+    with transaction.atomic():
+        apply_stock_deltas(lock_products(Product.objects.filter(tenant=tenant)), {p.id: -1 for p in products})
+
+    fields = [
+        "total_quantity",
+        "purchase_value",
+        "selling_value",
+        "raw_material_selling_value",
+        "low_stock_count",
+        "low_qty_count",
+        "out_of_stock_count",
+        "converted_totals",
+    ]
+    adjusted = _snapshot(service, "2025-06", "sec")
+    adjusted = {field: getattr(adjusted, field) for field in fields}
+    refresh_bucket(tenant.id, service.id, "2025-06", "sec")
+    rebuilt = _snapshot(service, "2025-06", "sec")
+    assert adjusted == {field: getattr(rebuilt, field) for field in fields}
+    assert adjusted["out_of_stock_count"] == 1
@@ -1,4 +1,11 @@
+import asyncio
+import json
+import threading
+
 import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
 from decimal import Decimal
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -6,7 +13,10 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from accounts.models import Service
 from products.models import Product
 from pos.models import PosTicket
-from kds.models import MenuItem, RecipeItem, StockConsumption, WasteEvent
+from kds.models import MenuItem, OrderLine, RecipeItem, StockConsumption, WasteEvent
+from kds.services import orders as kds_orders
+from kds.services.events import broker
+from pos.services.checkout import perform_checkout
 from .factories import TenantFactory, UserFactory
 
 
@@ -234,3 +244,267 @@ def test_kds_mark_paid_creates_pos_ticket():
     assert PosTicket.objects.filter(tenant=tenant, service=service).count() == 1
     ingredient.refresh_from_db()
     assert ingredient.quantity == Decimal("9")
+
+
+@pytest.mark.django_db
+def test_kds_kitchen_stream_pushes_order_deltas(django_capture_on_commit_callbacks, settings):
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    _enable_kds(service)
+    ingredient = Product.objects.create(
+        tenant=tenant,
+        service=service,
+        name="Pâtes",
+        quantity=Decimal("10"),
+        selling_price=Decimal("1.00"),
+        inventory_month="2025-01",
+    )
+    menu_item = MenuItem.objects.create(tenant=tenant, service=service, name="Carbonara", price=Decimal("11.00"))
+    RecipeItem.objects.create(menu_item=menu_item, ingredient_product=ingredient, qty=Decimal("1"))
+
+    client = _auth_client(user)
+    order_id = client.post(
+        "/api/kds/orders/", {"lines": [{"menu_item_id": menu_item.id, "qty": "1"}]}, format="json"
+    ).data["id"]
+
+    # Désactivé par défaut (déploiement WSGI) : les écrans restent sur le feed.
+    assert client.get("/api/kds/kitchen/feed/?cursor=0").data["stream"] is False
+    assert client.get("/api/kds/kitchen/stream/").status_code == 404
+    settings.KDS_STREAM_ENABLED = True
+    assert client.get("/api/kds/kitchen/feed/?cursor=0").data["stream"] is True
+
+    # EventSource n'envoie pas d'en-tête : ticket court à usage unique, jamais le jeton d'accès.
+    stream_client = APIClient()
+    assert stream_client.get("/api/kds/kitchen/stream/").status_code == 401
+    token = RefreshToken.for_user(user).access_token
+    assert stream_client.get(f"/api/kds/kitchen/stream/?token={token}").status_code == 401
+    ticket = client.post("/api/kds/kitchen/stream/ticket/").data["ticket"]
+    assert str(token) not in ticket
+
+    def transition(action):
+        with django_capture_on_commit_callbacks(execute=True):
+            assert client.post(f"/api/kds/orders/{order_id}/{action}/", {}, format="json").status_code == 200
+
+    async def next_event(stream):
+        while True:
+            chunk = await asyncio.wait_for(stream.__anext__(), timeout=2)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n") if ": " in line)
+            if "event" in fields:
+                return fields["event"], json.loads(fields["data"])
+
+    async def scenario():
+        res = await sync_to_async(stream_client.get)(f"/api/kds/kitchen/stream/?ticket={ticket}")
+        assert res.status_code == 200
+        assert res["Content-Type"] == "text/event-stream"
+        stream = res.streaming_content
+        assert (await next_event(stream))[0] == "hello"
+        assert broker.subscriber_count(service.id) == 1
+
+        await sync_to_async(transition)("send")
+        name, event = await next_event(stream)
+        assert (name, event["order"]["id"], event["order"]["status"]) == ("order.sent", order_id, "SENT")
+        assert event["order"]["lines"][0]["menu_item_name"] == "Carbonara"
+
+        await sync_to_async(transition)("ready")
+        name, event = await next_event(stream)
+        assert (name, event["order"]["status"]) == ("order.ready", "READY")
+        assert "lines" not in event["order"]
+        await stream.aclose()
+
+    async_to_sync(scenario)()
+    assert broker.subscriber_count(service.id) == 0
+    # Ticket consommé : pas de rejeu.
+    assert stream_client.get(f"/api/kds/kitchen/stream/?ticket={ticket}").status_code == 401
+
+
+@pytest.mark.django_db
+def test_kds_kitchen_feed_cursor_deltas_and_etag():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    _enable_kds(service)
+    ingredient = Product.objects.create(
+        tenant=tenant,
+        service=service,
+        name="Riz",
+        quantity=Decimal("10"),
+        selling_price=Decimal("1.00"),
+        inventory_month="2025-01",
+    )
+    menu_item = MenuItem.objects.create(tenant=tenant, service=service, name="Risotto", price=Decimal("12.00"))
+    RecipeItem.objects.create(menu_item=menu_item, ingredient_product=ingredient, qty=Decimal("1"))
+
+    client = _auth_client(user)
+    order_ids = [
+        client.post("/api/kds/orders/", {"lines": [{"menu_item_id": menu_item.id, "qty": "1"}]}, format="json").data[
+            "id"
+        ]
+        for _ in range(2)
+    ]
+    for order_id in order_ids:
+        client.post(f"/api/kds/orders/{order_id}/send/", {}, format="json")
+
+    snapshot = client.get("/api/kds/kitchen/feed/?cursor=0")
+    assert snapshot.status_code == 200 and snapshot.data["full"] is True
+    assert sorted(order["id"] for order in snapshot.data["orders"]) == sorted(order_ids)
+    cursor, etag = snapshot.data["cursor"], snapshot["ETag"]
+
+    unchanged = client.get(f"/api/kds/kitchen/feed/?cursor={cursor}", HTTP_IF_NONE_MATCH=etag)
+    assert unchanged.status_code == 304
+    assert client.get("/api/kds/orders/open/", HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    client.post(f"/api/kds/orders/{order_ids[0]}/ready/", {}, format="json")
+    client.post(f"/api/kds/orders/{order_ids[1]}/served/", {}, format="json")
+    delta = client.get(f"/api/kds/kitchen/feed/?cursor={cursor}", HTTP_IF_NONE_MATCH=etag)
+    assert delta.status_code == 200 and delta.data["full"] is False
+    assert [(order["id"], order["status"]) for order in delta.data["orders"]] == [(order_ids[0], "READY")]
+    assert delta.data["removed"] == [order_ids[1]]
+    assert delta.data["cursor"] > cursor and delta["ETag"] != etag
+
+    # Une ligne modifiée seule fait repartir la commande dans les deltas.
+    cursor = delta.data["cursor"]
+    line = OrderLine.objects.get(order_id=order_ids[0])
+    line.notes = "Sans parmesan"
+    line.save()
+    delta = client.get(f"/api/kds/kitchen/feed/?cursor={cursor}")
+    assert delta.data["orders"][0]["lines"][0]["notes"] == "Sans parmesan"
+
+
+@pytest.mark.django_db
+def test_kds_menu_availability_batch_cache_and_what_if(django_capture_on_commit_callbacks):
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    _enable_kds(service)
+    farine = Product.objects.create(
+        tenant=tenant, service=service, name="Farine", quantity=Decimal("10"), inventory_month="2025-01"
+    )
+    oeufs = Product.objects.create(
+        tenant=tenant, service=service, name="Oeufs", quantity=Decimal("6"), inventory_month="2025-01"
+    )
+    dishes = {}
+    for name, recipe in {
+        "Crêpe": [(farine, "1"), (oeufs, "1")],
+        "Gaufre": [(farine, "2"), (oeufs, "2")],
+        "Pain": [(farine, "1")],
+    }.items():
+        dishes[name] = MenuItem.objects.create(tenant=tenant, service=service, name=name, price=Decimal("3.00"))
+        for product, qty in recipe:
+            RecipeItem.objects.create(menu_item=dishes[name], ingredient_product=product, qty=Decimal(qty))
+
+    client = _auth_client(user)
+    res = client.get("/api/kds/menu-items/availability/")
+    counts = {row["menu_item_id"]: row["available_count"] for row in res.data}
+    assert counts == {dishes["Crêpe"].id: 6, dishes["Gaufre"].id: 3, dishes["Pain"].id: 10}
+
+    # Deuxième lecture : ni recette ni stock relus.
+    with CaptureQueriesContext(connection) as ctx:
+        listing = client.get("/api/kds/menu-items/?with_availability=1")
+    assert not [q for q in ctx.captured_queries if "kds_recipeitem" in q["sql"] or "products_product" in q["sql"]]
+    assert {row["name"]: row["available_count"] for row in listing.data}["Gaufre"] == 3
+
+    with django_capture_on_commit_callbacks(execute=True):
+        oeufs.quantity = Decimal("2")
+        oeufs.save()
+    res = client.get(f"/api/kds/menu-items/{dishes['Crêpe'].id}/availability/")
+    assert res.data["available_count"] == 2
+
+    what_if = client.post(
+        "/api/kds/menu-items/availability/",
+        {"lines": [{"menu_item_id": dishes["Gaufre"].id, "qty": "1"}]},
+        format="json",
+    )
+    assert what_if.status_code == 200 and what_if.data["feasible"] is True
+    counts = {row["menu_item_id"]: row["available_count"] for row in what_if.data["items"]}
+    assert counts == {dishes["Crêpe"].id: 0, dishes["Gaufre"].id: 0, dishes["Pain"].id: 8}
+
+    too_much = client.post(
+        "/api/kds/menu-items/availability/",
+        {"lines": [{"menu_item_id": dishes["Crêpe"].id, "qty": "3"}]},
+        format="json",
+    )
+    assert too_much.data["feasible"] is False
+    assert [row["name"] for row in too_much.data["shortages"]] == ["Oeufs"]
+    farine.refresh_from_db()
+    assert farine.quantity == Decimal("10")
+
+
+def _shared_ingredient_setup(stock):
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    _enable_kds(service)
+    lait = Product.objects.create(
+        tenant=tenant,
+        service=service,
+        name="Lait",
+        quantity=Decimal(stock),
+        selling_price=Decimal("1.00"),
+        inventory_month="2025-01",
+    )
+    menu_item = MenuItem.objects.create(tenant=tenant, service=service, name="Latte", price=Decimal("4.00"))
+    RecipeItem.objects.create(menu_item=menu_item, ingredient_product=lait, qty=Decimal("2"))
+    return tenant, user, service, lait, menu_item
+
+
+def _pos_sale(product, qty):
+    return {
+        "items": [{"product_id": product.id, "qty": Decimal(qty)}],
+        "payments": [{"method": "cash", "amount": Decimal(qty)}],
+    }
+
+
+@pytest.mark.django_db
+def test_kds_send_does_not_overwrite_concurrent_pos_checkout(monkeypatch):
+    tenant, user, service, lait, menu_item = _shared_ingredient_setup("20")
+    order = kds_orders.create_order(tenant, service, user, None, [{"menu_item_id": menu_item.id, "qty": Decimal("3")}])
+
+    # Une vente POS est validée entre la lecture du stock par l'envoi cuisine et son écriture.
+    real_apply = kds_orders.apply_stock_deltas
+
+    def apply_after_pos_sale(products, deltas, **kwargs):
+        perform_checkout(tenant, service, user, _pos_sale(lait, "5"))
+        return real_apply(products, deltas, **kwargs)
+
+    monkeypatch.setattr(kds_orders, "apply_stock_deltas", apply_after_pos_sale)
+    kds_orders.send_order_to_kitchen(order, user)
+
+    lait.refresh_from_db()
+    assert lait.quantity == Decimal("9")  # 20 - 5 (POS) - 6 (3 Latte x 2)
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="verrous de ligne concurrents : PostgreSQL requis")
+@pytest.mark.django_db(transaction=True)
+def test_kds_send_and_pos_checkout_concurrent_no_lost_update():
+    tenant, user, service, lait, menu_item = _shared_ingredient_setup("200")
+    orders = [
+        kds_orders.create_order(tenant, service, user, None, [{"menu_item_id": menu_item.id, "qty": Decimal("1")}])
+        for _ in range(10)
+    ]
+    start = threading.Barrier(20)
+    errors = []
+
+    def run(action):
+        try:
+            start.wait()
+            action()
+        except Exception as exc:  # pragma: no cover - remonté par l'assertion
+            errors.append(exc)
+        finally:
+            close_old_connections()
+
+    threads = [threading.Thread(target=run, args=(lambda o=o: kds_orders.send_order_to_kitchen(o, user),)) for o in orders]
+    threads += [
+        threading.Thread(target=run, args=(lambda: perform_checkout(tenant, service, user, _pos_sale(lait, "3")),))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    lait.refresh_from_db()
+    assert lait.quantity == Decimal("150")  # 200 - 10 x 2 (KDS) - 10 x 3 (POS)
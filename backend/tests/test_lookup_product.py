@@ -1,6 +1,4 @@
 import pytest
-import urllib.error
-import urllib.request
 
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -63,19 +61,117 @@ def test_lookup_product_non_food_returns_200():
 
 
 @pytest.mark.django_db
-def test_lookup_product_off_down_returns_message(monkeypatch):
+def test_lookup_product_off_down_returns_message(off_stub):
     tenant = TenantFactory(domain="food")
     user = UserFactory(profile=tenant)
     client = APIClient()
     token = RefreshToken.for_user(user).access_token
     client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
-
-    def _raise(*args, **kwargs):
-        raise urllib.error.URLError("down")
-
-    monkeypatch.setattr(urllib.request, "urlopen", _raise)
+    off_stub.fail_status = 503
 
     res = client.get("/api/products/lookup/?barcode=9999")
     assert res.status_code == 200
     assert res.data["found"] is False
     assert "off_error" in res.data
+
+
+@pytest.mark.django_db
+def test_lookup_product_scan_payload_is_lean_with_optional_sections(django_assert_num_queries):
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    Product.objects.create(
+        tenant=tenant,
+        service=service,
+        name="Farine T55",
+        barcode="3017620422003",
+        inventory_month=timezone.now().strftime("%Y-%m"),
+        quantity=2,
+    )
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    client.get("/api/products/lookup/?barcode=3017620422003")  # entitlements / accès en cache
+
+    # utilisateur JWT + profil/tenant/plan + service + produit : ni recent ni history
+    with django_assert_num_queries(4):
+        res = client.get("/api/products/lookup/?barcode=3017620422003")
+    assert res.data["found"] is True
+    assert "history" not in res.data and "recent" not in res.data
+    assert res.data["product"]["name"] == "Farine T55"
+    assert res.data["product"]["quantity"] == 2.0
+    assert "warnings" not in res.data["product"] and "tenant" not in res.data["product"]
+
+    res = client.get("/api/products/lookup/?barcode=3017620422003&include=recent,history,full")
+    assert [p["name"] for p in res.data["history"]] == ["Farine T55"]
+    assert len(res.data["recent"]) == 1
+    assert "warnings" in res.data["product"]
+
+
+@pytest.mark.django_db
+def test_lookup_product_caches_off_answers_including_unknown_codes(off_stub):
+    from products.services.lookup import reset_off_cache
+
+    tenant = TenantFactory(domain="food")
+    user = UserFactory(profile=tenant)
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    off_stub.products["3017620422003"] = {"product_name": "Pâte à tartiner", "brands": "Ferrero"}
+    calls = off_stub.hits
+
+    for _ in range(3):
+        res = client.get("/api/products/lookup/?barcode=3017620422003")
+        assert res.data["suggestion"]["brand"] == "Ferrero"
+    for code in ("1111111111116", "4044040440404"):
+        for _ in range(2):
+            res = client.get(f"/api/products/lookup/?barcode={code}")
+            assert res.data == {"found": False}
+    assert len(calls) == 3
+
+    # Autre process (LRU local vide) : servi par le cache partagé.
+    reset_off_cache()
+    client.get("/api/products/lookup/?barcode=3017620422003")
+    client.get("/api/products/lookup/?barcode=1111111111116")
+    assert len(calls) == 3
+
+
+@pytest.mark.django_db
+def test_lookup_products_batch_single_query_and_parallel_off(off_stub, django_assert_num_queries):
+    tenant = TenantFactory(domain="food")
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    for month, qty in (("2025-01", 4), ("2025-02", 7)):
+        Product.objects.create(
+            tenant=tenant, service=service, name="Cola", barcode="5449000000996", inventory_month=month, quantity=qty
+        )
+    Product.objects.create(tenant=tenant, service=service, name="Eau", barcode="3274080005003", inventory_month="2025-01")
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    off_stub.products["3017620422003"] = {"product_name": "Pâte à tartiner"}
+    off_stub.failing.add("0000000000000")
+    client.post("/api/products/lookup/batch/", {"barcodes": ["3274080005003"]}, format="json")  # accès en cache
+
+    payload = {"barcodes": ["5449000000996", "3017620422003", " 3274080005003 ", "5449000000996", "0000000000000"]}
+    # utilisateur JWT + profil/tenant/plan + service + un seul barcode__in
+    with django_assert_num_queries(4):
+        res = client.post("/api/products/lookup/batch/", payload, format="json")
+    assert res.status_code == 200
+    assert [r["barcode"] for r in res.data["results"]] == [
+        "5449000000996",
+        "3017620422003",
+        "3274080005003",
+        "0000000000000",
+    ]
+    cola, nutella, eau, unknown = res.data["results"]
+    assert cola["product"]["inventory_month"] == "2025-02" and cola["product"]["quantity"] == 7.0
+    assert nutella == {"barcode": "3017620422003", "found": False, "suggestion": nutella["suggestion"]}
+    assert nutella["suggestion"]["name"] == "Pâte à tartiner"
+    assert eau["found"] is True
+    assert unknown["found"] is False and "off_error" in unknown
+    assert (res.data["found"], res.data["unknown"]) == (2, 2)
+
+    too_many = client.post("/api/products/lookup/batch/", {"barcodes": [str(i) for i in range(301)]}, format="json")
+    assert too_many.status_code == 400
@@ -1,12 +1,14 @@
 from datetime import timedelta
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from accounts.models import Plan, Service
-from products.models import Product
+from products.models import LossEvent, Product
 from .factories import TenantFactory, UserFactory
 
 
@@ -60,3 +62,68 @@ def test_loss_event_affects_monthly_stats():
 
     by_product = next(p for p in data["by_product"] if p["name"] == "PerteTest")
     assert by_product["losses_qty"] == 2
+
+
+def _create_catalog(tenant, service, prefix, categories, reasons):
+    for idx, category in enumerate(categories):
+        product = Product.objects.create(
+            tenant=tenant,
+            service=service,
+            name=f"{prefix}-{idx}",
+            category=category,
+            inventory_month="2025-06",
+            quantity=4,
+            purchase_price="2.50",
+            selling_price="4.00",
+            barcode=f"{prefix}-{idx}",
+            conversion_unit="kg",
+            conversion_factor="0.5",
+        )
+        for reason in reasons:
+            LossEvent.objects.create(
+                tenant=tenant,
+                service=service,
+                product=product,
+                occurred_at=timezone.now(),
+                inventory_month="2025-06",
+                quantity=1,
+                reason=reason,
+            )
+
+
+@pytest.mark.django_db
+def test_inventory_stats_query_count_does_not_grow_with_catalog():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+
+    _create_catalog(tenant, service, "SMALL", ["sec"], ["breakage"])
+    client.get("/api/inventory-stats/?month=2025-06")  # entitlements en cache
+    with CaptureQueriesContext(connection) as small:
+        res = client.get("/api/inventory-stats/?month=2025-06")
+    assert res.status_code == 200
+
+    _create_catalog(
+        tenant,
+        service,
+        "BIG",
+        [f"cat-{i}" for i in range(15)],
+        ["breakage", "expired", "theft"],
+    )
+    with CaptureQueriesContext(connection) as big:
+        res = client.get("/api/inventory-stats/?month=2025-06")
+    assert res.status_code == 200
+    assert len(big.captured_queries) == len(small.captured_queries)
+
+    data = res.json()
+    assert len(data["by_product"]) == 16
+    assert len(data["by_category"]) == 16
+    assert data["total_value"] == 16 * 4 * 2.5
+    assert data["converted_totals"] == {"kg": 16 * 4 * 0.5}
+    breakage = next(r for r in data["losses_by_reason"] if r["reason"] == "breakage")
+    assert breakage["total_qty"] == 16
+    assert breakage["total_cost"] == 16 * 2.5
+    assert data["losses_total_qty"] == 1 + 15 * 3
+    cat_0 = next(c for c in data["by_category"] if c["category"] == "cat-0")
+    assert cat_0["losses_qty"] == 3
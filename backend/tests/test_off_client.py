@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from products.services.off_client import OffLookupError, get_off_client
+
+
+def test_off_client_reuses_keepalive_connection(off_stub):
+    off_stub.products["3017620422003"] = {"product_name": "Pâte à tartiner"}
+    client = get_off_client()
+
+    assert client.fetch_product("3017620422003") == {"product_name": "Pâte à tartiner"}
+    assert client.fetch_product("1111111111116") is None  # 404 OFF = code inconnu, pas une panne
+    assert client.fetch_product("3017620422003")["product_name"] == "Pâte à tartiner"
+
+    ports = {port for _, port in off_stub.hits}
+    assert len(off_stub.hits) == 3 and len(ports) == 1
+    assert client.breaker.state == "closed"
+
+
+def test_off_client_circuit_breaker_fails_fast_then_recovers(off_stub, settings):
+    settings.OFF_BREAKER_FAILURES = 3
+    settings.OFF_BREAKER_RESET_SECONDS = 0.2
+    off_stub.fail_status = 503
+    client = get_off_client()
+
+    for _ in range(3):
+        with pytest.raises(OffLookupError) as exc:
+            client.fetch_product("3017620422003")
+        assert exc.value.reason == "url_error"
+    assert client.breaker.state == "open"
+
+    # Ouvert : échec immédiat, OFF n'est plus appelé.
+    with pytest.raises(OffLookupError) as exc:
+        client.fetch_product("3017620422003")
+    assert exc.value.reason == "circuit_open"
+    assert len(off_stub.hits) == 3
+
+    # Après le délai, un appel d'essai : en échec, le disjoncteur se rouvre aussitôt.
+    time.sleep(0.25)
+    with pytest.raises(OffLookupError):
+        client.fetch_product("3017620422003")
+    assert client.breaker.state == "open" and len(off_stub.hits) == 4
+
+    time.sleep(0.25)
+    off_stub.fail_status = None
+    off_stub.products["3017620422003"] = {"product_name": "Pâte à tartiner"}
+    assert client.fetch_product("3017620422003")["product_name"] == "Pâte à tartiner"
+    assert client.breaker.state == "closed"
+
+
+def test_off_client_coalesces_identical_inflight_barcodes(off_stub):
+    off_stub.products["3017620422003"] = {"product_name": "Pâte à tartiner"}
+    off_stub.delay = 0.2
+    client = get_off_client()
+    results = []
+
+    def _scan():
+        results.append(client.fetch_product("3017620422003"))
+
+    threads = [threading.Thread(target=_scan) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(off_stub.hits) == 1
+    assert results == [{"product_name": "Pâte à tartiner"}] * 6
@@ -1,11 +1,15 @@
 import pytest
 from decimal import Decimal
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from accounts.models import Service
 from products.models import Product, LossEvent
-from pos.models import PosTicket
+from pos.models import PosCashSession, PosDailyProductRollup, PosDailyRollup, PosTicket
+from pos.services.sessions import recompute_session_totals, stored_session_totals
 from .factories import TenantFactory, UserFactory
 
 
@@ -271,3 +275,273 @@ def test_pos_cash_session_close_returns_totals():
     assert close.status_code == 200
     summary = close.data.get("summary") or {}
     assert Decimal(summary.get("total_net")) == Decimal("10.00")
+
+
+def _checkout_payload(products, qty="1"):
+    total = sum(Decimal(p.selling_price) * Decimal(qty) for p in products)
+    return {
+        "items": [{"product_id": p.id, "qty": qty} for p in products],
+        "payments": [{"method": "cash", "amount": str(total)}],
+    }
+
+
+@pytest.mark.django_db
+def test_pos_checkout_queries_do_not_scale_with_lines():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    products = [
+        Product.objects.create(
+            tenant=tenant,
+            service=service,
+            name=f"Article {idx}",
+            category="sec",
+            selling_price="1.50",
+            quantity=Decimal("100"),
+            inventory_month="2025-01",
+        )
+        for idx in range(40)
+    ]
+    client = _auth_client(user)
+    url = "/api/pos/tickets/checkout/"
+    assert client.post(url, _checkout_payload(products[:1]), format="json").status_code == 200
+
+    with CaptureQueriesContext(connection) as small:
+        assert client.post(url, _checkout_payload(products[:2]), format="json").status_code == 200
+    with CaptureQueriesContext(connection) as big:
+        assert client.post(url, _checkout_payload(products), format="json").status_code == 200
+    assert len(big.captured_queries) == len(small.captured_queries)
+
+    ticket = PosTicket.objects.filter(tenant=tenant).order_by("-id").first()
+    assert ticket.lines.count() == 40
+    assert Product.objects.get(id=products[0].id).quantity == Decimal("97")
+    assert Product.objects.get(id=products[-1].id).quantity == Decimal("99")
+
+
+@pytest.mark.django_db
+def test_pos_checkout_checks_stock_on_cumulated_lines():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    product = Product.objects.create(
+        tenant=tenant,
+        service=service,
+        name="Croissant",
+        selling_price="1.00",
+        quantity=Decimal("3"),
+        inventory_month="2025-01",
+    )
+    client = _auth_client(user)
+    res = client.post("/api/pos/tickets/checkout/", _checkout_payload([product, product], qty="2"), format="json")
+    assert res.status_code == 409
+    assert res.data["products"][0]["available"] == "3.000"
+
+    res = client.post("/api/pos/tickets/checkout/", _checkout_payload([product, product]), format="json")
+    assert res.status_code == 200
+    product.refresh_from_db()
+    assert product.quantity == Decimal("1")
+
+
+@pytest.mark.django_db
+def test_pos_checkout_idempotency_key_replays_ticket():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    product = Product.objects.create(
+        tenant=tenant,
+        service=service,
+        name="Glace",
+        selling_price="2.50",
+        quantity=Decimal("10"),
+        inventory_month="2025-01",
+    )
+    client = _auth_client(user)
+    url = "/api/pos/tickets/checkout/"
+    payload = _checkout_payload([product], qty="2")
+
+    first = client.post(url, payload, format="json", HTTP_IDEMPOTENCY_KEY="till-1-0001")
+    retry = client.post(url, payload, format="json", HTTP_IDEMPOTENCY_KEY="till-1-0001")
+    assert first.status_code == retry.status_code == 200
+    assert retry.data["ticket_id"] == first.data["ticket_id"]
+    assert retry.data["replayed"] is True
+    product.refresh_from_db()
+    assert product.quantity == Decimal("8")
+    assert PosTicket.objects.filter(tenant=tenant).count() == 1
+
+    other = client.post(url, _checkout_payload([product], qty="1"), format="json", HTTP_IDEMPOTENCY_KEY="till-1-0001")
+    assert other.status_code == 409
+    assert other.data["code"] == "idempotency_key_conflict"
+
+
+@pytest.mark.django_db
+def test_pos_checkout_batch_applies_offline_queue_once():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    cola = Product.objects.create(
+        tenant=tenant, service=service, name="Cola", selling_price="2.00", quantity=Decimal("5"), inventory_month="2025-01"
+    )
+    chips = Product.objects.create(
+        tenant=tenant, service=service, name="Chips", selling_price="1.00", quantity=Decimal("1"), inventory_month="2025-01"
+    )
+    client = _auth_client(user)
+    already_synced = {**_checkout_payload([cola]), "idempotency_key": "k-1"}
+    assert client.post("/api/pos/tickets/checkout/", already_synced, format="json").status_code == 200
+
+    tickets = [
+        already_synced,
+        {**_checkout_payload([cola, chips]), "idempotency_key": "k-2", "created_at": "2025-01-10T12:00:00Z"},
+        {**_checkout_payload([chips]), "idempotency_key": "k-3"},
+    ]
+    res = client.post("/api/pos/tickets/checkout/batch/", {"tickets": tickets}, format="json")
+    assert res.status_code == 200
+    assert [r["status"] for r in res.data["results"]] == ["replayed", "created", "rejected"]
+    assert res.data["results"][2]["code"] == "stock_insufficient"
+    assert (res.data["created"], res.data["replayed"], res.data["rejected"]) == (1, 1, 1)
+    offline = PosTicket.objects.get(tenant=tenant, idempotency_key="k-2")
+    assert offline.created_at.date().isoformat() == "2025-01-10"
+
+    # Renvoi du lot complet après une coupure : aucun double décompte.
+    again = client.post("/api/pos/tickets/checkout/batch/", {"tickets": tickets}, format="json")
+    assert [r["status"] for r in again.data["results"]] == ["replayed", "replayed", "rejected"]
+    cola.refresh_from_db()
+    chips.refresh_from_db()
+    assert (cola.quantity, chips.quantity) == (Decimal("3"), Decimal("0"))
+    assert PosTicket.objects.filter(tenant=tenant).count() == 2
+
+
+@pytest.mark.django_db
+def test_pos_session_totals_follow_checkouts_and_cancellations():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    products = [
+        Product.objects.create(
+            tenant=tenant,
+            service=service,
+            name=f"Boisson {idx}",
+            selling_price="2.00",
+            quantity=Decimal("10"),
+            inventory_month="2025-01",
+        )
+        for idx in range(2)
+    ]
+    client = _auth_client(user)
+    url = "/api/pos/tickets/checkout/"
+    first = client.post(url, _checkout_payload(products), format="json")
+    card = {**_checkout_payload(products[:1]), "payments": [{"method": "card", "amount": "2.00"}]}
+    assert client.post(url, card, format="json").status_code == 200
+    res = client.post(f"/api/pos/tickets/{first.data['ticket_id']}/cancel/", {"reason_code": "error"}, format="json")
+    assert res.status_code == 200
+
+    with CaptureQueriesContext(connection) as ctx:
+        res = client.get("/api/pos/session/active/")
+    summary = res.data["summary"]
+    assert (summary["total_net"], summary["total_tickets"]) == ("2.00", 1)
+    assert summary["payments_by_method"] == [{"method": "card", "total": Decimal("2.00")}]
+    assert not [q for q in ctx.captured_queries if "pos_posticket" in q["sql"]]
+
+    session = PosCashSession.objects.get(tenant=tenant, status="OPEN")
+    assert stored_session_totals(session) == recompute_session_totals(session)
+
+    PosCashSession.objects.filter(id=session.id).update(total_tickets=7, totals_by_method={})
+    call_command("verify_pos_session_totals", "--fix")
+    session.refresh_from_db()
+    assert stored_session_totals(session) == recompute_session_totals(session)
+
+    close = client.post("/api/pos/session/close/")
+    assert close.data["summary"]["status"] == "CLOSED"
+    assert close.data["summary"]["total_net"] == "2.00"
+
+
+@pytest.mark.django_db
+def test_pos_reports_read_daily_rollups_with_timeseries():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    products = [
+        Product.objects.create(
+            tenant=tenant,
+            service=service,
+            name=f"Glace {idx}",
+            selling_price="2.00",
+            quantity=Decimal("50"),
+            inventory_month="2025-01",
+        )
+        for idx in range(2)
+    ]
+    client = _auth_client(user)
+    url = "/api/pos/tickets/checkout/"
+    offline = {**_checkout_payload(products), "idempotency_key": "veille-1", "created_at": "2025-06-30T12:00:00Z"}
+    assert client.post(url, offline, format="json").status_code == 200
+    kept = client.post(url, _checkout_payload(products), format="json")
+    card = {**_checkout_payload(products[:1]), "payments": [{"method": "card", "amount": "2.00"}]}
+    voided = client.post(url, card, format="json")
+    res = client.post(f"/api/pos/tickets/{voided.data['ticket_id']}/cancel/", {"reason_code": "error"}, format="json")
+    assert res.status_code == 200 and kept.status_code == 200
+
+    with CaptureQueriesContext(connection) as ctx:
+        report = client.get("/api/pos/reports/summary/?from=2025-01-01&to=2099-12-31")
+    assert report.status_code == 200
+    assert not [q for q in ctx.captured_queries if "pos_posticket" in q["sql"]]
+    assert (report.data["total_net"], report.data["tickets_count"]) == ("8.00", 2)
+    assert report.data["payments_by_method"] == [{"method": "cash", "total": Decimal("8.00")}]
+    assert [row["day"] for row in report.data["timeseries"]][0] == "2025-06-30"
+    assert [row["total_net"] for row in report.data["timeseries"]] == ["4.00", "4.00"]
+    assert {row["product_name"]: row["total_qty"] for row in report.data["top_products"]} == {
+        "Glace 0": Decimal("2"),
+        "Glace 1": Decimal("2"),
+    }
+
+    only_june = client.get("/api/pos/reports/summary/?from=2025-06-30&to=2025-06-30")
+    assert only_june.data["total_net"] == "4.00"
+
+    live = (
+        list(PosDailyRollup.objects.order_by("day").values_list("day", "tickets_count", "total_net", "payments_by_method")),
+        sorted(PosDailyProductRollup.objects.filter(total_qty__gt=0).values_list("day", "product_name", "total_qty")),
+    )
+    PosDailyRollup.objects.filter(tenant=tenant).update(total_net=0)
+    call_command("rebuild_pos_rollups", "--tenant", str(tenant.id))
+    rebuilt = (
+        list(PosDailyRollup.objects.order_by("day").values_list("day", "tickets_count", "total_net", "payments_by_method")),
+        sorted(PosDailyProductRollup.objects.values_list("day", "product_name", "total_qty")),
+    )
+    assert rebuilt == live
+
+    PosDailyRollup.objects.filter(tenant=tenant).delete()
+    call_command("rebuild_pos_rollups", "--missing-only")
+    assert PosDailyRollup.objects.filter(tenant=tenant).count() == 2
+
+
+@pytest.mark.django_db
+def test_pos_cancel_on_day_without_rollup_rebuilds_instead_of_going_negative():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    product = Product.objects.create(
+        tenant=tenant, service=service, name="Jus", selling_price="2.00", quantity=Decimal("10"), inventory_month="2025-01"
+    )
+    client = _auth_client(user)
+    ticket_ids = []
+    for qty in ("1", "2"):
+        res = client.post(
+            "/api/pos/tickets/checkout/",
+            {"items": [{"product_id": product.id, "qty": qty}], "payments": [{"method": "cash", "amount": str(2 * int(qty))}]},
+            format="json",
+        )
+        assert res.status_code == 200
+        ticket_ids.append(res.data["ticket_id"])
+
+    # Jour jamais cumulé (ventes antérieures aux cumuls) : l'annulation ne doit pas créer de ligne négative.
+    PosDailyRollup.objects.filter(tenant=tenant).delete()
+    PosDailyProductRollup.objects.filter(tenant=tenant).delete()
+    cancel = client.post(f"/api/pos/tickets/{ticket_ids[0]}/cancel/", {"reason_code": "error", "restock": True}, format="json")
+    assert cancel.status_code == 200
+
+    day = PosDailyRollup.objects.get(tenant=tenant)
+    assert day.tickets_count == 1
+    assert day.total_net == Decimal("4.00")
+    assert day.payments_by_method == {"cash": "4.00"}
+    assert list(PosDailyProductRollup.objects.filter(tenant=tenant).values_list("product_name", "total_qty")) == [
+        ("Jus", Decimal("2"))
+    ]
@@ -1,10 +1,15 @@
+import random
+
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from accounts.models import Service
 from products.models import Product, LossEvent
+from products.services.duplicates import fuzzy_candidate_pairs
 from .factories import TenantFactory, UserFactory
 
 
@@ -64,3 +69,62 @@ def test_merge_products_archives_duplicates_and_moves_loss():
     assert float(master.quantity) == 8.0
     assert duplicate.is_archived is True
     assert loss.product_id == master.id
+
+
+@pytest.mark.django_db
+def test_product_duplicates_single_catalog_query_and_indexed_fuzzy_pass():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    long_name = "Sauce tomate cuisinée basilic origan ail oignon poivron carotte céleri thym laurier fenouil"
+    signals = {"category": "epicerie", "brand": "Maison", "supplier": "Metro", "purchase_price": "2.40"}
+    common = {"tenant": tenant, "service": service, "inventory_month": "2025-01"}
+    for idx in range(130):  # > 120 noms : l'ancienne passe floue était désactivée
+        Product.objects.create(**common, name=f"Conserve legumes variete {idx} numero {idx}")
+    Product.objects.create(**common, **signals, name=long_name, barcode="3017620422003")
+    Product.objects.create(**common, **signals, name=f"{long_name} 7")
+    for idx in range(4):
+        Product.objects.create(**common, name=f"Biscuit {idx}", barcode=f"376000000{idx}")
+        Product.objects.create(
+            tenant=tenant, service=service, inventory_month="2025-02", name=f"Biscuit {idx}", barcode=f"376000000{idx}"
+        )
+
+    client = _auth_client(user)
+    client.get("/api/products/duplicates/")  # entitlements en cache
+    with CaptureQueriesContext(connection) as ctx:
+        res = client.get("/api/products/duplicates/")
+    assert res.status_code == 200
+    catalog_queries = [q for q in ctx.captured_queries if 'FROM "products_product"' in q["sql"]]
+    assert len(catalog_queries) == 1
+
+    by_type = {}
+    for group in res.data["groups"]:
+        by_type.setdefault(group["type"], []).append(group)
+    assert len(by_type["barcode"]) == 4
+    fuzzy = by_type["name_fuzzy"]
+    assert len(fuzzy) == 1
+    assert {p["name"] for p in fuzzy[0]["products"]} == {long_name, f"{long_name} 7"}
+
+
+def test_fuzzy_candidate_pairs_match_all_pairs_scan():
+    rng = random.Random(7)
+    words = [f"mot{idx}" for idx in range(40)]
+    token_sets = {}
+    for idx in range(400):
+        tokens = rng.sample(words, rng.randint(2, 14))
+        if idx % 5 == 0 and token_sets:
+            base = rng.choice(list(token_sets.values()))
+            tokens = [*base, *rng.sample(words, rng.randint(0, 1))]
+        token_sets[" ".join(tokens) + f" #{idx}"] = tokens
+
+    expected = []
+    keys = list(token_sets)
+    for i, base in enumerate(keys):
+        for other in keys[i + 1 :]:
+            set_a, set_b = set(token_sets[base]), set(token_sets[other])
+            shared = len(set_a & set_b)
+            if shared >= 3 and shared / len(set_a | set_b) >= 0.9:
+                expected.append((base, other))
+
+    assert expected
+    assert fuzzy_candidate_pairs(token_sets) == expected
@@ -87,7 +87,7 @@ def test_export_advanced_includes_variant_lot_opened_fields():
     }
     res = client.post("/api/export-advanced/", payload, format="json")
     assert res.status_code == 200
-    content = res.content.decode("utf-8-sig")
+    content = b"".join(res.streaming_content).decode("utf-8-sig")
     assert "Variante" in content
     assert "LOT-009" in content
     assert "OPENED" in content
@@ -0,0 +1,91 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Service
+from products.models import Product
+from products.services.search import normalize_search_text, search_catalog
+from .factories import TenantFactory, UserFactory
+
+
+def _auth_client(user):
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+def _names(res):
+    assert res.status_code == 200
+    return [row["name"] for row in res.data]
+
+
+@pytest.mark.django_db
+def test_pos_search_ranks_prefix_first_and_ignores_accents(django_capture_on_commit_callbacks):
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    common = {"tenant": tenant, "service": service, "inventory_month": "2025-01", "selling_price": Decimal("2")}
+    for name in ("Thé glacé pêche", "Crème brûlée", "Glace vanille", "Sorbet citron glacé"):
+        Product.objects.create(**common, name=name)
+    Product.objects.create(**common, name="Eau pétillante", barcode="3274080005003", internal_sku="EAU-50")
+    Product.objects.create(**common, name="Glaçons", is_archived=True)
+
+    client = _auth_client(user)
+    # Préfixe du nom, puis début de mot, puis sous-chaîne ; accents ignorés des deux côtés.
+    assert _names(client.get("/api/pos/products/search/?q=glace")) == [
+        "Glace vanille",
+        "Sorbet citron glacé",
+        "Thé glacé pêche",
+    ]
+    assert _names(client.get("/api/pos/products/search/?q=CREME BRU")) == ["Crème brûlée"]
+    assert _names(client.get("/api/pos/products/search/?q=gl")) == ["Glace vanille", "Sorbet citron glacé", "Thé glacé pêche"]
+    assert _names(client.get("/api/pos/products/search/?q=3274080005003")) == ["Eau pétillante"]
+    assert _names(client.get("/api/pos/products/search/?q=eau-5")) == ["Eau pétillante"]
+    assert _names(client.get("/api/pos/products/search/?q=vanile")) == []
+
+    # Index en mémoire tenu à jour au commit des save() (renommage, archivage, création).
+    vanille = Product.objects.get(tenant=tenant, name="Glace vanille")
+    with django_capture_on_commit_callbacks(execute=True):
+        vanille.name = "Glace fraise"
+        vanille.save()
+        Product.objects.filter(name="Thé glacé pêche").get().delete()
+        Product.objects.create(**common, name="Glace chocolat")
+    assert _names(client.get("/api/pos/products/search/?q=glace")) == [
+        "Glace chocolat",
+        "Glace fraise",
+        "Sorbet citron glacé",
+    ]
+    assert _names(client.get("/api/pos/products/search/?q=vanille")) == []
+
+    global_search = client.get(f"/api/products/search/?q=fraise&service={service.id}")
+    assert _names(global_search) == ["Glace fraise"]
+    assert global_search.data[0]["service__name"] == "Principal"
+
+
+@pytest.mark.django_db
+def test_search_keeps_fetching_past_candidates_filtered_out_by_queryset():
+    tenant = TenantFactory()
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    old = [
+        Product(tenant=tenant, service=service, name=f"Coca a{idx:03d}", inventory_month="2024-01")
+        for idx in range(200)
+    ]
+    Product.objects.bulk_create(old)
+    Product.objects.filter(tenant=tenant).update(created_at=timezone.now() - timedelta(days=400))
+    for idx in range(5):
+        Product.objects.create(tenant=tenant, service=service, name=f"Coca z{idx}", inventory_month="2025-01")
+
+    # Rétention : les 200 premiers du classement sont écartés par le queryset, pas par l'index.
+    qs = Product.objects.filter(tenant=tenant, created_at__gte=timezone.now() - timedelta(days=30))
+    for query in ("coca", "co"):
+        rows = search_catalog(qs, query, [service.id], ("id", "name"), limit=10)
+        assert [row["name"] for row in rows] == [f"Coca z{idx}" for idx in range(5)]
+
+
+def test_normalize_search_text():
+    assert normalize_search_text("  Œufs  frais   Bío ") == "oeufs frais bio"
@@ -1,8 +1,15 @@
 import pytest
+from decimal import Decimal
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from accounts.models import Service
+from accounts.services.usage import get_products_count
+from products.models import Product, ReceiptLine, StockMovement
 from .factories import TenantFactory, UserFactory
 
 
@@ -38,3 +45,75 @@ def test_receipt_import_solo_quota():
     res4 = client.post("/api/receipts/import/", {"file": _csv_file("C")}, format="multipart")
     assert res4.status_code == 403
     assert res4.data.get("code") == "LIMIT_RECEIPTS_IMPORT_MONTH"
+
+
+@pytest.mark.django_db
+def test_receipt_lines_matched_and_applied_in_bulk():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+    month = timezone.now().strftime("%Y-%m")
+    farine = Product.objects.create(
+        tenant=tenant, service=service, name="Farine", barcode="3000000000017", inventory_month=month, quantity=5
+    )
+    sucre = Product.objects.create(
+        tenant=tenant, service=service, name="Sucre", internal_sku="SUC-1", inventory_month=month, quantity=1
+    )
+    huile = Product.objects.create(tenant=tenant, service=service, name="Huile Olive", inventory_month=month)
+    usage_before = get_products_count(tenant)
+
+    rows = [
+        "Farine T45,2,kg,1.10,3000000000017,,",
+        "Sucre poudre,3,kg,,,SUC-1,",
+        "huile olive,4,l,5.00,,,epicerie",
+        "Tomates,6,kg,2.00,,,frais",
+        "Farine T45,1,kg,,3000000000017,,",
+        "Sel,1,kg,0.50,,,",
+        *[f"Epice maison {idx},1,pcs,1.00,,,divers" for idx in range(60)],
+    ]
+    content = "name,quantity,unit,purchase_price,barcode,sku,category\n" + "\n".join(rows) + "\n"
+    upload = SimpleUploadedFile("receipt.csv", content.encode("utf-8"), content_type="text/csv")
+
+    with CaptureQueriesContext(connection) as import_queries:
+        res = client.post("/api/receipts/import/", {"file": upload}, format="multipart")
+    assert res.status_code == 201
+    lines = res.data["lines"]
+    assert [line["matched_product_id"] for line in lines[:6]] == [farine.id, sucre.id, huile.id, None, farine.id, None]
+    assert ReceiptLine.objects.filter(receipt_id=res.data["receipt_id"]).count() == 66
+    assert len(import_queries) < 30  # matcher groupé + bulk_create, quel que soit le nombre de lignes
+
+    with CaptureQueriesContext(connection) as apply_queries:
+        applied = client.post(
+            f"/api/receipts/{res.data['receipt_id']}/apply/",
+            {
+                "decisions": [{"line_id": lines[5]["id"], "action": "ignore"}],
+                "line_overrides": {str(lines[3]["id"]): {"name": "Tomates grappe"}},
+            },
+            format="json",
+        )
+    assert applied.status_code == 200
+    assert applied.data["applied"] == 65
+    # Moins d'une requête par ligne (recalcul des snapshots : par catégorie touchée).
+    assert len(apply_queries) < len(rows)
+
+    farine.refresh_from_db()
+    sucre.refresh_from_db()
+    huile.refresh_from_db()
+    assert farine.quantity == 8 and farine.purchase_price == Decimal("1.10")
+    assert sucre.quantity == 4
+    assert (huile.quantity, huile.purchase_price, huile.category) == (4, Decimal("5.00"), "epicerie")
+    tomates = Product.objects.get(tenant=tenant, name="Tomates grappe")
+    assert (tomates.quantity, tomates.category, tomates.inventory_month) == (6, "frais", month)
+    assert not Product.objects.filter(tenant=tenant, name="Sel").exists()
+    assert get_products_count(tenant) == usage_before + 61
+
+    statuses = dict(
+        ReceiptLine.objects.filter(receipt_id=res.data["receipt_id"]).values_list("line_number", "status")
+    )
+    assert [statuses[n] for n in range(1, 7)] == ["MATCHED", "MATCHED", "MATCHED", "CREATED", "MATCHED", "IGNORED"]
+    assert ReceiptLine.objects.get(id=lines[3]["id"]).matched_product_id == tomates.id
+
+    movements = StockMovement.objects.filter(reference=f"receipt:{res.data['receipt_id']}", kind="receipt")
+    assert movements.count() == 64  # Farine (2 lignes) regroupée
+    assert movements.get(product=farine).delta == Decimal("3")
@@ -0,0 +1,83 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Membership, Service, UserProfile
+from accounts.utils import get_service_from_request, get_tenant_for_request, get_user_role
+from products.models import Product
+from products.services.search import get_service_index
+from .factories import TenantFactory, UserFactory
+
+
+def _auth_client(user):
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+def _drf_request(user, path="/"):
+    request = Request(APIRequestFactory().get(path))
+    # Utilisateur rechargé : aucun profil en cache ORM.
+    request.user = get_user_model().objects.get(pk=user.pk)
+    return request
+
+
+@pytest.mark.django_db
+def test_owner_context_resolves_in_two_queries(django_assert_num_queries):
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.create(tenant=tenant, name="Bar")
+    request = _drf_request(user, f"/?service={service.id}")
+
+    with django_assert_num_queries(2):
+        assert get_tenant_for_request(request) == tenant
+        assert get_user_role(request) == "owner"
+        assert get_service_from_request(request) == service
+        assert get_service_from_request(request) == service
+        assert get_tenant_for_request(request).plan_id == tenant.plan_id
+        assert request.user.profile.tenant_id == tenant.id
+
+
+@pytest.mark.django_db
+def test_manager_scoped_service_resolves_in_two_queries(django_assert_num_queries):
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    UserProfile.objects.filter(user=user).update(role="manager")
+    principal = Service.objects.get(tenant=tenant, name="Principal")
+    bar = Service.objects.create(tenant=tenant, name="Bar")
+    Membership.objects.create(user=user, tenant=tenant, role="manager", service=bar)
+
+    request = _drf_request(user)
+    with django_assert_num_queries(2):
+        assert get_user_role(request) == "manager"
+        assert get_service_from_request(request) == bar
+        assert get_service_from_request(request) == bar
+
+    denied = _drf_request(user, f"/?service={principal.id}")
+    with pytest.raises(PermissionDenied):
+        get_service_from_request(denied)
+
+
+@pytest.mark.django_db
+def test_typical_endpoints_query_budget(django_assert_num_queries):
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    Product.objects.create(tenant=tenant, service=service, name="Farine", inventory_month="2025-01", quantity=1)
+    client = _auth_client(user)
+    # Index de recherche en mémoire (hors PostgreSQL) : construit une fois par process et par service.
+    get_service_index(service.id)
+
+    # utilisateur JWT + profil/tenant/plan + service + overrides d'entitlements + produits
+    with django_assert_num_queries(5):
+        res = client.get(f"/api/products/search/?q=Far&service={service.id}")
+    assert res.status_code == 200
+
+    # entitlements déjà en cache pour cette version d'accès : plus de requête overrides
+    with django_assert_num_queries(4):
+        res = client.get(f"/api/pos/products/search/?q=Far&service={service.id}")
+    assert res.status_code == 200
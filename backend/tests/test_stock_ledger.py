@@ -0,0 +1,158 @@
+import pytest
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import Service
+from products.models import Product, StockCheckpoint, StockMovement
+from products.services.ledger import ledger_balances, movement_totals, stock_at
+from products.services.stats import PRODUCT_NOTE_LIMITED
+from .factories import TenantFactory, UserFactory
+
+
+def _auth_client(user):
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+def _movements(product):
+    return list(StockMovement.objects.filter(product=product).order_by("id").values_list("kind", "delta", "amount"))
+
+
+@pytest.mark.django_db
+def test_stock_paths_write_ledger_and_stats_read_it():
+    tenant = TenantFactory()
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+
+    created = client.post(
+        "/api/products/",
+        {
+            "name": "Cola",
+            "category": "sec",
+            "purchase_price": "1.00",
+            "selling_price": "2.50",
+            "quantity": 10,
+            "inventory_month": "2025-02",
+            "service": service.id,
+        },
+        format="json",
+    )
+    assert created.status_code == 201
+    product = Product.objects.get(id=created.data["id"])
+
+    res = client.patch(f"/api/products/{product.id}/", {"quantity": 12, "name": "Cola 33cl"}, format="json")
+    assert res.status_code == 200
+    # Modification sans changement de stock : aucun mouvement.
+    client.patch(f"/api/products/{product.id}/", {"name": "Cola canette"}, format="json")
+
+    checkout = client.post(
+        "/api/pos/tickets/checkout/",
+        {
+            "items": [{"product_id": product.id, "qty": "4"}],
+            "payments": [{"method": "cash", "amount": "9.00"}],
+            "global_discount": {"type": "amount", "value": "1.00"},
+        },
+        format="json",
+    )
+    assert checkout.status_code == 200
+    second = client.post(
+        "/api/pos/tickets/checkout/",
+        {"items": [{"product_id": product.id, "qty": "1"}], "payments": [{"method": "card", "amount": "2.50"}]},
+        format="json",
+    )
+    cancel = client.post(
+        f"/api/pos/tickets/{second.data['ticket_id']}/cancel/",
+        {"reason_code": "error", "restock": True},
+        format="json",
+    )
+    assert cancel.status_code == 200
+
+    assert _movements(product) == [
+        ("initial", Decimal("10.000"), None),
+        ("manual", Decimal("2.000"), None),
+        ("pos_sale", Decimal("-4.000"), Decimal("9.00")),  # remise globale répartie
+        ("pos_sale", Decimal("-1.000"), Decimal("2.50")),
+        ("pos_restock", Decimal("1.000"), Decimal("-2.50")),
+    ]
+    sale = StockMovement.objects.filter(product=product, kind="pos_sale").first()
+    assert sale.reference == f"pos_ticket:{checkout.data['ticket_id']}"
+    assert sale.created_by == user
+    assert sale.unit_cost == Decimal("1.00")
+
+    product.refresh_from_db()
+    assert product.quantity == Decimal("8")
+    assert ledger_balances(Product.objects.filter(id=product.id))[product.id]["balance"] == Decimal("8")
+
+    totals = movement_totals(tenant, service)[product.id]
+    assert totals["sold_qty"] == Decimal("4")
+    assert totals["sales_amount"] == Decimal("9")
+    assert totals["margin"] == Decimal("5")  # 9 - 4 x 1.00
+
+    stats = client.get(f"/api/inventory-stats/?month=2025-02&service={service.id}").json()
+    row = next(p for p in stats["by_product"] if p["name"] == "Cola canette")
+    assert row["quantity_sold_est"] == 4
+    assert row["marge"] == 5
+    assert row["stock_initial"] == 0
+    assert stats["service_totals"]["sales_amount"] == 9
+
+    # Produit antérieur au journal (aucun mouvement) : colonnes vides et note « limité », pas des zéros.
+    legacy = Product.objects.create(
+        tenant=tenant, service=service, name="Sirop ancien", quantity=Decimal("3"), inventory_month="2025-02"
+    )
+    StockMovement.objects.filter(product=legacy).delete()
+    stats = client.get(f"/api/inventory-stats/?month=2025-02&service={service.id}").json()
+    row = next(p for p in stats["by_product"] if p["name"] == "Sirop ancien")
+    assert row["quantity_sold_est"] is None and row["ca_estime"] is None and row["marge"] is None
+    assert "stock_initial" not in row
+    assert PRODUCT_NOTE_LIMITED in row["notes"]
+
+    # Totaux seuls (include_products=0) : un aggregate sur le journal, mêmes totaux service.
+    with CaptureQueriesContext(connection) as ctx:
+        summary = client.get(f"/api/inventory-stats/?month=2025-02&service={service.id}&include_products=0").json()
+    assert summary["by_product"] == []
+    assert summary["service_totals"]["sales_amount"] == 9
+    assert summary["service_totals"]["margin"] == 5
+    assert not any("GROUP BY" in q["sql"] and "products_stockmovement" in q["sql"] for q in ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_checkpoints_bound_history_and_report_drift():
+    tenant = TenantFactory()
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    product = Product.objects.create(
+        tenant=tenant, service=service, name="Farine", quantity=Decimal("5"), inventory_month="2025-01"
+    )
+    before_update = timezone.now()
+    product.quantity = Decimal("7")
+    product.save()
+
+    out = StringIO()
+    call_command("checkpoint_stock_ledger", "--tenant", str(tenant.id), stdout=out)
+    assert "1 point(s) de stock créé(s), 0 écart(s)" in out.getvalue()
+    checkpoint = StockCheckpoint.objects.get(product=product)
+    assert checkpoint.quantity == Decimal("7")
+    assert checkpoint.movement_id == StockMovement.objects.filter(product=product).latest("id").id
+
+    # Écriture hors journal (SQL brut / update()) : signalée puis réparée par un mouvement d'écart.
+    Product.objects.filter(id=product.id).update(quantity=Decimal("6"))
+    out = StringIO()
+    call_command("checkpoint_stock_ledger", "--tenant", str(tenant.id), stdout=out)
+    assert f"Écart produit {product.id}" in out.getvalue()
+    assert StockCheckpoint.objects.filter(product=product).count() == 1  # rien de neuf dans le journal
+
+    call_command("checkpoint_stock_ledger", "--tenant", str(tenant.id), "--repair", stdout=StringIO())
+    assert StockMovement.objects.filter(product=product, kind="adjustment").get().delta == Decimal("-1")
+    assert StockCheckpoint.objects.filter(product=product).order_by("-movement_id").first().quantity == Decimal("6")
+
+    balances = stock_at(Product.objects.filter(id=product.id), before_update)
+    assert balances[product.id] == Decimal("5")
+    assert stock_at(Product.objects.filter(id=product.id), timezone.now())[product.id] == Decimal("6")
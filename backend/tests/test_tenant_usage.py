@@ -0,0 +1,92 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import OrganizationOverrides, Service, TenantUsage
+from accounts.services.access import LimitExceeded
+from accounts.services.usage import get_products_count, reserve_product_slots
+from products.models import Product
+from .factories import TenantFactory, UserFactory
+
+
+def _auth_client(user):
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+def _product(tenant, service, name, **kwargs):
+    return Product.objects.create(tenant=tenant, service=service, name=name, inventory_month="2025-06", **kwargs)
+
+
+@pytest.mark.django_db
+def test_counter_follows_create_archive_and_delete():
+    tenant = TenantFactory()
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    a = _product(tenant, service, "A")
+    b = _product(tenant, service, "B")
+    _product(tenant, service, "Archivé", is_archived=True)
+    assert get_products_count(tenant) == 2
+
+    a.is_archived = True
+    a.save(update_fields=["is_archived"])
+    assert get_products_count(tenant) == 1
+    a.is_archived = False
+    a.save()
+    assert get_products_count(tenant) == 2
+
+    b.delete()
+    assert get_products_count(tenant) == Product.objects.filter(tenant=tenant).count() == 1
+
+
+@pytest.mark.django_db
+def test_product_create_reads_counter_instead_of_counting():
+    tenant = TenantFactory()
+    OrganizationOverrides.objects.create(tenant=tenant, custom_limits={"max_products": 2})
+    user = UserFactory(profile=tenant)
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    client = _auth_client(user)
+    url = f"/api/products/?service={service.id}"
+
+    def _payload(name):
+        return {"name": name, "inventory_month": "2025-06", "quantity": 1, "barcode": f"BC-{name}", "service": service.id}
+
+    # Le premier appel amorce le compteur, ensuite plus aucun COUNT(*) sur products_product.
+    assert client.post(url, _payload("P1"), format="json").status_code == 201
+    with CaptureQueriesContext(connection) as ctx:
+        assert client.post(url, _payload("P2"), format="json").status_code == 201
+        res = client.post(url, _payload("P3"), format="json")
+    assert res.status_code == 403
+    assert res.json()["code"] == "LIMIT_MAX_PRODUCTS"
+    assert not [q for q in ctx.captured_queries if 'COUNT(*)' in q["sql"] and "products_product" in q["sql"]]
+
+
+@pytest.mark.django_db
+def test_reserve_slots_is_all_or_nothing():
+    tenant = TenantFactory()
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    _product(tenant, service, "A")
+
+    reserve_product_slots(tenant, 99)
+    assert get_products_count(tenant) == 100
+    with pytest.raises(LimitExceeded):
+        reserve_product_slots(tenant, 1)
+    assert get_products_count(tenant) == 100
+
+
+@pytest.mark.django_db
+def test_reconcile_command_fixes_drift():
+    tenant = TenantFactory()
+    service = Service.objects.get(tenant=tenant, name="Principal")
+    _product(tenant, service, "A")
+    _product(tenant, service, "B")
+    TenantUsage.objects.filter(tenant=tenant).update(products_count=40)
+
+    call_command("reconcile_tenant_usage", "--tenant", str(tenant.id))
+    usage = TenantUsage.objects.get(tenant=tenant)
+    assert usage.products_count == 2
+    assert usage.reconciled_at is not None
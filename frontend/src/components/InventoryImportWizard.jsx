@@ -187,8 +187,9 @@ export default function InventoryImportWizard({
   };
 
   const downloadErrorReport = () => {
-    if (!preview?.rows?.length) return;
-    const csv = buildErrorsCsv(preview.rows);
+    const reportRows = preview?.invalid_rows || preview?.rows;
+    if (!reportRows?.length) return;
+    const csv = buildErrorsCsv(reportRows);
     const blob = new Blob([csv], { type: "text/csv;charset=utf-8;" });
     const url = URL.createObjectURL(blob);
     const link = document.createElement("a");
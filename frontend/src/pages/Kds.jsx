@@ -37,6 +37,8 @@ import { isKdsEnabled } from "../lib/kdsAccess";
 import kdsLogo from "../assets/kds-logo.png";
 
 const POLL_MS = 2500;
+const STREAM_FALLBACK_POLL_MS = 60000;
+const STREAM_RECONNECT_MS = 3000;
 const KDS_GUIDE_STORAGE = "kds_hub_guide_v2_cash_ui";
 const KDS_POS_NUDGE_STORAGE = "kds_pos_nudge_v2_cash_ui";
 
@@ -517,12 +519,30 @@ export default function KdsHub({ defaultTab = "orders" }) {
   const [cancelRestock, setCancelRestock] = useState(true);
   const [actionLoading, setActionLoading] = useState(false);
 
+  // Curseur de changements : seules les commandes modifiées depuis le dernier appel reviennent.
+  const kitchenCursorRef = useRef(0);
+  // Flux SSE proposé par le serveur (KDS_STREAM_ENABLED, servi en ASGI) ; sinon sondage du feed.
+  const [kitchenStreamEnabled, setKitchenStreamEnabled] = useState(false);
+
+  useEffect(() => {
+    kitchenCursorRef.current = 0;
+  }, [serviceId]);
+
   const fetchKitchenFeed = useCallback(async () => {
     if (!isReadyService || !kdsActive) return;
     setKitchenLoading(true);
     try {
-      const res = await api.get("/api/kds/kitchen/feed");
-      setKitchenOrders(res.data || []);
+      const res = await api.get("/api/kds/kitchen/feed", { params: { cursor: kitchenCursorRef.current } });
+      const data = res.data || {};
+      const changed = data.orders || [];
+      if (data.full) {
+        setKitchenOrders(changed);
+      } else {
+        const dropped = new Set([...(data.removed || []), ...changed.map((order) => order.id)]);
+        setKitchenOrders((prev) => [...changed, ...prev.filter((order) => !dropped.has(order.id))]);
+      }
+      kitchenCursorRef.current = data.cursor || 0;
+      setKitchenStreamEnabled(Boolean(data.stream));
     } catch {
       pushToast?.({ message: "Impossible de charger le flux cuisine.", type: "error" });
     } finally {
@@ -534,11 +554,91 @@ export default function KdsHub({ defaultTab = "orders" }) {
     fetchKitchenFeed();
   }, [fetchKitchenFeed]);
 
+  // Flux temps réel (SSE) : "hello" => rechargement complet, puis deltas appliqués localement.
+  const [kitchenLive, setKitchenLive] = useState(false);
+
+  useEffect(() => {
+    if (!isReadyService || !kdsActive || !kitchenStreamEnabled || typeof window.EventSource === "undefined") {
+      return undefined;
+    }
+    let source = null;
+    let reconnectTimer = null;
+    let cancelled = false;
+
+    const applyDelta = (event) => {
+      let payload = null;
+      try {
+        payload = JSON.parse(event.data);
+      } catch {
+        return;
+      }
+      const order = payload?.order;
+      if (!order?.id) return;
+      if (order.refetch) {
+        fetchKitchenFeed();
+        return;
+      }
+      setKitchenOrders((prev) => {
+        const rest = prev.filter((row) => row.id !== order.id);
+        if (order.status !== "SENT" && order.status !== "READY") return rest;
+        const current = prev.find((row) => row.id === order.id);
+        if (!current && !order.lines) {
+          fetchKitchenFeed();
+          return prev;
+        }
+        return [{ ...(current || {}), ...order }, ...rest];
+      });
+    };
+
+    // Ticket court et à usage unique (POST authentifié) : le jeton d'accès ne passe pas dans l'URL.
+    // EventSource rejouerait un ticket consommé : à chaque erreur, nouveau ticket puis reconnexion.
+    const connect = async () => {
+      let ticket = "";
+      try {
+        const res = await api.post("/api/kds/kitchen/stream/ticket/");
+        ticket = res?.data?.ticket || "";
+      } catch {
+        ticket = "";
+      }
+      if (cancelled) return;
+      if (!ticket) {
+        reconnectTimer = window.setTimeout(connect, STREAM_RECONNECT_MS);
+        return;
+      }
+      const params = new URLSearchParams({ service: String(serviceId), ticket });
+      source = new window.EventSource(`${api.defaults.baseURL}/api/kds/kitchen/stream/?${params}`);
+      source.addEventListener("hello", () => {
+        setKitchenLive(true);
+        fetchKitchenFeed();
+      });
+      source.addEventListener("reset", () => {
+        kitchenCursorRef.current = 0;
+        fetchKitchenFeed();
+      });
+      ["order.sent", "order.ready", "order.served", "order.cancelled"].forEach((name) =>
+        source.addEventListener(name, applyDelta)
+      );
+      source.onerror = () => {
+        source.close();
+        setKitchenLive(false);
+        if (!cancelled) reconnectTimer = window.setTimeout(connect, STREAM_RECONNECT_MS);
+      };
+    };
+    connect();
+
+    return () => {
+      cancelled = true;
+      window.clearTimeout(reconnectTimer);
+      if (source) source.close();
+      setKitchenLive(false);
+    };
+  }, [fetchKitchenFeed, isReadyService, kdsActive, kitchenStreamEnabled, serviceId]);
+
   useEffect(() => {
     if (!isReadyService || !kdsActive) return undefined;
-    const timer = window.setInterval(fetchKitchenFeed, POLL_MS);
+    const timer = window.setInterval(fetchKitchenFeed, kitchenLive ? STREAM_FALLBACK_POLL_MS : POLL_MS);
     return () => window.clearInterval(timer);
-  }, [fetchKitchenFeed, isReadyService, kdsActive]);
+  }, [fetchKitchenFeed, isReadyService, kdsActive, kitchenLive]);
 
   const sendKitchenAction = async (action, orderId) => {
     setActionLoading(true);
@@ -1127,7 +1227,7 @@ export default function KdsHub({ defaultTab = "orders" }) {
                   <div className="min-w-0">
                     <div className="text-[11px] uppercase tracking-wide text-[var(--muted)]">Cuisine</div>
                     <div className="text-lg font-black text-[var(--text)] leading-none">
-                      Flux auto toutes les {Math.round(POLL_MS / 100) / 10}s
+                      {kitchenLive ? "Flux en direct" : `Flux auto toutes les ${Math.round(POLL_MS / 100) / 10}s`}
                     </div>
                     <div className="mt-1 text-xs text-[var(--muted)]">
                       À préparer : {ordersByStatus.sent.length} · Prêt : {ordersByStatus.ready.length}